@@ -12,6 +12,7 @@ class DBDataManager(data_management.DataManager):
             monzo_stats_io=db_controller.MonzoTransactionsDBAccessor(db),
             revo_stats_io=db_controller.RevoTransactionsDBAccessor(db),
         )
+        self._transactions.migrate_transaction_tags()
 
 
 class CachedDBDataManager(data_management.CachedDataManager):
@@ -24,5 +25,6 @@ class CachedDBDataManager(data_management.CachedDataManager):
             monzo_stats_io=db_controller.MonzoTransactionsDBAccessor(db),
             revo_stats_io=db_controller.RevoTransactionsDBAccessor(db),
         )
+        self._transactions.migrate_transaction_tags()
 
 
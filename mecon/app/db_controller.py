@@ -1,8 +1,9 @@
 import logging
+from datetime import datetime
 from typing import Any, List
 
 import pandas as pd
-from sqlalchemy.sql.expression import case
+from sqlalchemy import select, insert, update, delete, bindparam, text, and_, func, inspect
 
 from mecon.app import models
 from mecon.etl import io_framework
@@ -11,6 +12,27 @@ from mecon.monitoring import logging_utils
 from mecon.utils import currencies
 
 
+def read_table(db, table, columns: List[str] | None = None, where=None,
+               dtypes: dict | None = None, datetime_columns: List[str] | None = None) -> pd.DataFrame:
+    """
+    Reads the rows of a table straight into a dataframe with a single query, instead of creating an ORM
+    object for each row. Only the selected columns are read and the where clause is applied by the database.
+    """
+    selected_columns = list(table.c) if columns is None else [table.c[col] for col in columns]
+    query = select(*selected_columns)
+    if where is not None:
+        query = query.where(where)
+
+    selected_names = [col.name for col in selected_columns]
+    dtypes = {col: dtype for col, dtype in (dtypes or {}).items() if col in selected_names}
+    with db.engine.connect() as connection:
+        df = pd.read_sql(query, connection, dtype=dtypes)
+    for col in datetime_columns or []:
+        if col in selected_names:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
 class TagsDBAccessor(io_framework.TagsIOABC):
     def __init__(self, db):
         self._db = db
@@ -156,18 +178,13 @@ class BaseTransactionsDBAccessor(io_framework.RawTransactionsIOABC):
         merged_df.to_sql(self._model.__tablename__, self._db.engine, if_exists='append', index=False)
 
     @logging_utils.codeflow_log_wrapper('#db#transactions')
-    def get_transactions(self) -> pd.DataFrame:
-        session = self._db.new_session()
+    def get_transactions(self, columns: List[str] | None = None) -> pd.DataFrame | None:
         try:
-            transactions = session.query(self._model).all()
-            transactions_df = pd.DataFrame([trans.to_dict() for trans in transactions])
+            transactions_df = read_table(self._db, self._model.__table__, columns=columns)
             return transactions_df if not transactions_df.empty else None
         except Exception as e:
             logging.error(f"Failed to retrieve transactions: {e}")
-            session.rollback()
             raise
-        finally:
-            session.close()
 
     @logging_utils.codeflow_log_wrapper('#db#transactions')
     def delete_all(self) -> None:
@@ -229,6 +246,9 @@ class InvalidTransactionsDataframeDataValueException(Exception):
 
 
 class TransactionsDBAccessor(io_framework.CombinedTransactionsIOABC):
+    DTYPES = {'amount': 'float64', 'amount_cur': 'float64'}
+    UPDATE_TAGS_BATCH_SIZE = 10_000
+
     def __init__(self, db):
         super().__init__()
         self._db = db
@@ -310,17 +330,82 @@ class TransactionsDBAccessor(io_framework.CombinedTransactionsIOABC):
     # ----------------- TRANSACTION OPERATIONS -----------------
 
     @logging_utils.codeflow_log_wrapper('#db#data#io')
-    def get_transactions(self) -> pd.DataFrame:
+    def get_transactions(self,
+                         start_date: datetime | None = None,
+                         end_date: datetime | None = None,
+                         columns: List[str] | None = None,
+                         containing_tags: List[str] | None = None,
+                         not_containing_tags: List[str] | None = None) -> pd.DataFrame:
         """
-        Retrieve all transactions from the database.
+        Retrieve the transactions from the database. The date range [start_date, end_date], the columns and the tag
+        filters are selected by the database, so only the needed data are read.
+        containing_tags keeps the transactions that have all the given tags, not_containing_tags drops the
+        transactions that have all the given tags (like the TagsColumnMixin methods with the same names).
         """
-        session = self._db.new_session()
-        try:
-            transactions = session.query(models.TransactionsDBTable).all()
-            transactions_df = pd.DataFrame([trans.to_dict() for trans in transactions])
-            return transactions_df
-        finally:
-            session.close()
+        table = models.TransactionsDBTable.__table__
+        conditions = []
+        if start_date is not None:
+            conditions.append(table.c.datetime >= start_date)
+        if end_date is not None:
+            conditions.append(table.c.datetime <= end_date)
+        if containing_tags:
+            conditions.append(table.c.id.in_(self._ids_with_all_tags(containing_tags)))
+        if not_containing_tags:
+            conditions.append(table.c.id.not_in(self._ids_with_all_tags(not_containing_tags)))
+
+        return read_table(self._db, table, columns=columns, where=and_(*conditions) if conditions else None,
+                          dtypes=self.DTYPES, datetime_columns=['datetime'])
+
+    @staticmethod
+    def _ids_with_all_tags(tags: List[str]):
+        tags_table = models.TransactionTagsDBTable.__table__
+        tags = set(tags)
+        return select(tags_table.c.transaction_id) \
+            .where(tags_table.c.tag.in_(tags)) \
+            .group_by(tags_table.c.transaction_id) \
+            .having(func.count() == len(tags))
+
+    @staticmethod
+    def _transaction_tag_rows(df_tags: pd.DataFrame) -> list[dict]:
+        """ Splits the 'tags' of each transaction into one {'transaction_id', 'tag'} row per tag. """
+        df_split = pd.DataFrame({'transaction_id': df_tags['id'].to_numpy(),
+                                 'tag': df_tags['tags'].fillna('').str.split(',').to_numpy()}).explode('tag')
+        df_split = df_split[df_split['tag'] != ''].drop_duplicates()
+        return df_split.to_dict('records')
+
+    def _create_indexes(self, connection) -> None:
+        # the table is recreated by load_transactions (to_sql), so its indexes may be missing
+        table_name = models.TransactionsDBTable.__tablename__
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table_name}_id ON {table_name} (id)"))
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table_name}_datetime ON {table_name} (datetime)"))
+
+    def _insert_transaction_tags(self, connection, df_tags: pd.DataFrame) -> None:
+        rows = self._transaction_tag_rows(df_tags)
+        for i in range(0, len(rows), self.UPDATE_TAGS_BATCH_SIZE):
+            connection.execute(insert(models.TransactionTagsDBTable.__table__), rows[i:i + self.UPDATE_TAGS_BATCH_SIZE])
+
+    @logging_utils.codeflow_log_wrapper('#db#tags')
+    def migrate_transaction_tags(self) -> None:
+        """
+        Creates the transaction_tags table and the indexes of the transactions table if they do not exist, and fills
+        transaction_tags from the 'tags' column of the transactions when it has not been filled yet
+        (i.e. databases created before transaction_tags).
+        """
+        tags_table = models.TransactionTagsDBTable.__table__
+        tags_table.create(self._db.engine, checkfirst=True)
+        if not inspect(self._db.engine).has_table(models.TransactionsDBTable.__tablename__):
+            return
+
+        with self._db.engine.begin() as connection:
+            self._create_indexes(connection)
+            is_filled = connection.execute(select(func.count()).select_from(tags_table)).scalar() > 0
+        if is_filled:
+            return
+
+        df_tags = read_table(self._db, models.TransactionsDBTable.__table__, columns=['id', 'tags'])
+        logging.info(f"Migrating the tags of {len(df_tags)} transactions to {tags_table.name}.")
+        with self._db.engine.begin() as connection:
+            self._insert_transaction_tags(connection, df_tags)
 
     @logging_utils.codeflow_log_wrapper('#db#data#io')
     def delete_all(self) -> None:
@@ -330,6 +415,7 @@ class TransactionsDBAccessor(io_framework.CombinedTransactionsIOABC):
         session = self._db.new_session()
         try:
             session.query(models.TransactionsDBTable).delete()
+            session.query(models.TransactionTagsDBTable).delete()
             session.commit()
         except Exception as e:
             logging.error(f"Failed to delete transactions: {e}")
@@ -373,32 +459,33 @@ class TransactionsDBAccessor(io_framework.CombinedTransactionsIOABC):
 
         # Store the merged data into the Transactions table
         df_merged.to_sql(models.TransactionsDBTable.__tablename__, self._db.engine, if_exists='replace', index=False)
+        with self._db.engine.begin() as connection:
+            self._create_indexes(connection)
+            connection.execute(delete(models.TransactionTagsDBTable.__table__))
 
     @logging_utils.codeflow_log_wrapper('#db#tags')
     def update_tags(self, df_tags: pd.DataFrame) -> None:
         """
-        Update the 'tags' column for the transactions based on a dataframe containing the updated tags.
+        Update the 'tags' column for the transactions based on a dataframe containing the updated tags,
+        and their rows in the transaction_tags table.
         """
         logging.info(f"Updating tags (shape: {df_tags.shape}) in DB.")
 
-        session = self._db.new_session()
+        table = models.TransactionsDBTable.__table__
+        tags_table = models.TransactionTagsDBTable.__table__
+        statement = update(table).where(table.c.id == bindparam('row_id')).values(tags=bindparam('row_tags'))
+        delete_statement = delete(tags_table).where(tags_table.c.transaction_id == bindparam('row_id'))
+        params = [{'row_id': row_id, 'row_tags': tags}
+                  for row_id, tags in zip(df_tags['id'].tolist(), df_tags['tags'].tolist())]
         try:
-            update_values = df_tags.set_index('id')['tags'].to_dict()
-
-            # Perform batch update using a SQLAlchemy case expression
-            session.query(models.TransactionsDBTable).filter(
-                models.TransactionsDBTable.id.in_(update_values.keys())
-            ).update(
-                {models.TransactionsDBTable.tags: case(update_values, value=models.TransactionsDBTable.id)},
-                synchronize_session=False
-            )
-
-            # Commit after all updates
-            session.commit()
-
+            # a single prepared statement executed for each row (executemany), in one transaction
+            with self._db.engine.begin() as connection:
+                self._create_indexes(connection)
+                for i in range(0, len(params), self.UPDATE_TAGS_BATCH_SIZE):
+                    connection.execute(statement, params[i:i + self.UPDATE_TAGS_BATCH_SIZE])
+                    connection.execute(delete_statement,
+                                       [{'row_id': p['row_id']} for p in params[i:i + self.UPDATE_TAGS_BATCH_SIZE]])
+                self._insert_transaction_tags(connection, df_tags)
         except Exception as e:
             logging.error(f"Failed to update tags: {e}")
-            session.rollback()
             raise
-        finally:
-            session.close()
@@ -139,7 +139,7 @@ class TransactionsDBTable(Base):
     __tablename__ = 'transactions_db_table'
 
     id = Column(Integer, primary_key=True)
-    datetime = Column(DateTime, nullable=False)
+    datetime = Column(DateTime, nullable=False, index=True)
     amount = Column(Float, nullable=False)
     currency = Column(String(10), nullable=False)
     amount_cur = Column(Float, nullable=False)
@@ -157,3 +157,20 @@ class TransactionsDBTable(Base):
             'tags': self.tags,
         }
 
+
+
+class TransactionTagsDBTable(Base):
+    """
+    One row for each tag of each transaction, the normalised form of TransactionsDBTable.tags used to filter
+    transactions by tag in SQL.
+    """
+    __tablename__ = 'transaction_tags'
+
+    tag = Column(String(50), primary_key=True)
+    transaction_id = Column(Integer, primary_key=True, index=True)
+
+    def to_dict(self):
+        return {
+            'transaction_id': self.transaction_id,
+            'tag': self.tag,
+        }
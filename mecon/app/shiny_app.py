@@ -5,6 +5,7 @@ from shiny import ui, Inputs, Outputs, Session, reactive, render
 
 from mecon import config
 from mecon.app.current_data import WorkingDataManager, WorkingDatasetDir
+from mecon.app.tagging_jobs import TaggingJobRunner
 from mecon.utils.html import build_url
 
 logging.basicConfig()
@@ -38,6 +39,62 @@ def create_data_manager():
     return WorkingDataManager()
 
 
+TAGGING_JOBS_POLL_SECONDS = 1
+_tagging_job_runner = None
+
+
+def get_tagging_job_runner() -> TaggingJobRunner:
+    """ The TaggingJobRunner of the app process, shared by all its sessions. """
+    global _tagging_job_runner
+    if _tagging_job_runner is None:
+        _tagging_job_runner = TaggingJobRunner(create_data_manager)
+    return _tagging_job_runner
+
+
+def tagging_jobs_status_ui():
+    return ui.output_ui(id='tagging_jobs_status')
+
+
+def tagging_jobs_function_factory(input: Inputs,
+                                  output: Outputs,
+                                  session: Session,
+                                  data_manager: WorkingDataManager, ):
+    """
+    Shows the background tagging jobs in the 'tagging_jobs_status' output (see tagging_jobs_status_ui), notifies when
+    they finish and reloads data_manager after they stored new data. Returns a reactive.Value with the version of the
+    data, for the reactive functions that read data_manager to depend on.
+    """
+    runner = get_tagging_job_runner()
+    data_version = reactive.Value(runner.version)
+    last_seen_job_id = max([0] + [job.id for job in runner.finished_jobs()])
+
+    @reactive.effect
+    def reload_after_tagging_jobs():
+        nonlocal last_seen_job_id
+        reactive.invalidate_later(TAGGING_JOBS_POLL_SECONDS)
+        for job in runner.finished_jobs(after_id=last_seen_job_id):
+            last_seen_job_id = max(last_seen_job_id, job.id)
+            ui.notification_show(job.description(), type='message' if job.state == 'done' else 'error',
+                                 duration=5 if job.state == 'done' else None, close_button=True)
+
+        with reactive.isolate():
+            if runner.version != data_version.get():
+                version = runner.reload(data_manager)  # None while a job is writing, then it is tried at the next poll
+                if version is not None:
+                    logging.info(f"Reloaded the data manager after the tagging jobs (data version {version}).")
+                    data_version.set(version)
+
+    @render.ui
+    def tagging_jobs_status():
+        reactive.invalidate_later(TAGGING_JOBS_POLL_SECONDS)
+        jobs = runner.active_jobs()
+        if len(jobs) == 0:
+            return None
+        return ui.card(*[ui.p(job.description()) for job in jobs])
+
+    return data_version
+
+
 def url_for_tag_report(**kwargs):
     url = build_url("http://127.0.0.1:8001/reports/tags/", kwargs)
     return url
@@ -306,22 +363,17 @@ def filter_funcs_factory(
     @reactive.calc
     def filtered_transactions():
         start_date, end_date, time_unit, filter_in_tags, filter_out_tags = get_filter_params().values()
-        transactions = data_manager.get_transactions()
+        filtered_in_and_out_transactions = data_manager.get_filtered_transactions(start_date, end_date,
+                                                                                  filter_in_tags, filter_out_tags)
 
-        in_date_range_transactions = transactions.select_date_range(start_date, end_date)
-        if in_date_range_transactions.size() == 0:
-            error_msg = f"No transactions found for '{time_unit}' time unit in given date range {start_date} to {end_date}."
-            raise ShinyTransactionFilterError(error_msg)
-
-        filtered_in_transactions = in_date_range_transactions.containing_tags(filter_in_tags)
-        if filtered_in_transactions.size() == 0:
-            error_msg = f"No transactions found for '{time_unit}' time unit containing {filter_in_tags} tags."
-            raise ShinyTransactionFilterError(error_msg)
-
-        filtered_in_and_out_transactions = filtered_in_transactions.not_containing_tags(filter_out_tags,
-                                                                                        empty_tags_strategy='all_true')
         if filtered_in_and_out_transactions.size() == 0:
-            error_msg = f"No transactions found for '{time_unit}' time unit after filtering out {filter_out_tags} tags."
+            # find which filter removed all the transactions, only when there is an error to report
+            if data_manager.get_filtered_transactions(start_date, end_date).size() == 0:
+                error_msg = f"No transactions found for '{time_unit}' time unit in given date range {start_date} to {end_date}."
+            elif data_manager.get_filtered_transactions(start_date, end_date, filter_in_tags).size() == 0:
+                error_msg = f"No transactions found for '{time_unit}' time unit containing {filter_in_tags} tags."
+            else:
+                error_msg = f"No transactions found for '{time_unit}' time unit after filtering out {filter_out_tags} tags."
             raise ShinyTransactionFilterError(error_msg)
 
         logging.info(
@@ -0,0 +1,194 @@
+"""
+tagging_jobs runs the slow data manager operations (re-tagging, loading statements, rebuilding the tags metadata) in a
+background thread, so the Shiny handler that requests one returns at once and the sessions stay responsive while it runs.
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from mecon.data.data_management import CachedFileDataManager
+
+
+class TaggingJob:
+    """
+    A request to a TaggingJobRunner, one of TaggingJobRunner.JOB_KINDS. tag_names are the changed tags of a 'retag' job.
+    Its state goes from 'queued' to 'running', and then to 'done' (with the result of the operation) or 'failed' (with
+    the error). While running, progress is the (done, total) batches of the tagging session.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, kind: str, tag_names=()):
+        self.id = next(self._ids)
+        self.kind = kind
+        self.tag_names = set(tag_names)
+        self.state = 'queued'
+        self.progress = (0, 0)
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._finished_event = threading.Event()
+
+    def __repr__(self):
+        return f"TaggingJob({self.id}, {self.kind}, {self.state})"
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ('done', 'failed')
+
+    def report_progress(self, done: int, total: int) -> None:
+        self.progress = (done, total)
+
+    def wait(self, timeout: float = None) -> bool:
+        """ Blocks until the job is finished (or timeout seconds passed), returns whether it is finished. """
+        return self._finished_event.wait(timeout)
+
+    def _finish(self, state: str, result=None, error: Exception = None) -> None:
+        self.state, self.result, self.error = state, result, error
+        self.finished_at = time.time()
+        self._finished_event.set()
+
+    def description(self) -> str:
+        titles = {'retag': f"Re-tagging {', '.join(sorted(self.tag_names))}",
+                  'reset_tags': "Re-tagging all the transactions",
+                  'ingest': "Loading the new statements",
+                  'metadata': "Rebuilding the tags metadata",
+                  'reset': "Reloading all the statements and re-tagging them"}
+        text = f"{titles[self.kind]}: {self.state}"
+        done, total = self.progress
+        if self.state == 'running' and total > 0:
+            text += f", batch {done}/{total}"
+        if self.state == 'done' and self.kind == 'ingest':
+            text += f", {self.result} new transactions"
+        if self.state == 'failed':
+            text += f" ({self.error!r})"
+        return text
+
+
+class TaggingJobRunner:
+    """
+    Runs TaggingJobs one at a time, in the order they were submitted, in a worker thread. Every job gets a new data
+    manager (from data_manager_factory), so it starts from the tags and transactions stored when it starts, and the data
+    managers of the sessions are never changed while they are in use. Every file is replaced atomically (see
+    TableFileStorage), but a job replaces several of them one by one, so it holds the storage lock while it runs and the
+    sessions reload their data manager with reload, that holds it too and so never reads the files of two versions.
+    version is incremented after every successful job, so the sessions know when to reload.
+    Duplicate requests are coalesced into the last queued job (it has not read anything yet, so it will see the changes
+    of both requests):
+    * a job of the same kind, the tag names of 'retag' jobs are merged
+    * a job that does the work of the new one too, like a queued 'reset_tags' for a new 'retag'
+    * a new job that does the work of the queued one too replaces its kind, like a new 'reset_tags' for a queued 'retag'
+    """
+    JOB_KINDS = ('retag', 'reset_tags', 'ingest', 'metadata', 'reset')
+    # the kinds of jobs whose work is also done by a job of the key kind
+    SUBSUMED_KINDS = {
+        'retag': {'metadata'},
+        'reset_tags': {'retag', 'metadata'},
+        'ingest': {'metadata'},
+        'metadata': set(),
+        'reset': {'retag', 'reset_tags', 'ingest', 'metadata'},
+    }
+
+    def __init__(self, data_manager_factory: Callable[[], CachedFileDataManager]):
+        self._data_manager_factory = data_manager_factory
+        self._lock = threading.Lock()
+        self._storage_lock = threading.Lock()  # held while a job writes the files, and while a session reads them
+        self._queue = deque()
+        self._jobs = []
+        self._running_job = None
+        self._thread = None
+        self.version = 0
+
+    def submit(self, kind: str, tag_names=()) -> TaggingJob:
+        """ Queues a job (or coalesces it with the last queued one, see TaggingJobRunner) and returns it. """
+        if kind not in self.JOB_KINDS:
+            raise ValueError(f"Invalid job kind '{kind}', valid kinds are {list(self.JOB_KINDS)}")
+
+        with self._lock:
+            if len(self._queue) > 0 and self._coalesce(self._queue[-1], kind, tag_names):
+                logging.info(f"Coalesced the {kind} request into {self._queue[-1]}.")
+                return self._queue[-1]
+
+            job = TaggingJob(kind, tag_names)
+            self._queue.append(job)
+            self._jobs.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name='tagging-jobs', daemon=True)
+                self._thread.start()
+            return job
+
+    def _coalesce(self, queued_job: TaggingJob, kind: str, tag_names) -> bool:
+        if kind == queued_job.kind or kind in self.SUBSUMED_KINDS[queued_job.kind]:
+            if queued_job.kind == 'retag':
+                queued_job.tag_names |= set(tag_names)
+            return True
+        if queued_job.kind in self.SUBSUMED_KINDS[kind]:
+            queued_job.kind, queued_job.tag_names = kind, set(tag_names)
+            return True
+        return False
+
+    def active_jobs(self) -> list[TaggingJob]:
+        """ The running job and the queued ones, in the order they will run. """
+        with self._lock:
+            running = [self._running_job] if self._running_job is not None else []
+            return running + list(self._queue)
+
+    def finished_jobs(self, after_id: int = 0) -> list[TaggingJob]:
+        """ The finished jobs that were submitted after the job with after_id. """
+        with self._lock:
+            return [job for job in self._jobs if job.id > after_id and job.finished]
+
+    def reload(self, data_manager: CachedFileDataManager) -> int | None:
+        """
+        Reloads data_manager from the stored files and returns the version it has now. While a job is writing them it
+        returns None without waiting (the session stays responsive), so the caller tries again later.
+        """
+        if not self._storage_lock.acquire(blocking=False):
+            return None
+        try:
+            data_manager.reload()
+            return self.version
+        finally:
+            self._storage_lock.release()
+
+    def _work(self) -> None:
+        while True:
+            with self._lock:
+                if len(self._queue) == 0:
+                    self._thread = None
+                    return
+                job = self._running_job = self._queue.popleft()
+                job.state = 'running'
+
+            logging.info(f"Running {job}.")
+            try:
+                with self._storage_lock:
+                    result = self._run(job)
+                    with self._lock:
+                        self._running_job = None
+                        self.version += 1
+            except Exception as error:
+                logging.exception(f"{job} failed: {error!r}")
+                with self._lock:
+                    self._running_job = None
+                job._finish('failed', error=error)
+            else:
+                job._finish('done', result=result)
+                logging.info(f"{job} finished in {job.finished_at - job.submitted_at:.1f} seconds.")
+
+    def _run(self, job: TaggingJob):
+        data_manager = self._data_manager_factory()
+        data_manager.progress = job.report_progress
+        if job.kind == 'retag':
+            return data_manager.update_transaction_tags(sorted(job.tag_names))
+        elif job.kind == 'reset_tags':
+            return data_manager.reset_transaction_tags()
+        elif job.kind == 'ingest':
+            return data_manager.load_new_statements()
+        elif job.kind == 'metadata':
+            return data_manager.rebuild_tags_metadata()
+        else:
+            return data_manager.reset()
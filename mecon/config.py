@@ -56,6 +56,9 @@ HISTORIC_PERFORMANCE_DATA_FILENAME = "performance_data.csv"
 
 TRANSACTIONS_CHUNK_SIZE = 250
 
+PLAN_CACHE_MAX_BYTES = 50 * 1024 * 1024
+TRANSFORMATION_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
 EXPECTED_MONZO_COLUMNS_IN_RAW_STATEMENT = {'Transaction',
                                            "ID",
                                            "Date", "Time", "Type", "Name", "Emoji",
@@ -20,9 +20,53 @@ def aggregate_currencies(currencies):
     # return json.dumps(dict(sorted(Counter(currencies).items(), reverse=True)))
     return ','.join(currencies.to_list())
 
+
+def aggregate_tags(tags):
+    return ','.join(sorted(aggregate_tags_set(tags)))
+
+
 ID_AGGREGATION_VALUE = 'aggregated'
 
+
+def aggregate_id(ids):
+    return ID_AGGREGATION_VALUE
+
+
+def _groupby_concat_strings(grouped_column) -> pd.Series:
+    str_column = grouped_column.obj.astype(str)
+    return str_column.groupby(grouped_column.ngroup().to_numpy(), sort=False).agg(','.join)
+
+
+def _groupby_aggregate_currencies(grouped_column) -> pd.Series:
+    return grouped_column.agg(','.join)
+
+
+def _groupby_aggregate_tags(grouped_column) -> pd.Series:
+    """ The sorted unique tags of each group, splitting each distinct tags value once instead of every row. """
+    codes, unique_tags_values = pd.factorize(grouped_column.obj)
+    df_tags = pd.DataFrame({'group': grouped_column.ngroup().to_numpy(), 'code': codes})
+    df_tags = df_tags[df_tags['code'] >= 0].drop_duplicates()
+    split_tags_values = pd.Series(unique_tags_values, dtype=object).str.split(',').to_numpy()
+    df_tags = pd.DataFrame({'group': df_tags['group'].to_numpy(),
+                            'tag': split_tags_values[df_tags['code'].to_numpy()]}).explode('tag')
+    df_tags = df_tags[df_tags['tag'].str.len() > 0].drop_duplicates().sort_values(['group', 'tag'])
+    tags_per_group = df_tags.groupby('group', sort=True)['tag'].agg(','.join)
+    return tags_per_group.reindex(range(grouped_column.ngroups), fill_value='')
+
+
+def _groupby_aggregate_id(grouped_column) -> pd.Series:
+    return pd.Series([ID_AGGREGATION_VALUE] * grouped_column.ngroups, dtype=object)
+
+
 class TransactionAggregator(InTypeAggregator):
+    _groupby_aggregations = {
+        **InTypeAggregator._groupby_aggregations,
+        concat_strings: _groupby_concat_strings,
+        aggregate_currencies: _groupby_aggregate_currencies,
+        aggregate_tags: _groupby_aggregate_tags,
+        aggregate_id: _groupby_aggregate_id,
+    }
+
     def __init__(self, id_agg, datetime_agg, amount_agg, currency_agg, description_agg, tags_agg):
         super().__init__({
             'id': id_agg,
@@ -45,12 +89,12 @@ class CustomisableDefaultTransactionAggregator(TransactionAggregator):
                  tags_agg=None):
 
         # id_agg = min if id_agg is None else id_agg  # (lambda ints: int(''.join([str(i) for i in ints]))) if id_agg is None else id_agg # TODO:v3 if id becomes a string, then just concat
-        id_agg = (lambda x: ID_AGGREGATION_VALUE) if id_agg is None else id_agg
+        id_agg = aggregate_id if id_agg is None else id_agg
         datetime_agg = min if datetime_agg is None else datetime_agg
         amount_agg = sum if amount_agg is None else amount_agg
         currency_agg = aggregate_currencies if currency_agg is None else currency_agg
         description_agg = concat_strings if description_agg is None else description_agg
-        tags_agg = (lambda tags_set: ','.join(sorted(aggregate_tags_set(tags_set)))) if tags_agg is None else tags_agg
+        tags_agg = aggregate_tags if tags_agg is None else tags_agg
 
         super().__init__(
             id_agg=id_agg,
@@ -103,6 +147,12 @@ class CustomisableAmountTransactionAggregator(CustomisableDefaultTransactionAggr
         )
 
     def _round_dates(self, dt_series: pd.Series):
-        date_floors = dt_series.apply(lambda dt: calendar_utils.date_floor(dt, self._date_group_unit))
-        min_date_floors = min(date_floors)
+        date_floors = calendar_utils.date_floor_series(dt_series, self._date_group_unit)
+        min_date_floors = date_floors.min()
         return min_date_floors
+
+    def groupby_aggregation(self, grouped_column, agg_func) -> pd.Series:
+        if agg_func == self._round_dates:
+            # the floor of the minimum date is the minimum of the date floors
+            return calendar_utils.date_floor_series(grouped_column.min(), self._date_group_unit)
+        return super().groupby_aggregation(grouped_column, agg_func)
@@ -1,18 +1,32 @@
+import hashlib
 import json
 import logging
 import pathlib
-from datetime import datetime
+from collections import namedtuple
+from datetime import datetime, date, timedelta
 from typing import List
 
 import pandas as pd
 
+from mecon.data.file_storage import TableFileStorage, CSVFileStorage, STORAGE_FORMAT_SETTING
 from mecon.data.transactions import Transactions
 from mecon.etl import io_framework
 from mecon.etl.dataset import Dataset
-from mecon.tags.process import OptREPTagging
-from mecon.tags.tag_helpers import tag_stats_from_transactions
+from mecon.tags.plan_cache import PlanCache
+from mecon.tags.process import OptREPTagging, IncrementalTagging, RowChunkedTagging, TaggingSession, \
+    RuleExecutionPlanMonitor
+from mecon.tags.tag_helpers import tag_stats_from_transactions, compact_rule_json
 from mecon.tags.tagging import Tag
+from mecon.tags.transformation_cache import TransformationCache
 from mecon.etl import transformers
+from mecon.utils import calendar_utils
+
+
+TAGGING_WORKERS_SETTING = 'tagging_workers'
+
+# the result of CachedFileDataManager.preview_tag: the transactions with the previewed tags, a boolean array of the rows
+# whose tags changed and the names of the tags that were recalculated
+TagPreview = namedtuple('TagPreview', ['transactions', 'changed_rows', 'tag_names'])
 
 
 class BaseDataManager:
@@ -33,6 +47,21 @@ class BaseDataManager:
     def get_transactions(self) -> Transactions:
         return Transactions(self._transactions.get_transactions())
 
+    def get_filtered_transactions(self,
+                                  start_date: str | datetime | date | None = None,
+                                  end_date: str | datetime | date | None = None,
+                                  containing_tags: List[str] | None = None,
+                                  not_containing_tags: List[str] | None = None) -> Transactions:
+        """
+        Returns the transactions in the date range (inclusive) that contain all containing_tags and do not contain
+        all not_containing_tags. The filters are applied when the transactions are read, so only these are loaded.
+        """
+        start_datetime, end_datetime = _date_range_to_datetimes(start_date, end_date)
+        return Transactions(self._transactions.get_transactions(start_date=start_datetime,
+                                                                end_date=end_datetime,
+                                                                containing_tags=containing_tags,
+                                                                not_containing_tags=not_containing_tags))
+
     def reset_transactions(self):
         self._transactions.delete_all()
         self._transactions.load_transactions()
@@ -71,14 +100,14 @@ class BaseDataManager:
         return Tag.from_json(tag_name, tag_dict['conditions_json'])
 
     def update_tag(self, tag: Tag, update_tags=True):
-        self._tags.set_tag(tag.name, tag.rule.to_json())
+        self._tags.set_tag(tag.name, compact_rule_json(tag.rule.to_json()))
         if update_tags:
-            self.reset_transaction_tags()
+            self.update_transaction_tags([tag.name])
 
     def delete_tag(self, tag_name: str, update_tags=True):
         self._tags.delete_tag(tag_name)
         if update_tags:
-            self.reset_transaction_tags()
+            self.update_transaction_tags([tag_name])
 
     def all_tags(self) -> List[Tag]:
         tags_dict = self._tags.all_tags()
@@ -98,6 +127,21 @@ class BaseDataManager:
         tags_metadata = tag_stats_from_transactions(transactions)
         self.replace_tags_metadata(tags_metadata)
 
+    def update_transaction_tags(self, tag_names: List[str]):
+        """
+        Re-tags the transactions only for the changed tag_names and the tags that depend on them,
+        and writes back only the transactions whose tags changed.
+        """
+        sess = IncrementalTagging(self.all_tags(), tag_names)
+        transactions = sess.tag(self.get_transactions())
+
+        if sess.changed_rows.any():
+            data_df = transactions.dataframe()
+            self._transactions.update_tags(data_df[sess.changed_rows])
+
+        tags_metadata = tag_stats_from_transactions(transactions)
+        self.replace_tags_metadata(tags_metadata)
+
     def get_tags_metadata(self):
         tags_metadata_df = self._tags_metadata.get_all_metadata()
         # TODO date_created currently not returned by the tags_io
@@ -135,6 +179,16 @@ class CachedDataManager(BaseDataManager):
             self._cache.transaction = Transactions(trans_df)
         return self._cache.transaction
 
+    def get_filtered_transactions(self,
+                                  start_date: str | datetime | date | None = None,
+                                  end_date: str | datetime | date | None = None,
+                                  containing_tags: List[str] | None = None,
+                                  not_containing_tags: List[str] | None = None) -> Transactions:
+        if self._cache.transaction is not None:
+            return filter_transactions(self._cache.transaction, start_date, end_date,
+                                       containing_tags, not_containing_tags)
+        return super().get_filtered_transactions(start_date, end_date, containing_tags, not_containing_tags)
+
     def reset_transactions(self):
         self._cache.reset_transactions()
         super().reset_transactions()
@@ -187,6 +241,10 @@ class CachedDataManager(BaseDataManager):
         super().reset_transaction_tags()
         self._cache.reset_transactions()
 
+    def update_transaction_tags(self, tag_names: List[str]):
+        super().update_transaction_tags(tag_names)
+        self._cache.reset_transactions()
+
     def get_tags_metadata(self):
         if self._cache.tags_metadata is None:
             self._cache.tags_metadata = super().get_tags_metadata()
@@ -227,43 +285,145 @@ class DataCache:
         self.reset_tags_metadata()
 
 
+def filter_transactions(transactions: Transactions,
+                        start_date: str | datetime | date | None = None,
+                        end_date: str | datetime | date | None = None,
+                        containing_tags: List[str] | None = None,
+                        not_containing_tags: List[str] | None = None) -> Transactions:
+    """ The in-memory equivalent of BaseDataManager.get_filtered_transactions. """
+    return transactions \
+        .select_date_range(start_date, end_date) \
+        .containing_tags(containing_tags) \
+        .not_containing_tags(not_containing_tags, empty_tags_strategy='all_true')
+
+
+def _date_range_to_datetimes(start_date, end_date) -> tuple[datetime | None, datetime | None]:
+    """ Converts an inclusive date range to the first and last moment it contains. """
+    start_datetime = calendar_utils.to_datetime(calendar_utils.to_date(start_date)) if start_date is not None else None
+    end_datetime = calendar_utils.to_datetime(calendar_utils.to_date(end_date)) + timedelta(days=1) - \
+                   timedelta(microseconds=1) if end_date is not None else None
+    return start_datetime, end_datetime
+
+
+def _file_hash(path: pathlib.Path) -> str:
+    return hashlib.sha256(pathlib.Path(path).read_bytes()).hexdigest()
+
+
 class CachedFileDataManager:
     def __init__(self, dataset: Dataset):
         self.dataset = dataset
         self.files_dirpath = dataset.db.parent
         self.statements_dirpath = self.files_dirpath / "statements"
+        self.storage = TableFileStorage.factory(self.storage_format, self.files_dirpath)
+        self.plan_cache = PlanCache(self.files_dirpath / 'plan_cache')
+        self.transformation_cache = TransformationCache(self.files_dirpath / 'transformation_cache')
+        self.progress = None  # passed to the tagging sessions, see TaggingSession.progress
 
         self.transactions = None
-        self._transactions_path = self.files_dirpath / 'transactions.csv'
-        self._load_transactions()
-
         self.tags_df = None
-        self._tags_path = self.files_dirpath / 'tags.csv'
-        self._load_tags()
-
         self.tags_metadata_df = None
-        self._tags_metadata_path = self.files_dirpath / 'tags_metadata.csv'
+        self.statements_manifest_df = None
+        self._statements_manifest_path = self.files_dirpath / 'statements_manifest.csv'
+        self.reload()
+
+    def reload(self):
+        """
+        Reads the transactions, tags, tags metadata and statements manifest again from their files, like after a
+        background job (mecon.app.tagging_jobs) stored new ones with another data manager.
+        """
+        self._load_transactions()
+        self._load_tags()
         self._load_tags_metadata()
-        pass
+        self._load_statements_manifest()
+        return self
+
+    @property
+    def storage_format(self) -> str:
+        return self.dataset.settings.get(STORAGE_FORMAT_SETTING, CSVFileStorage.format_name)
+
+    @property
+    def tagging_workers(self) -> int:
+        """ The number of processes that tag the transactions in parallel row chunks, 1 (the default) for no chunks. """
+        return int(self.dataset.settings.get(TAGGING_WORKERS_SETTING, 1))
+
+    def tagging_plan(self, tags: List[Tag]) -> OptREPTagging:
+        """
+        The OptREPTagging session of tags, with its optimised plan loaded from the plan cache when possible, and the
+        transformed columns loaded from the transformation cache.
+        """
+        sess = self.plan_cache.session(tags)
+        sess.transformation_cache = self.transformation_cache
+        sess.progress = self.progress
+        return sess
+
+    def _full_tagging_session(self, tags: List[Tag]) -> TaggingSession:
+        sess = self.tagging_plan(tags)
+        return RowChunkedTagging(sess, workers=self.tagging_workers) if self.tagging_workers > 1 else sess
+
+    @property
+    def _transactions_path(self) -> pathlib.Path:
+        return self.storage.path('transactions')
+
+    @property
+    def _tags_path(self) -> pathlib.Path:
+        return self.storage.path('tags')
+
+    @property
+    def _tags_metadata_path(self) -> pathlib.Path:
+        return self.storage.path('tags_metadata')
 
     def _load_transactions(self):
-        self.transactions = Transactions.from_csv(self._transactions_path) if self._transactions_path.exists() else None
+        self.transactions = Transactions(self.storage.read_transactions('transactions')) \
+            if self.storage.exists('transactions') else None
 
     def _load_tags(self):
-        self.tags_df = pd.read_csv(self._tags_path, index_col=None) if self._tags_path.exists() else None
+        self.tags_df = self.storage.read('tags') if self.storage.exists('tags') else None
 
     def _load_tags_metadata(self):
-        self.tags_metadata_df = pd.read_csv(self._tags_metadata_path,
-                                            index_col=None) if self._tags_metadata_path.exists() else None
+        self.tags_metadata_df = self.storage.read('tags_metadata') if self.storage.exists('tags_metadata') else None
+
+    def _load_statements_manifest(self):
+        self.statements_manifest_df = pd.read_csv(self._statements_manifest_path, index_col=None) \
+            if self._statements_manifest_path.exists() else \
+            pd.DataFrame(columns=['source', 'path', 'mtime_ns', 'hash', 'rows'])
 
     def _save_transactions(self):
-        self.transactions.dataframe().to_csv(self._transactions_path, index=False)
+        self.storage.write_transactions('transactions', self.transactions.dataframe())
+
+    def _save_transaction_tags(self):
+        self.storage.write_transaction_tags('transactions', self.transactions.dataframe())
 
     def _save_tags(self):
-        self.tags_df.to_csv(self._tags_path, index=False)
+        self.storage.write('tags', self.tags_df)
 
     def _save_tags_metadata(self):
-        self.tags_metadata_df.to_csv(self._tags_metadata_path, index=False)
+        self.storage.write('tags_metadata', self.tags_metadata_df)
+
+    def _save_statements_manifest(self):
+        self.statements_manifest_df.to_csv(self._statements_manifest_path, index=False)
+
+    def migrate_storage(self, storage_format: str):
+        """
+        Rewrites the transactions, tags and tags metadata of the dataset with the storage_format, stores the choice
+        in the dataset's settings and deletes the files of the previous format.
+        """
+        if storage_format == self.storage_format:
+            return self
+
+        old_storage, new_storage = self.storage, TableFileStorage.factory(storage_format, self.files_dirpath)
+        logging.info(f"Migrating {self.dataset.name} dataset storage from {old_storage.format_name} to {storage_format}.")
+        self.storage = new_storage
+        if self.transactions is not None:
+            self._save_transactions()
+        if self.tags_df is not None:
+            self._save_tags()
+        if self.tags_metadata_df is not None:
+            self._save_tags_metadata()
+        self.dataset.settings[STORAGE_FORMAT_SETTING] = storage_format
+
+        for table_name in ['transactions', 'tags', 'tags_metadata']:
+            old_storage.delete(table_name)
+        return self
 
     def get_statement_filepaths(self) -> dict[str, list[pathlib.Path]]:
         # all_statement_paths = list(self.statements_dirpath.rglob("*.csv"))
@@ -278,20 +438,24 @@ class CachedFileDataManager:
         sources_and_filenames = self.dataset.statement_files()
         return sources_and_filenames
 
-    def get_statements(self) -> dict[str, list[pd.DataFrame]]:
-        filepaths = self.get_statement_filepaths()
+    def get_statements(self, filepaths: dict[str, list[pathlib.Path]] = None) -> dict[str, list[pd.DataFrame]]:
+        filepaths = self.get_statement_filepaths() if filepaths is None else filepaths
         sources_and_statements = {
             source: [transformers.StatementTransformer.factory(source).read_df(filepath) for filepath in filepaths]
             for source, filepaths in filepaths.items() if source in transformers.StatementTransformer.SOURCES}
         return sources_and_statements
 
-    def get_transformed_statements(self) -> dict[str, pd.DataFrame]:
-        sources_and_statements = self.get_statements().copy()
+    def get_transformed_statements(self,
+                                   sources_and_statements: dict[str, list[pd.DataFrame]] = None,
+                                   ordinal_offsets: dict[str, int] = None) -> dict[str, pd.DataFrame]:
+        sources_and_statements = (self.get_statements() if sources_and_statements is None else sources_and_statements).copy()
+        ordinal_offsets = {} if ordinal_offsets is None else ordinal_offsets
         sources_and_merged_statenents = {}
         for source, statements in sources_and_statements.items():
             try:
                 merged_statements = pd.concat(statements)
                 transformer = transformers.StatementTransformer.factory(source)
+                transformer.ordinal_offset = ordinal_offsets.get(source, 0)
                 transformed_statement = transformer.transform(merged_statements)
                 sources_and_merged_statenents[source] = transformed_statement
             except ValueError:
@@ -303,8 +467,24 @@ class CachedFileDataManager:
 
         return sources_and_merged_statenents
 
+    def _statements_manifest(self,
+                             filepaths: dict[str, list[pathlib.Path]],
+                             sources_and_statements: dict[str, list[pd.DataFrame]]) -> pd.DataFrame:
+        """ Returns a row for each read statement file, with the info needed to recognise it in a later load. """
+        rows = []
+        for source, statements in sources_and_statements.items():
+            for filepath, df_statement in zip(filepaths[source], statements):
+                rows.append({'source': source,
+                             'path': pathlib.Path(filepath).relative_to(self.dataset.statements).as_posix(),
+                             'mtime_ns': pathlib.Path(filepath).stat().st_mtime_ns,
+                             'hash': _file_hash(filepath),
+                             'rows': len(df_statement)})
+        return pd.DataFrame(rows, columns=['source', 'path', 'mtime_ns', 'hash', 'rows'])
+
     def reset_transactions(self):
-        sources_and_statements = self.get_transformed_statements()
+        filepaths = self.get_statement_filepaths()
+        sources_and_raw_statements = self.get_statements(filepaths)
+        sources_and_statements = self.get_transformed_statements(sources_and_raw_statements)
         df_merged = pd.concat(sources_and_statements.values())
         df_merged.sort_values(by=["datetime"], inplace=True)
 
@@ -312,11 +492,96 @@ class CachedFileDataManager:
         df_merged['tags'] = ''  # '[[] for _ in range(len(df_merged))]
         self._save_transactions()
         # logging.info(f"Wrote {self.transactions.size()} transactions to {self.files_dirpath}")
+
+        self.statements_manifest_df = self._statements_manifest(filepaths, sources_and_raw_statements)
+        self._save_statements_manifest()
         return self
 
+    def new_statement_filepaths(self) -> dict[str, list[pathlib.Path]]:
+        """
+        Returns the statement files that have not been loaded yet. A file is considered loaded if its
+        modification time is the same as when it was loaded, or else if its content hash is the same as
+        the hash of any loaded file (i.e. it was touched, copied or renamed).
+        """
+        manifest = self.statements_manifest_df
+        known_mtimes = dict(zip(manifest['path'], manifest['mtime_ns']))
+        known_hashes = set(manifest['hash'])
+
+        new_filepaths = {}
+        for source, filepaths in self.get_statement_filepaths().items():
+            if source not in transformers.StatementTransformer.SOURCES:
+                continue
+
+            for filepath in filepaths:
+                rel_path = pathlib.Path(filepath).relative_to(self.dataset.statements).as_posix()
+                if known_mtimes.get(rel_path) == pathlib.Path(filepath).stat().st_mtime_ns:
+                    continue
+                if _file_hash(filepath) in known_hashes:
+                    continue
+                if rel_path in known_mtimes:
+                    logging.warning(f"Statement file {rel_path} has changed since it was loaded. Its new transactions "
+                                    f"will be added, but removed or modified ones need a full reset.")
+                new_filepaths.setdefault(source, []).append(filepath)
+
+        return new_filepaths
+
+    def load_new_statements(self) -> int:
+        """
+        Adds the transactions of the statement files that have not been loaded yet, without re-reading, re-transforming
+        and re-tagging the existing transactions. The new transactions that already exist (same id) are ignored,
+        the rest are tagged with the current tags and merged into the sorted transactions.
+        Returns the number of added transactions.
+        """
+        if self.transactions is None:
+            self.reset()
+            return self.transactions.size()
+
+        filepaths = self.new_statement_filepaths()
+        if len(filepaths) == 0:
+            logging.info(f"No new statement files to load.")
+            return 0
+
+        manifest = self.statements_manifest_df
+        ordinal_offsets = {source: int(manifest[manifest['source'] == source]['rows'].sum()) for source in filepaths}
+        sources_and_raw_statements = self.get_statements(filepaths)
+        sources_and_statements = self.get_transformed_statements(sources_and_raw_statements, ordinal_offsets)
+
+        df_old = self.transactions.dataframe()
+        df_new = pd.concat(sources_and_statements.values())
+        df_new = df_new[~df_new['id'].isin(df_old['id'])].drop_duplicates(subset=['id'])
+        df_new = df_new.sort_values(by=['datetime'], kind='stable')
+        df_new['tags'] = ''
+        logging.info(f"Loading {len(df_new)} new transactions from {sum(map(len, filepaths.values()))} statement files.")
+
+        new_transactions = Transactions(df_new.reset_index(drop=True))
+        if self.tags_df is not None and len(self.tags_df) > 0 and new_transactions.size() > 0:
+            sess = self._full_tagging_session(self.all_tags())
+            new_transactions = sess.tag(new_transactions)
+
+        df_merged = pd.concat([df_old, new_transactions.dataframe()[df_old.columns]])
+        df_merged = df_merged.sort_values(by=['datetime'], kind='stable').reset_index(drop=True)
+        self.transactions = Transactions(df_merged)
+        self._save_transactions()
+
+        self.statements_manifest_df = pd.concat(
+            [manifest, self._statements_manifest(filepaths, sources_and_raw_statements)], ignore_index=True)
+        self._save_statements_manifest()
+
+        if self.tags_df is not None:
+            self.rebuild_tags_metadata()
+
+        return len(df_new)
+
     def get_transactions(self) -> Transactions:
         return self.transactions
 
+    def get_filtered_transactions(self,
+                                  start_date: str | datetime | date | None = None,
+                                  end_date: str | datetime | date | None = None,
+                                  containing_tags: List[str] | None = None,
+                                  not_containing_tags: List[str] | None = None) -> Transactions:
+        return filter_transactions(self.get_transactions(), start_date, end_date, containing_tags, not_containing_tags)
+
     def get_tagged_transactions(self) -> Transactions:
         if 'tags' not in self.transactions.dataframe().columns:
             self.reset_transaction_tags()
@@ -341,10 +606,10 @@ class CachedFileDataManager:
                 'conditions_json': None,
                 'date_created': datetime.strftime(datetime.now(), '%Y-%m-%d %H:%M:%S'),
             }
-        tags_dict[tag_name]['conditions_json'] = json.dumps(tag.rule.to_json())
+        tags_dict[tag_name]['conditions_json'] = json.dumps(compact_rule_json(tag.rule.to_json()))
         self.tags_df = pd.DataFrame.from_dict(tags_dict, orient='index').reset_index().rename(columns={'index': 'name'})
         if update_tags:
-            self.reset_transaction_tags()
+            self.update_transaction_tags([tag_name])
 
         self._save_tags()
 
@@ -358,7 +623,7 @@ class CachedFileDataManager:
         self.tags_df = pd.DataFrame.from_dict(tags_dict, orient='index').reset_index().rename(columns={'index': 'name'})
 
         if update_tags:
-            self.reset_transaction_tags()
+            self.update_transaction_tags([tag_name])
 
         self._save_tags()
 
@@ -370,20 +635,46 @@ class CachedFileDataManager:
         transactions = self.get_transactions().reset_tags()
         all_tags = self.all_tags()
 
-        sess = OptREPTagging(all_tags) \
-            .create_rule_execution_plan() \
-            .create_optimised_rule_execution_plan()
+        sess = self._full_tagging_session(all_tags)
         transactions = sess.tag(transactions)
         self.transactions = transactions
-        self._save_transactions()
+        self._save_transaction_tags()
 
-        tags_metadata = tag_stats_from_transactions(transactions)
-        self.replace_tags_metadata(tags_metadata)
+        self.rebuild_tags_metadata()
+
+    def preview_tag(self, tag: Tag, monitor: RuleExecutionPlanMonitor = None) -> TagPreview:
+        """
+        The transactions as they would be if tag was saved (replacing the tag with the same name), without saving
+        anything. Only tag and the tags that depend on it are calculated, the rest of the tags are taken from the
+        already tagged transactions (see IncrementalTagging). The monitor, if given, gets only their calculations.
+        """
+        all_tags = self.all_tags()
+        tags = [tag if curr_tag.name == tag.name else curr_tag for curr_tag in all_tags]
+        if tag.name not in {curr_tag.name for curr_tag in all_tags}:
+            tags.append(tag)
+
+        sess = IncrementalTagging(tags, [tag.name], transformation_cache=self.transformation_cache)
+        transactions = sess.tag(self.get_transactions(), monitor=monitor)
+        return TagPreview(transactions, sess.changed_rows, sorted(sess.affected_tag_names()))
+
+    def update_transaction_tags(self, tag_names: List[str]):
+        """
+        Re-tags the transactions only for the changed tag_names and the tags that depend on them.
+        """
+        if 'tags' not in self.transactions.dataframe().columns:
+            self.reset_transaction_tags()
+            return
+
+        sess = IncrementalTagging(self.all_tags(), tag_names, transformation_cache=self.transformation_cache)
+        sess.progress = self.progress
+        self.transactions = sess.tag(self.get_transactions())
+        self._save_transaction_tags()
+
+        self.rebuild_tags_metadata()
 
     def get_tags_metadata(self):
         if self.tags_metadata_df is None:
-            path = self.files_dirpath / 'tags_metadata.csv'
-            self.tags_metadata_df = pd.read_csv(path, index_col=None)
+            self.tags_metadata_df = self.storage.read('tags_metadata')
 
         self.all_tags()  # load tags if not already loaded
         df_metadata = self.tags_df.merge(self.tags_metadata_df, on='name')
@@ -391,6 +682,10 @@ class CachedFileDataManager:
 
         return df_metadata
 
+    def rebuild_tags_metadata(self):
+        """ Recalculates the tags metadata (counts, money in and out) from the tagged transactions and stores it. """
+        self.replace_tags_metadata(tag_stats_from_transactions(self.transactions))
+
     def replace_tags_metadata(self, metadata_df: pd.DataFrame):
         self.tags_metadata_df = metadata_df
         self.tags_metadata_df['date_modified'] = datetime.strftime(datetime.now(), '%Y-%m-%d %H:%M:%S')
@@ -9,6 +9,7 @@ from datetime import datetime, date
 from itertools import chain
 from typing import List, Literal
 
+import numpy as np
 import pandas as pd
 
 from mecon.monitoring import logging_utils
@@ -71,6 +72,10 @@ class DataframeWrapper:
         if self.size() == 0:
             return self.factory(self.dataframe())
 
+        keys = grouper.group_keys(self)
+        if keys is not None and isinstance(aggregator, InTypeAggregator):
+            return aggregator.groupby_aggregate(self, keys)
+
         groups = grouper.group(self)
         aggregated_groups = aggregator.aggregate(groups)
         return aggregated_groups
@@ -250,24 +255,125 @@ class TagsColumnDoesNotExistInDataframe(Exception):
     pass
 
 
+class TagsIndex:
+    """
+    Columnar membership index of the comma separated 'tags' column: one boolean array per tag, with one element
+    per row of the dataframe. The 'tags' strings are split only once when the index is built, after that tag
+    queries (contains, counts, selections) are numpy operations over these arrays.
+    The index is immutable, every change returns a new TagsIndex that shares the unchanged arrays.
+    """
+
+    def __init__(self, size: int, memberships: dict = None):
+        self._size = size
+        self._memberships = {} if memberships is None else memberships
+
+    @classmethod
+    def from_tags_column(cls, tags: pd.Series) -> TagsIndex:
+        if len(tags) == 0:
+            return cls(0)
+
+        tags_lists = tags.str.split(',').to_list()
+        lengths = np.fromiter((len(tags_list) for tags_list in tags_lists), dtype=np.int64, count=len(tags_lists))
+        rows = np.repeat(np.arange(len(tags_lists)), lengths)
+        flat_tags = np.fromiter(chain.from_iterable(tags_lists), dtype=object, count=int(lengths.sum()))
+
+        non_empty = flat_tags != ''
+        rows, flat_tags = rows[non_empty], flat_tags[non_empty]
+        codes, unique_tags = pd.factorize(flat_tags)  # unique tags in order of first appearance
+
+        order = np.argsort(codes, kind='stable')
+        rows_per_tag = np.split(rows[order], np.cumsum(np.bincount(codes, minlength=len(unique_tags)))[:-1])
+
+        memberships = {}
+        for tag, tag_rows in zip(unique_tags, rows_per_tag):
+            membership = np.zeros(len(tags_lists), dtype=bool)
+            membership[tag_rows] = True
+            memberships[tag] = membership
+        return cls(len(tags_lists), memberships)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def tag_names(self) -> list:
+        return list(self._memberships.keys())
+
+    def contains(self, tag_name: str) -> np.ndarray:
+        """ Returns a boolean array with True for each row that has the tag. """
+        if tag_name not in self._memberships:
+            return np.zeros(self._size, dtype=bool)
+        return self._memberships[tag_name]
+
+    def contains_all(self, tag_names: list) -> np.ndarray:
+        """ Returns a boolean array with True for each row that has all the tags. """
+        return np.logical_and.reduce([self.contains(tag_name) for tag_name in tag_names] +
+                                     [np.ones(self._size, dtype=bool)])
+
+    def counts(self) -> dict:
+        """
+        Returns the number of rows of each tag, sorted by count. Ties keep the order of the first appearance.
+        """
+        counts = []
+        for order, (tag_name, membership) in enumerate(self._memberships.items()):
+            count = int(np.count_nonzero(membership))
+            if count > 0:
+                counts.append((tag_name, count, int(np.argmax(membership)), order))
+        counts.sort(key=lambda item: (-item[1], item[2], item[3]))
+        return {tag_name: count for tag_name, count, _, _ in counts}
+
+    def with_tag(self, tag_name: str, rows: np.ndarray) -> TagsIndex:
+        """ Returns a new index where the tag is added to the rows marked True. """
+        memberships = dict(self._memberships)
+        memberships[tag_name] = self.contains(tag_name) | np.asarray(rows, dtype=bool)
+        return TagsIndex(self._size, memberships)
+
+    def without_tag(self, tag_name: str) -> TagsIndex:
+        """ Returns a new index without the tag. """
+        memberships = {name: membership for name, membership in self._memberships.items() if name != tag_name}
+        return TagsIndex(self._size, memberships)
+
+    def select(self, rows: np.ndarray) -> TagsIndex:
+        """ Returns the index of the rows marked True, in the same order. """
+        rows = np.asarray(rows, dtype=bool)
+        memberships = {name: membership[rows] for name, membership in self._memberships.items()}
+        return TagsIndex(int(np.count_nonzero(rows)), memberships)
+
+
 class TagsColumnMixin(ColumnMixin):
     _required_columns = 'tags'
 
+    def __init__(self, df_wrapper: DataframeWrapper, validate=False):
+        ColumnMixin.__init__(self, df_wrapper, validate=validate)
+        self._tags_index = None
+
     @property
     def tags(self) -> pd.Series:
         """ Returns the 'tags' column of the dataframe wrapper. """
         return self._df_wrapper_obj.dataframe()['tags']
 
+    @property
+    def tags_index(self) -> TagsIndex:
+        """
+        Returns the membership index of the 'tags' column. It is built on first use, and it is passed on
+        to the dataframe wrappers that are derived from this one through the tag methods of this mixin.
+        """
+        if getattr(self, '_tags_index', None) is None:
+            self._tags_index = TagsIndex.from_tags_column(self.tags)
+        return self._tags_index
+
+    def _factory_with_tags_index(self, df: pd.DataFrame, tags_index: TagsIndex) -> DataframeWrapper:
+        new_df_wrapper = self._df_wrapper_obj.factory(df)
+        if isinstance(new_df_wrapper, TagsColumnMixin):
+            new_df_wrapper._tags_index = tags_index
+        return new_df_wrapper
+
     def invalid_tags(self):
         return self.tags.isna() | self.tags.isnull() |  self.tags.apply(lambda x: not isinstance(x, str))
 
     def all_tag_counts(self) -> dict:
         """ Returns all the unique tags in the dataframe wrapper along with their counts. """
-        tags_split = self.tags.apply(
-            lambda s: s.split(',')).to_list()
-        tags_list = [tag for tag in chain.from_iterable(tags_split) if len(tag) > 0]
-        tags_dict = dict(sorted(Counter(tags_list).items(), key=lambda item: item[1], reverse=True))
-        return tags_dict
+        return self.tags_index.counts()
 
     def all_tags(self) -> list:
         return list(self.all_tag_counts().keys())
@@ -292,9 +398,7 @@ class TagsColumnMixin(ColumnMixin):
                     f"Invalid 'empty_tags_strategy' value: {empty_tags_strategy}, allows values are [all_true, raise, all_false]")
 
         tags = [tags] if isinstance(tags, str) else tags
-        tag_rules = [tagging.TagMatchCondition(tag) for tag in tags]
-        rule = tagging.Conjunction(tag_rules)
-        index_col = tagging.Tagger.get_index_for_rule(self._df_wrapper_obj.dataframe(), rule)
+        index_col = pd.Series(self.tags_index.contains_all(tags), index=self.tags.index)
         return index_col
 
     def not_contains_tags(self, tags: str | list | None,
@@ -316,10 +420,10 @@ class TagsColumnMixin(ColumnMixin):
         Returns a copy of the df_wrapper with all the rows where tags are present.
         """
         contains_tags_flags = self.contains_tags(tags, empty_tags_strategy=empty_tags_strategy)
-        df = self.dataframe_wrapper_obj.dataframe()[contains_tags_flags].reset_index(drop=True)
+        df = self.dataframe_wrapper_obj.dataframe()[contains_tags_flags.to_numpy()].reset_index(drop=True)
 
         try:
-            return self._df_wrapper_obj.factory(df)
+            return self._factory_with_tags_index(df, self.tags_index.select(contains_tags_flags.to_numpy()))
         except InvalidInputDataFrameColumns as e:
             logging.error(f"Invalid input dataframe columns: {e}")
             raise ValueError(f"TagsColumnMixin failed to create dataframe containing tags {tags}, result {df.shape=}")
@@ -331,10 +435,10 @@ class TagsColumnMixin(ColumnMixin):
         """
 
         not_contains_tags_flags = self.not_contains_tags(tags, empty_tags_strategy=empty_tags_strategy)
-        df = self.dataframe_wrapper_obj.dataframe()[not_contains_tags_flags].reset_index(drop=True)
+        df = self.dataframe_wrapper_obj.dataframe()[not_contains_tags_flags.to_numpy()].reset_index(drop=True)
 
         try:
-            return self._df_wrapper_obj.factory(df)
+            return self._factory_with_tags_index(df, self.tags_index.select(not_contains_tags_flags.to_numpy()))
         except InvalidInputDataFrameColumns as e:
             logging.error(f"Invalid input dataframe columns: {e}")
             original_df = self.dataframe_wrapper_obj.dataframe()
@@ -346,16 +450,29 @@ class TagsColumnMixin(ColumnMixin):
         """
         new_df = self._df_wrapper_obj.dataframe().copy()
         new_df['tags'] = ''
-        return self._df_wrapper_obj.factory(new_df)
+        return self._factory_with_tags_index(new_df, TagsIndex(len(new_df)))
 
-    def apply_tag(self, tag: tagging.Tag) -> DataframeWrapper:
+    def apply_tag(self, tag: tagging.Tag, statistics=None) -> DataframeWrapper:
         """
         Calculates and sets the tag to the df_wrapper and returns it.
+        Only the 'tags' of the rows that get the tag for the first time are rewritten, and the tags index
+        is updated instead of being rebuilt.
+        The optional statistics (selectivity.RuleStatistics) are passed to Tagger.get_index_for_rule.
         """
         logging.info(f"Applying {tag.name} tag to transaction.")
         new_df = self._df_wrapper_obj.dataframe().copy()
-        tagging.Tagger.tag(tag, new_df)
-        return self._df_wrapper_obj.factory(new_df)
+        rows_to_tag = tagging.Tagger.get_index_for_rule(new_df, tag.rule, statistics=statistics).to_numpy(dtype=bool)
+        new_rows = rows_to_tag & ~self.tags_index.contains(tag.name)
+        tagging.Tagger.add_tag(tag.name, new_df, new_rows, already_tagged_rows=~new_rows)
+        return self._factory_with_tags_index(new_df, self.tags_index.with_tag(tag.name, rows_to_tag))
+
+    def remove_tag(self, tag_name: str) -> DataframeWrapper:
+        """
+        Removes the tag from all the rows of the df_wrapper and returns it.
+        """
+        new_df = self._df_wrapper_obj.dataframe().copy()
+        tagging.Tagger.remove_tag(tag_name, new_df, from_rows=self.tags_index.contains(tag_name))
+        return self._factory_with_tags_index(new_df, self.tags_index.without_tag(tag_name))
 
 
 class Grouping(abc.ABC):
@@ -374,6 +491,14 @@ class Grouping(abc.ABC):
     def compute_group_indexes(self, df_wrapper: DataframeWrapper) -> List[pd.Series]:
         pass
 
+    def group_keys(self, df_wrapper: DataframeWrapper) -> pd.Series | None:
+        """
+        Returns a key for each row, when the groups do not overlap and each group is made of the rows with the
+        same key (in order of first appearance), so that they can be aggregated with a single groupby.
+        Returns None otherwise.
+        """
+        return None
+
 
 class InvalidInputToAggregator(Exception):
     pass
@@ -395,6 +520,16 @@ class AggregatorABC(abc.ABC):  # TODO:v3 tested only through InTypeAggregator
 
 
 class InTypeAggregator(AggregatorABC):
+    # aggregation functions that have a built-in groupby aggregation with the same result
+    _groupby_aggregations = {
+        min: 'min',
+        max: 'max',
+        sum: 'sum',
+        len: 'size',
+        pd.Series.mean: 'mean',
+        pd.Series.median: 'median',
+    }
+
     def __init__(self, aggregation_functions):
         self._agg_functions = aggregation_functions
 
@@ -414,6 +549,34 @@ class InTypeAggregator(AggregatorABC):
         new_df_wrapper = df_wrapper.factory(new_df)
         return new_df_wrapper
 
+    @logging_utils.codeflow_log_wrapper('#data#transactions#process')
+    def groupby_aggregate(self, df_wrapper: DataframeWrapper, keys: pd.Series) -> DataframeWrapper:
+        """
+        Aggregates the groups of rows with the same key in a single groupby, instead of creating a DataframeWrapper
+        for each group. The result is the same as aggregate for the same groups.
+        """
+        grouped = df_wrapper.dataframe().groupby(np.asarray(keys), sort=False)
+        res_dict = {}
+        for col_name, agg_func in self._agg_functions.items():
+            res_dict[col_name] = self.groupby_aggregation(grouped[col_name], agg_func).to_numpy()
+
+        # every aggregated group was a single row dataframe with index 0 before they were concatenated
+        new_df = pd.DataFrame(res_dict, index=np.zeros(grouped.ngroups, dtype=int))
+        return df_wrapper.factory(new_df)
+
+    def groupby_aggregation(self, grouped_column, agg_func) -> pd.Series:
+        """
+        Aggregates a grouped column. The functions with a built-in groupby aggregation are lowered to it,
+        the rest are called for each group.
+        """
+        groupby_agg = self._groupby_aggregations.get(agg_func)
+        if groupby_agg is None:
+            return grouped_column.agg(agg_func)
+        elif isinstance(groupby_agg, str):
+            return grouped_column.agg(groupby_agg)
+        else:
+            return groupby_agg(grouped_column)
+
 
 class UnorderedDatedDataframeWrapper(Exception):
     pass
@@ -466,7 +629,7 @@ class DateFiller:
         end_date = df_end_date if end_date is None else end_date
 
         if df_wrapper.size() > 0:
-            fill_dates_to_remove = [calendar_utils.date_floor(dt, date_unit=self._fill_unit) for dt in df_wrapper.datetime]
+            fill_dates_to_remove = calendar_utils.date_floor_series(df_wrapper.datetime, date_unit=self._fill_unit)
         else:
             fill_dates_to_remove = None
 
@@ -474,24 +637,39 @@ class DateFiller:
             start_date,
             end_date,
             remove_dates=fill_dates_to_remove)
-        fill_df_wrapper = df_wrapper.factory(fill_df)
-        filtered_df_wrapper = df_wrapper.select_date_range(
-            calendar_utils.date_floor(start_date, date_unit=self._fill_unit),
-            calendar_utils.date_ceil(end_date, date_unit=self._fill_unit))
 
-        merged_df_wrapper = filtered_df_wrapper.merge(fill_df_wrapper)
-        return merged_df_wrapper
+        if df_wrapper.size() > 0:
+            in_fill_range = self._fill_range_mask(df_wrapper.datetime, start_date, end_date)
+            filtered_df = df_wrapper.dataframe()[in_fill_range.to_numpy()]
+        else:
+            filtered_df = df_wrapper.dataframe()
+
+        if len(filtered_df) == 0:  # silencing FutureWarning: The behavior of DataFrame concatenation with empty or all-NA entries is deprecated
+            merged_df = fill_df.reset_index(drop=True)
+        elif len(fill_df) == 0:
+            merged_df = filtered_df.reset_index(drop=True)
+        else:
+            merged_df = pd.concat([filtered_df, fill_df], ignore_index=True)
+            merged_df.sort_values(by='datetime', kind='stable', ignore_index=True, inplace=True)
+        return df_wrapper.factory(merged_df)
+
+    def _fill_range_mask(self, dt_series: pd.Series,
+                         start_date: datetime | date,
+                         end_date: datetime | date) -> pd.Series:
+        """ The rows dated from the beginning of start_date's fill unit to the end of end_date's fill unit. """
+        range_start = pd.Timestamp(calendar_utils.date_floor(start_date, date_unit=self._fill_unit).date())
+        range_end = pd.Timestamp(calendar_utils.date_ceil(end_date, date_unit=self._fill_unit).date()) + pd.Timedelta(days=1)
+        return (dt_series >= range_start) & (dt_series < range_end)
 
     def produce_fill_df_rows(self,
                              start_date: datetime | date,
                              end_date: datetime | date,
                              remove_dates=None):
-        date_range = calendar_utils.date_range_group_beginning(start_date, end_date, step=self._fill_unit)
-        date_range.name = 'datetime'
+        date_range = pd.DatetimeIndex(
+            calendar_utils.date_range_group_beginning(start_date, end_date, step=self._fill_unit))
 
         if remove_dates is not None:
-            remove_dates = pd.to_datetime(remove_dates).to_list()
-            date_range = [date for date in date_range if date not in remove_dates]
+            date_range = date_range.difference(pd.DatetimeIndex(pd.to_datetime(remove_dates)))
 
         fill_df = pd.DataFrame({'datetime': date_range})
         for column, default_value in self._fill_values.items():
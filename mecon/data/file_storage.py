@@ -0,0 +1,198 @@
+"""
+file_storage manages how the tables of the file based data manager (transactions, tags, tags metadata) are stored
+in the dataset's directory. The storage format is selected with the 'storage_format' key of the dataset's settings.json.
+"""
+import abc
+import logging
+import os
+import pathlib
+import tempfile
+import time
+import uuid
+
+import pandas as pd
+
+STORAGE_FORMAT_SETTING = 'storage_format'
+
+
+def replace_file(path: pathlib.Path, write) -> None:
+    """
+    Calls write(tmp_path) on a new temporary file next to path and then replaces path with it, so a reader (like
+    another session's data manager) never sees a partially written file. The temporary file is unique per call, even
+    between the threads of a process.
+    """
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.name}.", suffix='.tmp', delete=False) as tmp_file:
+        tmp_path = pathlib.Path(tmp_file.name)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+class TableFileStorage(abc.ABC):
+    """
+    Reads and writes tables as files, one file per table, named after the table.
+    """
+    format_name = None
+    extension = None
+
+    def __init__(self, dirpath: pathlib.Path):
+        self._dirpath = pathlib.Path(dirpath)
+
+    def path(self, table_name: str) -> pathlib.Path:
+        return self._dirpath / f"{table_name}.{self.extension}"
+
+    def exists(self, table_name: str) -> bool:
+        return self.path(table_name).exists()
+
+    def delete(self, table_name: str) -> None:
+        self.path(table_name).unlink(missing_ok=True)
+
+    @abc.abstractmethod
+    def read(self, table_name: str) -> pd.DataFrame:
+        pass
+
+    @abc.abstractmethod
+    def write(self, table_name: str, df: pd.DataFrame) -> None:
+        pass
+
+    def read_transactions(self, table_name: str) -> pd.DataFrame:
+        return self.read(table_name)
+
+    def write_transactions(self, table_name: str, df: pd.DataFrame) -> None:
+        self.write(table_name, df)
+
+    def write_transaction_tags(self, table_name: str, df: pd.DataFrame) -> None:
+        """ Stores the transactions after only their 'tags' changed. Formats that cannot do better rewrite everything. """
+        self.write_transactions(table_name, df)
+
+    def transactions_files(self, table_name: str) -> list[pathlib.Path]:
+        return [self.path(table_name)]
+
+    @staticmethod
+    def factory(format_name: str, dirpath: pathlib.Path) -> 'TableFileStorage':
+        if format_name == CSVFileStorage.format_name:
+            return CSVFileStorage(dirpath)
+        elif format_name == ParquetFileStorage.format_name:
+            return ParquetFileStorage(dirpath)
+        else:
+            raise ValueError(f"Invalid storage format '{format_name}', valid formats are "
+                             f"[{CSVFileStorage.format_name}, {ParquetFileStorage.format_name}]")
+
+
+class CSVFileStorage(TableFileStorage):
+    format_name = 'csv'
+    extension = 'csv'
+
+    def read(self, table_name: str) -> pd.DataFrame:
+        return pd.read_csv(self.path(table_name), index_col=None)
+
+    def write(self, table_name: str, df: pd.DataFrame) -> None:
+        replace_file(self.path(table_name), lambda tmp_path: df.to_csv(tmp_path, index=False))
+
+    def read_transactions(self, table_name: str) -> pd.DataFrame:
+        df = self.read(table_name)
+        df['datetime'] = pd.to_datetime(df['datetime'])
+        if 'tags' in df.columns:
+            df['tags'] = df['tags'].fillna('')  # empty tags are read as NaN
+        return df
+
+
+class ParquetFileStorage(TableFileStorage):
+    """
+    Stores the tables as typed Parquet files (needs pyarrow), read through memory maps.
+    The transactions are split in two files: one with all the columns except 'tags' and one with only the 'tags'
+    (dictionary encoded), so re-tagging rewrites only the latter. Both files have the same generation id in their
+    metadata, as each one is replaced on its own: a reader that finds different generations (it read between the two
+    replacements) reads them again, and fails after READ_ATTEMPTS. The columns with few distinct values (currency,
+    tags) are stored dictionary encoded, but they are read back as plain strings like the csv columns.
+    """
+    format_name = 'parquet'
+    extension = 'parquet'
+    dictionary_columns = ['currency', 'tags']
+    GENERATION_KEY = b'mecon_generation'
+    READ_ATTEMPTS = 5
+    READ_RETRY_SECONDS = .2
+
+    def __init__(self, dirpath: pathlib.Path):
+        super().__init__(dirpath)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("The 'parquet' storage format needs pyarrow, install it with 'pip install pyarrow'") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+
+    def tags_path(self, table_name: str) -> pathlib.Path:
+        return self._dirpath / f"{table_name}_tags.{self.extension}"
+
+    def delete(self, table_name: str) -> None:
+        super().delete(table_name)
+        self.tags_path(table_name).unlink(missing_ok=True)
+
+    def _read_table(self, path: pathlib.Path) -> pd.DataFrame:
+        return self._read_table_and_generation(path)[0]
+
+    def _read_table_and_generation(self, path: pathlib.Path) -> tuple[pd.DataFrame, bytes | None]:
+        table = self._pq.read_table(path, memory_map=True)
+        df = table.to_pandas()
+        for col in self.dictionary_columns:
+            if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(object)
+        return df, (table.schema.metadata or {}).get(self.GENERATION_KEY)
+
+    def _generation(self, path: pathlib.Path) -> bytes | None:
+        return (self._pq.read_schema(path).metadata or {}).get(self.GENERATION_KEY)
+
+    def _write_table(self, path: pathlib.Path, df: pd.DataFrame, generation: bytes = None) -> None:
+        table = self._pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+        if generation is not None:
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), self.GENERATION_KEY: generation})
+        dictionary_columns = [col for col in self.dictionary_columns if col in df.columns]
+        replace_file(path, lambda tmp_path: self._pq.write_table(table, tmp_path, use_dictionary=dictionary_columns))
+
+    def read(self, table_name: str) -> pd.DataFrame:
+        return self._read_table(self.path(table_name))
+
+    def write(self, table_name: str, df: pd.DataFrame) -> None:
+        self._write_table(self.path(table_name), df)
+
+    def read_transactions(self, table_name: str) -> pd.DataFrame:
+        for attempt in range(1, self.READ_ATTEMPTS + 1):
+            df, generation = self._read_table_and_generation(self.path(table_name))
+            if not self.tags_path(table_name).exists():
+                break
+            df_tags, tags_generation = self._read_table_and_generation(self.tags_path(table_name))
+            if generation == tags_generation:
+                if len(df_tags) != len(df):
+                    raise ValueError(f"Transactions and tags files have different number of rows: "
+                                     f"{len(df)} != {len(df_tags)}")
+                df['tags'] = df_tags['tags'].to_numpy()
+                break
+            if attempt == self.READ_ATTEMPTS:
+                raise ValueError(f"The transactions and tags files of '{table_name}' are from different writes "
+                                 f"({generation} != {tags_generation})")
+            logging.info(f"The transactions and tags files of '{table_name}' are being written, reading them again.")
+            time.sleep(self.READ_RETRY_SECONDS)
+
+        df['datetime'] = df['datetime'].astype('datetime64[ns]')
+        return df
+
+    def write_transactions(self, table_name: str, df: pd.DataFrame) -> None:
+        generation = uuid.uuid4().hex.encode('ascii')
+        self._write_table(self.path(table_name), df[[col for col in df.columns if col != 'tags']], generation)
+        if 'tags' in df.columns:
+            self._write_table(self.tags_path(table_name), df[['tags']], generation)
+        else:
+            self.tags_path(table_name).unlink(missing_ok=True)  # the old tags are not of these transactions
+
+    def write_transaction_tags(self, table_name: str, df: pd.DataFrame) -> None:
+        """ Rewrites only the 'tags' file, with the generation of the (unchanged) transactions file. """
+        logging.info(f"Writing only the 'tags' of {len(df)} transactions.")
+        self._write_table(self.tags_path(table_name), df[['tags']], self._generation(self.path(table_name)))
+
+    def transactions_files(self, table_name: str) -> list[pathlib.Path]:
+        return [self.path(table_name), self.tags_path(table_name)]
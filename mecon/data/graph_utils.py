@@ -31,13 +31,13 @@ class FullLengthYearCalendarTransformer(DataframeTransformer):
     def _construct_calendar_table(self, df: pd.DataFrame) -> pd.DataFrame:
         df['date'] = df['datetime'].dt.date
         df['year'] = df['datetime'].dt.year
-        df['month'] = df['datetime'].apply(lambda dt: dt.strftime("%B"))
-        df['month_num'] = df['datetime'].apply(lambda dt: dt.strftime("%m"))
-        df['year-month'] = df['date'].apply(calendar_utils.date_to_month_date)
-        df['day_of_week'] = df['date'].apply(calendar_utils.day_of_week)
-        df['day_of_month'] = df['date'].apply(calendar_utils.day_of_month)
-        df['week_of_year'] = df['date'].apply(calendar_utils.week_of_year)
-        df['week_of_month'] = df['date'].apply(calendar_utils.week_of_month)
+        df['month'] = df['datetime'].dt.strftime("%B")
+        df['month_num'] = df['datetime'].dt.strftime("%m")
+        df['year-month'] = calendar_utils.date_to_month_date_series(df['datetime'])
+        df['day_of_week'] = calendar_utils.day_of_week_series(df['datetime'])
+        df['day_of_month'] = calendar_utils.day_of_month_series(df['datetime'])
+        df['week_of_year'] = calendar_utils.week_of_year_series(df['datetime'])
+        df['week_of_month'] = calendar_utils.week_of_month_series(df['datetime'])
 
         calendar_table = pd.pivot_table(df,
                                         values='amount',
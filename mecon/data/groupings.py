@@ -5,7 +5,6 @@ import numpy as np
 import pandas as pd
 
 from mecon.data.datafields import DataframeWrapper, Grouping
-from mecon.tags.tagging import Tagger, TagMatchCondition
 from mecon.utils import calendar_utils
 from mecon.utils.instance_management import Multiton
 
@@ -20,8 +19,7 @@ class TagGrouping(Grouping):
         tags_list = self._tags_list if self._tags_list is not None else df_wrapper.all_tag_counts().keys()
 
         for tag in tags_list:
-            rule = TagMatchCondition(tag)
-            index_col = Tagger.get_index_for_rule(df_wrapper.dataframe(), rule)
+            index_col = df_wrapper.contains_tags(tag)
             res_indexes.append(index_col)
 
         return res_indexes
@@ -33,29 +31,42 @@ class LabelGroupingABC(Grouping, Multiton, abc.ABC):
 
     def compute_group_indexes(self, df_wrapper: DataframeWrapper) -> List[pd.Series]:
         labels = self.labels(df_wrapper)
-        unique_labels = labels.unique()
+        codes, unique_labels = pd.factorize(labels)
 
         indexes = []
-        for label in unique_labels:
-            index = labels == label
+        for i in range(len(unique_labels)):
+            index = pd.Series(codes == i, index=labels.index)
             indexes.append(index)
 
         return indexes
 
+    def group_keys(self, df_wrapper: DataframeWrapper) -> pd.Series:
+        return self.labels(df_wrapper)
+
     @abc.abstractmethod
     def labels(self, df_wrapper: DataframeWrapper) -> pd.Series:
         pass
 
 
 class LabelGrouping(LabelGroupingABC, abc.ABC):
-    def __init__(self, name, label_function):
+    def __init__(self, name, label_function, key_function=None):
+        """
+        key_function (optional) returns a vectorised equivalent of the labels, i.e. any values that are equal
+        exactly when the labels are equal, used to group in a single pass instead of calculating the labels.
+        """
         super().__init__(instance_name=name)
         self._label_function = label_function
+        self._key_function = key_function
 
     def labels(self, df_wrapper: DataframeWrapper) -> pd.Series:
         res = self._label_function(df_wrapper)
         return res
 
+    def group_keys(self, df_wrapper: DataframeWrapper) -> pd.Series:
+        if self._key_function is None:
+            return super().group_keys(df_wrapper)
+        return self._key_function(df_wrapper)
+
 
 class IndexGrouping(Grouping):
     def __init__(self, indices):
@@ -74,10 +85,15 @@ class IndexGrouping(Grouping):
         return IndexGrouping(group_indices)
 
 
-HOUR = LabelGrouping('hour', lambda df_wrapper: df_wrapper.datetime.apply(calendar_utils.datetime_to_hour_id_str))
-DAY = LabelGrouping('day', lambda df_wrapper: df_wrapper.datetime.apply(calendar_utils.datetime_to_date_id_str))
-WEEK = LabelGrouping('week', lambda df_wrapper: df_wrapper.datetime.apply(
-    calendar_utils.get_closest_past_monday).dt.date.astype(str))
-MONTH = LabelGrouping('month', lambda df_wrapper: df_wrapper.datetime.apply(
-    lambda dt: calendar_utils.datetime_to_date_id_str(dt)[:6]))
-YEAR = LabelGrouping('year', lambda df_wrapper: df_wrapper.datetime.apply(lambda dt: str(dt.year)))
+HOUR = LabelGrouping('hour', lambda df_wrapper: calendar_utils.datetime_to_hour_id_str_series(df_wrapper.datetime),
+                     key_function=lambda df_wrapper: df_wrapper.datetime.dt.floor('h'))
+DAY = LabelGrouping('day', lambda df_wrapper: calendar_utils.datetime_to_date_id_str_series(df_wrapper.datetime),
+                    key_function=lambda df_wrapper: calendar_utils.date_floor_series(df_wrapper.datetime, 'day'))
+WEEK = LabelGrouping('week', lambda df_wrapper: calendar_utils.date_floor_series(
+    df_wrapper.datetime, 'week').dt.strftime('%Y-%m-%d'),
+                     key_function=lambda df_wrapper: calendar_utils.date_floor_series(df_wrapper.datetime, 'week'))
+MONTH = LabelGrouping('month', lambda df_wrapper: calendar_utils.datetime_to_date_id_str_series(
+    df_wrapper.datetime).str[:6],
+                      key_function=lambda df_wrapper: calendar_utils.date_floor_series(df_wrapper.datetime, 'month'))
+YEAR = LabelGrouping('year', lambda df_wrapper: df_wrapper.datetime.dt.year.astype(str),
+                     key_function=lambda df_wrapper: calendar_utils.date_floor_series(df_wrapper.datetime, 'year'))
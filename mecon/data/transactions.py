@@ -230,6 +230,8 @@ class Transactions(fields.DatedDataframeWrapper, fields.IdColumnMixin, fields.Am
     def from_csv(cls, path) -> Transactions:
         df = pd.read_csv(path, index_col=None)
         df['datetime'] = pd.to_datetime(df['datetime'])
+        if 'tags' in df.columns:
+            df['tags'] = df['tags'].fillna('')  # empty tags are read as NaN
         return cls(df)
 
 
@@ -1,4 +1,5 @@
 import abc
+from datetime import datetime
 from typing import List, Any
 
 import pandas as pd
@@ -106,6 +107,15 @@ class CombinedTransactionsIOABC(TransactionsIOABC, abc.ABC):
     The interface of transactions io operations used by the app
     """
 
+    @abc.abstractmethod
+    def get_transactions(self,
+                         start_date: datetime | None = None,
+                         end_date: datetime | None = None,
+                         columns: List[str] | None = None,
+                         containing_tags: List[str] | None = None,
+                         not_containing_tags: List[str] | None = None) -> pd.DataFrame:
+        pass
+
     @abc.abstractmethod
     def load_transactions(self) -> None:
         pass
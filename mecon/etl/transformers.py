@@ -151,6 +151,7 @@ class RevoStatementTransformer(DataframeTransformer):
 
 class StatementTransformer(DataframeTransformer, abc.ABC):
     SOURCES = ['Monzo', 'HSBC', 'Revolut', 'INVENG', 'HSBCSVR', 'TRD212']
+    ordinal_offset = 0  # first ordinal of the ids, for the sources that number the transactions by their position
 
     def read_df(self, path):
         df = pd.read_csv(path, index_col=None)
@@ -204,7 +205,7 @@ class HSBCFileStatementTransformer(StatementTransformer):
         df_hsbc['amount_cur'] = df_hsbc['amount']
         df_hsbc['description'] = f'bank:{self.source_name}, ' + df_hsbc['description']
 
-        df_hsbc['id'] = list(range(len(df_hsbc)))
+        df_hsbc['id'] = list(range(self.ordinal_offset, self.ordinal_offset + len(df_hsbc)))
         df_hsbc['id'] = df_hsbc.apply(lambda row: transaction_id_formula(row, self.source_name), axis=1)
 
         # Select and rename columns
@@ -322,7 +323,7 @@ class RevoFileStatementTransformer(StatementTransformer):
         logging.info(f"Transforming Revolut raw transactions ({df_revo.shape} shape)")
         df_revo = df_revo.copy()
 
-        df_revo['id'] = list(range(len(df_revo)))
+        df_revo['id'] = list(range(self.ordinal_offset, self.ordinal_offset + len(df_revo)))
         df_transformed = pd.DataFrame({'id': ('3' + df_revo['id'].astype(str)).astype(np.int64)})
         df_transformed['datetime'] = pd.to_datetime(df_revo['started_date'], format="%Y-%m-%d %H:%M:%S")
         df_transformed['amount'] = self.convert_amounts(df_revo['amount'], df_revo['currency'],
@@ -351,7 +352,7 @@ class InvestEngineStatementTransformer(StatementTransformer):
         logging.info(f"Transforming InvestEngineer raw transactions ({df.shape} shape)")
         df = df.copy()
 
-        df['id'] = list(range(len(df)))
+        df['id'] = list(range(self.ordinal_offset, self.ordinal_offset + len(df)))
         df['datetime'] = pd.to_datetime(df['datetime'], format="%d/%m/%Y %H:%M:%S")
         df['amount_cur'] = df['amount']
         df['description'] = df['description'].apply(lambda x: f'bank:{self.source_name}, ' + x)
@@ -392,7 +393,7 @@ class Trading212StatementTransformer(StatementTransformer):
 
         df['description'] = df['description'].apply(lambda x: f'bank:{self.source_name}, ' + x)
 
-        df['id'] = list(range(len(df)))
+        df['id'] = list(range(self.ordinal_offset, self.ordinal_offset + len(df)))
         df['id'] = df.apply(lambda row: transaction_id_formula(row, self.source_name), axis=1)
 
         df_final = df[['id', 'datetime', 'amount', 'currency', 'amount_cur', 'description']]
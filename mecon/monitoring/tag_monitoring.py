@@ -23,6 +23,13 @@ class TagRuleMonitor:
         if outcome:
             self.cnt_dict[rule_key] += 1
 
+    def observe_batch(self, rule, df, outcomes):
+        rule_key = rule
+        if rule_key not in self.cnt_dict:
+            self.cnt_dict[rule_key] = 0
+
+        self.cnt_dict[rule_key] += int(outcomes.sum())
+
 
 class TaggingReport:
     _filename = 'tag_report.csv'
@@ -53,6 +60,41 @@ class TaggingReport:
         return tag_rules[tag_rules['count'] == 0]
 
 
+class TaggingStats:
+    """
+    Hit counters of the rules, for the rule execution plan engines (RuleExecutionPlanTagging.tag(transactions,
+    stats=...)). The engine counts them on the boolean columns it has already calculated, so unlike the observers of
+    TaggingStatsMonitoringSystem there is no python callback per rule evaluation, and they can be always on.
+    The counters add up over all the runs the same TaggingStats is passed to.
+    """
+    columns = ['tag', 'rule', 'rule_type', 'rows', 'count', 'false_count', 'seconds']
+
+    def __init__(self):
+        self._counters = {}
+
+    def record(self, tag_name: str, rule: str, rule_type: str, n_rows: int, n_true: int, seconds: float) -> None:
+        counters = self._counters.setdefault((tag_name, rule, rule_type), {'rows': 0, 'count': 0, 'seconds': 0.})
+        counters['rows'] += int(n_rows)
+        counters['count'] += int(n_true)
+        counters['seconds'] += float(seconds)
+
+    def dataframe(self) -> pd.DataFrame:
+        """
+        A row per rule and a 'Tag' row per tag (for the rows it was applied to and the seconds of all its operations),
+        with the number of rows evaluated, true ('count') and false. The rows of every tag are together, with the 'Tag'
+        row last, as TaggingReport.unsatisfied_tagging_rules_df expects.
+        """
+        df = pd.DataFrame([{'tag': tag_name, 'rule': rule, 'rule_type': rule_type, **counters,
+                            'false_count': counters['rows'] - counters['count']}
+                           for (tag_name, rule, rule_type), counters in self._counters.items()], columns=self.columns)
+        tag_order = {tag_name: i for i, tag_name in enumerate(dict.fromkeys(df['tag']))}
+        df['_order'] = df['tag'].map(tag_order) * 2 + (df['rule_type'] == 'Tag')
+        return df.sort_values('_order', kind='stable').drop(columns='_order').reset_index(drop=True)
+
+    def report(self) -> TaggingReport:
+        return TaggingReport(self.dataframe())
+
+
 class TaggingStatsMonitoringSystem:  # TODO Disjunction dict appears twice in the report
     def __init__(self, tags: list[tagging.Tag]):
         self._tags = tags
@@ -61,7 +103,7 @@ class TaggingStatsMonitoringSystem:  # TODO Disjunction dict appears twice in th
         for tag in self._tags:
             rule_monitoring = TagRuleMonitor(tag)
             self._tag_monitors.append(rule_monitoring)
-            tag.rule.add_observers_recursively(rule_monitoring.observe)
+            tag.rule.add_batch_observers_recursively(rule_monitoring.observe_batch)
 
     def produce_report(self) -> TaggingReport:
         report_json = []
@@ -1,4 +1,11 @@
+import base64
 import re
+import warnings
+import zlib
+from itertools import chain
+
+import numpy as np
+import pandas as pd
 
 from mecon.utils import instance_management
 
@@ -12,6 +19,99 @@ def _any_input_items_in_target_items(input_items, target_items):
     return False
 
 
+def _csv_items(value):
+    """ The items of a comma separated value, unless they are already parsed (see CompareOperator.parse_value). """
+    return value if isinstance(value, frozenset) else value.split(',')
+
+
+def _parse_csv(value):
+    return frozenset(value.split(',')) if isinstance(value, str) else value
+
+
+def _parse_items(value):
+    if not isinstance(value, (list, tuple, set)):
+        return value  # a string target is checked as a substring
+    try:
+        return frozenset(value)
+    except TypeError:  # unhashable items can only be found in the list
+        return value
+
+
+PACKED_CSV_PREFIX = 'zlib:'
+
+
+def pack_csv(value: str) -> str:
+    """ A compressed (zlib and base64) form of a long comma separated value, unpack_csv restores it. """
+    return PACKED_CSV_PREFIX + base64.b64encode(zlib.compress(value.encode('utf-8'), 9)).decode('ascii')
+
+
+def unpack_csv(value):
+    if isinstance(value, str) and value.startswith(PACKED_CSV_PREFIX):
+        return zlib.decompress(base64.b64decode(value[len(PACKED_CSV_PREFIX):])).decode('utf-8')
+    return value
+
+
+def _is_series_of_lists(values: pd.Series) -> bool:
+    return values.dtype == object and len(values) > 0 and isinstance(values.iloc[0], list)
+
+
+def _any_list_items_in_target_items(values: pd.Series, target_items) -> pd.Series:
+    """ Vectorised _any_input_items_in_target_items for a pd.Series where every element is a list. """
+    lengths = values.map(len).to_numpy()
+    flat_items = pd.Series(list(chain.from_iterable(values)), dtype=object)
+    owners = np.repeat(np.arange(len(values)), lengths)
+
+    result = np.zeros(len(values), dtype=bool)
+    result[owners[flat_items.isin(target_items).to_numpy()]] = True
+    return pd.Series(result, index=values.index)
+
+
+def _series_in(values: pd.Series, target_items):
+    if isinstance(target_items, str):  # substring check, no vectorised equivalent
+        return None
+    if _is_series_of_lists(values):
+        return _any_list_items_in_target_items(values, target_items)
+    if pd.api.types.is_datetime64_any_dtype(values) and any(isinstance(item, str) for item in target_items):
+        return None  # pandas would parse the strings
+    return values.isin(target_items)
+
+
+def _series_contains(values: pd.Series, value):
+    if _is_series_of_lists(values):
+        return _any_list_items_in_target_items(values, [value])
+    if not isinstance(value, str):
+        return None
+    return values.str.contains(value, regex=False)
+
+
+def _series_regex(values: pd.Series, pattern):
+    if _is_series_of_lists(values):
+        return None
+    with warnings.catch_warnings():  # match groups in the pattern are irrelevant for a boolean result
+        warnings.simplefilter('ignore', UserWarning)
+        matches = values.str.contains(pattern, regex=True)
+    return matches & (values.str.len() > 0)
+
+
+def _series_compare(compare_f):
+    def _compare(values: pd.Series, value):
+        if isinstance(value, (list, tuple, set, dict)) or _is_series_of_lists(values):
+            return None
+        if pd.api.types.is_datetime64_any_dtype(values) and isinstance(value, str):  # pandas would parse the string
+            return None
+        return compare_f(values, value)
+
+    return _compare
+
+
+def _negated(series_f):
+    def _negate(values: pd.Series, value):
+        result = series_f(values, value)
+        return ~result if result is not None and result.dtype == bool else None
+
+    return _negate
+
+
 class CompareOperatorMustReturnBooleanResults(Exception):
     pass
 
@@ -23,12 +123,18 @@ class TypesOfComparedValuesDoNotMatch(Exception):
 class CompareOperator(instance_management.Multiton):
     """
     Compare operators used by Condition.
+    The optional series_function is the vectorised equivalent of function, applied to a whole pd.Series at once.
+    It can return None for the inputs it cannot handle, and then the comparison is applied element by element.
+    The optional value_parser converts the compared value once (when a Condition is created) to a form that is faster
+    to compare with, like a frozenset for the 'in' operators. Both functions accept the raw and the parsed value.
     """
 
-    def __init__(self, name, function):
+    def __init__(self, name, function, series_function=None, value_parser=None):
         super().__init__(instance_name=name)
         self.name = name
         self.function = function
+        self.series_function = series_function
+        self.value_parser = value_parser
 
     def __call__(self, value_1, value_2):
         return self.apply(value_1, value_2)
@@ -44,6 +150,27 @@ class CompareOperator(instance_management.Multiton):
         self.validate_result(result)
         return result
 
+    def parse_value(self, value):
+        return self.value_parser(value) if self.value_parser is not None else value
+
+    def apply_series(self, values: pd.Series, value_2) -> pd.Series:
+        """
+        Compares every element of values with value_2 and returns a boolean pd.Series with the same index.
+        Any input that the series_function cannot handle (or results in nulls) is applied element by element
+        instead, so the results and the raised errors are identical to apply.
+        """
+        result = None
+        if self.series_function is not None:
+            try:
+                result = self.series_function(values, value_2)
+            except (TypeError, ValueError, AttributeError):
+                result = None
+
+        if result is None or result.dtype != bool:
+            result = values.map(lambda value_1: self.apply(value_1, value_2)).astype(bool)
+
+        return result
+
     def validate_result(self, result):
         if result != True and result != False:
             raise CompareOperatorMustReturnBooleanResults(f"Compare operation: {self} return result of {type(result)=}: {result=}")
@@ -52,19 +179,31 @@ class CompareOperator(instance_management.Multiton):
         return f"CompareOp({self.name})"
 
 
-GREATER = CompareOperator('greater', lambda a, b: a > b)
-GREATER_EQUAL = CompareOperator('greater_equal', lambda a, b: a >= b)
-LESS = CompareOperator('less', lambda a, b: a < b)
-LESS_EQUAL = CompareOperator('less_equal', lambda a, b: a <= b)
-EQUAL = CompareOperator('equal', lambda a, b: a == b)
-
-CONTAINS = CompareOperator('contains', lambda a, b: b in a)
-NOT_CONTAINS = CompareOperator('not_contains', lambda a, b: b not in a)
+GREATER = CompareOperator('greater', lambda a, b: a > b,
+                          _series_compare(lambda ser, b: ser > b))
+GREATER_EQUAL = CompareOperator('greater_equal', lambda a, b: a >= b,
+                                _series_compare(lambda ser, b: ser >= b))
+LESS = CompareOperator('less', lambda a, b: a < b,
+                       _series_compare(lambda ser, b: ser < b))
+LESS_EQUAL = CompareOperator('less_equal', lambda a, b: a <= b,
+                             _series_compare(lambda ser, b: ser <= b))
+EQUAL = CompareOperator('equal', lambda a, b: a == b,
+                        _series_compare(lambda ser, b: ser == b))
+
+CONTAINS = CompareOperator('contains', lambda a, b: b in a,
+                           _series_contains)
+NOT_CONTAINS = CompareOperator('not_contains', lambda a, b: b not in a,
+                               _negated(_series_contains))
 REGEX = CompareOperator('regex',
-                        lambda a, b: bool(re.search(pattern=b, string=a)) if (a is not None and len(a) > 0) else False)
-
-IN = CompareOperator('in', lambda a, b: _any_input_items_in_target_items(a, b))
-NOT_IN = CompareOperator('not_in', lambda a, b: not _any_input_items_in_target_items(a, b))
-
-IN_CSV = CompareOperator('in_csv', lambda a, b: _any_input_items_in_target_items(a, b.split(',')))
-NOT_IN_CSV = CompareOperator('not_in_csv', lambda a, b: not _any_input_items_in_target_items(a, b.split(',')))
+                        lambda a, b: bool(re.search(pattern=b, string=a)) if (a is not None and len(a) > 0) else False,
+                        _series_regex)
+
+IN = CompareOperator('in', lambda a, b: _any_input_items_in_target_items(a, b),
+                     _series_in, _parse_items)
+NOT_IN = CompareOperator('not_in', lambda a, b: not _any_input_items_in_target_items(a, b),
+                         _negated(_series_in), _parse_items)
+
+IN_CSV = CompareOperator('in_csv', lambda a, b: _any_input_items_in_target_items(a, _csv_items(b)),
+                         lambda ser, b: _series_in(ser, _csv_items(b)), _parse_csv)
+NOT_IN_CSV = CompareOperator('not_in_csv', lambda a, b: not _any_input_items_in_target_items(a, _csv_items(b)),
+                             _negated(lambda ser, b: _series_in(ser, _csv_items(b))), _parse_csv)
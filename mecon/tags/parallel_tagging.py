@@ -0,0 +1,284 @@
+"""
+parallel_tagging runs the tag rules of a tagging session on several processes. The transactions and the results of
+the tags live in shared memory, so the workers only receive the rule (as json) and the positions of the tags it
+depends on, and only send back the time they took.
+"""
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from mecon.data.transactions import Transactions
+from mecon.tags.process import TaggingSession, join_tag_names, timeit
+from mecon.tags.rule_graphs import AcyclicTagGraph
+from mecon.tags.tagging import Tag, Tagger
+from mecon.tags.transformations import TransformationFunction
+
+
+class SharedColumns:
+    """
+    Copies the columns of a pd.DataFrame to shared memory blocks, one per column. Text (object) columns are stored as
+    fixed width unicode arrays, with a second block for the mask of their missing values (None or NaN), which are
+    attached as None. The (picklable) descriptors() are enough for another process to attach to the blocks and
+    rebuild the DataFrame with SharedColumns.attach.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._blocks = {}
+        self._descriptors = []
+        for col in df.columns:
+            values, na_block_name = df[col].to_numpy(), None
+            if values.dtype == object:
+                na_mask = df[col].isna().to_numpy()
+                values = df[col].fillna('').to_numpy(dtype=str)
+                if na_mask.any():
+                    na_block_name = self._share(f"{col}_na", na_mask)
+            self._descriptors.append((col, self._share(col, values), values.shape, values.dtype.str,
+                                      df[col].dtype == object, na_block_name))
+
+    def _share(self, key: str, values: np.ndarray) -> str:
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+        self._blocks[key] = block
+        return block.name
+
+    def descriptors(self) -> list[tuple]:
+        return self._descriptors
+
+    @staticmethod
+    def attach(descriptors: list[tuple]) -> tuple[pd.DataFrame, list[shared_memory.SharedMemory]]:
+        """ Returns the DataFrame and the attached blocks, which have to stay referenced while it is used. """
+        columns, blocks = {}, []
+        for col, block_name, shape, dtype, is_text, na_block_name in descriptors:
+            block = shared_memory.SharedMemory(name=block_name)
+            values = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            blocks.append(block)
+            if is_text:
+                values = values.astype(object)
+                if na_block_name is not None:
+                    na_block = shared_memory.SharedMemory(name=na_block_name)
+                    values[np.ndarray(shape, dtype=bool, buffer=na_block.buf)] = None
+                    blocks.append(na_block)
+            columns[col] = values
+        return pd.DataFrame(columns), blocks
+
+    def release(self) -> None:
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+        self._blocks = {}
+
+
+def transformed_column(field_key: str) -> str:
+    """ The column of the transformed values of a rule json key like 'description.lower'. """
+    return field_key.replace('.', '__')
+
+
+def transformations_of_tags(tags: list[Tag], df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The transformed columns (by transformed_column) of all the 'field.transformation' keys in the rules of the tags,
+    calculated once for all of them. The transformations whose values cannot be shared (not numbers or text, like
+    dates) are left out, the rules calculate them.
+    """
+    field_keys = {key for tag in tags for conjunction_dict in tag.rule.to_json() if isinstance(conjunction_dict, dict)
+                  for key in conjunction_dict if '.' in key}
+    columns = {}
+    for field_key in sorted(field_keys):
+        field, transformation_key = field_key.split('.', 1)
+        if field == 'tags' or field not in df.columns:
+            continue
+        values = TransformationFunction.from_key(transformation_key).apply_series(df[field])
+        if values.dtype != object or pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+            columns[transformed_column(field_key)] = values
+    return pd.DataFrame(columns, index=df.index)
+
+
+def transformed_rule_json(rule_json: list, transformed_columns) -> list:
+    """ The rule json, comparing the already transformed columns instead of transforming their fields again. """
+    return [{transformed_column(key) if transformed_column(key) in transformed_columns else key: value
+             for key, value in conjunction_dict.items()} if isinstance(conjunction_dict, dict) else conjunction_dict
+            for conjunction_dict in rule_json]
+
+
+class SharedTagMatrix:
+    """ A (tags x rows) boolean matrix in shared memory, every worker writes the row of the tag it calculated. """
+
+    def __init__(self, n_tags: int, n_rows: int, block_name: str = None):
+        self.shape = (n_tags, n_rows)
+        create = block_name is None
+        self._block = shared_memory.SharedMemory(name=block_name, create=create, size=max(n_tags * n_rows, 1))
+        self.matrix = np.ndarray(self.shape, dtype=bool, buffer=self._block.buf)
+        if create:
+            self.matrix[:] = False
+
+    @property
+    def block_name(self) -> str:
+        return self._block.name
+
+    def release(self, unlink: bool = True) -> None:
+        self.matrix = None
+        self._block.close()
+        if unlink:
+            self._block.unlink()
+
+
+_worker_state = {}
+
+
+def _init_worker(column_descriptors: list[tuple], tag_matrix_block: str, tag_matrix_shape: tuple, tag_names: list[str]):
+    df, blocks = SharedColumns.attach(column_descriptors)
+    _worker_state.update(df=df, blocks=blocks, tag_names=tag_names,
+                         tag_matrix=SharedTagMatrix(*tag_matrix_shape, block_name=tag_matrix_block))
+
+
+def _apply_tag(tag_name: str, rule_json: list, tag_row: int, dependency_rows: list[int]) -> tuple[str, float, float, float]:
+    """
+    Calculates the rule of a tag on the shared transactions and writes the result on the tag's row of the shared tag
+    matrix. The 'tags' column that the rule sees contains only the tags it depends on.
+    Returns the tag name, the start and end (wall clock) time of the calculation and the CPU time it took.
+    """
+    start_time, start_cpu_time = time.time(), time.process_time()
+    df, tag_matrix = _worker_state['df'], _worker_state['tag_matrix'].matrix
+
+    dependency_names = [_worker_state['tag_names'][row] for row in dependency_rows]
+    df = df.assign(tags=join_tag_names(dependency_names, tag_matrix[dependency_rows]))
+
+    tag = Tag.from_json(tag_name, rule_json)
+    tag_matrix[tag_row] = Tagger.get_index_for_rule(df, tag.rule).to_numpy(dtype=bool)
+    return tag_name, start_time, time.time(), time.process_time() - start_cpu_time
+
+
+class ParallelTagging(TaggingSession):
+    """
+    Tags the transactions (from scratch, like RuleExecutionPlanTagging) running each tag's rule as a separate task
+    on a pool of worker processes.
+    Key features:
+    * the tags are scheduled on their dependency graph (AcyclicTagGraph): the tags without dependencies start at once,
+    and every other tag starts as soon as all the tags it depends on are calculated
+    * the transactions are copied once to shared memory, and the workers write their results to a shared tag matrix
+    * the transformed columns that the rules use (like 'description.lower') are calculated once for all the tags and
+    shared along with the transactions, instead of once per tag by every worker
+    * the worker processes are spawned, not forked, so they do not inherit the locks and threads of the app
+    * the rules that check 'tags' see only the tags they depend on, so the result does not depend on the order that the
+    independent tags finish
+    * after tagging, level_report() shows how much each dependency level gained from the workers, and how long the
+    critical path (the slowest chain of dependent tags) is, which is the limit of the speedup with any number of workers
+    The data managers do not use it (they tag row chunks with process.RowChunkedTagging): every worker still compares
+    the conditions of its own tags, which OptREPTagging shares between the tags, so on bench_parallel_tagging it does
+    not beat OptREPTagging.
+    """
+
+    def __init__(self, tags: list[Tag], max_workers: int = None, remove_cycles: bool = True):
+        super().__init__(tags)
+        self.max_workers = max_workers if max_workers is not None else os.cpu_count()
+
+        tg = AcyclicTagGraph.from_tags(tags)
+        if remove_cycles:
+            tg = tg.remove_cycles()
+        if len(tg.find_all_cycles()) > 0:
+            raise ValueError("Cannot run ParallelTagging on a graph with cycles")
+
+        levels_dict = tg.levels()
+        tag_names = {tag.name for tag in tags}
+        self._levels = {tag.name: levels_dict.get(tag.name, 0) for tag in tags}
+        self._dependencies = {tag.name: [dep.name for dep in (tg.all_tag_dependencies(tag) or []) if dep.name in tag_names]
+                              for tag in tags}
+        self._direct_dependencies = {tag.name: [dep for dep in tg.dependency_names(tag.name) if dep in tag_names]
+                                     for tag in tags}
+        self._dependents = {tag.name: [] for tag in tags}
+        for tag_name, deps in self._direct_dependencies.items():
+            for dep in set(deps):
+                self._dependents[dep].append(tag_name)
+        # the tags in the order that OptREPTagging applies them, by level and then by name
+        self._ordered_tags = sorted(tags, key=lambda tag: (self._levels[tag.name], tag.name))
+        self._task_times = {}
+        self._transformed_columns = []
+
+    def _submit(self, executor: ProcessPoolExecutor, tag: Tag, tag_rows: dict):
+        dependency_rows = sorted({tag_rows[dep] for dep in self._dependencies[tag.name]})
+        rule_json = transformed_rule_json(tag.rule.to_json(), self._transformed_columns)
+        return executor.submit(_apply_tag, tag.name, rule_json, tag_rows[tag.name], dependency_rows)
+
+    @timeit
+    def tag(self, transactions: Transactions) -> Transactions:
+        df = transactions.dataframe()
+        tag_names = [tag.name for tag in self._ordered_tags]
+        tag_rows = {tag_name: i for i, tag_name in enumerate(tag_names)}
+        tags_by_name = {tag.name: tag for tag in self._ordered_tags}
+
+        df_transformed = transformations_of_tags(self.tags, df)
+        self._transformed_columns = list(df_transformed.columns)
+        columns = SharedColumns(pd.concat([df[[col for col in df.columns if col != 'tags']], df_transformed],
+                                          axis=1).reset_index(drop=True))
+        tag_matrix = SharedTagMatrix(len(tag_names), len(df))
+        self._task_times = {}
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker,
+                                     initargs=(columns.descriptors(), tag_matrix.block_name, tag_matrix.shape,
+                                               tag_names)) as executor:
+                pending_deps = {name: set(deps) for name, deps in self._direct_dependencies.items()}
+                running = {self._submit(executor, tags_by_name[name], tag_rows) for name in tag_names
+                           if len(pending_deps[name]) == 0}
+                while running:
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finished_tag_name, *task_times = future.result()
+                        self._task_times[finished_tag_name] = task_times
+                        for name in self._dependents[finished_tag_name]:
+                            pending_deps[name].discard(finished_tag_name)
+                            if len(pending_deps[name]) == 0:
+                                running.add(self._submit(executor, tags_by_name[name], tag_rows))
+
+            new_tags = join_tag_names(tag_names, tag_matrix.matrix)
+        finally:
+            tag_matrix.release()
+            columns.release()
+
+        logging.info(f"Applied {len(tag_names)} tags with {self.max_workers} workers.")
+        new_df = df.copy()
+        new_df['tags'] = new_tags
+        return transactions.factory(new_df)
+
+    def critical_path_time(self) -> float:
+        """ The (CPU) time of the slowest chain of dependent tags, from the task times of the last tag() call. """
+        chain_times = {}
+        for tag in self._ordered_tags:  # dependencies are always in lower levels
+            _, _, cpu_time = self._task_times[tag.name]
+            deps_time = max([chain_times[dep] for dep in self._direct_dependencies[tag.name]], default=0.)
+            chain_times[tag.name] = deps_time + cpu_time
+        return max(chain_times.values(), default=0.)
+
+    def level_report(self) -> pd.DataFrame:
+        """
+        One row per dependency level of the last tag() call with:
+        * serial_time: the sum of the CPU times of the level's tags (about the time it would take with one worker)
+        * wall_time: the time from the first task of the level starting to the last one ending
+        * speedup: serial_time / wall_time
+        and a final 'total' row, with the critical path time and the maximum speedup it allows (serial_time / critical
+        path time), no matter how many workers are used.
+        """
+        if len(self._task_times) == 0:
+            raise ValueError("No tagging has run yet, call tag first.")
+
+        df_times = pd.DataFrame([{'tag': name, 'level': str(self._levels[name]), 'start': start, 'end': end,
+                                  'cpu_time': cpu_time} for name, (start, end, cpu_time) in self._task_times.items()])
+        df_times = pd.concat([df_times, df_times.assign(level='total')])
+        df_report = df_times.groupby('level', sort=False).agg(tags=('tag', 'count'), serial_time=('cpu_time', 'sum'),
+                                                              start=('start', 'min'), end=('end', 'max'))
+        df_report['wall_time'] = df_report['end'] - df_report['start']
+        df_report['speedup'] = df_report['serial_time'] / df_report['wall_time']
+        df_report['critical_path_time'] = np.nan
+        df_report['max_speedup'] = np.nan
+        critical_path_time = self.critical_path_time()
+        df_report.loc['total', 'critical_path_time'] = critical_path_time
+        df_report.loc['total', 'max_speedup'] = df_report.loc['total', 'serial_time'] / critical_path_time \
+            if critical_path_time > 0 else np.nan
+
+        df_report = df_report.reset_index()
+        return df_report[['level', 'tags', 'serial_time', 'wall_time', 'speedup', 'critical_path_time', 'max_speedup']]
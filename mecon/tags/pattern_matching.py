@@ -0,0 +1,122 @@
+"""
+pattern_matching finds many substrings and regular expressions in text values with one scan per value, instead of
+one scan per pattern. It is used by OptimisedRuleExecutionPlanTagging for the 'contains' and 'regex' conditions.
+"""
+import re
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+class AhoCorasickAutomaton:
+    """
+    Finds which of a list of substrings are contained in a text, scanning the text once (Aho-Corasick algorithm).
+    The substrings are stored in a trie where every state knows the longest suffix state (fail) to continue from when
+    the next character does not follow, and all the substrings that end on it (output).
+    """
+
+    def __init__(self, substrings: list[str]):
+        self.substrings = list(substrings)
+        goto, fail, output = [{}], [0], [set()]
+        for i, substring in enumerate(self.substrings):
+            state = 0
+            for char in substring:
+                if char not in goto[state]:
+                    goto.append({})
+                    fail.append(0)
+                    output.append(set())
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            output[state].add(i)
+
+        queue = deque(goto[0].values())  # breadth first, so the fail states are always calculated before they are used
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback != 0 and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                output[next_state] |= output[fail[next_state]]
+
+        self._goto, self._fail = goto, fail
+        self._output = [frozenset(state_output) for state_output in output]
+
+    def find(self, text: str) -> set[int]:
+        """ The positions (in substrings) of all the substrings that text contains. """
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set(output[0])  # the empty substring
+        state = 0
+        for char in text:
+            while state != 0 and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+class MultiPatternMatcher:
+    """
+    Matches substrings (like comparisons.CONTAINS) and regular expressions (like comparisons.REGEX, so an empty value
+    never matches) against text values. Every distinct value is scanned:
+    * once for all the substrings, with an AhoCorasickAutomaton
+    * once for all the regular expressions, combined in one alternation with a named group per expression. The values
+    that the alternation does not match do not match any of the expressions. For the rest, an alternation reports one
+    expression per position, so the expressions that were not found are searched again one by one.
+    Expressions with groups of their own are always searched one by one, as combining them would renumber their groups.
+    Up to DIRECT_SEARCH_SUBSTRINGS substrings are searched one by one instead (str.__contains__), which is faster than
+    walking the automaton over every character of every value when there are few of them, like when a single tag is
+    tagged again.
+    """
+
+    DIRECT_SEARCH_SUBSTRINGS = 32
+
+    def __init__(self, substrings: list[str], regexes: list[str]):
+        self.substrings = list(substrings)
+        self.regexes = list(regexes)
+        self._automaton = AhoCorasickAutomaton(self.substrings)
+        self._compiled_regexes = [re.compile(regex) for regex in self.regexes]
+
+        combinable = [i for i, compiled in enumerate(self._compiled_regexes) if compiled.groups == 0]
+        try:
+            self._combined_regex = re.compile('|'.join(f"(?P<r{i}>{self.regexes[i]})" for i in combinable)) \
+                if len(combinable) > 0 else None
+        except re.error:  # e.g. inline flags, that are only allowed at the start of a pattern
+            self._combined_regex, combinable = None, []
+        self._combined = combinable
+        self._separate = [i for i in range(len(self.regexes)) if i not in set(combinable)]
+
+    def _find_regexes(self, text: str) -> set[int]:
+        if len(text) == 0:
+            return set()
+        found = {i for i in self._separate if self._compiled_regexes[i].search(text)}
+        if self._combined_regex is not None:
+            combined_found = {int(match.lastgroup[1:]) for match in self._combined_regex.finditer(text)}
+            if len(combined_found) > 0:
+                found |= combined_found
+                found |= {i for i in self._combined if i not in combined_found and self._compiled_regexes[i].search(text)}
+        return found
+
+    def match(self, values: pd.Series) -> np.ndarray:
+        """
+        A (patterns x values) boolean matrix, with a row per pattern, the substrings first and then the regular
+        expressions, in the order they were given. All the values must be strings.
+        """
+        codes, uniques = pd.factorize(values)
+        n_substrings = len(self.substrings)
+        unique_matrix = np.zeros((n_substrings + len(self.regexes), len(uniques)), dtype=bool)
+        if n_substrings <= self.DIRECT_SEARCH_SUBSTRINGS:
+            for i, substring in enumerate(self.substrings):
+                unique_matrix[i] = np.fromiter((substring in text for text in uniques), dtype=bool, count=len(uniques))
+        else:
+            for j, text in enumerate(uniques):
+                for i in self._automaton.find(text):
+                    unique_matrix[i, j] = True
+        if len(self.regexes) > 0:
+            for j, text in enumerate(uniques):
+                for i in self._find_regexes(text):
+                    unique_matrix[n_substrings + i, j] = True
+        return unique_matrix[:, codes]
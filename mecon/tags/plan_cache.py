@@ -0,0 +1,114 @@
+"""
+plan_cache keeps the compiled rule execution plans (OptREPTagging sessions) on disk, so tagging with a set of tags
+that has not changed skips expanding, deduplicating and ordering their rules again.
+"""
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import pickle
+
+from mecon import config
+from mecon.data.file_storage import replace_file
+from mecon.tags.process import OptREPTagging
+from mecon.tags.tagging import Tag
+
+PLAN_CACHE_FORMAT_VERSION = 4
+
+
+def ruleset_hash(tags: list[Tag]) -> str:
+    """
+    A stable hash of the tags' names and rules, in their order (it affects the order of the tags in the results).
+    It also depends on the mecon version and the cache format, so a new version does not load old plans.
+    """
+    ruleset = [config.MECON_VERSION, PLAN_CACHE_FORMAT_VERSION, [[tag.name, tag.rule.to_json()] for tag in tags]]
+    return hashlib.sha256(json.dumps(ruleset, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class PlanCache:
+    """
+    Stores the OptREPTagging session of a list of tags after create_optimised_rule_execution_plan, as a pickle file in
+    dirpath named by the ruleset_hash of the tags. session(tags) loads it when it exists (a hit), or creates and
+    stores it (a miss).
+    * the cache is limited to max_bytes, the least recently used plans are deleted first
+    * a plan that cannot be loaded (e.g. a corrupted file) is deleted and created again
+    * invalidate() deletes the plan of some tags, or all the plans
+    * hits and misses count the session calls of this PlanCache object
+    """
+
+    def __init__(self, dirpath: pathlib.Path, max_bytes: int = config.PLAN_CACHE_MAX_BYTES):
+        self.dirpath = pathlib.Path(dirpath)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.dirpath / f"{key}.pkl"
+
+    def _entries(self) -> list[pathlib.Path]:
+        return list(self.dirpath.glob('*.pkl')) if self.dirpath.exists() else []
+
+    def size(self) -> int:
+        """ The total size (in bytes) of the stored plans. """
+        return sum(path.stat().st_size for path in self._entries())
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries()), 'bytes': self.size()}
+
+    def get(self, tags: list[Tag]) -> OptREPTagging | None:
+        path = self._path(ruleset_hash(tags))
+        if not path.exists():
+            return None
+
+        try:
+            with open(path, 'rb') as plan_file:
+                sess = pickle.load(plan_file)
+        except Exception as error:
+            logging.warning(f"Deleting the cached plan {path.name} that cannot be loaded: {error!r}")
+            path.unlink(missing_ok=True)
+            return None
+
+        os.utime(path)  # the modification time is the last time the plan was used
+        return sess
+
+    def put(self, tags: list[Tag], sess: OptREPTagging) -> None:
+        try:
+            plan_bytes = pickle.dumps(sess)
+        except Exception as error:  # e.g. rules with observers or custom callables
+            logging.info(f"The tagging plan cannot be cached: {error!r}")
+            return
+
+        self.dirpath.mkdir(parents=True, exist_ok=True)
+        path = self._path(ruleset_hash(tags))
+        replace_file(path, lambda tmp_path: tmp_path.write_bytes(plan_bytes))  # a reader never sees a partial plan
+        self._evict(keep=path)
+
+    def _evict(self, keep: pathlib.Path) -> None:
+        entries = sorted(self._entries(), key=lambda path: path.stat().st_mtime_ns)
+        total_bytes = sum(path.stat().st_size for path in entries)
+        for path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            if path != keep:
+                total_bytes -= path.stat().st_size
+                path.unlink(missing_ok=True)
+                logging.info(f"Evicted the cached plan {path.name}.")
+
+    def session(self, tags: list[Tag]) -> OptREPTagging:
+        sess = self.get(tags)
+        if sess is not None:
+            self.hits += 1
+            logging.info(f"Loaded the cached tagging plan of {len(tags)} tags ({self.hits=}, {self.misses=}).")
+            return sess
+
+        self.misses += 1
+        sess = OptREPTagging(tags).create_rule_execution_plan().create_optimised_rule_execution_plan()
+        self.put(tags, sess)
+        return sess
+
+    def invalidate(self, tags: list[Tag] = None) -> None:
+        """ Deletes the plan of tags, or all the plans if tags is None. """
+        paths = [self._path(ruleset_hash(tags))] if tags is not None else self._entries()
+        for path in paths:
+            path.unlink(missing_ok=True)
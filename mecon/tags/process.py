@@ -1,20 +1,31 @@
 import abc
+import copy
 import logging
+import multiprocessing
+import os
+import tempfile
 import time
+import uuid
 from collections import namedtuple
-from itertools import chain
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import Any
 
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+from mecon import config
 from mecon.data.transactions import Transactions
 from mecon.etl.dataset import Dataset
+from mecon.monitoring.tag_monitoring import TaggingStats
 from mecon.tags import tagging
+from mecon.tags.pattern_matching import MultiPatternMatcher
 from mecon.tags.rule_graphs import AcyclicTagGraph
+from mecon.tags.rule_optimiser import RuleOptimiser
+from mecon.tags.selectivity import RuleStatistics
 from mecon.tags.tag_helpers import expand_rule_to_subrules
 from mecon.tags.tagging import Tag
+from mecon.tags.transformations import TransformationFunction
 
 
 def timeit(func):
@@ -29,9 +40,19 @@ def timeit(func):
 
 
 class TaggingSession(abc.ABC):
+    """
+    progress is an optional callable progress(done, total), that tag calls as its batches (a priority of the rule
+    execution plan, a tag of LinearTagging) are applied, like to show the progress of a background job.
+    """
+    progress = None  # a class default, so sessions unpickled from the PlanCache have it too
+
     def __init__(self, tags: list[Tag]):
         self.tags = tags
 
+    def report_progress(self, done: int, total: int) -> None:
+        if self.progress is not None:
+            self.progress(done, total)
+
     @abc.abstractmethod
     def tag(self, transactions: Transactions) -> Transactions:
         pass
@@ -40,61 +61,307 @@ class TaggingSession(abc.ABC):
 class LinearTagging(TaggingSession):
     """
     Applying one tag after the other to the transactions, in the order that they are provided on LinearTagging.__init__
+    With statistics (selectivity.RuleStatistics), the conjunctions of the tags are evaluated with short-circuits, in
+    the order of the statistics, which are updated by every tagging.
     """
 
+    def __init__(self, tags: list[Tag], statistics: RuleStatistics = None):
+        super().__init__(tags)
+        self.statistics = statistics
+
     @timeit
     def tag(self, transactions: Transactions) -> Transactions:
-        for tag in tqdm(self.tags, desc='Applying tag'):
-            transactions = transactions.apply_tag(tag)
+        self.report_progress(0, len(self.tags))
+        for i, tag in enumerate(tqdm(self.tags, desc='Applying tag')):
+            transactions = transactions.apply_tag(tag, statistics=self.statistics)
+            self.report_progress(i + 1, len(self.tags))
         return transactions
 
 
+def _tag_chunk(session: TaggingSession, factory, df_chunk: pd.DataFrame) -> pd.DataFrame:
+    return session.tag(factory(df_chunk)).dataframe()
+
+
+class RowChunkedTagging(TaggingSession):
+    """
+    Runs a tagging session (like OptREPTagging or LinearTagging) on row chunks of the transactions, in parallel worker
+    processes, and concatenates the tagged chunks in their original order.
+    Every rule, even the ones checking other tags, only looks at its own row, so the chunks are tagged independently.
+    The transactions are split in one chunk per worker, but in fewer chunks if they would be smaller than
+    min_chunk_size rows. With one chunk the session runs in this process.
+    The workers are spawned (not forked), as tag may run on a thread of a multithreaded process, like the tagging jobs
+    of the app, and progress is reported as every chunk is tagged. The chunks are tagged without the session's
+    transformation_cache, which is keyed by whole columns, so the entries of a chunk would never be read again.
+    """
+
+    def __init__(self, session: TaggingSession, workers: int, min_chunk_size: int = config.TRANSACTIONS_CHUNK_SIZE):
+        super().__init__(session.tags)
+        self.session = session
+        self.workers = workers
+        self.min_chunk_size = min_chunk_size
+
+    def n_chunks(self, n_rows: int) -> int:
+        return max(1, min(self.workers, n_rows // max(self.min_chunk_size, 1)))
+
+    @timeit
+    def tag(self, transactions: Transactions) -> Transactions:
+        df = transactions.dataframe()
+        n_chunks = self.n_chunks(len(df))
+        if n_chunks == 1:
+            self.session.progress = self.progress
+            return self.session.tag(transactions)
+
+        session = copy.copy(self.session)
+        session.progress = None  # the chunks are tagged in other processes, only their completion is reported
+        if getattr(session, 'transformation_cache', None) is not None:
+            session.transformation_cache = None  # the entries of a chunk would never be read again
+        self.report_progress(0, n_chunks)
+
+        logging.info(f"Tagging {len(df)} transactions in {n_chunks} chunks.")
+        bounds = np.arange(n_chunks + 1) * len(df) // n_chunks
+        tagged_chunks = [None] * n_chunks
+        with ProcessPoolExecutor(max_workers=n_chunks, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {executor.submit(_tag_chunk, session, transactions.factory, df.iloc[start:end]): i
+                       for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))}
+            for n_done, future in enumerate(as_completed(futures), start=1):
+                tagged_chunks[futures[future]] = future.result()
+                self.report_progress(n_done, n_chunks)
+        return transactions.factory(pd.concat(tagged_chunks))
+
+
 class RuleExecutionPlanMonitor:
     """
+    Keeps the intermediate calculations of a RuleExecutionPlanTagging.tag call, to show how every tag was calculated.
+    They are stored in the 'monitoring' folder of the dataset:
+    * calc_monitoring.npz: the ids of the transactions, the output of every rule (by its alias) as a bit-packed boolean
+    array and the transformed columns (like 'description.lower')
+    * op_monitoring.csv: the operations of the plan and the tag each one belongs to
+    The transactions are not copied, they are referenced by id and joined back from the transactions given to populate.
+    get_tag_calculations only reads the columns of the requested tag from calc_monitoring.npz. Another monitor of the
+    dataset (like the preview of another session) may overwrite the file in the meantime, so it has a generation id
+    that get_tag_calculations checks, and raises a ValueError if it is not the one of populate (or load).
+    The text columns are stored as unicode arrays with a mask of the missing values, only the columns of other objects
+    (like the dates of 'datetime.date' or the lists of 'description.split_comma') are pickled.
+
     TODO
     * find redundant rules (never true, always true, conditions of the same Tag conjunction that can be removes (a>10, a>100  << redundant))
     """
 
-    def __init__(self, dataset: Dataset, df_calculations=None, df_operations=None):
-        self.df_calculations = df_calculations
+    def __init__(self, dataset: Dataset, transactions: Transactions = None, df_operations: pd.DataFrame = None):
+        self.transactions = transactions
         self.df_operations = df_operations
         self.path = dataset.statements.parent / 'monitoring'
-        self.calc_path = self.path / 'calc_monitoring.csv'
+        self.calc_path = self.path / 'calc_monitoring.npz'
         self.op_path = self.path / 'op_monitoring.csv'
         self.path.mkdir(parents=True, exist_ok=True)
+        self._ids, self._rule_aliases, self._column_names = None, [], []
+        self._generation, self._text_columns, self._pickled_columns = None, set(), set()
 
-    def populate(self, df_calculations: pd.DataFrame, df_operations: pd.DataFrame):
-        self.df_calculations = df_calculations
+    def populate(self, frame: 'RuleExecutionFrame', df_operations: pd.DataFrame, transactions: Transactions = None):
+        self.transactions = transactions
         self.df_operations = df_operations
-        self.save()
-        self.load()
+        aliases, rule_matrix = frame.rule_outputs()
+        self.save(frame['id'].to_numpy(), aliases, rule_matrix, frame.columns())
+        self._load_calc_index()
 
     def get_tag_calculations(self, tag_name: str) -> pd.DataFrame:
-        ops = self.df_operations[self.df_operations['tag']==tag_name]
-        in_and_out_ops = ops['in'].to_list()+ops['out'].to_list()
-        valid_cols = [col for col in self.df_calculations.columns.to_list() if col in in_and_out_ops]
-        all_valid_cols = Transactions.columns+valid_cols
-        ordered_cols = list(dict.fromkeys(all_valid_cols))
-        calcs = self.df_calculations[ordered_cols]
+        ops = self.df_operations[self.df_operations['tag'] == tag_name]
+        in_and_out_ops = set(ops['out']) | {col for col in ops['in'] if isinstance(col, str)}
+        column_names = [col for col in self._column_names if col in in_and_out_ops]
+        rule_aliases = [alias for alias in self._rule_aliases if alias in in_and_out_ops]
+
+        calcs = self._transactions_dataframe()
+        with np.load(self.calc_path, allow_pickle=False) as calc_file:
+            if calc_file['generation'].item() != self._generation:
+                raise ValueError(f"The calculations in {self.calc_path} were overwritten by another tagging, "
+                                 f"tag the transactions again to monitor them.")
+            n_rows = len(self._ids)
+            for col in column_names:
+                i = self._column_names.index(col)
+                if i in self._text_columns:
+                    values = calc_file[f"column_{i}"].astype(object)
+                    values[calc_file[f"column_{i}_na"]] = None
+                    calcs[col] = values
+                elif i not in self._pickled_columns:
+                    calcs[col] = calc_file[f"column_{i}"]
+            for alias in rule_aliases:
+                packed = calc_file[f"rule_{self._rule_aliases.index(alias)}"]
+                calcs[alias] = np.unpackbits(packed, count=n_rows).astype(bool)
+
+        pickled_columns = [col for col in column_names if self._column_names.index(col) in self._pickled_columns]
+        if len(pickled_columns) > 0:  # the file has the generation checked above, the same monitor wrote it
+            with np.load(self.calc_path, allow_pickle=True) as calc_file:
+                for col in pickled_columns:
+                    calcs[col] = calc_file[f"column_{self._column_names.index(col)}"]
         return calcs
 
+    def _transactions_dataframe(self) -> pd.DataFrame:
+        if self.transactions is None:
+            return pd.DataFrame({'id': self._ids})
+
+        df = self.transactions.dataframe()
+        if not np.array_equal(df['id'].to_numpy(dtype=str), self._ids):
+            df = df.drop_duplicates('id').set_index('id').reindex(self._ids).reset_index()
+        return df[[col for col in Transactions.columns if col in df.columns]].reset_index(drop=True)
+
     def all_monitored_tag_names(self) -> list[str]:
         return self.df_operations['tag'].unique().tolist()
 
-    def save(self):
-        if self.df_calculations is not None:
-            logging.info(f"Saving calculation stats at {self.calc_path}")
-            self.df_calculations.to_csv(self.calc_path, index=False)
+    def save(self, ids: np.ndarray, rule_aliases: list[str], rule_matrix: np.ndarray, columns: dict[str, pd.Series]):
+        logging.info(f"Saving calculation stats at {self.calc_path}")
+        arrays = {'generation': np.array(uuid.uuid4().hex),
+                  'ids': np.asarray(ids, dtype=str),
+                  'rule_aliases': np.array(rule_aliases, dtype=str),
+                  'column_names': np.array(list(columns), dtype=str)}
+        for i, packed in enumerate(np.packbits(rule_matrix, axis=1)):
+            arrays[f"rule_{i}"] = packed
+        text_columns, pickled_columns = [], []
+        for i, column in enumerate(columns.values()):
+            values = column.to_numpy()
+            if values.dtype == object and column.dropna().map(type).eq(str).all():
+                text_columns.append(i)
+                values, arrays[f"column_{i}_na"] = column.fillna('').to_numpy(dtype=str), column.isna().to_numpy()
+            elif values.dtype == object:
+                pickled_columns.append(i)
+            arrays[f"column_{i}"] = values
+        arrays['text_columns'] = np.array(text_columns, dtype=int)
+        arrays['pickled_columns'] = np.array(pickled_columns, dtype=int)
+        with tempfile.NamedTemporaryFile(dir=self.path, suffix='.tmp', delete=False) as calc_file:
+            np.savez(calc_file, **arrays)
+        os.replace(calc_file.name, self.calc_path)  # a reader never sees a partially written file
 
         if self.df_operations is not None:
             logging.info(f"Saving operation stats at {self.op_path}")
-            self.df_operations.to_csv(self.op_path, index=False)
+            with tempfile.NamedTemporaryFile(dir=self.path, suffix='.tmp', delete=False) as op_file:
+                self.df_operations.to_csv(op_file, index=False)
+            os.replace(op_file.name, self.op_path)
+
+    def _load_calc_index(self):
+        with np.load(self.calc_path, allow_pickle=False) as calc_file:  # only the index, not the columns
+            self._generation = calc_file['generation'].item()
+            self._ids = calc_file['ids']
+            self._rule_aliases = calc_file['rule_aliases'].tolist()
+            self._column_names = calc_file['column_names'].tolist()
+            self._text_columns = set(calc_file['text_columns'].tolist())
+            self._pickled_columns = set(calc_file['pickled_columns'].tolist())
 
     def load(self):
-        self.df_calculations = pd.read_csv(self.calc_path, index_col=None)
+        self._load_calc_index()
         self.df_operations = pd.read_csv(self.op_path, index_col=None)
 
 
+def join_tag_names(tag_names: list[str], tag_matrix: np.ndarray, initial_tags: np.ndarray = None) -> np.ndarray:
+    """
+    Builds the 'tags' strings from a (tags x rows) boolean matrix: each row gets the names of its tags joined with
+    commas, in the order of tag_names, after its initial_tags (if any).
+    The strings are joined once per distinct combination of tags, not once per row.
+    """
+    n_rows = tag_matrix.shape[1]
+    if len(tag_names) == 0 or n_rows == 0:
+        new_tags = np.full(n_rows, '', dtype=object)
+    else:
+        packed_rows = np.ascontiguousarray(np.packbits(tag_matrix, axis=0).T)
+        row_keys = packed_rows.view(np.dtype((np.void, packed_rows.shape[1]))).ravel()
+        unique_keys, inverse = np.unique(row_keys, return_inverse=True)
+        unique_bits = np.unpackbits(unique_keys.view(np.uint8).reshape(len(unique_keys), -1), axis=1,
+                                    count=len(tag_names)).astype(bool)
+        names = np.array(tag_names, dtype=object)
+        unique_tags = np.array([','.join(names[bits]) for bits in unique_bits], dtype=object)
+        new_tags = unique_tags[inverse.ravel()]
+
+    if initial_tags is None:
+        return new_tags
+
+    initial_tags = np.asarray(initial_tags, dtype=object)
+    has_initial, has_new = initial_tags != '', new_tags != ''
+    return np.where(has_initial & has_new, initial_tags + ',' + new_tags, np.where(has_initial, initial_tags, new_tags))
+
+
+class RuleExecutionFrame:
+    """
+    The table that the operations of a RuleExecutionPlanTagging read from and write to, instead of a DataFrame that
+    grows by one column per operation.
+    * the boolean outputs of the rules are written in a preallocated (rules x rows) matrix, indexed by the rule alias
+    * the applied tags are kept in a (tags x rows) bit matrix, the 'tags' column is only joined when it is read
+    * any other output (like the transformations) and the transactions' columns are kept as Series
+    Reading one or more columns (frame[col], frame[[col1, col2]]) returns Series and DataFrames like a DataFrame does.
+    """
+
+    def __init__(self, df: pd.DataFrame, rule_aliases: list[str], tag_names: list[str]):
+        self._df = df
+        self._columns = {}
+        self._rule_rows = {alias: i for i, alias in enumerate(dict.fromkeys(rule_aliases))}
+        self._rule_matrix = np.zeros((len(self._rule_rows), len(df)), dtype=bool)
+        self._computed_rules = set()
+        self._tag_names = list(dict.fromkeys(tag_names))
+        self._tag_rows = {tag_name: i for i, tag_name in enumerate(self._tag_names)}
+        self._tag_matrix = np.zeros((len(self._tag_names), len(df)), dtype=bool)
+        self._initial_tags = df['tags'].to_numpy(dtype=object)
+        self._tags = self._initial_tags
+
+    def __getitem__(self, key):
+        if isinstance(key, list):
+            if all(col in self._computed_rules for col in key):
+                rows = [self._rule_rows[col] for col in key]
+                return pd.DataFrame(self._rule_matrix[rows].T, index=self._df.index, columns=key)
+            return pd.concat([self[col] for col in key], axis=1)
+        elif key in self._computed_rules:
+            return pd.Series(self._rule_matrix[self._rule_rows[key]], index=self._df.index, name=key)
+        elif key in self._columns:
+            return self._columns[key]
+        elif key == 'tags':
+            return pd.Series(self.tags(), index=self._df.index, name='tags')
+        else:
+            return self._df[key]
+
+    def store(self, result: pd.Series | pd.DataFrame) -> None:
+        if isinstance(result, pd.DataFrame):
+            for col in result.columns:
+                self.store(result[col])
+        elif result.name in self._rule_rows:
+            self._rule_matrix[self._rule_rows[result.name]] = result.to_numpy(dtype=bool)
+            self._computed_rules.add(result.name)
+        else:
+            self._columns[result.name] = result
+
+    def add_tag(self, tag_name: str, applied: pd.Series) -> None:
+        self._tag_matrix[self._tag_rows[tag_name]] |= applied.to_numpy(dtype=bool)
+        self._tags = None
+
+    def tags(self) -> np.ndarray:
+        if self._tags is None:
+            self._tags = join_tag_names(self._tag_names, self._tag_matrix, self._initial_tags)
+        return self._tags
+
+    def columns(self) -> dict[str, pd.Series]:
+        """ The stored columns that are not rule outputs, like the transformed columns. """
+        return dict(self._columns)
+
+    def tag_outputs(self) -> tuple[list[str], np.ndarray]:
+        """ The names of the tags and their (tags x rows) boolean matrix of the rows they were applied to. """
+        return list(self._tag_names), self._tag_matrix
+
+    def rule_outputs(self) -> tuple[list[str], np.ndarray]:
+        """ The aliases of the computed rules and their (rules x rows) boolean outputs. """
+        computed_aliases = [alias for alias in self._rule_rows if alias in self._computed_rules]
+        return computed_aliases, self._rule_matrix[[self._rule_rows[alias] for alias in computed_aliases]]
+
+    def dataframe(self) -> pd.DataFrame:
+        df = self._df.copy()
+        df['tags'] = self.tags()
+        computed_aliases, rule_matrix = self.rule_outputs()
+        df_rules = pd.DataFrame(rule_matrix.T, index=self._df.index, columns=computed_aliases) \
+            if computed_aliases else None
+        return pd.concat([df, *self._columns.values(), df_rules], axis=1)
+
+    @property
+    def index(self) -> pd.Index:
+        return self._df.index
+
+    def __len__(self) -> int:
+        return len(self._df)
+
+
 class RuleExecutionPlanTagging(TaggingSession):
     """
     Expands the tag rules in subrules and apply them in a Pandas.DataFrame oriented way to take advantage of its performance optimizations.
@@ -103,7 +370,16 @@ class RuleExecutionPlanTagging(TaggingSession):
     * rule operations are applied in an order based on the tag dependency level. This means that the provided tags will be checked for cyclic dependencies,
     and if any are found they will be removed.
     * the subrules are applied in the order of their parent tag's dependency level, or in first priority if there is no dependecy.
+    * a rule may belong to several tags (the RuleOptimiser shares Conjunctions between them, and the equal rules of
+    different tags are applied once), so the tags of every rule are kept by its alias, from the 'tag' of the plan, and
+    its operation is monitored and counted for all of them (see rule_tag_names).
+    With statistics (selectivity.RuleStatistics), the conditions that only one Conjunction reads are not applied on
+    every row: the Conjunction evaluates them itself, in the statistics.conjunction_order, each only on the rows that
+    all the previous subrules were true for (see deferred_conditions). Their comparisons are recorded in the statistics,
+    and their seconds are counted in the Conjunction's operation.
     """
+    statistics = None  # a class default, so sessions unpickled from the PlanCache have it too
+    _deferred_conditions = {}
 
     class TagApplicator:
         def __init__(self, tag_name: str, depends_on: tagging.AbstractRule):
@@ -117,7 +393,6 @@ class RuleExecutionPlanTagging(TaggingSession):
         super().__init__(tags)
 
         tg = AcyclicTagGraph.from_tags(tags)
-        tg.add_hierarchy_levels()
         if remove_cycles:
             tg = tg.remove_cycles()
 
@@ -126,8 +401,10 @@ class RuleExecutionPlanTagging(TaggingSession):
             raise ValueError("Cannot run ExtendedRuleTagging on a graph with cycles")
         self._levels_dict = tg.levels()
         self._rule_aliases = {}
+        self._alias_tag_names = {}
         self._op_monitoring = []
         self._df_plan = None
+        self.transformation_cache = None
 
     @property
     def plan(self):
@@ -136,24 +413,112 @@ class RuleExecutionPlanTagging(TaggingSession):
     def operation_monitoring_table(self):
         return pd.DataFrame(self._op_monitoring) if self._op_monitoring else None
 
+    def rule_tag_names(self, rule) -> list[str]:
+        """ The tags whose rules contain rule, in the order of the plan. """
+        if isinstance(rule, self.TagApplicator):
+            return [rule.tag_name]
+        return self._alias_tag_names.get(self._rule_aliases.get(rule), [])
+
+    def operation_tag_names(self, rule) -> list[str]:
+        """ The tags that the operation of rule is done for: the tags of all the rules it outputs. """
+        if isinstance(rule, self.TagApplicator):
+            return [rule.tag_name]
+        return list(dict.fromkeys(tag_name for output_rule in self.output_rules(rule)
+                                  for tag_name in self.rule_tag_names(output_rule)))
+
+    def _monitor_operation(self, rule, in_cols, out: str, alias: str) -> None:
+        for tag_name in self.rule_tag_names(rule):
+            self._op_monitoring.append({'tag': tag_name, 'in': in_cols, 'out': out, 'allias': alias})
+
+    def deferred_conditions(self) -> dict:
+        """
+        With statistics, the conditions (by alias) that are only read by one Conjunction, which evaluates them on the
+        rows that are still true. The conditions that are read by several rules, a Disjunction or a tag are applied on
+        every row, so all of them share the result.
+        """
+        if self.statistics is None:
+            return {}
+
+        readers, conditions = {}, {}
+        for rule in self.plan['rule']:
+            conditions.update({self._rule_aliases[output_rule]: output_rule for output_rule in self.output_rules(rule)
+                               if isinstance(output_rule, tagging.Condition)})
+            subrules = [rule.depends_on] if isinstance(rule, self.TagApplicator) else \
+                rule.rules if isinstance(rule, tagging.AbstractCompositeRule) else []
+            for subrule in subrules:
+                readers.setdefault(self._rule_aliases.get(subrule), set()).add(
+                    (self._rule_aliases.get(rule), isinstance(rule, tagging.Conjunction)))
+        return {alias: cond for alias, cond in conditions.items()
+                if len(readers.get(alias, ())) == 1 and all(is_conjunction for _, is_conjunction in readers[alias])}
+
+    def is_deferred(self, rule) -> bool:
+        """ Whether the operation of rule is left to the Conjunctions that read its outputs (see deferred_conditions). """
+        output_aliases = self.output_aliases(rule)
+        return len(output_aliases) > 0 and all(alias in self._deferred_conditions for alias in output_aliases)
+
+    def condition_values(self, df_in, rule: tagging.Condition) -> pd.Series:
+        """ The transformed values that the condition compares. """
+        return self.transform(df_in[f"{rule.field}"], rule.transformation_operation)
+
+    def condition_input(self, rule: tagging.Condition) -> str:
+        return f"{rule.field}"
+
+    def _evaluate_deferred(self, df_in, rule: tagging.Condition, positions: np.ndarray) -> np.ndarray:
+        """ The result of the deferred condition on the rows at positions, recorded in the statistics. """
+        values = self.condition_values(df_in, rule).iloc[positions]
+        start_time = time.perf_counter()
+        res = rule.compare_operation.apply_series(values, rule.compare_value).to_numpy(dtype=bool)
+        self.statistics.record(rule, len(positions), res.sum(), time.perf_counter() - start_time)
+        alias = self._rule_aliases[rule]
+        self._monitor_operation(rule, self.condition_input(rule), alias, alias)
+        return res
+
+    def transform(self, values: pd.Series, transformation) -> pd.Series:
+        """ The transformed values, through the transformation_cache (a TransformationCache) when it is set. """
+        if self.transformation_cache is None or not isinstance(transformation, TransformationFunction) or \
+                transformation.name == 'none':
+            return values.apply(transformation)
+        return self.transformation_cache.transform(values, transformation)
+
+    def output_rules(self, rule) -> list:
+        """ The rules whose boolean results the operation of the rule produces. """
+        if isinstance(rule, self.TagApplicator) or rule not in self._rule_aliases:
+            return []
+        return [rule]
+
+    def output_aliases(self, rule) -> list[str]:
+        """ The aliases of the boolean results that the operation of the rule produces. """
+        return [self._rule_aliases[output_rule] for output_rule in self.output_rules(rule)]
+
     def convert_rule_to_df_rule(self, rule) -> callable(pd.DataFrame):
         rule_alias = self._rule_aliases.get(rule)
         if isinstance(rule, tagging.Condition):
             def condition_op(df_in) -> pd.Series:
-                comp_f = lambda df_value: rule.compare_operation(rule.transformation_operation(df_value),
-                                                                 rule.value)
-                res = df_in[f"{rule.field}"].apply(comp_f).rename(rule_alias)  # TODO optimise, np.vectorise maybe
-                self._op_monitoring.append(
-                    {'tag': rule.parent_tag, 'in': f"{rule.field}", 'out': rule_alias, 'allias': rule_alias})
+                values = self.condition_values(df_in, rule)
+                res = rule.compare_operation.apply_series(values, rule.compare_value).rename(rule_alias)
+                self._monitor_operation(rule, self.condition_input(rule), rule_alias, rule_alias)
                 return res
 
             return condition_op
         elif isinstance(rule, tagging.Conjunction):
             def conjunction_op(df_in) -> pd.Series:
                 in_cols = [self._rule_aliases.get(subrule) for subrule in rule.rules]
-                res = df_in[in_cols].all(axis=1).rename(rule_alias)
-                self._op_monitoring.append(
-                    {'tag': rule.parent_tag, 'in': in_cols, 'out': rule_alias, 'allias': rule_alias})
+                deferred = [self._deferred_conditions[col] for col in dict.fromkeys(in_cols)
+                            if col in self._deferred_conditions]
+                if len(deferred) == 0:
+                    res = df_in[in_cols].all(axis=1).rename(rule_alias)
+                else:  # the applied subrules cost nothing, so they discard rows first
+                    applied_cols = [col for col in in_cols if col not in self._deferred_conditions]
+                    positions = np.flatnonzero(df_in[applied_cols].all(axis=1).to_numpy(dtype=bool)) \
+                        if applied_cols else np.arange(len(df_in))
+                    for cond in self.statistics.conjunction_order(deferred):
+                        if len(positions) == 0:
+                            break
+                        positions = positions[self._evaluate_deferred(df_in, cond, positions)]
+                    result = np.zeros(len(df_in), dtype=bool)
+                    result[positions] = True
+                    res = pd.Series(result, index=df_in.index, name=rule_alias)
+                self._monitor_operation(rule, in_cols, rule_alias, rule_alias)
                 return res
 
             return conjunction_op
@@ -161,42 +526,43 @@ class RuleExecutionPlanTagging(TaggingSession):
             def disjunction_op(df_in) -> pd.Series:
                 in_cols = [self._rule_aliases.get(subrule) for subrule in rule.rules]
                 res = df_in[in_cols].any(axis=1).rename(rule_alias)
-                self._op_monitoring.append(
-                    {'tag': rule.parent_tag, 'in': in_cols, 'out': rule_alias, 'allias': rule_alias})
+                self._monitor_operation(rule, in_cols, rule_alias, rule_alias)
                 return res
 
             return disjunction_op
         elif isinstance(rule, self.TagApplicator):
             def tag_application_op(df_in) -> pd.Series:
-                res = df_in[self._rule_aliases.get(rule.depends_on)].apply(lambda b: [rule.tag_name] if b else [])
-                self._op_monitoring.append(
-                    {'tag': rule.parent_tag, 'in': str(rule.depends_on), 'out': "tags", 'allias': rule_alias})
+                res = df_in[self._rule_aliases.get(rule.depends_on)].rename(rule.tag_name)
+                self._monitor_operation(rule, str(rule.depends_on), "tags", rule_alias)
                 return res
 
             return tag_application_op
         else:
             raise ValueError(f"Unexpected rule type: {type(rule)}")
 
+    def rule_tags(self) -> list[Tag]:
+        """ The tags whose rules are expanded in the rule execution plan. """
+        return self.tags
+
     @timeit
     def create_rule_execution_plan(self) -> 'RuleExecutionPlanTagging':
-        rules = {tag.name: expand_rule_to_subrules(tag.rule) for tag in self.tags}
+        rules = {tag.name: expand_rule_to_subrules(tag.rule) for tag in self.rule_tags()}
         expanded_rules = []
         for tag_name, tag_rules in rules.items():
             tag_rules.insert(0, RuleExecutionPlanTagging.TagApplicator(tag_name, depends_on=tag_rules[0]))
-            for rule in tag_rules:
-                # if hasattr(rule, 'parent_tag'):
-                #     raise ValueError(f"Unexpected 'parent_tag' attribute on '{rule=}'")
-                # else:
-                rule.parent_tag = tag_name
-
+            for rule in tag_rules:  # the tag of the rule is kept in the plan, not on the (maybe shared) rule
                 expanded_rules.append({'tag': tag_name, 'rule': rule})
 
         df_plan = pd.DataFrame(expanded_rules)
         df_plan['type'] = df_plan['rule'].apply(lambda rule: type(rule).__name__)
         df_plan['tag_level'] = df_plan['tag'].map(self._levels_dict)
+        # conjunctions nested in conjunctions (like the ones hoisted by the RuleOptimiser) are applied before them
+        nested_conjunctions = {id(subrule) for rule in df_plan['rule'] if isinstance(rule, tagging.Conjunction)
+                               for subrule in rule.rules if isinstance(subrule, tagging.Conjunction)}
         df_plan['rule_level'] = df_plan['rule'].apply(lambda rule:
                                                       .8 if isinstance(rule, self.TagApplicator) else
                                                       .4 if isinstance(rule, tagging.Disjunction) else
+                                                      .15 if id(rule) in nested_conjunctions else
                                                       .2 if isinstance(rule, tagging.Conjunction) else
                                                       .1 if rule.field == 'tags' else
                                                       0)
@@ -207,6 +573,11 @@ class RuleExecutionPlanTagging(TaggingSession):
         del df_plan['tag_level'], df_plan['rule_level']
 
         self._rule_aliases = {rule: str(rule) for rule in df_plan['rule'].to_list()}
+        self._alias_tag_names = {}
+        for tag_name, rule in zip(df_plan['tag'], df_plan['rule']):
+            tag_names = self._alias_tag_names.setdefault(self._rule_aliases[rule], [])
+            if tag_name not in tag_names:
+                tag_names.append(tag_name)
 
         logging.info(f"Created {len(df_plan)} rules using {len(self._rule_aliases)} aliases.")
 
@@ -225,53 +596,83 @@ class RuleExecutionPlanTagging(TaggingSession):
             ['id', 'datetime', 'amount', 'currency', 'amount_cur', 'description', 'tags']]
         df['old_tags'] = df['tags']
         df['tags'] = ''
-        df['new_tags_list'] = np.empty((len(df), 0)).tolist()
 
         return df
 
+    def record_stats(self, stats: TaggingStats, frame: 'RuleExecutionFrame', rule_seconds: list[tuple]) -> None:
+        """
+        Adds the hit counters of a tag call to stats: the true counts of every rule and the matched rows of every tag,
+        counted on the boolean outputs already in the frame, and the seconds of the operations (rule_seconds).
+        """
+        aliases, rule_matrix = frame.rule_outputs()
+        true_counts = dict(zip(aliases, np.count_nonzero(rule_matrix, axis=1).tolist()))
+        tag_names, tag_matrix = frame.tag_outputs()
+        matched_counts = dict(zip(tag_names, np.count_nonzero(tag_matrix, axis=1).tolist()))
+        n_rows = tag_matrix.shape[1]
+
+        tag_seconds = {}
+        for rule, seconds in rule_seconds:  # the seconds of a shared operation are split between its tags
+            tag_names = self.operation_tag_names(rule)
+            for tag_name in tag_names:
+                tag_seconds[tag_name] = tag_seconds.get(tag_name, 0.) + seconds / len(tag_names)
+
+        for rule, seconds in rule_seconds:
+            if isinstance(rule, self.TagApplicator):
+                stats.record(rule.tag_name, self._rule_aliases.get(rule.depends_on), 'Tag', n_rows,
+                             matched_counts[rule.tag_name], tag_seconds.get(rule.tag_name, 0.))
+                continue
+            output_rules = [output_rule for output_rule in self.output_rules(rule)
+                            if self._rule_aliases[output_rule] in true_counts]
+            for output_rule in output_rules:  # the seconds of an operation are split between its outputs and tags
+                alias = self._rule_aliases[output_rule]
+                tag_names = self.rule_tag_names(output_rule)
+                for tag_name in tag_names:
+                    stats.record(tag_name, alias, type(output_rule).__name__, n_rows, true_counts[alias],
+                                 seconds / len(output_rules) / len(tag_names))
+
     @timeit
-    def tag(self, transactions: Transactions, monitor: RuleExecutionPlanMonitor = None) -> Transactions:
+    def tag(self, transactions: Transactions, monitor: RuleExecutionPlanMonitor = None,
+            stats: TaggingStats = None) -> Transactions:
         rule_groups = self.split_in_batches()
         all_priorities = sorted(rule_groups.keys(), reverse=False)
 
         df_in = self.prepare_transactions(transactions)
-
-        for priority in all_priorities:
+        self._deferred_conditions = self.deferred_conditions()
+        rule_groups = {priority: [rule for rule in rules if not self.is_deferred(rule)]
+                       for priority, rules in rule_groups.items()}
+        ordered_rules = [rule for priority in all_priorities for rule in rule_groups[priority]]
+        frame = RuleExecutionFrame(
+            df_in,
+            rule_aliases=[alias for rule in ordered_rules for alias in self.output_aliases(rule)
+                          if alias not in self._deferred_conditions],
+            tag_names=[rule.tag_name for rule in ordered_rules if isinstance(rule, self.TagApplicator)])
+
+        rule_seconds = []
+        self.report_progress(0, len(all_priorities))
+        for i, priority in enumerate(all_priorities):
             rules = rule_groups[priority]
             column_rules = [self.convert_rule_to_df_rule(rule) for rule in rules]
             logging.info(f"Applying {len(rules)} rules, with priority {priority}")
-            group_results = [col_rule(df_in) for col_rule in tqdm(column_rules, desc=f"Priority {priority}")]
-
-            if priority.endswith('.8'):
-                df_temp = pd.concat(group_results, axis=1)
-
-                new_tags_col = f"tags_added_{priority}"
-
-                # # TODO fix: PerformanceWarning: DataFrame is highly fragmented.  This is usually the result of calling `frame.insert` many times, which has poor performance.  Consider joining all columns at once using pd.concat(axis=1) instead. To get a de-fragmented frame, use `newframe = frame.copy()`
-                # df_in[new_tags_col] = df_temp.apply(
-                #     # DataFrame is highly fragmented.  This is usually the result of calling `frame.insert` many times, which has poor performance.  Consider joining all columns at once using pd.concat(axis=1) instead. To get a de-fragmented frame, use `newframe = frame.copy()`
-                #     lambda row: list(chain(*[row[col] for col in df_temp.columns])), axis=1)
-                # df_in['new_tags_list'] = df_in.apply(lambda row: row['new_tags_list'] + row[new_tags_col], axis=1)
-                #
-                # df_in['tags'] = df_in['new_tags_list'].apply(lambda tags: ','.join(tags))
-                # # TODO fix: PerformanceWarning: DataFrame is highly fragmented.  This is usually the result of calling `frame.insert` many times, which has poor performance.  Consider joining all columns at once using pd.concat(axis=1) instead. To get a de-fragmented frame, use `newframe = frame.copy()`
-                # df_in[f"tags_list_{priority}"] = df_in['new_tags_list']
-
-                new_tags_col_series = df_temp.apply(
-                    # DataFrame is highly fragmented.  This is usually the result of calling `frame.insert` many times, which has poor performance.  Consider joining all columns at once using pd.concat(axis=1) instead. To get a de-fragmented frame, use `newframe = frame.copy()`
-                    lambda row: list(chain(*[row[col] for col in df_temp.columns])), axis=1).rename(new_tags_col)
-                df_in = pd.concat([df_in, new_tags_col_series], axis=1)
-                df_in['new_tags_list'] = df_in.apply(lambda row: row['new_tags_list'] + row[new_tags_col], axis=1)
-                df_in['tags'] = df_in['new_tags_list'].apply(lambda tags: ','.join(tags))
-                df_in = pd.concat([df_in, df_in['new_tags_list'].rename(f"tags_list_{priority}")], axis=1)
-            else:
-                df_in = pd.concat([df_in, *group_results], axis=1)
-            continue
-
-        new_transactions = Transactions(df_in[transactions.dataframe().columns])
+            for rule, col_rule in tqdm(zip(rules, column_rules), total=len(rules), desc=f"Priority {priority}"):
+                start_time = time.perf_counter()
+                result = col_rule(frame)
+                if isinstance(rule, self.TagApplicator):
+                    frame.add_tag(rule.tag_name, result)
+                else:
+                    frame.store(result)
+                if stats is not None:
+                    rule_seconds.append((rule, time.perf_counter() - start_time))
+            self.report_progress(i + 1, len(all_priorities))
+
+        df_out = df_in[transactions.dataframe().columns].copy()
+        df_out['tags'] = frame.tags()
+        new_transactions = Transactions(df_out)
 
         if monitor:
-            monitor.populate(df_in, self.operation_monitoring_table())
+            monitor.populate(frame, self.operation_monitoring_table(), new_transactions)
+
+        if stats is not None:
+            self.record_stats(stats, frame, rule_seconds)
 
         return new_transactions
 
@@ -290,17 +691,39 @@ class OptimisedRuleExecutionPlanTagging(RuleExecutionPlanTagging):
     * Condition rules are broken even further in transformation operations and comparison operations (except conditions referring to 'tags')
     * Redundant Composite rules like Conjunctions and Disjunctions that have only one subrule are removed to further reduce the number of rules that are applies in total.
     * Identical rules/subrules are applies only once
+    * All the 'contains' and 'regex' conditions on the same transformed column are matched together (PatternMatching),
+    scanning every distinct value of the column once with a MultiPatternMatcher
+    * Unless optimise_rules is False, the tag rules are first rewritten by a RuleOptimiser (merged ranges, removed dead
+    and subsumed conjunctions, 'equal' conditions folded to 'in', shared conditions hoisted). Its report is kept in
+    rule_optimisation_report.
     """
 
-    Transformation = namedtuple('Transformation', ['field', 'trans', 'parent_tag'])
+    class Transformation(namedtuple('Transformation', ['field', 'trans', 'parent_tag'])):
+        # a nested class (instead of a plain namedtuple) so that it is pickled by reference for the worker processes
+        __slots__ = ()
 
-    def __init__(self, tags: list[Tag], remove_cycles: bool = True):
+    class PatternMatching(namedtuple('PatternMatching', ['column', 'conditions', 'parent_tag'])):
+        __slots__ = ()
+
+    PATTERN_COMPARISONS = ('contains', 'regex')
+
+    def __init__(self, tags: list[Tag], remove_cycles: bool = True, optimise_rules: bool = True):
         super().__init__(tags, remove_cycles)
+        self._optimise_rules = optimise_rules
+        self.rule_optimisation_report = None
+
+    def rule_tags(self) -> list[Tag]:
+        if not self._optimise_rules:
+            return self.tags
+        optimiser = RuleOptimiser()
+        optimised_tags = optimiser.optimise(self.tags)
+        self.rule_optimisation_report = optimiser.report
+        return optimised_tags
 
     @staticmethod
     def transformations_execution_plan(df_plan) -> pd.DataFrame:
         df_condition = df_plan[df_plan['type'] == 'Condition']
-        df_non_tag_condition = df_condition[df_condition['rule'].apply(lambda rule: rule.field != 'tags')].copy()
+        df_non_tag_condition = df_condition[df_condition['rule'].apply(lambda rule: rule.field != 'tags').astype(bool)].copy()
 
         df_non_tag_condition['trans_id'] = df_non_tag_condition['rule'].apply(lambda
                                                                                   rule: f"{rule.field}.{rule.transformation_operation.name}")  # if rule.transformation_operation.name != 'none' else rule.field)
@@ -308,6 +731,9 @@ class OptimisedRuleExecutionPlanTagging(RuleExecutionPlanTagging):
         filtered_conditions = df_non_tag_condition.drop_duplicates(subset=['trans_id']).copy()
         logging.info(
             f"Reduce {len(df_non_tag_condition)} conditions to {len(filtered_conditions)} unique transformation operations")
+        del filtered_conditions['trans_id']
+        if len(filtered_conditions) == 0:
+            return filtered_conditions
 
         filtered_conditions['rule'] = filtered_conditions.apply(
             lambda row: OptimisedRuleExecutionPlanTagging.Transformation(field=row['rule'].field,
@@ -318,9 +744,28 @@ class OptimisedRuleExecutionPlanTagging(RuleExecutionPlanTagging):
 
         logging.info(f"Expanded the plan with {len(filtered_conditions)} transformations")
 
-        del filtered_conditions['trans_id']
         return filtered_conditions
 
+    @staticmethod
+    def pattern_matching_execution_plan(df_plan) -> pd.DataFrame:
+        is_pattern_condition = df_plan['rule'].apply(
+            lambda rule: isinstance(rule, tagging.Condition) and rule.field != 'tags' and isinstance(rule.value, str) and
+                         rule.compare_operation.name in OptimisedRuleExecutionPlanTagging.PATTERN_COMPARISONS).astype(bool)
+        df_pattern_condition = df_plan[is_pattern_condition]
+        if len(df_pattern_condition) == 0:
+            return df_plan
+
+        columns = df_pattern_condition['rule'].apply(lambda rule: f"{rule.field}.{rule.transformation_operation.name}")
+        pattern_matchings = [
+            {'type': 'PatternMatching', 'tag': group['tag'].iloc[0], 'priority': group['priority'].min(),
+             'rule': OptimisedRuleExecutionPlanTagging.PatternMatching(column=column, conditions=tuple(group['rule']),
+                                                                       parent_tag=group['tag'].iloc[0])}
+            for column, group in df_pattern_condition.groupby(columns)]
+        logging.info(f"Combined {len(df_pattern_condition)} contains/regex conditions in {len(pattern_matchings)} "
+                     f"pattern matching operations")
+
+        return pd.concat([df_plan[~is_pattern_condition], pd.DataFrame(pattern_matchings)], ignore_index=True)
+
     @staticmethod
     def remove_unnecessary_composite_rules(df_plan, alias_dict) -> tuple[pd.DataFrame, dict[Any, Any]]:
         alias_dict = alias_dict.copy()
@@ -362,24 +807,42 @@ class OptimisedRuleExecutionPlanTagging(RuleExecutionPlanTagging):
             field, trans_op, parent_tag = rule
 
             def tranform_op(df_in) -> pd.Series:
-                res = df_in[field].apply(trans_op).rename(
-                    f"{field}.{trans_op.name}")  # TODO optimise, np.vectorise maybe
+                res = self.transform(df_in[field], trans_op).rename(f"{field}.{trans_op.name}")
                 self._op_monitoring.append(
                     {'tag': rule.parent_tag, 'in': field, 'out': f"{field}.{trans_op.name}", 'allias': rule_alias})
                 return res
 
             return tranform_op
+        elif isinstance(rule, OptimisedRuleExecutionPlanTagging.PatternMatching):
+            applied_conditions = [cond for cond in rule.conditions
+                                  if self._rule_aliases[cond] not in self._deferred_conditions]
+            contains_conditions = [cond for cond in applied_conditions if cond.compare_operation.name == 'contains']
+            regex_conditions = [cond for cond in applied_conditions if cond.compare_operation.name == 'regex']
+            conditions = contains_conditions + regex_conditions
+            aliases = [self._rule_aliases[cond] for cond in conditions]
+            matcher = MultiPatternMatcher([cond.value for cond in contains_conditions],
+                                          [cond.value for cond in regex_conditions])
+
+            def pattern_matching_op(df_in) -> pd.DataFrame:
+                values = df_in[rule.column]
+                if pd.api.types.infer_dtype(values, skipna=False) not in ('string', 'empty'):
+                    # the comparisons are applied one by one, so they raise the same errors on the non text values
+                    return pd.concat([self.convert_rule_to_df_rule(cond)(df_in) for cond in conditions], axis=1)
+
+                res = pd.DataFrame(matcher.match(values).T, index=values.index, columns=aliases)
+                for cond, alias in zip(conditions, aliases):
+                    self._monitor_operation(cond, rule.column, alias, alias)
+                return res
+
+            return pattern_matching_op
         elif isinstance(rule, tagging.Condition):
             if rule.field == 'tags':
                 return super().convert_rule_to_df_rule(rule)
 
             def condition_op(df_in) -> pd.Series:
-                comp_f = lambda df_value: rule.compare_operation(df_value, rule.value)
-                res = df_in[f"{rule.field}.{rule.transformation_operation.name}"].apply(comp_f).rename(
-                    rule_alias)  # TODO optimise, np.vectorise maybe
-                self._op_monitoring.append(
-                    {'tag': rule.parent_tag, 'in': f"{rule.field}.{rule.transformation_operation.name}",
-                     'out': rule_alias, 'allias': rule_alias})
+                values = self.condition_values(df_in, rule)
+                res = rule.compare_operation.apply_series(values, rule.compare_value).rename(rule_alias)
+                self._monitor_operation(rule, self.condition_input(rule), rule_alias, rule_alias)
                 return res
 
             return condition_op
@@ -396,6 +859,7 @@ class OptimisedRuleExecutionPlanTagging(RuleExecutionPlanTagging):
                                                                                       alias_dict)
 
         df_plan_opt = self.deduplicate_rule_execution_plan(df_plan_reduced)
+        df_plan_opt = self.pattern_matching_execution_plan(df_plan_opt)
         logging.info(
             f"Reduce {len(df_plan)} rules to {len(df_plan_opt)} unique rules and {len(set(self._rule_aliases))} aliases.")
 
@@ -404,9 +868,120 @@ class OptimisedRuleExecutionPlanTagging(RuleExecutionPlanTagging):
 
         return self
 
+    def output_rules(self, rule) -> list:
+        if isinstance(rule, OptimisedRuleExecutionPlanTagging.PatternMatching):
+            return list(rule.conditions)
+        return super().output_rules(rule)
+
+    def condition_values(self, df_in, rule: tagging.Condition) -> pd.Series:
+        if rule.field == 'tags':
+            return super().condition_values(df_in, rule)
+        return df_in[self.condition_input(rule)]  # transformed by a Transformation operation
+
+    def condition_input(self, rule: tagging.Condition) -> str:
+        if rule.field == 'tags':
+            return super().condition_input(rule)
+        return f"{rule.field}.{rule.transformation_operation.name}"
+
+    def operation_tag_names(self, rule) -> list[str]:
+        if isinstance(rule, OptimisedRuleExecutionPlanTagging.Transformation):  # it outputs a column, not a rule
+            return [rule.parent_tag]
+        return super().operation_tag_names(rule)
+
 
 class OptREPTagging(OptimisedRuleExecutionPlanTagging):
     """
     abv for OptimisedRuleExecutionPlanTagging
     """
     pass
+
+
+class IncrementalTagging(TaggingSession):
+    """
+    Updates already tagged transactions after some of the tags changed (edited, added or deleted), instead of
+    re-tagging them from scratch.
+    Key features:
+    * only the changed tags and the tags that depend on them (found through the AcyclicTagGraph) are recalculated,
+    using the same rule execution plan as OptREPTagging. All the other tags are left untouched.
+    * deleted tags (changed tags that are not in tags) are removed from the transactions
+    * only the rows where an affected tag is added or removed are rewritten, they are available as changed_rows after tag
+    * the optional transformation_cache is used by the rule execution plan
+    * a monitor (RuleExecutionPlanMonitor) or stats (TaggingStats) passed to tag only get the calculations of the
+    recalculated tags
+    """
+
+    def __init__(self, tags: list[Tag], changed_tag_names: list[str], transformation_cache=None):
+        super().__init__(tags)
+        self._changed_tag_names = list(changed_tag_names)
+        self._changed_rows = None
+        self.transformation_cache = transformation_cache
+
+        self._tag_graph = AcyclicTagGraph.from_tags(tags) if len(tags) > 0 else None
+
+    @property
+    def changed_rows(self) -> np.ndarray:
+        return self._changed_rows
+
+    def affected_tag_names(self) -> set[str]:
+        dependent_tag_names = self._tag_graph.all_dependent_tag_names(self._changed_tag_names) if self._tag_graph else set()
+        return set(self._changed_tag_names) | dependent_tag_names
+
+    @timeit
+    def tag(self, transactions: Transactions, monitor: RuleExecutionPlanMonitor = None,
+            stats: TaggingStats = None) -> Transactions:
+        affected_tag_names = self.affected_tag_names()
+        tags_to_apply = [tag for tag in self.tags if tag.name in affected_tag_names]
+        logging.info(f"Re-applying {len(tags_to_apply)} tags, affected by the changes in {self._changed_tag_names}")
+
+        if len(tags_to_apply) > 0:
+            sess = TaggedTransactionsOptREPTagging(tags_to_apply, removed_tag_names=affected_tag_names) \
+                .create_rule_execution_plan() \
+                .create_optimised_rule_execution_plan()
+            sess.transformation_cache = self.transformation_cache
+            sess.progress = self.progress
+            new_transactions = sess.tag(transactions, monitor=monitor, stats=stats)
+        else:
+            new_transactions = transactions
+            for tag_name in affected_tag_names:
+                new_transactions = new_transactions.remove_tag(tag_name)
+
+        self._changed_rows = self._changed_tag_sets(transactions.tags.to_numpy(), new_transactions.tags.to_numpy())
+        logging.info(f"{self._changed_rows.sum()} transactions changed tags.")
+
+        # the rows that did not change keep their 'tags' exactly as they were, including the order of the tags
+        df = new_transactions.dataframe().copy()
+        df['tags'] = np.where(self._changed_rows, df['tags'], transactions.tags)
+        return transactions.factory(df)
+
+    @staticmethod
+    def _changed_tag_sets(old_tags: np.ndarray, new_tags: np.ndarray) -> np.ndarray:
+        """
+        True for the rows whose set of tags is different. Only the rows whose 'tags' strings differ are split, the others
+        (usually most of them) cannot have changed.
+        """
+        changed = old_tags != new_tags
+        for row in np.flatnonzero(changed):
+            changed[row] = set(old_tags[row].split(',')) - {''} != set(new_tags[row].split(',')) - {''}
+        return changed
+
+
+class TaggedTransactionsOptREPTagging(OptimisedRuleExecutionPlanTagging):
+    """
+    An OptimisedRuleExecutionPlanTagging that keeps the existing tags of the transactions and adds the new ones to them,
+    so tags that are not part of the session can still be used by the rules of the session's tags.
+    The existing tags in removed_tag_names (like the tags of the session, when they are recalculated) are dropped first.
+    The 'tags' strings are rewritten once per distinct value, as many rows share the same tags.
+    """
+
+    def __init__(self, tags: list[Tag], removed_tag_names=(), **kwargs):
+        super().__init__(tags, **kwargs)
+        self.removed_tag_names = set(removed_tag_names)
+
+    def prepare_transactions(self, transactions: Transactions) -> pd.DataFrame:
+        df = RuleExecutionPlanTagging.prepare_transactions(transactions)
+        removed_tag_names = self.removed_tag_names | {''}
+        codes, unique_tags = pd.factorize(df['old_tags'], use_na_sentinel=False)
+        kept_tags = np.array([','.join(tag for tag in tags.split(',') if tag not in removed_tag_names)
+                              for tags in unique_tags], dtype=object)
+        df['tags'] = kept_tags[codes]
+        return df
@@ -0,0 +1,141 @@
+import logging
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from mecon.tags import tagging
+from mecon.tags.comparisons import CompareOperator
+from mecon.tags.selectivity import RuleStatistics
+from mecon.tags.transformations import TransformationFunction
+
+
+class CompiledRule:
+    """
+    Compiles an AbstractRule tree into a flat list of whole-column operations, which are then applied to
+    a pd.DataFrame at once, instead of calling Condition.compute for every row and every condition.
+    Key features:
+    * Conditions are lowered to the vectorised TransformationFunction.apply_series and CompareOperator.apply_series
+    * each (field, transformation) column is calculated only once per evaluation, no matter how many conditions use it
+    * Conjunctions and Disjunctions are reduced with numpy logical and/or over the results of their subrules
+    * rules that cannot be vectorised (custom callables, CustomRules, conditions with row observers) fall back to
+    their own row-by-row fit, so the result is always the same as AbstractRule.fit
+    With statistics (selectivity.RuleStatistics), the rule is evaluated with short-circuits instead: the subrules of a
+    Conjunction are evaluated in statistics.conjunction_order, each only on the rows that the previous ones were true
+    for (and the subrules of a Disjunction only on the rows that are still false). Every comparison is recorded in the
+    statistics, to order the next evaluations. Rows that are skipped are not compared at all, so a comparison that
+    would fail on them does not fail. Rules with batch observers need every subrule on every row, so they are always
+    evaluated in full.
+    """
+
+    Step = namedtuple('Step', ['kind', 'rule', 'args'])
+
+    def __init__(self, rule: tagging.AbstractRule, statistics: RuleStatistics = None):
+        self._rule = rule
+        self._statistics = statistics
+        self._steps = []
+        self._transformations = {}
+        self._compile(rule)
+
+    @property
+    def rule(self) -> tagging.AbstractRule:
+        return self._rule
+
+    @property
+    def steps(self) -> list:
+        return self._steps
+
+    @staticmethod
+    def is_vectorizable(rule) -> bool:
+        """ Composite rules are always vectorised, conditions only if they are made of known operations. """
+        if isinstance(rule, tagging.AbstractCompositeRule):
+            return True
+
+        return (isinstance(rule, tagging.Condition) and
+                isinstance(rule.transformation_operation, TransformationFunction) and
+                isinstance(rule.compare_operation, CompareOperator) and
+                len(rule.observers) == 0)
+
+    def _add_step(self, kind, rule, args=None) -> int:
+        self._steps.append(CompiledRule.Step(kind, rule, args))
+        return len(self._steps) - 1
+
+    def _compile(self, rule) -> int:
+        if not self.is_vectorizable(rule):
+            logging.debug(f"Rule {rule} cannot be vectorised, it will be calculated row by row.")
+            return self._add_step('row', rule)
+
+        if isinstance(rule, tagging.Condition):
+            transformation_key = (rule.field, rule.transformation_operation.name)
+            self._transformations[transformation_key] = rule.transformation_operation
+            return self._add_step('condition', rule, transformation_key)
+
+        subrule_steps = [self._compile(subrule) for subrule in rule.rules]
+        kind = 'all' if isinstance(rule, tagging.Conjunction) else 'any'
+        return self._add_step(kind, rule, subrule_steps)
+
+    def __call__(self, df: pd.DataFrame) -> pd.Series:
+        return pd.Series(self.evaluate(df), index=df.index)
+
+    def _has_batch_observers(self) -> bool:
+        return any(len(rule.batch_observers) > 0 for _, rule, _ in self._steps)
+
+    def evaluate(self, df: pd.DataFrame) -> np.ndarray:
+        """ Returns the boolean result of the rule for each row of df, as a numpy array. """
+        if self._statistics is not None and not self._has_batch_observers():
+            return self._evaluate_short_circuit(self._rule, df, np.arange(len(df)), {})
+
+        columns, results, rows = {}, [], None
+        for kind, rule, args in self._steps:
+            if kind == 'condition':
+                if args not in columns:
+                    field, _ = args
+                    columns[args] = self._transformations[args].apply_series(df[field])
+                res = rule.compare_operation.apply_series(columns[args], rule.compare_value).to_numpy(dtype=bool)
+            elif kind == 'all':
+                res = np.logical_and.reduce([results[i] for i in args]) if len(args) > 0 else np.zeros(len(df), dtype=bool)
+            elif kind == 'any':
+                res = np.logical_or.reduce([results[i] for i in args]) if len(args) > 0 else np.zeros(len(df), dtype=bool)
+            else:
+                rows = [row for index, row in df.iterrows()] if rows is None else rows
+                res = np.asarray(rule.fit(rows), dtype=bool).reshape(len(df))
+
+            if isinstance(rule, tagging.AbstractRule):
+                rule.notify_batch_observers(df, res)
+            results.append(res)
+
+        return results[-1]
+
+    def _evaluate_short_circuit(self, rule, df: pd.DataFrame, positions: np.ndarray, columns: dict) -> np.ndarray:
+        """ The result of the rule for the rows of df at positions. The transformed columns are cached in columns. """
+        if not self.is_vectorizable(rule):
+            return np.asarray(rule.fit([row for index, row in df.iloc[positions].iterrows()]),
+                              dtype=bool).reshape(len(positions))
+
+        if isinstance(rule, tagging.Condition):
+            key = (rule.field, rule.transformation_operation.name)
+            if key not in columns:
+                columns[key] = rule.transformation_operation.apply_series(df[rule.field])
+            start_time = time.perf_counter()
+            res = rule.compare_operation.apply_series(columns[key].iloc[positions], rule.compare_value).to_numpy(
+                dtype=bool)
+            self._statistics.record(rule, len(positions), res.sum(), time.perf_counter() - start_time)
+            return res
+
+        if len(rule.rules) == 0:
+            return np.zeros(len(positions), dtype=bool)
+
+        is_conjunction = isinstance(rule, tagging.Conjunction)
+        result = np.full(len(positions), is_conjunction)
+        undecided = np.arange(len(positions))  # the rows that the next subrule can still change
+        subrules = self._statistics.conjunction_order(rule.rules) if is_conjunction else \
+            self._statistics.disjunction_order(rule.rules)
+        for subrule in subrules:
+            if len(undecided) == 0:
+                break
+            res = self._evaluate_short_circuit(subrule, df, positions[undecided], columns)
+            decided = ~res if is_conjunction else res
+            result[undecided[decided]] = not is_conjunction
+            undecided = undecided[~decided]
+        return result
@@ -9,22 +9,160 @@ import pandas as pd
 from mecon.tags import tagging, tag_helpers
 
 
+class TagDependencyIndex:
+    """
+    The dependencies between tags (depends_on) and their reverse (dependents), with the transitive closure of both
+    calculated once and kept as a bitset per tag: a python int with bit i set for the i-th tag name of the index.
+    * all_dependencies(tag_name): the names of the tags that tag_name depends on, directly or indirectly
+    * all_dependents(tag_name): the names of the tags that depend on tag_name, directly or indirectly
+    Both are ordered by descending level (a tag comes before the tags it depends on) and are cached per tag.
+    * set_dependencies(tag_name, depends_on) updates the index after the rule of a single tag changed, recalculating
+    only the closures of the tags that depend on it and of the tags it depends on (before and after the change)
+    The dependencies must not have cycles.
+    """
+
+    def __init__(self, dependency_mapping: dict):
+        self._names, self._bits = [], {}
+        self._depends_on, self._dependents = {}, {}
+        self._ancestors, self._descendants, self._levels = {}, {}, {}
+        self._query_cache = {}
+        for tag_name, info in dependency_mapping.items():
+            self._set_edges(tag_name, info['depends_on'])
+        self._closures(self._names, self._depends_on, self._ancestors, self._levels)
+        self._closures(self._names, self._dependents, self._descendants)
+
+    def __contains__(self, tag_name: str) -> bool:
+        return tag_name in self._bits
+
+    def _add_name(self, tag_name: str) -> None:
+        if tag_name not in self._bits:
+            self._bits[tag_name] = len(self._names)
+            self._names.append(tag_name)
+            self._depends_on[tag_name], self._dependents[tag_name] = set(), set()
+
+    def _set_edges(self, tag_name: str, depends_on: Iterable[str]) -> None:
+        self._add_name(tag_name)
+        for dep_tag in self._depends_on[tag_name]:
+            self._dependents[dep_tag].discard(tag_name)
+        self._depends_on[tag_name] = set(depends_on)
+        for dep_tag in self._depends_on[tag_name]:
+            self._add_name(dep_tag)
+            self._dependents[dep_tag].add(tag_name)
+
+    def _closures(self, tag_names: Iterable[str], adjacency: dict, closures: dict, levels: dict = None) -> None:
+        """ Recalculates the closures of tag_names over adjacency, reusing the closures of all the other tags. """
+        for tag_name in tag_names:
+            closures.pop(tag_name, None)
+
+        for tag_name in tag_names:
+            stack, visiting = [tag_name], set()
+            while stack:
+                curr_tag = stack[-1]
+                if curr_tag in closures:
+                    stack.pop()
+                    continue
+                pending = [next_tag for next_tag in adjacency[curr_tag] if next_tag not in closures]
+                if pending:
+                    if curr_tag in visiting:
+                        raise ValueError(f"Cannot index the dependencies of {curr_tag}, they have cycles")
+                    visiting.add(curr_tag)
+                    stack.extend(pending)
+                    continue
+
+                closure = 0
+                for next_tag in adjacency[curr_tag]:
+                    closure |= closures[next_tag] | (1 << self._bits[next_tag])
+                closures[curr_tag] = closure
+                if levels is not None:
+                    levels[curr_tag] = max((levels[next_tag] + 1 for next_tag in adjacency[curr_tag]), default=0)
+                stack.pop()
+
+    def _names_of(self, bitset: int) -> list[str]:
+        names = []
+        while bitset:
+            lowest_bit = bitset & -bitset
+            names.append(self._names[lowest_bit.bit_length() - 1])
+            bitset ^= lowest_bit
+        return sorted(names, key=lambda tag_name: (-self._levels[tag_name], self._bits[tag_name]))
+
+    def all_dependencies(self, tag_name: str) -> list[str]:
+        key = ('dependencies', tag_name)
+        if key not in self._query_cache:
+            self._query_cache[key] = self._names_of(self._ancestors.get(tag_name, 0))
+        return list(self._query_cache[key])
+
+    def all_dependents(self, tag_name: str) -> list[str]:
+        key = ('dependents', tag_name)
+        if key not in self._query_cache:
+            self._query_cache[key] = self._names_of(self._descendants.get(tag_name, 0))
+        return list(self._query_cache[key])
+
+    def depends_on(self, tag_name: str, other_tag_name: str) -> bool:
+        """ True if tag_name depends on other_tag_name, directly or indirectly. """
+        return other_tag_name in self._bits and bool(self._ancestors.get(tag_name, 0) >> self._bits[other_tag_name] & 1)
+
+    def set_dependencies(self, tag_name: str, depends_on: Iterable[str]) -> None:
+        old_ancestors, n_names = self._ancestors.get(tag_name, 0), len(self._names)
+        self._set_edges(tag_name, depends_on)
+        new_names = self._names[n_names:]
+
+        # the tags that depend on tag_name now depend on different tags, and their levels may change
+        dependent_names = [tag_name] + self._names_of(self._descendants.get(tag_name, 0))
+        self._closures(new_names + dependent_names, self._depends_on, self._ancestors, self._levels)
+        # the tags that tag_name depended on (or depends on now) have different dependents
+        changed_ancestors = old_ancestors | self._ancestors[tag_name]
+        self._closures(new_names + [tag_name] + self._names_of(changed_ancestors), self._dependents,
+                       self._descendants)
+        self._query_cache = {}
+
+
 class TagGraph:
     def __init__(self, tags: Iterable[tagging.Tag], dependency_mapping: dict):
         self._tags = tags
         self._quick_lookup = {tag.name: tag for tag in self._tags}
         self._dependency_mapping = dependency_mapping
-
-        self._tidy_table = self.tidy_table() # TODO
-
-        # if not self.has_cycles():
-        # if not self.find_all_cycles():
-        #     self.add_hierarchy_levels()
+        self._graph = None  # the networkx graph and the cyclic components are cached until invalidate is called
+        self._cyclic_components = None
 
     @property
     def tags(self):
         return self._tags
 
+    def invalidate(self) -> None:
+        """ Drops everything that is cached on the graph, after the tags or the dependency mapping changed. """
+        self._graph = None
+        self._cyclic_components = None
+
+    def set_tag(self, tag: tagging.Tag) -> None:
+        """ Adds the tag, or replaces the tag with the same name, and recalculates its dependencies. """
+        tags = list(self._tags)
+        positions = [i for i, curr_tag in enumerate(tags) if curr_tag.name == tag.name]
+        if positions:
+            tags[positions[0]] = tag
+        else:
+            tags.append(tag)
+        self._tags = tags
+        self._quick_lookup[tag.name] = tag
+        self._dependency_mapping[tag.name] = TagGraph.build_dependency_mapping([tag])[tag.name]
+        self.invalidate()
+
+    def graph(self) -> nx.DiGraph:
+        """ The dependency graph, with an edge from every tag to each tag that depends on it. """
+        if self._graph is None:
+            graph = nx.DiGraph()
+            graph.add_nodes_from(tag.name for tag in self._tags if tag.name in self._dependency_mapping)
+            graph.add_nodes_from(self._dependency_mapping)
+            graph.add_edges_from((dep_tag, tag) for tag, info in self._dependency_mapping.items()
+                                 for dep_tag in info['depends_on'])
+            self._graph = graph
+        return self._graph
+
+    def dependency_names(self, tag_name: str) -> list[str]:
+        """ The names of the tags that tag_name directly depends on. """
+        if tag_name not in self._dependency_mapping:
+            return []
+        return list(self._dependency_mapping[tag_name]['depends_on'])
+
     def tidy_table(self, ignore_tags_with_no_dependencies=False):
         # TODO maybe cache result
         tags = []
@@ -64,7 +202,7 @@ class TagGraph:
         df_cnd = df[df['type'] == 'Condition'].copy()
         df_cnd['is_tag_rule'] = df_cnd['rule'].apply(lambda rule: rule.field == 'tags')
 
-        df_tags = df_cnd[df_cnd['is_tag_rule']].copy()
+        df_tags = df_cnd[df_cnd['is_tag_rule'].astype(bool)].copy()
         df_tags['depends_on'] = df_tags['rule'].apply(
                 lambda rule: rule.value if isinstance(rule.value, list) else rule.value.split(','))
 
@@ -78,52 +216,58 @@ class TagGraph:
 
         return df_mapping
 
-    def find_all_cycles(self):
-        df = self.tidy_table()
-        # Create a directed graph
-        G = nx.DiGraph()
-
-        # Add edges based on the DataFrame
-        for _, row in df.iterrows():
-            tag = row['tag']
-            depends_on = row['depends_on']
-            if pd.notna(depends_on):
-                G.add_edge(depends_on, tag)
-
-        # Find all simple cycles
-        cycles = list(nx.simple_cycles(G))
-
-        sizewise_sorted_cycles = sorted(cycles, key=len, reverse=True)
-        return sizewise_sorted_cycles
+    @staticmethod
+    def _find_cyclic_components(graph: nx.DiGraph) -> list[list[str]]:
+        node_order = {node: i for i, node in enumerate(graph)}
+        components = [sorted(component, key=node_order.get) for component in nx.strongly_connected_components(graph)]
+        cyclic_components = [component for component in components
+                             if len(component) > 1 or graph.has_edge(component[0], component[0])]
+        return sorted(cyclic_components, key=len, reverse=True)
+
+    def find_all_cycles(self) -> list[list[str]]:
+        """
+        The groups of tags that depend on each other through a cycle, largest first: the strongly connected components
+        of the graph with more than one tag (or with a tag that depends on itself).
+        networkx finds them with Tarjan's algorithm in O(V+E), while enumerating every elementary cycle
+        (nx.simple_cycles) is exponential in the worst case.
+        """
+        if self._cyclic_components is None:
+            self._cyclic_components = self._find_cyclic_components(self.graph())
+        return [list(component) for component in self._cyclic_components]
 
     def has_cycles(self):
         return len(self.find_all_cycles()) > 0
 
     def remove_cycles(self) -> 'AcyclicTagGraph':
-        edges = self.tidy_table()[['tag', 'depends_on']].values.tolist()
+        """
+        Breaks every cyclic group of tags by removing the dependencies of its last tag (in the order of the tags) on
+        the other tags of the group. The rest of the group is checked again, until no cycle is left.
+        The tags that are left with no dependencies are not kept in the new dependency mapping.
+        """
+        insertion_order = {tag.name: i for i, tag in enumerate(self._tags)}
+        depends_on = {tag: list(info['depends_on']) for tag, info in self._dependency_mapping.items()}
+        graph = self.graph().copy()
         cycles = self.find_all_cycles()
 
-        edges_to_remove = []
-        for cycle in cycles:
-            cyclic_tags_ordered_based_on_insertion = [tag.name for tag in self._tags if tag.name in cycle]
-            tag_link_to_remove = cyclic_tags_ordered_based_on_insertion[-1]
-            edges_with_this_tag = [edge for edge in edges if edge[0] == tag_link_to_remove and edge[1] in cycle]
+        edges_to_remove, components_to_check = [], list(cycles)
+        while components_to_check:
+            component = components_to_check.pop()
+            tag_link_to_remove = max(component, key=lambda tag_name: insertion_order.get(tag_name, -1))
+            edges_with_this_tag = [[tag_link_to_remove, dep_tag] for dep_tag in depends_on[tag_link_to_remove]
+                                   if dep_tag in component]
             edges_to_remove.extend(edges_with_this_tag)
+            depends_on[tag_link_to_remove] = [dep_tag for dep_tag in depends_on[tag_link_to_remove]
+                                              if dep_tag not in component]
+            graph.remove_edges_from((dep_tag, tag) for tag, dep_tag in edges_with_this_tag)
+            components_to_check.extend(self._find_cyclic_components(graph.subgraph(component)))
 
-        cleaned_edges = [edge for edge in edges if edge not in edges_to_remove]
-
-        new_df = pd.DataFrame(cleaned_edges, columns=['tag', 'depends_on']).groupby('tag').agg({'depends_on': list}).reset_index()
-        new_df['depends_on'] = new_df['depends_on'].apply(lambda arr: arr if arr is not None and len(arr) > 0 and arr[0] is not None else list())
-
-        # new_dep_mapping = {k: v['depends_on'] for k, v in new_df.set_index('tag').to_dict('index').items()}
-        new_dep_mapping = new_df.set_index('tag').to_dict('index')
+        new_dep_mapping = {tag: {'depends_on': deps} for tag, deps in sorted(depends_on.items())
+                           if len(deps) > 0 or len(self._dependency_mapping[tag]['depends_on']) == 0}
 
         new_tg = AcyclicTagGraph(self._tags, new_dep_mapping)
-        logging.info(f"Removed cycles from the graph. {cycles=}, {edges_to_remove=}, {len(edges)=}, {len(cleaned_edges)=}, {len(new_tg.find_all_cycles())=}")
-        logging.info(f"{[edge in cleaned_edges for edge in edges_to_remove]=}")
+        logging.info(f"Removed cycles from the graph. {cycles=}, {edges_to_remove=}")
         return new_tg
 
-
     def create_plotly_graph(self, k=.5, levels_col=None):
         from mecon.data.graphs import create_plotly_graph
         df = self.tidy_table()
@@ -136,6 +280,8 @@ class AcyclicTagGraph(TagGraph):
                  tags: Iterable[tagging.Tag],
                  dependency_mapping: dict,
                  if_has_cycles: Literal['raise', 'remove'] = 'remove',):
+        self._levels = None
+        self._dependency_index = None
         super().__init__(tags, dependency_mapping)
 
         if self.has_cycles():
@@ -147,59 +293,81 @@ class AcyclicTagGraph(TagGraph):
                 self._tags = new_atg._tags
                 self._dependency_mapping = new_atg._dependency_mapping
                 self._quick_lookup = new_atg._quick_lookup
+                self.invalidate()
             else:
                 raise ValueError(f"Invalid if_has_cycles value: {if_has_cycles}!")
 
+    def invalidate(self) -> None:
+        super().invalidate()
+        self._levels = None
+        self._dependency_index = None
+        for info in self._dependency_mapping.values():
+            info.pop('level', None)
+
+    def set_tag(self, tag: tagging.Tag) -> None:
+        """
+        Like TagGraph.set_tag, but raises a ValueError (and keeps the graph as it was) if the tag adds a cycle.
+        The dependency index is updated for the new dependencies of the tag, instead of being rebuilt.
+        """
+        tags, dependency_mapping = self._tags, dict(self._dependency_mapping)
+        previous_tag = self._quick_lookup.get(tag.name)
+        dependency_index = self._dependency_index
+        super().set_tag(tag)
+        if self.has_cycles():
+            cycles = self.find_all_cycles()
+            self._tags, self._dependency_mapping = tags, dependency_mapping
+            if previous_tag is None:
+                del self._quick_lookup[tag.name]
+            else:
+                self._quick_lookup[tag.name] = previous_tag
+            self.invalidate()
+            self._dependency_index = dependency_index
+            raise ValueError(f"Tag {tag.name} creates cycles: {cycles}")
+
+        if dependency_index is not None:
+            dependency_index.set_dependencies(tag.name, self._dependency_mapping[tag.name]['depends_on'])
+            self._dependency_index = dependency_index
 
-        # self.add_hierarchy_levels()
+    def dependency_index(self) -> TagDependencyIndex:
+        """ The TagDependencyIndex of the graph, built on the first query. """
+        if self._dependency_index is None:
+            self._dependency_index = TagDependencyIndex(self._dependency_mapping)
+        return self._dependency_index
 
     def levels(self):
-        if len(self.find_all_cycles()) > 0:
-            raise ValueError("Cannot calculate hierarchy on a graph with cycles")
-        if 'level' not in self._dependency_mapping[list(self._dependency_mapping.keys())[0]]:
+        if self._levels is None:
             self.add_hierarchy_levels()
-        return {tag: info['level'] for tag, info in self._dependency_mapping.items()}
+        return dict(self._levels)
 
     @classmethod
     def from_cyclic_tag_graph(cls, tag_graph: TagGraph) -> 'AcyclicTagGraph':
         return tag_graph.remove_cycles()
 
     def add_hierarchy_levels(self):
-        if 'level' in self._dependency_mapping[list(self._dependency_mapping.keys())[0]]:
+        """
+        Sets the 'level' of every tag in the dependency mapping: 0 for the tags with no dependencies, else one more than
+        the highest level of their dependencies. The levels are calculated in a single topological sort of the graph
+        and kept until the graph is invalidated.
+        """
+        if self._levels is not None:
             return
 
         if self.has_cycles():
-            raise ValueError(f"Cannot calculate hierarchy on a graph with cycles: {self.has_cycles()=}, {self.find_all_cycles()=}")
+            raise ValueError(f"Cannot calculate hierarchy on a graph with cycles: {self.find_all_cycles()=}")
 
-        mapping = self._dependency_mapping.copy()
+        graph = self.graph()
+        levels = {}
+        for tag in nx.topological_sort(graph):
+            levels[tag] = max((levels[dep_tag] + 1 for dep_tag in graph.predecessors(tag)), default=0)
 
-        def _calc_level_rec(tag):
-            if tag not in mapping:
-                logging.warning(f"{tag} not in dependency mapping while calculating hierarchy. Will be replaced with 0")
-                return 0
-
-            if 'level' in mapping[tag]:
-                return mapping[tag]['level']
-
-            if len(mapping[tag]['depends_on']) == 0:
-                mapping[tag]['level'] = 0
-                return 0
-
-            dep_levels = []
-            for dep_tag in mapping[tag]['depends_on']:
-                 dep_levels.append(_calc_level_rec(dep_tag))
-
-            tag_level = max(dep_levels)+1
-            mapping[tag]['level'] = tag_level
-            return tag_level
-
-
-        for tag, info in mapping.items():
-            _calc_level_rec(tag)
-
-        # levels_dict = {tag: info['level'] for tag, info in mapping.items()}
-        self._dependency_mapping = mapping
+        missing_tags = set(levels) - set(self._dependency_mapping)
+        if missing_tags:
+            logging.warning(f"{sorted(missing_tags)} not in dependency mapping while calculating hierarchy. "
+                            f"Will be replaced with 0")
 
+        for tag, info in self._dependency_mapping.items():
+            info['level'] = levels[tag]
+        self._levels = {tag: info['level'] for tag, info in self._dependency_mapping.items()}
 
     def find_all_root_tags(self) -> Iterable[tagging.Tag]:
         res = [tag for tag in self._tags if tag if len(self.tags_that_depends_on(tag))==0]
@@ -220,31 +388,15 @@ class AcyclicTagGraph(TagGraph):
         tag_name = tag.name if isinstance(tag, tagging.Tag) else tag
         if tag_name not in self._dependency_mapping:
             return None
-        direct_deps_names = self._dependency_mapping[tag_name]['depends_on']
-        direct_deps = [self._quick_lookup[dep_name] for dep_name in direct_deps_names if dep_name in self._quick_lookup]
-
-        if len(direct_deps) == 0:
-            return []
-
-        _rec_results = [self.all_tag_dependencies(dep_tag) for dep_tag in direct_deps]
-        indirect_deps = list(chain(*[deps for deps in _rec_results if deps is not None]))
-        res = direct_deps + indirect_deps
-        return res
+        dep_names = self.dependency_index().all_dependencies(tag_name)
+        return [self._quick_lookup[dep_name] for dep_name in dep_names if dep_name in self._quick_lookup]
 
     def tags_that_depends_on(self, tag: tagging.Tag | str) -> Iterable[tagging.Tag] | None:
         tag_name = tag.name if isinstance(tag, tagging.Tag) else tag
         if tag_name not in self._dependency_mapping:
             return None
-
-        direct_deps = [self._quick_lookup[curr_tag_name] for curr_tag_name, curr_tag_info in self._dependency_mapping.items() if tag_name in curr_tag_info['depends_on']]
-        if len(direct_deps) == 0:
-            return []
-
-        _rec_results = [self.tags_that_depends_on(dep_tag) for dep_tag in direct_deps]
-        indirect_deps = list(chain(*[deps for deps in _rec_results if deps is not None]))
-        res = indirect_deps + direct_deps
-        return res
-
+        dependent_names = self.dependency_index().all_dependents(tag_name)
+        return [self._quick_lookup[dep_name] for dep_name in dependent_names if dep_name in self._quick_lookup]
 
     def all_tags_affected_by(self, tag: tagging.Tag | str) -> Iterable[tagging.Tag]:
         if isinstance(tag, str):
@@ -257,4 +409,10 @@ class AcyclicTagGraph(TagGraph):
         res = set(chain(*all_affected_tags_list))
         return res
 
-
+    def all_dependent_tag_names(self, tag_names: Iterable[str]) -> set[str]:
+        """
+        Returns the names of all the tags that depend, directly or indirectly, on any of the tag_names.
+        Unlike tags_that_depends_on, tag_names do not have to be in the graph (i.e. deleted tags).
+        """
+        dependency_index = self.dependency_index()
+        return set(chain.from_iterable(dependency_index.all_dependents(tag_name) for tag_name in tag_names))
@@ -0,0 +1,291 @@
+"""
+rule_optimiser rewrites the rules of a list of tags to equivalent but cheaper rules, before they are expanded in a rule
+execution plan. The rewritten tags are only used for tagging, they are never stored.
+"""
+import logging
+import math
+from collections import Counter
+from itertools import combinations
+
+from mecon.tags import comparisons, tagging
+from mecon.tags.tag_helpers import expand_rule_to_subrules
+from mecon.tags.tagging import Tag
+
+LOWER_BOUND_COMPARISONS = ('greater', 'greater_equal')
+UPPER_BOUND_COMPARISONS = ('less', 'less_equal')
+STRICT_COMPARISONS = ('greater', 'less')
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and not math.isnan(value)
+
+
+def _is_scalar(value) -> bool:
+    return isinstance(value, str) or _is_number(value)
+
+
+def _names(condition: tagging.Condition) -> tuple[str, str, str] | None:
+    trans_op, compare_op = condition.transformation_operation, condition.compare_operation
+    if not hasattr(trans_op, 'name') or not isinstance(compare_op, comparisons.CompareOperator):
+        return None
+    return condition.field, trans_op.name, compare_op.name
+
+
+def _column(condition: tagging.Condition) -> tuple[str, str] | None:
+    """
+    The (field, transformation) that the condition compares, if its comparison can be reasoned about. The 'tags' field
+    and the transformations that return lists are excluded, as 'equal' and 'in' differ on lists.
+    """
+    names = _names(condition)
+    if names is None or condition.field == 'tags' or names[1] == 'split_comma':
+        return None
+    return names[0], names[1]
+
+
+def _condition_key(condition: tagging.Condition) -> tuple:
+    """ Identifies identical conditions. Unlike str(condition), it tells apart the values 1 and '1'. """
+    names = _names(condition)
+    if names is None:
+        return 'condition', str(condition), id(condition)
+    return *names, type(condition.value).__name__, repr(condition.value)
+
+
+def _bound_kind(condition: tagging.Condition) -> str | None:
+    if _column(condition) is None or not _is_number(condition.value):
+        return None
+    compare_name = condition.compare_operation.name
+    return 'lower' if compare_name in LOWER_BOUND_COMPARISONS else \
+        'upper' if compare_name in UPPER_BOUND_COMPARISONS else \
+        None
+
+
+def _is_equal_scalar(condition: tagging.Condition) -> bool:
+    return _column(condition) is not None and condition.compare_operation.name == 'equal' and \
+        _is_scalar(condition.value)
+
+
+def implies(condition_a: tagging.Condition, condition_b: tagging.Condition) -> bool:
+    """ True if condition_b is true for every value that condition_a is true for (e.g. 'a > 100' implies 'a > 10'). """
+    if _condition_key(condition_a) == _condition_key(condition_b):
+        return True
+    if _column(condition_a) is None or _column(condition_a) != _column(condition_b):
+        return False
+
+    kind_a, kind_b = _bound_kind(condition_a), _bound_kind(condition_b)
+    if kind_b is None:
+        return False
+    if kind_a == kind_b:
+        value_a, value_b = condition_a.value, condition_b.value
+        if value_a == value_b:
+            return condition_a.compare_operation.name in STRICT_COMPARISONS or \
+                condition_b.compare_operation.name not in STRICT_COMPARISONS
+        return value_a > value_b if kind_b == 'lower' else value_a < value_b
+    if _is_equal_scalar(condition_a) and _is_number(condition_a.value):
+        return condition_b.compare_operation.function(condition_a.value, condition_b.value)
+    return False
+
+
+class RuleOptimiser:
+    """
+    Rewrites tags whose rule is a Disjunction of Conjunctions of Conditions (the form of Tag.from_json) to fewer rules
+    with the same result. The rules of the other tags are kept as they are.
+    For every tag:
+    * identical conditions in a conjunction are kept once, and the numeric ranges on the same field and transformation
+    are merged to their tightest bounds ('a > 10' and 'a > 100' to 'a > 100')
+    * conjunctions that can never be true are removed (like 'a > 10' and 'a < 5', or 'a equal x' and 'a equal y')
+    * conjunctions that are subsumed by another conjunction of the tag are removed ('a > 100 and b equal x' when the tag
+    also has 'a > 10')
+    * conjunctions of a single 'equal' condition on the same field and transformation are folded to one 'in' condition
+    Across the tags, the conditions that several conjunctions share are hoisted to one shared Conjunction, when that
+    evaluates fewer conditions in total. The conditions on 'tags' are never hoisted, as they are applied on the level
+    of their tag, which differs between the tags that would share them.
+    It is assumed that the compared values are of the same type as the rule values: for values that the original rules
+    would fail to compare (e.g. a text to a number), the optimised rules may not fail.
+    The report counts the rewrites, and the rules (every distinct Condition, Conjunction and Disjunction) before and
+    after the optimisation.
+    """
+
+    def __init__(self):
+        self.report = {'duplicate_conditions': 0, 'merged_ranges': 0, 'dead_conjunctions': 0,
+                       'subsumed_conjunctions': 0, 'folded_equal_conditions': 0, 'hoisted_conjunctions': 0,
+                       'rules_before': 0, 'rules_after': 0, 'removed_rules': 0}
+
+    @staticmethod
+    def count_rules(tags: list[Tag]) -> int:
+        return len({id(rule) for tag in tags for rule in expand_rule_to_subrules(tag.rule)})
+
+    @staticmethod
+    def tag_conjunctions(tag: Tag) -> list[list[tagging.Condition]] | None:
+        """ The conditions of every conjunction of the tag, or None if the tag's rule is not in the expected form. """
+        if not isinstance(tag.rule, tagging.Disjunction):
+            return None
+        conjunctions = []
+        for conjunction in tag.rule.rules:
+            if not isinstance(conjunction, tagging.Conjunction) or \
+                    not all(isinstance(rule, tagging.Condition) for rule in conjunction.rules):
+                return None
+            conjunctions.append(list(conjunction.rules))
+        return conjunctions
+
+    def merge_conjunction(self, conditions: list[tagging.Condition]) -> tuple[list[tagging.Condition], bool]:
+        """ The conjunction's conditions without duplicates and with merged ranges, and whether it can ever be true. """
+        merged, keys, bounds, equal_values = [], set(), {'lower': {}, 'upper': {}}, {}
+        for condition in conditions:
+            key = _condition_key(condition)
+            if key in keys:
+                self.report['duplicate_conditions'] += 1
+                continue
+            keys.add(key)
+
+            if _is_equal_scalar(condition):
+                equal_values.setdefault(_column(condition), []).append(condition.value)
+            kind = _bound_kind(condition)
+            if kind is None:
+                merged.append(condition)
+                continue
+
+            column_bounds, column = bounds[kind], _column(condition)
+            current = column_bounds.get(column)
+            if current is None:
+                column_bounds[column] = condition
+                merged.append(condition)
+                continue
+
+            self.report['merged_ranges'] += 1
+            if implies(condition, current):
+                merged[next(i for i, merged_condition in enumerate(merged) if merged_condition is current)] = condition
+                column_bounds[column] = condition
+
+        return merged, self._is_satisfiable(bounds, equal_values)
+
+    @staticmethod
+    def _is_satisfiable(bounds: dict, equal_values: dict) -> bool:
+        for column, lower in bounds['lower'].items():
+            upper = bounds['upper'].get(column)
+            if upper is None:
+                continue
+            if lower.value > upper.value:
+                return False
+            if lower.value == upper.value and (lower.compare_operation.name in STRICT_COMPARISONS or
+                                               upper.compare_operation.name in STRICT_COMPARISONS):
+                return False
+
+        for column, values in equal_values.items():
+            if any(value != values[0] for value in values[1:]):
+                return False
+            if _is_number(values[0]) and not all(bound.compare_operation.function(values[0], bound.value)
+                                                 for kind in ('lower', 'upper')
+                                                 for bound in [bounds[kind].get(column)] if bound is not None):
+                return False
+        return True
+
+    def remove_subsumed(self, conjunctions: list[list[tagging.Condition]]) -> list[list[tagging.Condition]]:
+        """
+        Removes every conjunction that implies another one (all the other's conditions are implied by its conditions),
+        as the disjunction is true whenever the other one is. Of two equivalent conjunctions, the first is kept.
+        """
+        supports = [{_column(condition) or _condition_key(condition) for condition in conditions}
+                    for conditions in conjunctions]
+
+        def is_subsumed_by(j, i) -> bool:
+            return supports[i] <= supports[j] and \
+                all(any(implies(condition_j, condition_i) for condition_j in conjunctions[j])
+                    for condition_i in conjunctions[i])
+
+        removed = set()
+        for j in range(len(conjunctions)):
+            if any(i not in removed and i != j and is_subsumed_by(j, i) and (i < j or not is_subsumed_by(i, j))
+                   for i in range(len(conjunctions))):
+                removed.add(j)
+        self.report['subsumed_conjunctions'] += len(removed)
+        return [conditions for j, conditions in enumerate(conjunctions) if j not in removed]
+
+    def fold_equals(self, conjunctions: list[list[tagging.Condition]]) -> list[list[tagging.Condition]]:
+        """ Folds the conjunctions of a single 'equal' condition on the same column to one 'in' condition. """
+        groups = {}
+        for j, conditions in enumerate(conjunctions):
+            if len(conditions) == 1 and _is_equal_scalar(conditions[0]):
+                groups.setdefault(_column(conditions[0]), []).append(j)
+
+        folded = {}
+        for column, positions in groups.items():
+            if len(positions) < 2:
+                continue
+            first_condition = conjunctions[positions[0]][0]
+            values = tuple(dict.fromkeys(conjunctions[j][0].value for j in positions))
+            folded[positions[0]] = [tagging.Condition(first_condition.field, first_condition.transformation_operation,
+                                                      comparisons.IN, values)]
+            folded.update({j: None for j in positions[1:]})
+            self.report['folded_equal_conditions'] += len(positions)
+
+        return [folded.get(j, conditions) for j, conditions in enumerate(conjunctions) if folded.get(j, 1) is not None]
+
+    def hoist_common_conditions(self, conjunctions: list[list[tagging.AbstractRule]]) -> None:
+        """
+        Replaces (in place) the conditions that several conjunctions share with one shared Conjunction, starting from
+        the most shared pair of conditions. It is only done when the shared Conjunction and the conjunctions that use it
+        evaluate fewer subrules in total than the conjunctions did. The conditions on 'tags' are not shared.
+        """
+        def condition_keys(conditions) -> list:
+            return sorted({_condition_key(rule) for rule in conditions
+                           if isinstance(rule, tagging.Condition) and rule.field != 'tags'}, key=repr)
+
+        keys = [condition_keys(conditions) for conditions in conjunctions]
+        while True:
+            key_sets = [set(conjunction_keys) for conjunction_keys in keys]
+            pair_counts = Counter(pair for conjunction_keys in keys for pair in combinations(conjunction_keys, 2))
+            for pair, count in sorted(pair_counts.items(), key=lambda item: (-item[1], repr(item[0]))):
+                if count < 2:
+                    return
+                members = [i for i, key_set in enumerate(key_sets) if pair[0] in key_set and pair[1] in key_set]
+                common_keys = set.intersection(*[key_sets[i] for i in members])
+                if len(common_keys) + len(members) < len(common_keys) * len(members):
+                    break
+            else:
+                return
+
+            common_conditions = [rule for rule in conjunctions[members[0]]
+                                 if isinstance(rule, tagging.Condition) and _condition_key(rule) in common_keys]
+            shared_conjunction = tagging.Conjunction(common_conditions)
+            for i in members:
+                conditions = conjunctions[i]
+                first_position = next(position for position, rule in enumerate(conditions)
+                                      if isinstance(rule, tagging.Condition) and _condition_key(rule) in common_keys)
+                conditions[first_position] = shared_conjunction
+                conditions[:] = [rule for rule in conditions
+                                 if not isinstance(rule, tagging.Condition) or _condition_key(rule) not in common_keys]
+                keys[i] = [key for key in keys[i] if key not in common_keys]
+            self.report['hoisted_conjunctions'] += 1
+
+    def _is_unchanged(self, tag: Tag, conjunctions: list[list[tagging.AbstractRule]]) -> bool:
+        original_conjunctions = self.tag_conjunctions(tag)
+        return len(original_conjunctions) == len(conjunctions) and \
+            all(len(original) == len(conditions) and all(a is b for a, b in zip(original, conditions))
+                for original, conditions in zip(original_conjunctions, conjunctions))
+
+    def optimise(self, tags: list[Tag]) -> list[Tag]:
+        """ The optimised tags, in the same order and with the same names. The given tags are not modified. """
+        tags_conjunctions = []
+        for tag in tags:
+            conjunctions = self.tag_conjunctions(tag)
+            if conjunctions is not None and len(conjunctions) > 0:
+                merged_conjunctions = [self.merge_conjunction(conditions) for conditions in conjunctions]
+                conjunctions = [conditions for conditions, is_satisfiable in merged_conjunctions if is_satisfiable] or \
+                    [merged_conjunctions[0][0]]  # a tag that is never applied keeps one conjunction that is never true
+                self.report['dead_conjunctions'] += len(merged_conjunctions) - len(conjunctions)
+                conjunctions = self.fold_equals(self.remove_subsumed(conjunctions))
+            tags_conjunctions.append(conjunctions)
+
+        self.hoist_common_conditions([conditions for conjunctions in tags_conjunctions if conjunctions is not None
+                                      for conditions in conjunctions])
+
+        optimised_tags = [tag if conjunctions is None or self._is_unchanged(tag, conjunctions) else
+                          Tag(tag.name, tagging.Disjunction([tagging.Conjunction(conditions)
+                                                             for conditions in conjunctions]))
+                          for tag, conjunctions in zip(tags, tags_conjunctions)]
+
+        self.report['rules_before'] += self.count_rules(tags)
+        self.report['rules_after'] += self.count_rules(optimised_tags)
+        self.report['removed_rules'] = self.report['rules_before'] - self.report['rules_after']
+        logging.info(f"Optimised the rules of {len(tags)} tags: {self.report}")
+        return optimised_tags
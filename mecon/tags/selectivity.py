@@ -0,0 +1,117 @@
+"""
+selectivity keeps statistics of how often the conditions of the tag rules are true and how long they take to compare,
+gathered on previous evaluations, so the subrules of a Conjunction can be evaluated in the order that discards the most
+rows for the least work (see rule_compiler.CompiledRule).
+"""
+import json
+import logging
+import math
+import os
+import pathlib
+import threading
+
+from mecon.etl.dataset import Dataset
+from mecon.tags import tagging
+
+STATISTICS_FILENAME = 'rule_statistics.json'
+
+# seconds per row of a comparison, until the condition has been measured
+DEFAULT_COMPARISON_COSTS = {'regex': 2e-6, 'contains': 5e-7, 'not_contains': 5e-7}
+DEFAULT_COMPARISON_COST = 1e-7
+DEFAULT_SELECTIVITY = .5
+
+_save_lock = threading.Lock()  # the sessions of the app are threads of one process
+
+
+class RuleStatistics:
+    """
+    For every condition (by str(condition)), the number of rows it was evaluated on, how many of them it was true for and
+    the seconds the comparisons took, accumulated over all the evaluations.
+    * selectivity: the estimated fraction of rows a rule is true for. Conjunctions and Disjunctions combine the estimates
+    of their subrules as if they were independent.
+    * cost: the estimated seconds per row to evaluate a rule
+    * conjunction_order: the subrules of a Conjunction by ascending cost / (1 - selectivity), which is the order with the
+    lowest expected cost when every subrule is only evaluated on the rows that all the previous ones were true for.
+    Expensive conditions that discard few rows (like most regexes) come last.
+    * disjunction_order: the same for a Disjunction, by ascending cost / selectivity
+    save adds only the counts recorded since the statistics were loaded (or last saved) to the ones saved by then, so
+    the statistics of concurrent taggings (like two sessions of the app) are merged instead of overwritten.
+    """
+
+    def __init__(self, stats: dict = None):
+        self._stats = stats if stats is not None else {}
+        self._unsaved = {}
+
+    def __contains__(self, condition: tagging.Condition) -> bool:
+        return str(condition) in self._stats
+
+    def record(self, condition: tagging.Condition, n_rows: int, n_true: int, seconds: float) -> None:
+        for stats_dict in (self._stats, self._unsaved):
+            self._add(stats_dict, str(condition), n_rows, n_true, seconds)
+
+    @staticmethod
+    def _add(stats_dict: dict, key: str, n_rows: int, n_true: int, seconds: float) -> None:
+        stats = stats_dict.setdefault(key, {'rows': 0, 'true': 0, 'seconds': 0.})
+        stats['rows'] += int(n_rows)
+        stats['true'] += int(n_true)
+        stats['seconds'] += float(seconds)
+
+    def selectivity(self, rule: tagging.AbstractRule) -> float:
+        if isinstance(rule, tagging.Conjunction):
+            return math.prod(self.selectivity(subrule) for subrule in rule.rules) if len(rule.rules) > 0 else 0.
+        if isinstance(rule, tagging.Disjunction):
+            return 1 - math.prod(1 - self.selectivity(subrule) for subrule in rule.rules)
+
+        stats = self._stats.get(str(rule))
+        if stats is None:
+            return DEFAULT_SELECTIVITY
+        return (stats['true'] + DEFAULT_SELECTIVITY) / (stats['rows'] + 1)  # never exactly 0 or 1
+
+    def cost(self, rule: tagging.AbstractRule) -> float:
+        if isinstance(rule, tagging.AbstractCompositeRule):
+            return sum(self.cost(subrule) for subrule in rule.rules)
+
+        stats = self._stats.get(str(rule))
+        if stats is not None and stats['rows'] > 0:
+            return stats['seconds'] / stats['rows']
+        compare_name = getattr(getattr(rule, 'compare_operation', None), 'name', None)
+        return DEFAULT_COMPARISON_COSTS.get(compare_name, DEFAULT_COMPARISON_COST)
+
+    def conjunction_order(self, rules: list[tagging.AbstractRule]) -> list[tagging.AbstractRule]:
+        return sorted(rules, key=lambda rule: self.cost(rule) / max(1 - self.selectivity(rule), 1e-9))
+
+    def disjunction_order(self, rules: list[tagging.AbstractRule]) -> list[tagging.AbstractRule]:
+        return sorted(rules, key=lambda rule: self.cost(rule) / max(self.selectivity(rule), 1e-9))
+
+    def to_dict(self) -> dict:
+        return {key: dict(stats) for key, stats in self._stats.items()}
+
+    def save(self, path: pathlib.Path) -> None:
+        """ Adds the counts recorded since the last load or save to the statistics saved in path (see RuleStatistics). """
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with _save_lock:
+            merged = self.load(path)._stats
+            for key, stats in self._unsaved.items():
+                self._add(merged, key, stats['rows'], stats['true'], stats['seconds'])
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(merged))
+            os.replace(tmp_path, path)  # a reader never sees a partially written file
+        self._stats, self._unsaved = merged, {}
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> 'RuleStatistics':
+        """ The statistics saved in path, or empty statistics if there are none (or they cannot be read). """
+        path = pathlib.Path(path)
+        if not path.exists():
+            return cls()
+        try:
+            return cls(json.loads(path.read_text()))
+        except ValueError as error:
+            logging.warning(f"Ignoring the rule statistics in {path} that cannot be read: {error!r}")
+            return cls()
+
+    @staticmethod
+    def dataset_path(dataset: Dataset) -> pathlib.Path:
+        """ Where the statistics of a dataset are kept, next to the RuleExecutionPlanMonitor files. """
+        return dataset.statements.parent / 'monitoring' / STATISTICS_FILENAME
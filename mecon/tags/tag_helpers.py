@@ -3,7 +3,9 @@ import logging
 import pandas as pd
 
 from mecon.data.transactions import Transactions
-from mecon.tags import tagging
+from mecon.tags import comparisons, tagging
+
+COMPACT_CSV_MIN_ITEMS = 50
 
 
 def add_rule_for_id(tag: tagging.Tag, ids_to_add: str | list[str]) -> tagging.Tag:
@@ -26,6 +28,31 @@ def add_rule_for_id(tag: tagging.Tag, ids_to_add: str | list[str]) -> tagging.Ta
     return tag
 
 
+def compact_rule_json(rule_json: list | dict, min_items: int = COMPACT_CSV_MIN_ITEMS) -> list | dict:
+    """
+    Returns the rule json with the 'in_csv' and 'not_in_csv' values of at least min_items items (like the ids that
+    add_rule_for_id collects) packed by comparisons.pack_csv, for storage. Tag.from_json unpacks them.
+    """
+    def compact_value(value):
+        if isinstance(value, list):
+            return [compact_value(sub_value) for sub_value in value]
+        if isinstance(value, str) and value.count(',') + 1 >= min_items:
+            packed_value = comparisons.pack_csv(value)
+            return packed_value if len(packed_value) < len(value) else value
+        return value
+
+    def compact_dict(rule_dict: dict) -> dict:
+        return {field: {compare_op: compact_value(value) if compare_op in ('in_csv', 'not_in_csv') else value
+                        for compare_op, value in compare_dict.items()} if isinstance(compare_dict, dict) else compare_dict
+                for field, compare_dict in rule_dict.items()}
+
+    if isinstance(rule_json, dict):
+        return compact_dict(rule_json)
+    if isinstance(rule_json, list):
+        return [compact_dict(_dict) if isinstance(_dict, dict) else _dict for _dict in rule_json]
+    return rule_json
+
+
 def expand_rule_to_subrules(rule: tagging.AbstractRule) -> list[tagging.AbstractRule]:
     expanded_rules = []
     rule_to_expand = [rule]
@@ -56,7 +83,7 @@ def aggregate_data_for_each_tagged_row(transactions: Transactions,
 
     res_dict = {}
     for tag in tag_stats.keys():
-        res_dict[tag] = operation_func(df[df['tags'].apply(lambda tags: tag in tags)])
+        res_dict[tag] = operation_func(df[transactions.contains_tags(tag).to_numpy()])
 
     df_res = pd.DataFrame({'name': list(res_dict.keys()), operation_func_name: list(res_dict.values())})
     return df_res
@@ -27,6 +27,7 @@ class NotARuleException(Exception):
 class AbstractRule(abc.ABC):
     def __init__(self):
         self._observers = []
+        self._batch_observers = []
 
     def compute(self, element):
         result = self._compute(element)
@@ -57,6 +58,31 @@ class AbstractRule(abc.ABC):
 
         self._observers.extend(observers_f)
 
+    @property
+    def observers(self) -> list:
+        return self._observers
+
+    def add_batch_observers(self, observers_f):
+        """
+        Batch observers are called once per evaluation of the rule over a whole dataframe
+        with (rule, df, results), where results is a boolean array with one value per row.
+        """
+        if observers_f is None:
+            return
+
+        if not isinstance(observers_f, list):
+            observers_f = [observers_f]
+
+        self._batch_observers.extend(observers_f)
+
+    @property
+    def batch_observers(self) -> list:
+        return self._batch_observers
+
+    def notify_batch_observers(self, df: pd.DataFrame, results: np.ndarray):
+        for observer_callback in self._batch_observers:
+            observer_callback(self, df, results)
+
 
 class AbstractCompositeRule(AbstractRule, abc.ABC):
     def __init__(self, rule_list: list):
@@ -81,6 +107,17 @@ class AbstractCompositeRule(AbstractRule, abc.ABC):
             else:
                 rule.add_observers(observers_f)
 
+    def add_batch_observers_recursively(self, observers_f):
+        if observers_f is None:
+            return
+
+        self.add_batch_observers(observers_f)
+        for rule in self.rules:
+            if issubclass(rule.__class__, AbstractCompositeRule):
+                rule.add_batch_observers_recursively(observers_f)
+            else:
+                rule.add_batch_observers(observers_f)
+
 
 class Condition(AbstractRule):
     def __init__(self, field, transformation_op, compare_op, value):
@@ -98,6 +135,7 @@ class Condition(AbstractRule):
         self._compare_op = compare_op
 
         self._value = value
+        self._compare_value = compare_op.parse_value(value) if hasattr(compare_op, 'parse_value') else value
 
     @property
     def field(self):
@@ -115,8 +153,13 @@ class Condition(AbstractRule):
     def value(self):
         return self._value
 
+    @property
+    def compare_value(self):
+        """ The value parsed by the compare operation, to be used for the comparisons. """
+        return self._compare_value
+
     def _compute(self, element):
-        left, right = self._transformation_op(element[self.field]), self.value
+        left, right = self._transformation_op(element[self.field]), self.compare_value
         res = self._compare_op(left, right)
         return res
 
@@ -304,7 +347,7 @@ class Tag(object):
 class Tagger(abc.ABC):
     @staticmethod
     @logging_utils.codeflow_log_wrapper('#data#tags')
-    def tag(tag: Tag, df: pd.DataFrame, remove_old_tags: bool = False) -> None:
+    def tag(tag: Tag, df: pd.DataFrame, remove_old_tags: bool = False, statistics=None) -> None:
         """
         Applies the rule:AbstractRule to df:pandas.DataFrame changing the 'tags' of the dataframe.
         """
@@ -312,16 +355,24 @@ class Tagger(abc.ABC):
         if remove_old_tags:
             Tagger.remove_tag(tag_name, df)
 
-        rows_to_tag = Tagger.get_index_for_rule(df, tag.rule)
+        rows_to_tag = Tagger.get_index_for_rule(df, tag.rule, statistics=statistics)
         Tagger.add_tag(tag_name, df, rows_to_tag)
 
     @staticmethod
     @logging_utils.codeflow_log_wrapper('#data#tags')
-    def get_index_for_rule(df: pd.DataFrame, rule: AbstractRule) -> pd.Series:
+    def get_index_for_rule(df: pd.DataFrame, rule: AbstractRule, vectorized: bool = True,
+                           statistics=None) -> pd.Series:
         """
         Calculates the rule:AbstractRule to df:pandas.DataFrame and returns the index:pd.Series
         with the rows that satisfy the rule.
+        By default the rule is compiled to whole-column operations (see rule_compiler.CompiledRule), and only
+        the parts of it that cannot be vectorised are calculated row by row. With statistics
+        (selectivity.RuleStatistics), the conjunctions are evaluated with short-circuits, ordered by the statistics.
         """
+        if vectorized and isinstance(rule, AbstractRule):
+            from mecon.tags.rule_compiler import CompiledRule  # rule_compiler depends on this module
+            return CompiledRule(rule, statistics)(df)
+
         rows = [row for index, row in df.iterrows()]
         rows_to_tag = pd.Series(rule.fit(rows), index=df.index)
         return rows_to_tag
@@ -358,16 +409,17 @@ class Tagger(abc.ABC):
     @logging_utils.codeflow_log_wrapper('#data#tags')
     def _already_tagged_rows(tag_name: str, df: pd.DataFrame) -> pd.Series:
         """
-        Returns the rows that already contain the tag_name.
+        Returns the rows that already contain the tag_name. Rows without tags (NaN) do not contain it.
         """
-        already_tagged_rows = df['tags'].apply(lambda tags_row: tag_name in tags_row.split(','))
+        already_tagged_rows = (',' + df['tags'].fillna('') + ',').str.contains(f",{tag_name},", regex=False)
         return already_tagged_rows
 
     @staticmethod
     @logging_utils.codeflow_log_wrapper('#data#tags')
-    def remove_tag(tag_name: str, df: pd.DataFrame) -> None:
+    def remove_tag(tag_name: str, df: pd.DataFrame, from_rows=None) -> None:
         """
-        Removes the tag for the rows of df.
+        Removes the tag for the rows of df. Only the rows that contain the tag are rewritten, if these rows
+        are known they can be passed as from_rows to skip searching for them.
         """
         def _remove_tag_from_row(row):
             row_elements = row.split(',')
@@ -375,25 +427,29 @@ class Tagger(abc.ABC):
             result_row = ','.join(filtered_element)
             return result_row
 
-        df['tags'] = df['tags'].apply(_remove_tag_from_row)
+        if from_rows is None:
+            from_rows = Tagger._already_tagged_rows(tag_name, df)
+        tagged_rows = np.asarray(from_rows, dtype=bool)
+        if tagged_rows.any():
+            df.loc[tagged_rows, 'tags'] = df.loc[tagged_rows, 'tags'].apply(_remove_tag_from_row)
 
     @staticmethod
     @logging_utils.codeflow_log_wrapper('#data#tags')
-    def add_tag(tag_name: str, df: pd.DataFrame, to_rows: pd.Series) -> None:
+    def add_tag(tag_name: str, df: pd.DataFrame, to_rows: pd.Series, already_tagged_rows=None) -> None:
         """
         Add the tag:tag_name to all the rows of df:pandas.DataFrame that are
         marked True in the to_rows pandas Series.
+        The tag is appended to the 'tags' of the rows that do not have it yet, if these rows are known
+        they can be passed as already_tagged_rows to skip searching for them.
         """
-        def _add_tag_to_row(row):
-            row_elements = row.split(',')
-            if tag_name not in row_elements:
-                row_elements.append(tag_name)
-            if '' in row_elements:
-                row_elements.remove('')
-            result_row = ','.join(row_elements)
-            return result_row
+        if already_tagged_rows is None:
+            already_tagged_rows = Tagger._already_tagged_rows(tag_name, df)
+        new_rows = np.asarray(to_rows, dtype=bool) & ~np.asarray(already_tagged_rows, dtype=bool)
+        if not new_rows.any():
+            return
 
-        df.loc[to_rows, 'tags'] = df.loc[to_rows, 'tags'].apply(_add_tag_to_row)
+        old_tags = df.loc[new_rows, 'tags'].fillna('')
+        df.loc[new_rows, 'tags'] = old_tags.where(old_tags == '', old_tags + ',') + tag_name
 
 
 # class TagMatchCondition(Condition): # didn't work when there was a white space ie "tag1 blabla"
@@ -449,6 +505,8 @@ class JsonRuleParser:
                 compare_value_list = [compare_value_list]
 
             for compare_value in compare_value_list:
+                if compare_op in ('in_csv', 'not_in_csv'):
+                    compare_value = comparisons.unpack_csv(compare_value)  # see tag_helpers.compact_rule_json
                 conditions.append(Condition.from_string_values(
                     field,
                     transformation_op,
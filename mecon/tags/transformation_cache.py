@@ -0,0 +1,173 @@
+"""
+transformation_cache keeps the transformed columns (like 'description.lower' or 'datetime.day_of_week') on disk, so
+tagging the same transactions again (a retag, a preview of a tag edit, a new session) does not transform them again.
+"""
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from mecon import config
+from mecon.data.file_storage import replace_file
+from mecon.tags.transformations import TransformationFunction
+
+TRANSFORMATION_CACHE_FORMAT_VERSION = 2
+
+
+def row_hashes(values: pd.Series) -> np.ndarray:
+    """
+    A hash per value. The type of every value is part of its hash, as pandas hashes the objects 1 and '1' the same, but
+    transformations like int do not treat them the same.
+    """
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    if values.dtype == object and pd.api.types.infer_dtype(values, skipna=False) not in ('string', 'empty'):
+        type_names = pd.Series([type(value).__name__ for value in values], dtype=object)
+        hashes = hashes ^ pd.util.hash_pandas_object(type_names, index=False).to_numpy()
+    return hashes
+
+
+def content_hash(values_dtype: str, hashes: np.ndarray) -> str:
+    digest = hashlib.blake2b(f"{TRANSFORMATION_CACHE_FORMAT_VERSION}/{values_dtype}/".encode('utf-8'), digest_size=16)
+    digest.update(np.ascontiguousarray(hashes).tobytes())
+    return digest.hexdigest()
+
+
+class TransformationCache:
+    """
+    Stores the output of a TransformationFunction over a column (TransformationFunction.apply_series), along with the
+    row_hashes of the column, as a pickle file in dirpath named by the transformation, the number of rows and the
+    content_hash of the column.
+    * transform(values, transformation) loads the output of the same column when it exists (a hit)
+    * otherwise, the rows are matched by their row hash to the last stored output of the transformation (like the ledger
+    before new transactions were merged into it, in any position), and only the rows it does not have are transformed.
+    A transformation only depends on the value of a row, so rows with the same hash have the same output.
+    * the last few outputs are also kept in memory, for the columns that are transformed many times in one session
+    * the cache is limited to max_bytes on disk, the least recently used outputs are deleted first
+    The files are pickles instead of a columnar format (like Parquet), as the outputs hold python objects like lists
+    (split_comma), dates and times that have to come back exactly as they were.
+    """
+
+    MEMORY_ENTRIES = 16
+
+    def __init__(self, dirpath: pathlib.Path, max_bytes: int = config.TRANSFORMATION_CACHE_MAX_BYTES):
+        self.dirpath = pathlib.Path(dirpath)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.transformed_rows = 0
+        self._memory = OrderedDict()
+
+    def __getstate__(self):  # the memory entries are not sent to the worker processes
+        return {**self.__dict__, '_memory': OrderedDict()}
+
+    def _path(self, transformation_name: str, n_rows: int, key: str) -> pathlib.Path:
+        return self.dirpath / f"{transformation_name}-{n_rows}-{key}.pkl"
+
+    def _entries(self, transformation_name: str = '*') -> list[pathlib.Path]:
+        return list(self.dirpath.glob(f"{transformation_name}-*.pkl")) if self.dirpath.exists() else []
+
+    def size(self) -> int:
+        """ The total size (in bytes) of the stored outputs. """
+        return sum(path.stat().st_size for path in self._entries())
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'transformed_rows': self.transformed_rows,
+                'entries': len(self._entries()), 'bytes': self.size()}
+
+    def _load(self, path: pathlib.Path) -> dict | None:
+        if path in self._memory:
+            self._memory.move_to_end(path)
+            return self._memory[path]
+        try:
+            with open(path, 'rb') as output_file:
+                output = pickle.load(output_file)
+        except FileNotFoundError:
+            return None
+        except Exception as error:
+            logging.warning(f"Deleting the cached transformation {path.name} that cannot be loaded: {error!r}")
+            path.unlink(missing_ok=True)
+            return None
+        if not isinstance(output, dict):  # an output of a previous format version
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)  # the modification time is the last time the output was used
+        self._remember(path, output)
+        return output
+
+    def _remember(self, path: pathlib.Path, output: dict) -> None:
+        self._memory[path] = output
+        while len(self._memory) > self.MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def _store(self, path: pathlib.Path, output: dict) -> None:
+        self._remember(path, output)
+        try:
+            self.dirpath.mkdir(parents=True, exist_ok=True)
+            replace_file(path, lambda tmp_path: tmp_path.write_bytes(pickle.dumps(output)))  # never partially read
+        except OSError as error:
+            logging.info(f"The transformation output cannot be cached: {error!r}")
+            return
+        self._evict(keep=path)
+
+    def _evict(self, keep: pathlib.Path) -> None:
+        entries = sorted(self._entries(), key=lambda path: path.stat().st_mtime_ns)
+        total_bytes = sum(path.stat().st_size for path in entries)
+        for path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            if path != keep:
+                total_bytes -= path.stat().st_size
+                path.unlink(missing_ok=True)
+                self._memory.pop(path, None)
+
+    def _last_output(self, transformation_name: str, values_dtype: str) -> dict | None:
+        """ The last stored output of the transformation over a column of the same dtype. """
+        for path in sorted(self._entries(transformation_name), key=lambda path: path.stat().st_mtime_ns,
+                           reverse=True):
+            output = self._load(path)
+            if output is not None and output['dtype'] == values_dtype:
+                return output
+        return None
+
+    @staticmethod
+    def _match_rows(hashes: np.ndarray, cached_hashes: np.ndarray) -> np.ndarray:
+        """ For every row, the position of a cached row with the same hash, or -1. """
+        unique_hashes, first_positions = np.unique(cached_hashes, return_index=True)
+        if len(unique_hashes) == 0:
+            return np.full(len(hashes), -1)
+        positions = np.searchsorted(unique_hashes, hashes).clip(max=len(unique_hashes) - 1)
+        return np.where(unique_hashes[positions] == hashes, first_positions[positions], -1)
+
+    def transform(self, values: pd.Series, transformation: TransformationFunction) -> pd.Series:
+        """ transformation.apply_series(values), from the cache when possible. """
+        if len(values) == 0:
+            return transformation.apply_series(values)
+
+        hashes, values_dtype = row_hashes(values), str(values.dtype)
+        path = self._path(transformation.name, len(values), content_hash(values_dtype, hashes))
+        output = self._load(path)
+        if output is not None:
+            self.hits += 1
+            return pd.Series(output['output'], index=values.index, name=values.name)
+
+        self.misses += 1
+        last_output = self._last_output(transformation.name, values_dtype)
+        cached_positions = self._match_rows(hashes, last_output['hashes']) if last_output is not None else \
+            np.full(len(values), -1)
+        found = cached_positions >= 0
+        if not found.any():
+            result = transformation.apply_series(values)
+        else:
+            cached_result = pd.Series(last_output['output'][cached_positions[found]], index=values.index[found],
+                                      name=values.name)
+            new_result = transformation.apply_series(values[~found]) if not found.all() else None
+            order = np.argsort(np.concatenate([np.flatnonzero(found), np.flatnonzero(~found)]), kind='stable')
+            result = pd.concat([cached_result, new_result]).iloc[order] if new_result is not None else cached_result
+        self.transformed_rows += int(np.count_nonzero(~found))
+        self._store(path, {'dtype': values_dtype, 'hashes': hashes, 'output': result.to_numpy()})
+        return result
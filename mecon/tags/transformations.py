@@ -1,14 +1,46 @@
+import pandas as pd
+
 from mecon.utils import calendar_utils, instance_management
 
+
+def _series_to_str(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(values):  # astype(str) drops the time part of midnight datetimes
+        return values.map(str)
+    return values.astype(str)
+
+
+def _series_to_int(values: pd.Series) -> pd.Series | None:
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values.astype('int64')
+    return None
+
+
+def _series_abs_int(values: pd.Series) -> pd.Series | None:
+    int_values = _series_to_int(values)
+    return int_values.abs() if int_values is not None else None
+
+
+def _datetime_series_function(dt_series_f):
+    def _apply(values: pd.Series) -> pd.Series | None:
+        if not pd.api.types.is_datetime64_any_dtype(values):
+            return None
+        return dt_series_f(values.dt)
+
+    return _apply
+
+
 # todo convert to enum
 class TransformationFunction(instance_management.Multiton):
     """
     Transformation operation used by Condition
+    The optional series_function is the vectorised equivalent of function, applied to a whole pd.Series at once.
+    It can return None for the inputs it cannot handle, and then the transformation is applied element by element.
     """
-    def __init__(self, name, function):
+    def __init__(self, name, function, series_function=None):
         self.name = name
         super().__init__(instance_name=name)
         self.function = function if function is not None else lambda x: x
+        self.series_function = series_function if function is not None else lambda values: values
 
     def __call__(self, value):
         return self.apply(value)
@@ -16,28 +48,54 @@ class TransformationFunction(instance_management.Multiton):
     def apply(self, value):
         return self.function(value)
 
+    def apply_series(self, values: pd.Series) -> pd.Series:
+        result = None
+        if self.series_function is not None:
+            try:
+                result = self.series_function(values)
+            except (TypeError, ValueError, AttributeError):
+                result = None
+
+        if result is None:
+            result = values.map(self.function)
+
+        return result
+
     def __repr__(self):
         return f"TransformationFunction({self.name})"
 
 
 NO_TRANSFORMATION = TransformationFunction('none', None)
 
-STR = TransformationFunction('str', lambda x: str(x))
-LOWER = TransformationFunction('lower', lambda x: str(x).lower())
-UPPER = TransformationFunction('upper', lambda x: str(x).upper())
-SPLIT_COMMA = TransformationFunction('split_comma', lambda x: str(x).split(','))
+STR = TransformationFunction('str', lambda x: str(x),
+                             _series_to_str)
+LOWER = TransformationFunction('lower', lambda x: str(x).lower(),
+                               lambda values: _series_to_str(values).str.lower())
+UPPER = TransformationFunction('upper', lambda x: str(x).upper(),
+                               lambda values: _series_to_str(values).str.upper())
+SPLIT_COMMA = TransformationFunction('split_comma', lambda x: str(x).split(','),
+                                     lambda values: _series_to_str(values).str.split(','))
 
-INT = TransformationFunction('int', lambda x: int(x))
-ABS = TransformationFunction('abs', lambda x: abs(int(x)))
+INT = TransformationFunction('int', lambda x: int(x),
+                             _series_to_int)
+ABS = TransformationFunction('abs', lambda x: abs(int(x)),
+                             _series_abs_int)
 
 # TODO:v3 datetime transformations don't work
 # TODO: v3 add part of day, day of week
-DATE = TransformationFunction('date', lambda x: x.date())  # TODO:v3 extract date
-DAY = TransformationFunction('day', lambda x: x.date().day)  # TODO:v3 extract date
-MONTH = TransformationFunction('month', lambda x: x.date().month)  # TODO:v3 extract date
-YEAR = TransformationFunction('year', lambda x: x.date().year)  # TODO:v3 extract date
-TIME = TransformationFunction('time', lambda x: x.time())  # TODO:v3 extract time
-HOUR = TransformationFunction('hour', lambda x: x.time().hour)  # TODO:v3 extract time
-MINUTE = TransformationFunction('minute', lambda x: x.time().minute)  # TODO:v3 extract time
-DAY_OF_WEEK = TransformationFunction('day_of_week', calendar_utils.day_of_week)
-
+DATE = TransformationFunction('date', lambda x: x.date(),
+                              _datetime_series_function(lambda dt: dt.date))  # TODO:v3 extract date
+DAY = TransformationFunction('day', lambda x: x.date().day,
+                             _datetime_series_function(lambda dt: dt.day))  # TODO:v3 extract date
+MONTH = TransformationFunction('month', lambda x: x.date().month,
+                               _datetime_series_function(lambda dt: dt.month))  # TODO:v3 extract date
+YEAR = TransformationFunction('year', lambda x: x.date().year,
+                              _datetime_series_function(lambda dt: dt.year))  # TODO:v3 extract date
+TIME = TransformationFunction('time', lambda x: x.time(),
+                              _datetime_series_function(lambda dt: dt.time))  # TODO:v3 extract time
+HOUR = TransformationFunction('hour', lambda x: x.time().hour,
+                              _datetime_series_function(lambda dt: dt.hour))  # TODO:v3 extract time
+MINUTE = TransformationFunction('minute', lambda x: x.time().minute,
+                                _datetime_series_function(lambda dt: dt.minute))  # TODO:v3 extract time
+DAY_OF_WEEK = TransformationFunction('day_of_week', calendar_utils.day_of_week,
+                                     _datetime_series_function(lambda dt: dt.day_name()))
@@ -61,12 +61,32 @@ class InvalidDataRange(Exception):
     pass
 
 
+def _to_datetime_series(dt_values) -> pd.Series:
+    """ Wraps the argument of the vectorised (*_series) functions to a datetime64 pd.Series. """
+    dt_series = dt_values if isinstance(dt_values, pd.Series) else pd.Series(dt_values)
+    if not pd.api.types.is_datetime64_any_dtype(dt_series):
+        dt_series = pd.to_datetime(dt_series)
+    return dt_series
+
+
+def _validate_date_unit(date_unit: str):
+    valid_values = [dr.value for dr in DateRangeUnit]
+    if date_unit not in valid_values:
+        raise InvalidDataRange(f"Date unit must be one of {valid_values}. {date_unit} was given instead.")
+
+
 def get_closest_past_monday(dt):
     days_until_monday = (dt.weekday() - 0) % 7  # Calculate the number of days until Monday (0 represents Monday)
     closest_monday = dt - timedelta(days=days_until_monday)
     return closest_monday
 
 
+def get_closest_past_monday_series(dt_values) -> pd.Series:
+    """ The vectorised get_closest_past_monday. """
+    dt_series = _to_datetime_series(dt_values)
+    return dt_series - pd.to_timedelta(dt_series.dt.weekday, unit='D')
+
+
 def get_closest_future_sunday(dt: datetime) -> datetime:
     """Returns the closest future Sunday from a given date."""
     days_until_sunday = (6 - dt.weekday()) % 7  # 0=Monday, 6=Sunday
@@ -89,6 +109,21 @@ def date_floor(dt: datetime, date_unit: str):
         return datetime(dt.year, 1, 1, 0, 0, 0)
 
 
+def date_floor_series(dt_values, date_unit: str) -> pd.Series:
+    """ The vectorised date_floor, for a datetime64 pd.Series (or anything pd.to_datetime accepts). """
+    _validate_date_unit(date_unit)
+    dt_series = _to_datetime_series(dt_values)
+
+    if date_unit == DateRangeUnit.DAY.value:
+        return dt_series.dt.floor('D')
+    elif date_unit == DateRangeUnit.WEEK.value:
+        return get_closest_past_monday_series(dt_series).dt.floor('D')
+    elif date_unit == DateRangeUnit.MONTH.value:
+        return dt_series.dt.to_period('M').dt.to_timestamp()
+    elif date_unit == DateRangeUnit.YEAR.value:
+        return dt_series.dt.to_period('Y').dt.to_timestamp()
+
+
 def date_ceil(dt: datetime, date_unit: str):
     """
     Returns the maximum date in the given date unit.
@@ -113,6 +148,22 @@ def date_ceil(dt: datetime, date_unit: str):
         return datetime(dt.year, 12, 31, 23, 59, 59)
 
 
+def date_ceil_series(dt_values, date_unit: str) -> pd.Series:
+    """ The vectorised date_ceil, the last second of the date unit of each date. """
+    _validate_date_unit(date_unit)
+    dt_series = _to_datetime_series(dt_values)
+    one_second = pd.Timedelta(seconds=1)
+
+    if date_unit == DateRangeUnit.DAY.value:
+        return dt_series.dt.floor('D') + pd.Timedelta(days=1) - one_second
+    elif date_unit == DateRangeUnit.WEEK.value:
+        return date_floor_series(dt_series, date_unit) + pd.Timedelta(days=7) - one_second
+    elif date_unit == DateRangeUnit.MONTH.value:
+        return (dt_series.dt.to_period('M') + 1).dt.to_timestamp() - one_second
+    elif date_unit == DateRangeUnit.YEAR.value:
+        return (dt_series.dt.to_period('Y') + 1).dt.to_timestamp() - one_second
+
+
 def datetime_to_str(dt: datetime) -> str:
     return dt.strftime(format=config.DATETIME_STRING_FORMAT)
 
@@ -133,6 +184,21 @@ def datetime_to_hour_id_str(dt):
     return f"{str(datetime_to_date_id(dt))}{hour_of_day(dt):0>2}"
 
 
+def datetime_to_date_id_series(dt_values) -> pd.Series:
+    """ The vectorised datetime_to_date_id (YYYYMMDD integers). """
+    dt_series = _to_datetime_series(dt_values)
+    return dt_series.dt.year * 10000 + dt_series.dt.month * 100 + dt_series.dt.day
+
+
+def datetime_to_date_id_str_series(dt_values) -> pd.Series:
+    return datetime_to_date_id_series(dt_values).astype(str)
+
+
+def datetime_to_hour_id_str_series(dt_values) -> pd.Series:
+    dt_series = _to_datetime_series(dt_values)
+    return (datetime_to_date_id_series(dt_series) * 100 + dt_series.dt.hour).astype(str)
+
+
 def date_range(start_date: datetime, end_date: datetime, step: str):
     #  https://pandas.pydata.org/pandas-docs/stable/user_guide/timeseries.html#period-aliases
     #  https://pandas.pydata.org/pandas-docs/stable/user_guide/timeseries.html#offset-aliases
@@ -184,6 +250,10 @@ def date_to_month_date(date_arg) -> str:
     return _date.strftime("%Y-%m")
 
 
+def date_to_month_date_series(dt_values) -> pd.Series:
+    return _to_datetime_series(dt_values).dt.strftime("%Y-%m")
+
+
 def days_in_between(start_date, end_date):
     return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
 
@@ -206,11 +276,21 @@ def day_of_week(date_arg) -> str:
     }[_date.weekday()]
 
 
+def day_of_week_series(dt_values) -> pd.Series:
+    """ The vectorised day_of_week. """
+    day_names = pd.Series([day.value for day in DayOfWeek])  # in weekday order, Monday is 0
+    return _to_datetime_series(dt_values).dt.weekday.map(day_names)
+
+
 def day_of_month(date_arg) -> int:
     _date = to_date(date_arg)
     return _date.day
 
 
+def day_of_month_series(dt_values) -> pd.Series:
+    return _to_datetime_series(dt_values).dt.day
+
+
 def day_of_year(date_arg) -> int:
     _date = to_date(date_arg)
     return _date.timetuple().tm_yday
@@ -230,11 +310,23 @@ def week_of_month(date_arg):
     return int(ceil(adjusted_dom / 7.0))
 
 
+def week_of_month_series(dt_values) -> pd.Series:
+    """ The vectorised week_of_month. """
+    dt_series = _to_datetime_series(dt_values)
+    dom = dt_series.dt.day
+    first_day_weekday = (dt_series.dt.weekday - (dom - 1)) % 7
+    return (dom + first_day_weekday + 6) // 7
+
+
 def week_of_year(date_arg):
     _date = to_date(date_arg)
     return _date.isocalendar()[1]
 
 
+def week_of_year_series(dt_values) -> pd.Series:
+    return _to_datetime_series(dt_values).dt.isocalendar().week.astype(int)
+
+
 def month_of_year(date_arg):
     _date = to_date(date_arg)
     return _date.month
@@ -57,6 +57,10 @@ class Multiton:
     def instance_name(self):
         return self._instance_name
 
+    def __reduce__(self):
+        # pickled by name, so unpickling returns the existing instance instead of a duplicate
+        return self.__class__.from_key, (self._instance_name,)
+
     @classmethod
     def from_key(cls, key):
         if key not in cls._get_instances():
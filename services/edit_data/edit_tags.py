@@ -7,9 +7,10 @@ from shiny import App, Inputs, Outputs, Session, render, ui, reactive
 from mecon.app import shiny_app
 from mecon.data import reports
 from mecon.data.transactions import Transactions
-from mecon.tags import tagging, process
+from mecon.tags import tagging
 from mecon.tags import transformations, comparisons, tag_helpers
 from mecon.tags.process import RuleExecutionPlanMonitor
+from mecon.tags.selectivity import RuleStatistics
 
 # from mecon.monitoring.logs import setup_logging
 # setup_logging()
@@ -21,6 +22,7 @@ app_ui = shiny_app.app_ui_factory(
     ui.page_fillable(
         ui.h1(ui.output_text(id='title_output_text')),
         ui.h3(ui.output_ui(id='tag_info_link')),
+        shiny_app.tagging_jobs_status_ui(),
         ui.input_task_button(id='save_button', label='Save'),
         ui.input_task_button(id='reset_button', label='Reset', label_busy='Loading...'),
         ui.input_task_button(id='recalculate_button', label='Recalculate'),
@@ -194,7 +196,11 @@ def rule_to_ui(rule: tagging.AbstractRule):
 def server(input: Inputs, output: Outputs, session: Session):
     dataset = shiny_app.get_working_dataset()
     data_manager = shiny_app.create_data_manager()
-    all_tags = data_manager.all_tags()
+    data_version = shiny_app.tagging_jobs_function_factory(input, output, session, data_manager)
+    # the rule statistics are read once per session, recorded by every recalculation and saved when it ends
+    statistics_path = RuleStatistics.dataset_path(dataset)
+    statistics = RuleStatistics.load(statistics_path)
+    session.on_ended(lambda: statistics.save(statistics_path))
 
     current_tag_value = reactive.Value(None)
 
@@ -226,10 +232,10 @@ def server(input: Inputs, output: Outputs, session: Session):
     def calculate_transaction_for_tag(tag):
         logging.info(f"Fetching transactions from the DB...")
         transactions = data_manager.get_transactions()
-        df_trans = transactions.dataframe()
+        df_trans = transactions.dataframe().copy()
 
         logging.info(f"Re-applying tag '{tag.name}' on transactions...")
-        tagging.Tagger.tag(tag, df_trans, remove_old_tags=True)
+        tagging.Tagger.tag(tag, df_trans, remove_old_tags=True, statistics=statistics)
         new_transactions = Transactions(df_trans)
         logging.info(f"Re-applying tag '{tag.name}' on transactions... Done")
         return new_transactions
@@ -271,6 +277,7 @@ def server(input: Inputs, output: Outputs, session: Session):
 
     @reactive.calc
     def current_transactions():
+        data_version.get()  # recalculated after a tagging job
         new_transactions = calculate_transaction_for_tag(current_tag_value.get())
         return new_transactions
 
@@ -282,17 +289,13 @@ def server(input: Inputs, output: Outputs, session: Session):
     def untagged_transactions():
         return current_transactions().not_containing_tags(current_tag_value.get().name)
 
+    @reactive.calc
     def new_transactions_and_monitor():
-        transactions = data_manager.get_transactions()
+        data_version.get()
         monitor = RuleExecutionPlanMonitor(dataset)
-        tag_name, tag_json_str = fetch_tag_name(), input.tag_json_text()
-        new_tag = tagging.Tag.from_json_string(tag_name, tag_json_str)
-        new_tags = [new_tag] + [tag for tag in all_tags if tag.name != tag_name]
-
-        orep = process.OptimisedRuleExecutionPlanTagging(new_tags)
-        orep.create_rule_execution_plan()
-        orep.create_optimised_rule_execution_plan()
-        new_trans = orep.tag(transactions, monitor=monitor)
+        new_tag = tagging.Tag.from_json_string(fetch_tag_name(), input.tag_json_text())
+        # only the edited tag and the tags that depend on it are calculated
+        new_trans = data_manager.preview_tag(new_tag, monitor=monitor).transactions
 
         return new_trans, monitor
 
@@ -390,7 +393,9 @@ def server(input: Inputs, output: Outputs, session: Session):
     @reactive.event(input.confirm_save_button)
     def _():
         logging.info("Saving")
-        data_manager.update_tag(current_tag_value.get(), update_tags=True)
+        tag = current_tag_value.get()
+        data_manager.update_tag(tag, update_tags=False)
+        shiny_app.get_tagging_job_runner().submit('retag', [tag.name])  # the transactions are re-tagged in the background
         ui.modal_remove()
 
     @reactive.effect
@@ -25,6 +25,7 @@ PAGE_SIZE = 100
 
 
 app_ui = shiny_app.app_ui_factory(
+    shiny_app.tagging_jobs_status_ui(),
     ui.layout_sidebar(
         ui.sidebar(
             ui.input_select(
@@ -92,6 +93,7 @@ def new_transaction_row(transaction, all_tags):
 
 def server(input: Inputs, output: Outputs, session: Session):
     data_manager = shiny_app.create_data_manager()
+    shiny_app.tagging_jobs_function_factory(input, output, session, data_manager)
     all_tags = data_manager.all_tags()
 
     transactions = data_manager.get_transactions()
@@ -20,6 +20,7 @@ app_ui = shiny_app.app_ui_factory(
         ui.input_task_button(id='create_button', label='Create new tag'),
         ui.input_task_button(id='recalculate_button', label='Recalculate all tags', label_busy='Recalculating...'),
         ui.input_task_button(id='delete_button', label='Delete a tag', type='warning'),
+        shiny_app.tagging_jobs_status_ui(),
         ui.h2(ui.output_text(id='menu_title_text')),
         ui.output_data_frame(id='menu_tags_table'),
     )
@@ -39,10 +40,18 @@ def tag_actions(tag_name):
 
 def server(input: Inputs, output: Outputs, session: Session):
     data_manager = WorkingDataManager()
+    data_version = shiny_app.tagging_jobs_function_factory(input, output, session, data_manager)
 
     all_tags_reactive = reactive.Value(data_manager.all_tags())
     tags_metadata_reactive = reactive.Value(value=data_manager.get_tags_metadata().copy())
 
+    @reactive.effect
+    def reload_tags_metadata():
+        data_version.get()  # the data manager was reloaded after a tagging job
+        with reactive.isolate():
+            all_tags_reactive.set(data_manager.all_tags())
+            tags_metadata_reactive.set(value=data_manager.get_tags_metadata().copy())
+
 
     @render.text
     def menu_title_text():
@@ -122,7 +131,9 @@ def server(input: Inputs, output: Outputs, session: Session):
     @reactive.event(input.confirm_delete_button)
     def _():
         logging.info(f"Deleting tag {input.name_of_tag_to_delete_select()}")
-        data_manager.delete_tag(input.name_of_tag_to_delete_select())
+        tag_name = input.name_of_tag_to_delete_select()
+        data_manager.delete_tag(tag_name, update_tags=False)
+        shiny_app.get_tagging_job_runner().submit('retag', [tag_name])  # removes it from the transactions
         all_tags_reactive.set(data_manager.all_tags())
         tags_metadata_reactive.set(value=data_manager.get_tags_metadata().copy())
         ui.modal_remove()
@@ -132,9 +143,7 @@ def server(input: Inputs, output: Outputs, session: Session):
     @reactive.event(input.recalculate_button)
     def _():
         logging.info(f"Recalculating all tags.")
-        data_manager.reset_transaction_tags()
-        all_tags_reactive.set(data_manager.all_tags())
-        tags_metadata_reactive.set(value=data_manager.get_tags_metadata().copy())
+        shiny_app.get_tagging_job_runner().submit('reset_tags')  # the tags metadata is reloaded when it is done
 
 
 menu_tags_app = App(app_ui, server)
@@ -2,6 +2,7 @@ import logging
 
 import pandas as pd
 
+from mecon.app import shiny_app
 from mecon.tags import tag_helpers
 from mecon.data import groupings
 from mecon.data.transactions import Transactions
@@ -23,7 +24,10 @@ def save_tag_changes(added_tags, removed_tags, data_manager):
     for tag_name, ids in ids_added_to_tags.items():
         tag_object = data_manager.get_tag(tag_name)
         new_tag = tag_helpers.add_rule_for_id(tag_object, ids)
-        data_manager.update_tag(new_tag)
+        data_manager.update_tag(new_tag, update_tags=False)
+
+    if len(ids_added_to_tags) > 0:  # one background job re-tags the transactions for all the changed tags
+        shiny_app.get_tagging_job_runner().submit('retag', list(ids_added_to_tags.keys()))
 
 
 def sort_and_filter_transactions_df(transactions, order, page_number, page_size):
@@ -5,7 +5,7 @@ from shiny import App, Inputs, Outputs, Session, render, ui, reactive
 
 from mecon import config
 from mecon.app import shiny_app
-from mecon.app.current_data import WorkingDatasetDirInfo, WorkingDatasetDir, WorkingDataManagerInfo, WorkingDataManager
+from mecon.app.current_data import WorkingDatasetDirInfo, WorkingDatasetDir, WorkingDataManagerInfo
 from mecon.etl import transformers
 
 # from mecon.monitoring.logs import setup_logging
@@ -25,6 +25,7 @@ datasets_dict = {dataset.name: dataset.name for dataset in datasets_obj.datasets
 dataset = datasets_obj.working_dataset
 
 app_ui = shiny_app.app_ui_factory(
+    shiny_app.tagging_jobs_status_ui(),
     ui.card(
         ui.navset_tab(
             ui.nav_panel("Home",
@@ -53,6 +54,7 @@ app_ui = shiny_app.app_ui_factory(
             ui.nav_panel(
                 'Data Flow',
                 ui.input_task_button(id='reset_button', label='Reset data from statements'),
+                ui.input_task_button(id='load_new_statements_button', label='Load new statements'),
                 ui.accordion(
                     ui.accordion_panel('Sources', ui.card(
                         ui.output_ui('statements_info_text'),
@@ -116,6 +118,7 @@ def source_info_df(source):
 
 def server(input: Inputs, output: Outputs, session: Session):
     data_manager = shiny_app.create_data_manager()
+    data_version = shiny_app.tagging_jobs_function_factory(input, output, session, data_manager)
 
     @render.text
     def links_output_text():
@@ -159,7 +162,7 @@ def server(input: Inputs, output: Outputs, session: Session):
     @reactive.effect
     @reactive.event(input.reset_db_button)
     def reset_db():
-        WorkingDataManager().reset()
+        shiny_app.get_tagging_job_runner().submit('reset')
 
     @render.ui
     def statements_info_text():
@@ -251,6 +254,7 @@ def server(input: Inputs, output: Outputs, session: Session):
 
     @render.data_frame
     def transactions_info_dataframe():
+        data_version.get()  # rendered again after a tagging job
         df_trans = data_manager.get_transactions().dataframe()
         df_info = df_trans.describe(include='all').reset_index()
         res = render.DataGrid(df_info, selection_mode="row")
@@ -258,12 +262,14 @@ def server(input: Inputs, output: Outputs, session: Session):
 
     @render.data_frame
     def tags_info_dataframe():
+        data_version.get()
         df_tags_info = data_manager.get_tags_metadata()
         res = render.DataGrid(df_tags_info, selection_mode="row")
         return res
 
     @render.data_frame
     def tagged_transactions_info_dataframe():
+        data_version.get()
         df_tags_info = pd.DataFrame.from_dict(data_manager.get_tagged_transactions().all_tag_counts(),
                                               orient='index').reset_index()
         df_tags_info.columns = ['tag', 'name']
@@ -290,7 +296,14 @@ def server(input: Inputs, output: Outputs, session: Session):
                 duration=10,
                 close_button=True
             )
-        data_manager.reset()
+        shiny_app.get_tagging_job_runner().submit('reset')
+
+    @reactive.effect
+    @reactive.event(input.load_new_statements_button)
+    def _():
+        logging.info(f"Load new statements")
+        # the number of loaded transactions is the result of the job, shown by its notification
+        shiny_app.get_tagging_job_runner().submit('ingest')
 
 
 main_app = App(app_ui, server)
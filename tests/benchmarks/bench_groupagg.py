@@ -0,0 +1,50 @@
+"""
+Benchmark of Transactions.groupagg with the date groupings and CustomisableAmountTransactionAggregator: the single
+groupby pass against the previous path of one DataframeWrapper for each group.
+
+Usage: python -m tests.benchmarks.bench_groupagg [--rows 100000] [--aggregation sum]
+"""
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+
+from mecon.data.aggregators import CustomisableAmountTransactionAggregator
+from mecon.data.groupings import LabelGrouping
+from tests.benchmarks.synthetic_data import synthetic_transactions, timed
+
+
+def per_group_groupagg(transactions, grouping, aggregator):
+    return aggregator.aggregate(grouping.group(transactions))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--aggregation', default='sum')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    transactions = synthetic_transactions(args.rows)
+    rng = np.random.default_rng(42)
+    tag_combinations = np.array([','.join(f"tag{j}" for j in rng.choice(20, rng.integers(0, 4), replace=False))
+                                 for _ in range(100)])
+    transactions = transactions.factory(
+        transactions.dataframe().assign(tags=tag_combinations[rng.integers(0, 100, transactions.size())]))
+    print(f"{args.rows} transactions, '{args.aggregation}' aggregation")
+
+    for grouping_key in ['day', 'week', 'month', 'year']:
+        grouping = LabelGrouping.from_key(grouping_key)
+        aggregator = CustomisableAmountTransactionAggregator(args.aggregation, grouping_key)
+
+        groupby_result, groupby_time = timed(transactions.groupagg, grouping, aggregator)
+        per_group_result, per_group_time = timed(per_group_groupagg, transactions, grouping, aggregator)
+        pd.testing.assert_frame_equal(groupby_result.dataframe(), per_group_result.dataframe())
+
+        print(f"{grouping_key:>5}: {groupby_result.size()} groups | groupby {groupby_time:.3f}s, "
+              f"per group {per_group_time:.2f}s, speedup x{per_group_time / groupby_time:.0f}")
+
+
+if __name__ == '__main__':
+    main()
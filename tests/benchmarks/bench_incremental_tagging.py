@@ -0,0 +1,51 @@
+"""
+Benchmark of the latency of saving a single tag edit: IncrementalTagging (only the edited tag and the tags that
+depend on it) against resetting and re-tagging all the transactions with OptREPTagging.
+
+Usage: python -m tests.benchmarks.bench_incremental_tagging [--rows 100000] [--tags 60]
+"""
+import argparse
+import logging
+
+from mecon.tags.process import OptREPTagging, IncrementalTagging
+from mecon.tags.tagging import Tag
+from tests.benchmarks.synthetic_data import synthetic_transactions, synthetic_tags, timed
+
+
+def full_tagging(tags, transactions):
+    return OptREPTagging(tags) \
+        .create_rule_execution_plan() \
+        .create_optimised_rule_execution_plan() \
+        .tag(transactions.reset_tags())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--tags', type=int, default=60)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    tags = synthetic_tags(args.tags)
+    transactions = full_tagging(tags, synthetic_transactions(args.rows))
+    print(f"{args.rows} transactions, {len(tags)} tags")
+
+    for edited_tag_name in [tags[0].name, tags[-1].name]:
+        edited_tag = Tag.from_json(edited_tag_name, [{'amount': {'greater': 50}}])
+        new_tags = [edited_tag if tag.name == edited_tag_name else tag for tag in tags]
+
+        sess = IncrementalTagging(new_tags, [edited_tag_name])
+        incremental_result, incremental_time = timed(sess.tag, transactions)
+        full_result, full_time = timed(full_tagging, new_tags, transactions)
+
+        for tag in new_tags:
+            assert (incremental_result.contains_tags(tag.name) == full_result.contains_tags(tag.name)).all(), tag.name
+
+        print(f"edit {edited_tag_name}: {len(sess.affected_tag_names())} affected tags, "
+              f"{sess.changed_rows.sum()} changed rows | "
+              f"incremental {incremental_time:.2f}s, full reset {full_time:.2f}s, "
+              f"speedup x{full_time / incremental_time:.1f}")
+
+
+if __name__ == '__main__':
+    main()
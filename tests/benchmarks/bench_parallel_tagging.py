@@ -0,0 +1,43 @@
+"""
+Benchmark of ParallelTagging against OptREPTagging on the same tags, with the per level speedup report.
+The critical path line is the speedup limit that no number of workers can beat.
+
+Usage: python -m tests.benchmarks.bench_parallel_tagging [--rows 50000] [--tags 300] [--workers 4]
+"""
+import argparse
+import logging
+
+import pandas as pd
+
+from mecon.tags.parallel_tagging import ParallelTagging
+from mecon.tags.process import OptREPTagging
+from tests.benchmarks.synthetic_data import synthetic_transactions, synthetic_tags, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--tags', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    tags = synthetic_tags(args.tags)
+    transactions = synthetic_transactions(args.rows)
+
+    serial_sess = OptREPTagging(tags).create_rule_execution_plan().create_optimised_rule_execution_plan()
+    serial_result, serial_time = timed(serial_sess.tag, transactions)
+
+    parallel_sess = ParallelTagging(tags, max_workers=args.workers)
+    parallel_result, parallel_time = timed(parallel_sess.tag, transactions)
+    assert serial_result.dataframe().equals(parallel_result.dataframe())
+
+    print(f"{args.rows} transactions, {len(tags)} tags, {parallel_sess.max_workers} workers | "
+          f"OptREPTagging {serial_time:.2f}s, ParallelTagging {parallel_time:.2f}s, "
+          f"speedup x{serial_time / parallel_time:.2f}")
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(parallel_sess.level_report().round(3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark of OptREPTagging on tags made of many description 'contains' and 'regex' conditions, which are all matched
+by one MultiPatternMatcher per transformed column, against LinearTagging that checks them one by one.
+
+Usage: python -m tests.benchmarks.bench_pattern_matching [--rows 20000] [--contains 200] [--regexes 50]
+"""
+import argparse
+import logging
+
+import numpy as np
+
+from mecon.tags.process import OptREPTagging, LinearTagging
+from mecon.tags.tagging import Tag
+from tests.benchmarks.synthetic_data import synthetic_transactions, timed
+
+
+def pattern_tags(n_contains: int, n_regexes: int, seed: int = 42) -> list[Tag]:
+    rng = np.random.default_rng(seed)
+    tags = [Tag.from_json(f"contains_{i}", [{'description.lower': {'contains': f"ref {rng.integers(0, 10_000)}"}}])
+            for i in range(n_contains)]
+    tags += [Tag.from_json(f"regex_{i}", [{'description': {'regex': rf"ref {rng.integers(0, 100)}\d$"}}])
+             for i in range(n_regexes)]
+    return tags
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--contains', type=int, default=200)
+    parser.add_argument('--regexes', type=int, default=50)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    tags = pattern_tags(args.contains, args.regexes)
+    transactions = synthetic_transactions(args.rows)
+
+    sess = OptREPTagging(tags).create_rule_execution_plan().create_optimised_rule_execution_plan()
+    opt_result, opt_time = timed(sess.tag, transactions)
+    linear_result, linear_time = timed(LinearTagging(tags).tag, transactions)
+    for tag in tags:
+        assert opt_result.contains_tags(tag.name).equals(linear_result.contains_tags(tag.name)), tag.name
+
+    print(f"{args.rows} transactions, {args.contains} contains and {args.regexes} regex tags | "
+          f"LinearTagging {linear_time:.2f}s, OptREPTagging {opt_time:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
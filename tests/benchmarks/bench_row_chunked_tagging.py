@@ -0,0 +1,43 @@
+"""
+Benchmark of RowChunkedTagging with 1, 2, 4 and 8 workers, around OptREPTagging and LinearTagging.
+The speedup is bounded by the number of CPUs of the machine, and the chunks are pickled to and from the workers.
+
+Usage: python -m tests.benchmarks.bench_row_chunked_tagging [--rows 50000] [--tags 300] [--workers 1 2 4 8]
+"""
+import argparse
+import logging
+import os
+
+from mecon.tags.process import OptREPTagging, LinearTagging, RowChunkedTagging
+from tests.benchmarks.synthetic_data import synthetic_transactions, synthetic_tags, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--tags', type=int, default=300)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    tags = synthetic_tags(args.tags)
+    transactions = synthetic_transactions(args.rows)
+    sessions = {
+        'OptREPTagging': OptREPTagging(tags).create_rule_execution_plan().create_optimised_rule_execution_plan(),
+        'LinearTagging': LinearTagging(tags),
+    }
+
+    print(f"{args.rows} transactions, {len(tags)} tags, {os.cpu_count()} CPUs")
+    for name, sess in sessions.items():
+        serial_result, serial_time = timed(sess.tag, transactions)
+        print(f"{name:<14} serial    {serial_time:8.2f}s")
+        for workers in args.workers:
+            chunked_sess = RowChunkedTagging(sess, workers=workers)
+            result, chunked_time = timed(chunked_sess.tag, transactions)
+            assert result.dataframe().equals(serial_result.dataframe())
+            print(f"{name:<14} {workers} workers {chunked_time:8.2f}s  "
+                  f"({chunked_sess.n_chunks(args.rows)} chunks, speedup x{serial_time / chunked_time:.2f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark of OptREPTagging with and without the RuleOptimiser, on tags with redundant rules: 'equal' conditions on the
+same field in separate conjunctions, overlapping amount ranges and conjunctions subsumed by simpler ones.
+
+Usage: python -m tests.benchmarks.bench_rule_optimiser [--rows 20000] [--tags 200]
+"""
+import argparse
+import logging
+
+import numpy as np
+
+from mecon.tags.process import OptREPTagging
+from mecon.tags.tagging import Tag
+from tests.benchmarks.synthetic_data import synthetic_transactions, MERCHANTS, timed
+
+
+def redundant_tags(n_tags: int, seed: int = 42) -> list[Tag]:
+    rng = np.random.default_rng(seed)
+    tags = []
+    for i in range(n_tags):
+        merchant = str(rng.choice(MERCHANTS)).lower()
+        threshold = int(rng.integers(0, 300))
+        rule_json = [{'datetime.hour': {'equal': int(hour)}} for hour in rng.choice(24, 4, replace=False)]
+        rule_json += [{'description.lower': {'contains': merchant}, 'amount': {'less': 0}},
+                      {'description.lower': {'contains': merchant}, 'amount': {'less': -threshold},
+                       'currency': {'equal': 'GBP'}},
+                      {'amount': {'greater': threshold, 'greater_equal': threshold // 2, 'less': threshold * 10}}]
+        tags.append(Tag.from_json(f"tag{i}", rule_json))
+    return tags
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--tags', type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    tags = redundant_tags(args.tags)
+    transactions = synthetic_transactions(args.rows)
+
+    results = {}
+    for optimise_rules in (False, True):
+        sess, plan_time = timed(lambda: OptREPTagging(tags, optimise_rules=optimise_rules)
+                                .create_rule_execution_plan().create_optimised_rule_execution_plan())
+        results[optimise_rules], tag_time = timed(sess.tag, transactions)
+        print(f"{optimise_rules=!s:<5} plan {plan_time:.2f}s, {len(sess.plan)} operations, tagging {tag_time:.2f}s")
+        if sess.rule_optimisation_report is not None:
+            print(sess.rule_optimisation_report)
+
+    assert results[True].dataframe().equals(results[False].dataframe())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark of LinearTagging with short-circuit evaluation of the conjunctions (ordered by RuleStatistics) against the
+full evaluation of every condition, on tags that combine an expensive regex with cheaper, selective conditions.
+The first short-circuit run starts with empty statistics, the second one uses the statistics of the first.
+
+Usage: python -m tests.benchmarks.bench_selectivity [--rows 20000] [--tags 100]
+"""
+import argparse
+import logging
+
+import numpy as np
+
+from mecon.tags.process import LinearTagging
+from mecon.tags.selectivity import RuleStatistics
+from mecon.tags.tagging import Tag
+from tests.benchmarks.synthetic_data import synthetic_transactions, MERCHANTS, timed
+
+
+def selective_tags(n_tags: int, seed: int = 42) -> list[Tag]:
+    rng = np.random.default_rng(seed)
+    return [Tag.from_json(f"tag{i}", [{
+        'description': {'regex': rf"(?i)payment ref {rng.integers(0, 10)}\d*$"},
+        'description.lower': {'contains': str(rng.choice(MERCHANTS)).lower()},
+        'amount': {'less': -int(rng.integers(100, 300))},
+        'datetime.hour': {'equal': int(rng.integers(0, 24))},
+    }]) for i in range(n_tags)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--tags', type=int, default=100)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    tags = selective_tags(args.tags)
+    transactions = synthetic_transactions(args.rows)
+
+    full_result, full_time = timed(LinearTagging(tags).tag, transactions)
+    print(f"full evaluation            {full_time:.2f}s")
+    statistics = RuleStatistics()
+    for run in ('empty statistics', 'previous statistics'):
+        result, run_time = timed(LinearTagging(tags, statistics=statistics).tag, transactions)
+        assert result.dataframe().equals(full_result.dataframe())
+        print(f"short-circuit ({run:<19}) {run_time:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Benchmark of loading and saving the transactions of CachedFileDataManager with each storage format, including
+writing only the tags after re-tagging.
+
+Usage: python -m tests.benchmarks.bench_storage_load [--rows 1000000] [--repeat 3]
+"""
+import argparse
+import logging
+import pathlib
+import tempfile
+
+import numpy as np
+
+from mecon.data.file_storage import CSVFileStorage, ParquetFileStorage
+from tests.benchmarks.synthetic_data import synthetic_transactions, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    df = synthetic_transactions(args.rows).dataframe()
+    rng = np.random.default_rng(42)
+    tag_combinations = np.array([','.join(f"tag{j}" for j in rng.choice(60, rng.integers(0, 8), replace=False))
+                                 for _ in range(500)])
+    df['tags'] = tag_combinations[rng.integers(0, len(tag_combinations), len(df))]
+    print(f"{args.rows} transactions")
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        for storage_class in [CSVFileStorage, ParquetFileStorage]:
+            storage = storage_class(pathlib.Path(dirpath))
+            _, write_time = timed(storage.write_transactions, 'transactions', df)
+            _, tags_write_time = timed(storage.write_transaction_tags, 'transactions', df, repeat=args.repeat)
+            df_read, read_time = timed(storage.read_transactions, 'transactions', repeat=args.repeat)
+            assert df_read.equals(df), storage.format_name
+
+            size_mb = sum(path.stat().st_size for path in storage.transactions_files('transactions')) / 2 ** 20
+            print(f"{storage.format_name:>8}: load {read_time:.2f}s, save {write_time:.2f}s, "
+                  f"save after re-tagging {tags_write_time:.2f}s, {size_mb:.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark of the tag graph layer (cycle detection, hierarchy levels and dependency queries) and of the plan compilation that uses it, on
+synthetic tags where some level 0 tags also depend on top level tags (so the graph has cycles), plus a group of tags
+that all depend on each other (a clique, which has more elementary cycles than any other graph of its size).
+
+Usage: python -m tests.benchmarks.bench_tag_graph [--tags 2000] [--cyclic-tags 20] [--clique 9]
+"""
+import argparse
+import logging
+
+import numpy as np
+
+from mecon.tags.process import OptREPTagging
+from mecon.tags.rule_graphs import TagGraph, AcyclicTagGraph
+from mecon.tags.tagging import Tag
+from tests.benchmarks.synthetic_data import synthetic_tags, timed
+
+
+def cyclic_tags(n_tags: int, n_cyclic_tags: int, seed: int = 42) -> list[Tag]:
+    rng = np.random.default_rng(seed)
+    tags = synthetic_tags(n_tags)
+    tag_graph = AcyclicTagGraph.from_tags(tags)
+    for i in rng.choice(n_tags // 3, n_cyclic_tags, replace=False):
+        dependent_names = sorted(name for name in tag_graph.all_dependent_tag_names([tags[i].name])
+                                 if name.startswith('L2_'))
+        if dependent_names:
+            rule_json = tags[i].rule.to_json() + [{'tags.split_comma': {'in_csv': str(rng.choice(dependent_names))}}]
+            tags[i] = Tag.from_json(tags[i].name, rule_json)
+    return tags
+
+
+def clique_tags(n_tags: int) -> list[Tag]:
+    names = [f"clique_tag{i}" for i in range(n_tags)]
+    return [Tag.from_json(name, [{'description.lower': {'contains': name}},
+                                 {'tags.split_comma': {'in': [other for other in names if other != name]}}])
+            for name in names]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tags', type=int, default=2000)
+    parser.add_argument('--cyclic-tags', type=int, default=20)
+    parser.add_argument('--clique', type=int, default=9)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    tags = cyclic_tags(args.tags, args.cyclic_tags) + clique_tags(args.clique)
+
+    tg, graph_time = timed(TagGraph.from_tags, tags)
+    cycles, cycles_time = timed(tg.find_all_cycles)
+    atg, remove_time = timed(tg.remove_cycles)
+    levels, levels_time = timed(atg.levels)
+    print(f"graph {graph_time:.2f}s, {len(cycles)} cyclic groups in {cycles_time:.2f}s, "
+          f"removed in {remove_time:.2f}s, {max(levels.values()) + 1} levels in {levels_time:.2f}s")
+
+    def query_all_tags():
+        return sum(len(atg.all_tag_dependencies(tag) or []) + len(atg.tags_that_depends_on(tag) or []) for tag in tags)
+
+    _, query_time = timed(query_all_tags)
+    print(f"dependencies and dependents of every tag in {query_time:.2f}s")
+
+    _, plan_time = timed(lambda: OptREPTagging(tags).create_rule_execution_plan().create_optimised_rule_execution_plan())
+    print(f"plan compilation {plan_time:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Benchmark of previewing a tag edit: IncrementalTagging (only the edited tag and the tags that depend on it) against
+tagging all the transactions again with OptREPTagging, both with a RuleExecutionPlanMonitor.
+
+Usage: python -m tests.benchmarks.bench_tag_preview [--rows 100000] [--tags 300]
+"""
+import argparse
+import logging
+import pathlib
+import tempfile
+from unittest.mock import MagicMock
+
+from mecon.tags.process import OptREPTagging, IncrementalTagging, RuleExecutionPlanMonitor
+from mecon.tags.tagging import Tag
+from tests.benchmarks.synthetic_data import synthetic_transactions, synthetic_tags, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--tags', type=int, default=300)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    tags = synthetic_tags(args.tags)
+    full_sess = OptREPTagging(tags).create_rule_execution_plan().create_optimised_rule_execution_plan()
+    tagged, full_time = timed(full_sess.tag, synthetic_transactions(args.rows))
+
+    edited_tag = Tag.from_json(tags[3].name, [{'description.lower': {'contains': 'tesco'}, 'amount': {'less': -50}}])
+    new_tags = [edited_tag if tag.name == edited_tag.name else tag for tag in tags]
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        monitor = RuleExecutionPlanMonitor(MagicMock(statements=pathlib.Path(dirpath) / 'statements'))
+        sess = IncrementalTagging(new_tags, [edited_tag.name])
+        preview, preview_time = timed(sess.tag, tagged, monitor=monitor)
+
+        full_preview, full_preview_time = timed(
+            OptREPTagging(new_tags).create_rule_execution_plan().create_optimised_rule_execution_plan().tag,
+            tagged.reset_tags(), monitor=monitor)
+
+    print(f"full tagging {full_time:.2f}s")
+    print(f"preview: full {full_preview_time:.2f}s, incremental {preview_time:.2f}s "
+          f"({len(sess.affected_tag_names())} tags, {sess.changed_rows.sum()} changed rows)")
+
+    for tag_name in sess.affected_tag_names():
+        assert preview.contains_tags(tag_name).to_list() == full_preview.contains_tags(tag_name).to_list(), tag_name
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Synthetic ledgers and tag sets for the benchmarks, and the timer they use. The data is random but seeded, so every run
+of a benchmark uses exactly the same transactions and tags.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from mecon.data.transactions import Transactions
+from mecon.tags.tagging import Tag
+
+MERCHANTS = ['Tesco', 'Sainsburys', 'Amazon', 'Paypal', 'Uber', 'TfL', 'Airbnb', 'Hotel', 'Landlord', 'Netflix',
+             'Spotify', 'Giffgaff', 'Revolut', 'Monzo', 'HSBC', 'Starbucks', 'Pret', 'Ryanair', 'Easyjet', 'Boots']
+
+
+def timed(func, *args, repeat: int = 1, **kwargs):
+    """ Calls func(*args, **kwargs) repeat times, returns the last result and the fastest time in seconds. """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = func(*args, **kwargs)
+        times.append(time.perf_counter() - start_time)
+    return result, min(times)
+
+
+def synthetic_transactions(n_rows: int, seed: int = 42) -> Transactions:
+    rng = np.random.default_rng(seed)
+    datetimes = pd.Timestamp('2019-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 5 * 365 * 24 * 3600, n_rows)),
+                                                             unit='s')
+    amounts = np.round(rng.normal(-20, 150, n_rows), 2)
+    merchants = rng.choice(MERCHANTS, n_rows)
+    references = rng.integers(0, 10_000, n_rows)
+    df = pd.DataFrame({
+        'id': [f"SYNd{i:08d}" for i in range(n_rows)],
+        'datetime': datetimes,
+        'amount': amounts,
+        'currency': rng.choice(['GBP', 'EUR', 'USD'], n_rows, p=[.8, .15, .05]),
+        'amount_cur': amounts,
+        'description': [f"bank:Synthetic, {merchant} payment ref {reference}"
+                        for merchant, reference in zip(merchants, references)],
+        'tags': '',
+    })
+    return Transactions(df)
+
+
+def synthetic_tags(n_tags: int, n_levels: int = 3, seed: int = 42) -> list[Tag]:
+    """
+    Creates n_tags tags spread evenly over n_levels dependency levels. Level 0 tags match descriptions, amounts
+    and dates, every other tag depends on two tags of the previous level.
+    """
+    rng = np.random.default_rng(seed)
+    tags_per_level = max(1, n_tags // n_levels)
+    levels, tags = [], []
+    for level in range(n_levels):
+        level_tags = []
+        for i in range(tags_per_level if level < n_levels - 1 else n_tags - tags_per_level * (n_levels - 1)):
+            name = f"L{level}_tag{i}"
+            if level == 0:
+                merchant = str(rng.choice(MERCHANTS))
+                threshold = int(rng.integers(0, 300))
+                rule_json = [
+                    {'description.lower': {'contains': merchant.lower()}, 'amount.abs': {'greater': threshold}},
+                    {'datetime.hour': {'equal': int(rng.integers(0, 24))},
+                     'datetime.day_of_week': {'in_csv': str(rng.choice(['Monday,Tuesday', 'Saturday,Sunday']))}},
+                ]
+            else:
+                dep_1, dep_2 = rng.choice(levels[-1], 2)
+                rule_json = [{'tags.split_comma': {'in_csv': str(dep_1)}},
+                             {'tags.split_comma': {'in_csv': str(dep_2)}, 'amount': {'less': 0}}]
+            level_tags.append(Tag.from_json(name, rule_json))
+        levels.append([tag.name for tag in level_tags])
+        tags.extend(level_tags)
+    return tags
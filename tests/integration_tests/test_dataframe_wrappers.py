@@ -162,6 +162,14 @@ class TestInTypeAggregator(unittest.TestCase):
                                       pd.DataFrame({'A': [5], 'B': [6]}))
 
 
+    def test_groupby_aggregate(self):
+        aggregator = InTypeAggregator({'A': max, 'B': lambda b: ','.join(b.astype(str))})
+        df_wrapper = DataframeWrapper(pd.DataFrame({'A': [2, 4, 1, 3], 'B': [7, 9, 6, 8]}))
+
+        result_df_wrapper = aggregator.groupby_aggregate(df_wrapper, pd.Series(['y', 'x', 'y', 'z']))
+        pd.testing.assert_frame_equal(result_df_wrapper.dataframe().reset_index(drop=True),
+                                      pd.DataFrame({'A': [2, 4, 3], 'B': ['7,6', '9', '8']}))
+
 class TestDatedDataframeWrapper(unittest.TestCase):
     def test_validation(self):
         # should work
@@ -214,6 +222,24 @@ class TestDateFiller(unittest.TestCase):
         })
         pd.testing.assert_frame_equal(result_df, expected_df)
 
+    def test_fill_keeps_duplicate_rows(self):
+        filler = DateFiller('day', fill_values_dict={'a': 'alpha', 'b': 'beta'})
+        df_wrapper = DatedDataframeWrapper(pd.DataFrame({
+            'datetime': [datetime(2023, 9, 1, 10, 0, 0), datetime(2023, 9, 1, 10, 0, 0), datetime(2023, 9, 3, 8, 0, 0)],
+            'a': ['coffee', 'coffee', 'lunch'],
+            'b': ['x', 'x', 'y'],
+        }, index=[7, 7, 2]))
+
+        result_df = filler.fill(df_wrapper).dataframe()
+        # identical input rows (like two equal purchases) are both kept, and the result has a new RangeIndex
+        expected_df = pd.DataFrame({
+            'datetime': [datetime(2023, 9, 1, 10, 0, 0), datetime(2023, 9, 1, 10, 0, 0),
+                         datetime(2023, 9, 2, 0, 0, 0), datetime(2023, 9, 3, 8, 0, 0)],
+            'a': ['coffee', 'coffee', 'alpha', 'lunch'],
+            'b': ['x', 'x', 'beta', 'y'],
+        })
+        pd.testing.assert_frame_equal(result_df, expected_df)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,17 +1,27 @@
 import pathlib
 import tempfile
 import unittest
-from datetime import datetime
+from datetime import datetime, date
 from unittest import mock
 
 import pandas as pd
+import sqlalchemy
 
 from mecon.app import db_controller
 from mecon.app import db_extension
 from mecon.app import models
-from mecon.data.data_management import CachedFileDataManager
+from mecon.app.data_manager import CachedDBDataManager, DBDataManager
+from mecon.app.tagging_jobs import TaggingJobRunner
+from mecon.data.data_management import CachedFileDataManager, filter_transactions
 from mecon.etl.dataset import Dataset
-from mecon.tags import tagging
+from mecon.tags import tag_helpers, tagging
+from mecon.tags.process import OptREPTagging, RowChunkedTagging, RuleExecutionPlanMonitor
+
+try:
+    import pyarrow.parquet
+    PYARROW_MISSING = False
+except ImportError:
+    PYARROW_MISSING = True
 
 
 @unittest.skip('In the process of removing the DB')
@@ -811,6 +821,216 @@ class TransactionsDBAccessorssorTestCase(unittest.TestCase):
         pd.testing.assert_frame_equal(transactions, df)
 
 
+class TransactionsDBQueriesTestCase(unittest.TestCase):
+    """ The typed single query reads and the batched tag updates, on a new database for every test. """
+
+    def setUp(self):
+        self.working_dir = tempfile.TemporaryDirectory()
+        self.db = db_extension.DBWrapper(pathlib.Path(self.working_dir.name) / 'db.sqlite')
+        self.accessor = db_controller.TransactionsDBAccessor(self.db)
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        self.working_dir.cleanup()
+
+    def test_get_transactions_dtypes(self):
+        df = pd.DataFrame({
+            'id': ['id1', 'id2'],
+            'datetime': ['2021-01-01 00:00:00', '2021-06-15 12:30:30'],  # stored as text by to_sql
+            'amount': [100, -200],  # stored as integers
+            'currency': ['GBP', 'EUR'],
+            'amount_cur': [100, -180],
+            'description': ['Transaction 1', 'Transaction 2'],
+            'tags': ['', 'tag1']
+        })
+        df.to_sql(models.TransactionsDBTable.__tablename__, self.db.engine, if_exists='replace', index=False)
+
+        transactions = self.accessor.get_transactions()
+        self.assertEqual(transactions['amount'].dtype, 'float64')
+        self.assertEqual(transactions['amount_cur'].dtype, 'float64')
+        self.assertTrue(pd.api.types.is_datetime64_dtype(transactions['datetime']))
+        self.assertListEqual(transactions['datetime'].to_list(),
+                             [pd.Timestamp('2021-01-01 00:00:00'), pd.Timestamp('2021-06-15 12:30:30')])
+        self.assertListEqual(transactions['amount'].to_list(), [100., -200.])
+
+    def test_raw_statement_transactions(self):
+        accessor = db_controller.HSBCTransactionsDBAccessor(self.db)
+        self.assertIsNone(accessor.get_transactions())
+
+        accessor.import_statement(pd.DataFrame({'id': [1, 2], 'date': ['01/01/2023', '06/15/2023'],
+                                                'amount': [1000.0, -20.5], 'description': ['Salary', 'Shop']}))
+        pd.testing.assert_frame_equal(accessor.get_transactions(columns=['date', 'amount']),
+                                      pd.DataFrame({'date': ['01/01/2023', '06/15/2023'], 'amount': [1000.0, -20.5]}))
+
+    def test_update_tags_executemany(self):
+        df = pd.DataFrame({'id': [f"id{i}" for i in range(25)], 'datetime': [datetime(2021, 1, 1)] * 25,
+                           'amount': [1.] * 25, 'currency': ['GBP'] * 25, 'amount_cur': [1.] * 25,
+                           'description': ['Transaction'] * 25, 'tags': [''] * 25})
+        df.to_sql(models.TransactionsDBTable.__tablename__, self.db.engine, if_exists='replace', index=False)
+        updates = []
+
+        def count_updates(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('UPDATE'):
+                updates.append(len(parameters) if executemany else 1)
+
+        sqlalchemy.event.listen(self.db.engine, 'before_cursor_execute', count_updates)
+        with mock.patch.object(db_controller.TransactionsDBAccessor, 'UPDATE_TAGS_BATCH_SIZE', 10):
+            self.accessor.update_tags(pd.DataFrame({'id': df['id'], 'tags': ['tag1'] * 25}))
+        sqlalchemy.event.remove(self.db.engine, 'before_cursor_execute', count_updates)
+
+        self.assertListEqual(updates, [10, 10, 5])  # one prepared statement per batch
+        self.assertListEqual(self.accessor.get_transactions()['tags'].to_list(), ['tag1'] * 25)
+
+    def test_update_tags_in_batches(self):
+        df = pd.DataFrame({
+            'id': list(range(25)),
+            'datetime': [datetime(2021, 1, 1 + i, 0, 0, 0) for i in range(25)],
+            'amount': [100.0] * 25,
+            'currency': ['GBP'] * 25,
+            'amount_cur': [100.0] * 25,
+            'description': ['Transaction'] * 25,
+            'tags': [''] * 25
+        })
+        df.to_sql(models.TransactionsDBTable.__tablename__, self.db.engine, if_exists='replace', index=False)
+
+        df_tags = pd.DataFrame({'id': list(range(24, -1, -1)), 'tags': [f"tag{i}" for i in range(24, -1, -1)]})
+        with mock.patch.object(db_controller.TransactionsDBAccessor, 'UPDATE_TAGS_BATCH_SIZE', 10):
+            self.accessor.update_tags(df_tags)
+
+        transactions = self.accessor.get_transactions()
+        self.assertListEqual(transactions['tags'].to_list(), [f"tag{i}" for i in range(25)])
+
+    def test_get_transactions_date_range_and_columns(self):
+        df = pd.DataFrame({
+            'id': [11, 12, 13],
+            'datetime': [datetime(2021, 1, 1, 0, 0, 0), datetime(2021, 6, 15, 12, 30, 30),
+                         datetime(2021, 12, 31, 23, 59, 59)],
+            'amount': [100, 200, 300],
+            'currency': ['GBP', 'GBP', 'GBP'],
+            'amount_cur': [100.0, 200.0, 300.0],
+            'description': ['Transaction 1', 'Transaction 2', 'Transaction 3'],
+            'tags': ['', 'tag1', 'tag1,tag2']
+        })
+        df.to_sql(models.TransactionsDBTable.__tablename__, self.db.engine, if_exists='replace', index=False)
+
+        transactions = self.accessor.get_transactions(start_date=datetime(2021, 6, 15, 12, 30, 30))
+        self.assertListEqual(transactions['id'].to_list(), [12, 13])
+        self.assertEqual(transactions['amount'].dtype, 'float64')
+        self.assertTrue(pd.api.types.is_datetime64_dtype(transactions['datetime']))
+
+        transactions = self.accessor.get_transactions(start_date=datetime(2021, 2, 1),
+                                                      end_date=datetime(2021, 12, 31),
+                                                      columns=['id', 'amount', 'tags'])
+        pd.testing.assert_frame_equal(transactions,
+                                      pd.DataFrame({'id': [12], 'amount': [200.], 'tags': ['tag1']}))
+
+        transactions = self.accessor.get_transactions(end_date=datetime(2020, 1, 1))
+        self.assertEqual(len(transactions), 0)
+        self.assertListEqual(list(transactions.columns), list(df.columns))
+
+
+class TransactionsDBFiltersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.TemporaryDirectory()
+        self.db = db_extension.DBWrapper(pathlib.Path(self.working_dir.name) / 'db.sqlite')
+        self.accessor = db_controller.TransactionsDBAccessor(self.db)
+
+        self.df = pd.DataFrame({
+            'id': ['id1', 'id2', 'id3', 'id4'],
+            'datetime': [datetime(2021, 1, 1, 0, 0, 0), datetime(2021, 6, 15, 12, 30, 30),
+                         datetime(2021, 12, 31, 23, 59, 59), datetime(2022, 1, 1, 0, 0, 0)],
+            'amount': [100.0, 200.0, 300.0, 400.0],
+            'currency': ['GBP', 'GBP', 'GBP', 'EUR'],
+            'amount_cur': [100.0, 200.0, 300.0, 350.0],
+            'description': ['Transaction 1', 'Transaction 2', 'Transaction 3', 'Transaction 4'],
+            'tags': ['', 'tag1', 'tag1,tag2', 'tag2']
+        })
+        self.df.to_sql(models.TransactionsDBTable.__tablename__, self.db.engine, if_exists='replace', index=False)
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        self.working_dir.cleanup()
+
+    def ids(self, **kwargs):
+        return self.accessor.get_transactions(**kwargs)['id'].to_list()
+
+    def test_migrate_transaction_tags(self):
+        self.assertListEqual(self.ids(containing_tags=['tag1']), [])
+
+        self.accessor.migrate_transaction_tags()
+
+        df_tags = pd.read_sql("SELECT transaction_id, tag FROM transaction_tags", self.db.engine)
+        self.assertListEqual(sorted(zip(df_tags['transaction_id'], df_tags['tag'])),
+                             [('id2', 'tag1'), ('id3', 'tag1'), ('id3', 'tag2'), ('id4', 'tag2')])
+        indexes = {index['name'] for index in
+                   sqlalchemy.inspect(self.db.engine).get_indexes(models.TransactionsDBTable.__tablename__)}
+        self.assertSetEqual(indexes, {'ix_transactions_db_table_id', 'ix_transactions_db_table_datetime'})
+
+        self.accessor.migrate_transaction_tags()  # already migrated, nothing changes
+        self.assertEqual(len(pd.read_sql("SELECT transaction_id, tag FROM transaction_tags", self.db.engine)), 4)
+
+    def test_tag_filters(self):
+        self.accessor.migrate_transaction_tags()
+        self.assertListEqual(self.ids(containing_tags=['tag1']), ['id2', 'id3'])
+        self.assertListEqual(self.ids(containing_tags=['tag1', 'tag2']), ['id3'])
+        self.assertListEqual(self.ids(not_containing_tags=['tag2']), ['id1', 'id2'])
+        self.assertListEqual(self.ids(not_containing_tags=['tag1', 'tag2']), ['id1', 'id2', 'id4'])
+        self.assertListEqual(self.ids(containing_tags=['tag2'], not_containing_tags=['tag1'],
+                                      start_date=datetime(2021, 6, 1)), ['id4'])
+        self.assertListEqual(self.ids(containing_tags=['tag3']), [])
+
+    def test_update_tags_updates_transaction_tags(self):
+        self.accessor.migrate_transaction_tags()
+        self.accessor.update_tags(pd.DataFrame({'id': ['id1', 'id3'], 'tags': ['tag2', 'tag3']}))
+
+        self.assertListEqual(self.ids(containing_tags=['tag2']), ['id1', 'id4'])
+        self.assertListEqual(self.ids(containing_tags=['tag1']), ['id2'])
+        self.assertListEqual(self.ids(containing_tags=['tag3']), ['id3'])
+
+    def test_data_manager_filters_match_in_memory_filters(self):
+        data_manager = CachedDBDataManager(self.db)
+        all_transactions = data_manager.get_transactions()
+        data_manager._cache.reset_transactions()
+
+        filters = [
+            (None, None, None, None),
+            ('2021-01-01', '2021-12-31', None, None),
+            (date(2021, 6, 15), date(2021, 6, 15), None, None),
+            (None, None, ['tag1'], ['tag2']),
+            ('2021-06-15', '2022-01-01', ['tag2'], []),
+        ]
+        for start_date, end_date, containing_tags, not_containing_tags in filters:
+            with self.subTest(filters=(start_date, end_date, containing_tags, not_containing_tags)):
+                result = data_manager.get_filtered_transactions(start_date, end_date,
+                                                                containing_tags, not_containing_tags)
+                expected = filter_transactions(all_transactions, start_date, end_date,
+                                               containing_tags, not_containing_tags)
+                pd.testing.assert_frame_equal(result.dataframe(), expected.dataframe())
+
+    def test_data_manager_migrates_at_startup(self):
+        # a database created before transaction_tags: the table is missing, the tags are only in the 'tags' column
+        models.TransactionTagsDBTable.__table__.drop(self.db.engine)
+        self.assertFalse(sqlalchemy.inspect(self.db.engine).has_table(models.TransactionTagsDBTable.__tablename__))
+
+        data_manager = DBDataManager(self.db)
+
+        df_tags = pd.read_sql("SELECT transaction_id, tag FROM transaction_tags", self.db.engine)
+        self.assertListEqual(sorted(zip(df_tags['transaction_id'], df_tags['tag'])),
+                             [('id2', 'tag1'), ('id3', 'tag1'), ('id3', 'tag2'), ('id4', 'tag2')])
+        DBDataManager(self.db)  # the next startup does not migrate again
+        self.assertEqual(len(pd.read_sql("SELECT transaction_id, tag FROM transaction_tags", self.db.engine)), 4)
+
+        queries = []
+        sqlalchemy.event.listen(self.db.engine, 'before_cursor_execute',
+                                lambda conn, cursor, statement, *args: queries.append(statement))
+        result = data_manager.get_filtered_transactions('2021-06-15', '2022-01-01', ['tag2'], ['tag1'])
+        self.assertListEqual(result.dataframe()['id'].to_list(), ['id4'])
+        transactions_query = [query for query in queries if 'FROM transactions_db_table' in query][-1]
+        self.assertIn('transaction_tags', transactions_query)  # the filters are applied by the database
+        self.assertIn('datetime >=', transactions_query)
+        self.assertIn('datetime <=', transactions_query)
+
+
 class CachedFileDataManagerTestDataFlow(unittest.TestCase):
     def setUp(self):
         self.working_dir = tempfile.TemporaryDirectory()
@@ -893,5 +1113,212 @@ test_tag2,"[{""description"":{""contains"":""something else""}}]",2025-01-21 02:
         self.assertEqual(transactions.containing_tags('test_tag1').size(), 0)
 
 
+class CachedFileDataManagerStatementsTest(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.TemporaryDirectory()
+        self.working_dir_path = pathlib.Path(self.working_dir.name)
+
+        self.dataset = Dataset.from_dirpath(self.working_dir_path)
+        self.hsbc_path = self.dataset.statements / 'HSBC'
+        self.hsbc_path.mkdir(parents=True, exist_ok=True)
+        (self.hsbc_path / 'statement_1.csv').write_text("""01/01/2023,Landlord rent,"-1,000.00"
+05/01/2023,Tesco,-20.50
+20/01/2023,Salary,"2,500.00"
+""")
+
+        with open(self.dataset.db.parent / 'tags.csv', 'w') as tags_file:
+            tags_file.write("""name,conditions_json,date_created
+Rent,"[{""description.lower"":{""contains"":""landlord""}}]",2025-01-22 00:40:10
+""")
+
+        self.dm = CachedFileDataManager(self.dataset)
+        self.dm.reset()
+
+    def tearDown(self):
+        self.working_dir.cleanup()
+
+    def test_reset_creates_manifest(self):
+        manifest = self.dm.statements_manifest_df
+        self.assertListEqual(manifest['path'].to_list(), ['HSBC/statement_1.csv'])
+        self.assertListEqual(manifest['rows'].to_list(), [3])
+        self.assertEqual(self.dm.load_new_statements(), 0)
+
+    def test_load_new_statements(self):
+        old_ids = self.dm.get_transactions().dataframe()['id'].to_list()
+        (self.hsbc_path / 'statement_2.csv').write_text("""03/01/2023,Landlord deposit,-500.00
+01/02/2023,Landlord rent,"-1,000.00"
+""")
+
+        self.assertEqual(self.dm.load_new_statements(), 2)
+
+        df = self.dm.get_transactions().dataframe()
+        self.assertEqual(len(df), 5)
+        self.assertTrue(df['datetime'].is_monotonic_increasing)
+        self.assertTrue(df['id'].is_unique)
+        self.assertTrue(set(old_ids).issubset(df['id']))
+        self.assertListEqual(df['tags'].to_list(), ['Rent', 'Rent', '', '', 'Rent'])
+
+        reloaded_dm = CachedFileDataManager(self.dataset)
+        self.assertEqual(reloaded_dm.get_transactions().size(), 5)
+        self.assertEqual(reloaded_dm.load_new_statements(), 0)
+
+    def test_load_copied_statement(self):
+        (self.hsbc_path / 'statement_copy.csv').write_bytes((self.hsbc_path / 'statement_1.csv').read_bytes())
+        self.assertDictEqual(self.dm.new_statement_filepaths(), {})
+        self.assertEqual(self.dm.load_new_statements(), 0)
+
+    def test_load_without_manifest(self):
+        self.dm._statements_manifest_path.unlink()
+        dm = CachedFileDataManager(self.dataset)
+
+        self.assertEqual(dm.load_new_statements(), 0)
+        self.assertEqual(dm.get_transactions().size(), 3)
+        self.assertEqual(len(dm.statements_manifest_df), 1)
+
+
+class CachedFileDataManagerStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.TemporaryDirectory()
+        self.working_dir_path = pathlib.Path(self.working_dir.name)
+
+        self.dataset = Dataset.from_dirpath(self.working_dir_path)
+        hsbc_path = self.dataset.statements / 'HSBC'
+        hsbc_path.mkdir(parents=True, exist_ok=True)
+        (hsbc_path / 'statement_1.csv').write_text("""01/01/2023,Landlord rent,"-1,000.00"
+05/01/2023,Tesco,-20.50
+20/01/2023,Salary,"2,500.00"
+""")
+
+        with open(self.dataset.db.parent / 'tags.csv', 'w') as tags_file:
+            tags_file.write("""name,conditions_json,date_created
+Rent,"[{""description.lower"":{""contains"":""landlord""}}]",2025-01-22 00:40:10
+""")
+
+        self.dm = CachedFileDataManager(self.dataset)
+        self.dm.reset()
+
+    def tearDown(self):
+        self.working_dir.cleanup()
+
+    def test_default_storage_is_csv(self):
+        self.assertEqual(self.dm.storage_format, 'csv')
+        self.assertTrue((self.dataset.db.parent / 'transactions.csv').exists())
+
+    @unittest.skipIf(PYARROW_MISSING, "pyarrow is not installed")
+    def test_migrate_to_parquet(self):
+        df_before = self.dm.get_transactions().dataframe()
+        self.dm.migrate_storage('parquet')
+
+        self.assertEqual(self.dataset.settings['storage_format'], 'parquet')
+        db_dirpath = self.dataset.db.parent
+        self.assertFalse((db_dirpath / 'transactions.csv').exists())
+        self.assertFalse((db_dirpath / 'tags.csv').exists())
+        self.assertTrue((db_dirpath / 'transactions.parquet').exists())
+        self.assertTrue((db_dirpath / 'transactions_tags.parquet').exists())
+        self.assertTrue((db_dirpath / 'tags_metadata.parquet').exists())
+
+        reloaded_dm = CachedFileDataManager(Dataset.from_dirpath(self.working_dir_path))
+        self.assertEqual(reloaded_dm.storage_format, 'parquet')
+        pd.testing.assert_frame_equal(reloaded_dm.get_transactions().dataframe(), df_before)
+        self.assertListEqual(reloaded_dm.tags_df['name'].to_list(), ['Rent'])
+
+    @unittest.skipIf(PYARROW_MISSING, "pyarrow is not installed")
+    def test_parquet_retag_rewrites_only_tags(self):
+        self.dm.migrate_storage('parquet')
+        transactions_path = self.dataset.db.parent / 'transactions.parquet'
+        mtime_ns = transactions_path.stat().st_mtime_ns
+
+        self.dm.update_tag(tagging.Tag.from_json_string('Salary', '[{"amount": {"greater": 0}}]'))
+
+        self.assertEqual(transactions_path.stat().st_mtime_ns, mtime_ns)
+        reloaded_dm = CachedFileDataManager(self.dataset)
+        self.assertListEqual(reloaded_dm.get_transactions().dataframe()['tags'].to_list(), ['Rent', '', 'Salary'])
+        self.assertListEqual(reloaded_dm.tags_df['name'].to_list(), ['Rent', 'Salary'])
+
+    def test_invalid_storage_format(self):
+        with self.assertRaises(ValueError):
+            self.dm.migrate_storage('xlsx')
+
+    def test_long_id_list_is_stored_packed(self):
+        ids = [f"id_{i:06d}" for i in range(200)] + self.dm.get_transactions().dataframe()['id'].to_list()[:1]
+        self.dm.update_tag(tag_helpers.add_rule_for_id(tagging.Tag.from_json('Manual', [{'amount': {'greater': 1e6}}]),
+                                                       ids))
+
+        self.assertEqual(self.dm.tags_df.set_index('name').loc['Manual', 'conditions_json'].count('zlib:'), 1)
+        reloaded_dm = CachedFileDataManager(self.dataset)
+        self.assertSetEqual(set(reloaded_dm.get_tag('Manual').rule.rules[0].rules[0].value.split(',')), set(ids))
+        self.assertListEqual(reloaded_dm.get_transactions().dataframe()['tags'].to_list(), ['Rent,Manual', '', ''])
+
+    def test_reset_transaction_tags_uses_plan_cache(self):
+        self.dm.plan_cache.invalidate()
+        misses = self.dm.plan_cache.misses
+        self.dm.reset_transaction_tags()
+        self.dm.reset_transaction_tags()
+
+        self.assertEqual(self.dm.plan_cache.misses, misses + 1)
+        self.assertGreaterEqual(self.dm.plan_cache.hits, 1)
+        self.assertListEqual(self.dm.get_transactions().dataframe()['tags'].to_list(), ['Rent', '', ''])
+
+    def test_reset_transaction_tags_uses_transformation_cache(self):
+        self.dm.reset_transaction_tags()
+        misses = self.dm.transformation_cache.misses
+        self.dm.reset_transaction_tags()
+
+        self.assertEqual(self.dm.transformation_cache.misses, misses)
+        self.assertGreater(self.dm.transformation_cache.hits, 0)
+        self.assertTrue((self.dm.files_dirpath / 'transformation_cache').exists())
+        self.assertListEqual(self.dm.get_transactions().dataframe()['tags'].to_list(), ['Rent', '', ''])
+
+    def test_preview_tag(self):
+        self.dm.update_tag(tagging.Tag.from_json_string('Housing', '[{"tags": {"contains": "Rent"}}]'))
+        self.assertListEqual(self.dm.get_transactions().dataframe()['tags'].to_list(), ['Rent,Housing', '', ''])
+
+        monitor = RuleExecutionPlanMonitor(self.dataset)
+        preview = self.dm.preview_tag(tagging.Tag.from_json_string('Rent', '[{"description.lower": {"contains": "tesco"}}]'),
+                                      monitor=monitor)
+
+        self.assertListEqual(preview.transactions.dataframe()['tags'].to_list(), ['', 'Rent,Housing', ''])
+        self.assertListEqual(preview.changed_rows.tolist(), [True, True, False])
+        self.assertListEqual(preview.tag_names, ['Housing', 'Rent'])
+        self.assertSetEqual(set(monitor.all_monitored_tag_names()), {'Housing', 'Rent'})
+        # nothing is saved
+        self.assertListEqual(self.dm.get_transactions().dataframe()['tags'].to_list(), ['Rent,Housing', '', ''])
+        self.assertEqual(self.dm.get_tag('Rent').rule.to_json(), [{'description.lower': {'contains': 'landlord'}}])
+
+    def test_preview_new_tag(self):
+        preview = self.dm.preview_tag(tagging.Tag.from_json_string('Salary', '[{"amount": {"greater": 0}}]'))
+
+        self.assertListEqual(preview.transactions.dataframe()['tags'].to_list(), ['Rent', '', 'Salary'])
+        self.assertListEqual(preview.changed_rows.tolist(), [False, False, True])
+        self.assertIsNone(self.dm.get_tag('Salary'))
+
+    def test_background_retag_job(self):
+        self.dm.update_tag(tagging.Tag.from_json_string('Salary', '[{"amount": {"greater": 0}}]'), update_tags=False)
+        runner = TaggingJobRunner(lambda: CachedFileDataManager(self.dataset))
+        job = runner.submit('retag', ['Salary'])
+        self.assertTrue(job.wait(60))
+        self.assertEqual(job.state, 'done', job.error)
+        self.assertGreater(job.progress[1], 0)
+        self.assertEqual(job.progress[0], job.progress[1])
+
+        self.assertListEqual(self.dm.get_transactions().dataframe()['tags'].to_list(), ['Rent', '', ''])
+        self.dm.reload()
+        self.assertListEqual(self.dm.get_transactions().dataframe()['tags'].to_list(), ['Rent', '', 'Salary'])
+        self.assertIn('Salary', self.dm.get_tags_metadata()['name'].to_list())
+        self.assertEqual(runner.version, 1)
+        self.assertListEqual(list(self.dataset.db.parent.glob('*.tmp')), [])
+
+    def test_tagging_workers_setting(self):
+        self.assertEqual(self.dm.tagging_workers, 1)
+        self.assertIsInstance(self.dm._full_tagging_session(self.dm.all_tags()), OptREPTagging)
+
+        self.dataset.settings['tagging_workers'] = 2
+        self.assertEqual(self.dm.tagging_workers, 2)
+        self.assertIsInstance(self.dm._full_tagging_session(self.dm.all_tags()), RowChunkedTagging)
+
+        self.dm.reset_transaction_tags()
+        self.assertListEqual(self.dm.get_transactions().dataframe()['tags'].to_list(), ['Rent', '', ''])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -738,6 +738,35 @@ class TestFillTransactions(unittest.TestCase):
         pd.testing.assert_frame_equal(result_df, expected_df)
 
 
+    def test_fill_weeks_outside_range_and_same_datetime(self):
+        transactions = Transactions(pd.DataFrame({
+            'id': ['11', '12', '13', '14', '15'],
+            'datetime': [datetime(2023, 8, 27, 23, 59, 59),  # Sunday, before the filled range
+                         datetime(2023, 9, 4, 0, 0, 0),
+                         datetime(2023, 9, 4, 0, 0, 0),
+                         datetime(2023, 9, 24, 23, 59, 59),  # Sunday, end of the last filled week
+                         datetime(2023, 9, 25, 0, 0, 0)],  # after the filled range
+            'amount': [100.0, 200.0, 300.0, 400.0, 500.0],
+            'currency': ['GBP', 'GBP', 'GBP', 'GBP', 'GBP'],
+            'amount_cur': [100.0, 200.0, 300.0, 400.0, 500.0],
+            'description': ['Transaction 1', 'Transaction 2', 'Transaction 3', 'Transaction 4', 'Transaction 5'],
+            'tags': ['', 'tag1', 'tag1,tag2', '', '']
+        }))
+
+        filler = TransactionDateFiller(fill_unit='week', id_fill=ID_FILL_VALUE)
+
+        result_df = filler.fill(
+            transactions,
+            start_date=datetime(2023, 8, 30, 0, 0, 0),
+            end_date=datetime(2023, 9, 20, 0, 0, 0)
+        ).dataframe()
+        self.assertListEqual(result_df['id'].to_list(), [ID_FILL_VALUE, '12', '13', ID_FILL_VALUE, '14'])
+        self.assertListEqual(result_df['datetime'].to_list(),
+                             [datetime(2023, 8, 28, 0, 0, 0), datetime(2023, 9, 4, 0, 0, 0),
+                              datetime(2023, 9, 4, 0, 0, 0), datetime(2023, 9, 11, 0, 0, 0),
+                              datetime(2023, 9, 24, 23, 59, 59)])
+        self.assertListEqual(list(result_df.index), [0, 1, 2, 3, 4])
+
 class TestGroupAgg(unittest.TestCase):
     def test_group_agg(self):
         transactions = Transactions(pd.DataFrame({
@@ -769,6 +798,29 @@ class TestGroupAgg(unittest.TestCase):
         pd.testing.assert_frame_equal(result_trans_df.reset_index(drop=True),
                                       expected_trans_df.reset_index(drop=True))
 
+    def test_group_agg_same_as_per_group_aggregation(self):
+        transactions = Transactions(pd.DataFrame({
+            'id': ['11', '12', '13', '14', '15', '16'],
+            'datetime': [datetime(2020, 12, 31, 23, 0, 0), datetime(2021, 2, 1, 4, 5, 6),
+                         datetime(2021, 2, 1, 8, 0, 0), datetime(2021, 2, 3, 4, 5, 6),
+                         datetime(2021, 3, 1, 0, 0, 0), datetime(2021, 12, 31, 23, 59, 59)],
+            'amount': [-50.5, 100.0, 0.25, 200.0, -10.0, 300.0],
+            'currency': ['GBP', 'EUR', 'GBP', 'GBP', 'USD', 'GBP'],
+            'amount_cur': [-50.5, 110.0, 0.25, 200.0, -13.0, 300.0],
+            'description': ['Transaction 1', 'Transaction 2', 'Transaction 3', 'Transaction 4', '', 'Transaction 6'],
+            'tags': ['', 'tag2,tag1', 'tag1', '', 'tag3', 'tag1,tag2']
+        }))
+
+        for grouping_key in ['day', 'week', 'month', 'year']:
+            for aggregation_key in ['min', 'max', 'sum', 'avg', 'median', 'count']:
+                with self.subTest(grouping=grouping_key, aggregation=aggregation_key):
+                    grouper = groupings.LabelGrouping.from_key(grouping_key)
+                    agg = CustomisableAmountTransactionAggregator(aggregation_key, grouping_key)
+
+                    result_trans_df = transactions.groupagg(grouper=grouper, aggregator=agg).dataframe()
+                    expected_trans_df = agg.aggregate(grouper.group(transactions)).dataframe()
+                    pd.testing.assert_frame_equal(result_trans_df, expected_trans_df)
+
     def test_group_agg__empty_group(self):
         transactions = Transactions(pd.DataFrame({
             'id': [],
@@ -1,6 +1,8 @@
 import unittest
 from datetime import datetime, date
 
+import numpy as np
+import pandas as pd
 from pandas import Timestamp
 
 from mecon.utils import calendar_utils as cu
@@ -243,6 +245,61 @@ class TestCalendarUtils(unittest.TestCase):
 
 
 
+class TestVectorisedCalendarUtils(unittest.TestCase):
+    """ The *_series functions must give the same results as their scalar counterparts on any datetime. """
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        random_seconds = rng.integers(0, 60 * 365 * 24 * 60 * 60, size=2000)
+        random_dts = pd.Timestamp(1990, 1, 1) + pd.to_timedelta(random_seconds, unit='s')
+        edge_dts = pd.to_datetime(['2020-02-29 23:59:59', '2021-01-01 00:00:00', '2021-12-31 23:59:59',
+                                   '2023-01-01 12:00:00', '2023-01-02 00:00:00', '2024-03-31 00:00:01'])
+        self.dts = pd.Series(random_dts.append(edge_dts), index=range(10, 10 + len(random_dts) + len(edge_dts)))
+
+    def assertSameAsScalar(self, series_result, scalar_function):
+        expected = [scalar_function(dt.to_pydatetime()) for dt in self.dts]
+        self.assertListEqual(list(series_result.index), list(self.dts.index))
+        self.assertListEqual(list(series_result), expected)
+
+    def test_date_floor_series(self):
+        for unit in ['day', 'week', 'month', 'year']:
+            with self.subTest(unit=unit):
+                self.assertSameAsScalar(cu.date_floor_series(self.dts, unit), lambda dt: cu.date_floor(dt, unit))
+
+        with self.assertRaises(cu.InvalidDataRange):
+            cu.date_floor_series(self.dts, 'decade')
+
+    def test_date_ceil_series(self):
+        for unit in ['day', 'week', 'month', 'year']:
+            with self.subTest(unit=unit):
+                self.assertSameAsScalar(cu.date_ceil_series(self.dts, unit), lambda dt: cu.date_ceil(dt, unit))
+
+        with self.assertRaises(cu.InvalidDataRange):
+            cu.date_ceil_series(self.dts, 'decade')
+
+    def test_get_closest_past_monday_series(self):
+        self.assertSameAsScalar(cu.get_closest_past_monday_series(self.dts), cu.get_closest_past_monday)
+
+    def test_datetime_to_id_str_series(self):
+        self.assertSameAsScalar(cu.datetime_to_date_id_str_series(self.dts), cu.datetime_to_date_id_str)
+        self.assertSameAsScalar(cu.datetime_to_hour_id_str_series(self.dts), cu.datetime_to_hour_id_str)
+
+    def test_calendar_fields_series(self):
+        self.assertSameAsScalar(cu.date_to_month_date_series(self.dts), cu.date_to_month_date)
+        self.assertSameAsScalar(cu.day_of_week_series(self.dts), cu.day_of_week)
+        self.assertSameAsScalar(cu.day_of_month_series(self.dts), cu.day_of_month)
+        self.assertSameAsScalar(cu.week_of_month_series(self.dts), cu.week_of_month)
+        self.assertSameAsScalar(cu.week_of_year_series(self.dts), cu.week_of_year)
+
+    def test_non_series_arguments(self):
+        dts_array = self.dts.to_numpy()
+        pd.testing.assert_series_equal(cu.date_floor_series(dts_array, 'week'),
+                                       cu.date_floor_series(self.dts, 'week').reset_index(drop=True))
+        pd.testing.assert_series_equal(cu.week_of_month_series([datetime(2023, 9, 30)]), pd.Series([5]),
+                                       check_dtype=False)
+        self.assertEqual(len(cu.date_floor_series(pd.Series([], dtype=object), 'day')), 0)
+
+
 class TestDateRange(unittest.TestCase):
     def test_date_range_day(self):
         self.assertEqual(
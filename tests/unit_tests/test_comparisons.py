@@ -1,5 +1,8 @@
+import pickle
 import unittest
 
+import pandas as pd
+
 from mecon.tags import comparisons as cmp
 
 
@@ -171,6 +174,43 @@ class TestCompareOperator(unittest.TestCase):
         self.assertEqual(co(['c'], 'a,b'), True)
         self.assertEqual(co(['c', 'b'], 'a,b'), False)
 
+    def test_parse_value(self):
+        self.assertEqual(cmp.IN_CSV.parse_value('a,b'), frozenset({'a', 'b'}))
+        self.assertEqual(cmp.NOT_IN_CSV.parse_value('a'), frozenset({'a'}))
+        self.assertEqual(cmp.IN.parse_value(['a', 'b']), frozenset({'a', 'b'}))
+        self.assertEqual(cmp.IN.parse_value('a,b'), 'a,b')  # substring check
+        self.assertEqual(cmp.IN.parse_value([['a'], 'b']), [['a'], 'b'])
+        self.assertEqual(cmp.EQUAL.parse_value('a,b'), 'a,b')
+
+        for co in [cmp.IN_CSV, cmp.NOT_IN_CSV]:
+            parsed_value = co.parse_value('a,1')
+            for value in ['a', 'aa', '', ['a'], ['c', '1']]:
+                self.assertEqual(co(value, parsed_value), co(value, 'a,1'), (co, value))
+
+    def test_apply_series_with_parsed_value(self):
+        values = pd.Series(['id_1', 'id_2', 'id_3', ''])
+        for co in [cmp.IN_CSV, cmp.NOT_IN_CSV]:
+            result = co.apply_series(values, co.parse_value('id_3,id_1'))
+            self.assertListEqual(result.to_list(), values.apply(lambda value: co(value, 'id_3,id_1')).to_list())
+
+    def test_apply_series_in_datetimes(self):
+        values = pd.Series(pd.to_datetime(['2020-01-01', '2020-01-02']))
+        for co in [cmp.IN, cmp.NOT_IN, cmp.IN_CSV]:
+            value = co.parse_value(('2020-01-01',) if co is not cmp.IN_CSV else '2020-01-01')
+            result = co.apply_series(values, value)
+            self.assertListEqual(result.to_list(), values.apply(lambda value_1: co(value_1, value)).to_list())
+
+    def test_pickle(self):
+        self.assertIs(pickle.loads(pickle.dumps(cmp.IN_CSV)), cmp.IN_CSV)
+
+    def test_pack_csv(self):
+        value = ','.join(f"id_{i:06d}" for i in range(1000))
+        packed_value = cmp.pack_csv(value)
+        self.assertTrue(packed_value.startswith(cmp.PACKED_CSV_PREFIX))
+        self.assertLess(len(packed_value), len(value) / 4)
+        self.assertEqual(cmp.unpack_csv(packed_value), value)
+        self.assertEqual(cmp.unpack_csv('a,b'), 'a,b')
+
 
 if __name__ == '__main__':
     unittest.main()
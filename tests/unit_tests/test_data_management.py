@@ -1,5 +1,5 @@
 import unittest
-from datetime import datetime
+from datetime import datetime, date
 from unittest.mock import Mock, patch, call
 
 import pandas as pd
@@ -48,6 +48,14 @@ class TestDataManager(unittest.TestCase):
             self.data_manager._transactions.get_transactions.assert_called_once()
             mock_trans.assert_called_once()
 
+    def test_get_filtered_transactions(self):
+        self.data_manager.get_filtered_transactions(date(2021, 1, 1), '2021-06-15', ['tag1'], ['tag2'])
+        self.transactions_io.get_transactions.assert_called_once_with(
+            start_date=datetime(2021, 1, 1, 0, 0, 0),
+            end_date=datetime(2021, 6, 15, 23, 59, 59, 999999),
+            containing_tags=['tag1'],
+            not_containing_tags=['tag2'])
+
     def test_reset_transactions(self):
         with patch.object(self.data_manager, 'reset_transaction_tags'):
             self.data_manager.reset_transactions()
@@ -106,31 +114,31 @@ class TestDataManager(unittest.TestCase):
 
     def test_update_tag(self):
         tag = Mock()
-        with patch.object(self.data_manager, 'reset_transaction_tags') as mock_reset_tags:
+        with patch.object(self.data_manager, 'update_transaction_tags') as mock_update_tags:
             self.data_manager.update_tag(tag)
             self.tags_io.set_tag.assert_called_once()
-            mock_reset_tags.assert_called_once()
+            mock_update_tags.assert_called_once_with([tag.name])
 
     def test_update_tag_no_reset(self):
         tag = Mock()
-        with patch.object(self.data_manager, 'reset_transaction_tags') as mock_reset_tags:
+        with patch.object(self.data_manager, 'update_transaction_tags') as mock_update_tags:
             self.data_manager.update_tag(tag, update_tags=False)
             self.tags_io.set_tag.assert_called_once()
-            mock_reset_tags.assert_not_called()
+            mock_update_tags.assert_not_called()
 
     def test_delete_tag(self):
         tag_name = 'tag1'
-        with patch.object(self.data_manager, 'reset_transaction_tags') as mock_reset_tags:
+        with patch.object(self.data_manager, 'update_transaction_tags') as mock_update_tags:
             self.data_manager.delete_tag(tag_name)
         self.tags_io.delete_tag.assert_called_once_with(tag_name)
-        mock_reset_tags.assert_called_once()
+        mock_update_tags.assert_called_once_with([tag_name])
 
     def test_delete_tag_no_reset(self):
         tag_name = 'tag1'
-        with patch.object(self.data_manager, 'reset_transaction_tags') as mock_reset_tags:
+        with patch.object(self.data_manager, 'update_transaction_tags') as mock_update_tags:
             self.data_manager.delete_tag(tag_name, update_tags=False)
         self.tags_io.delete_tag.assert_called_once_with(tag_name)
-        mock_reset_tags.assert_not_called()
+        mock_update_tags.assert_not_called()
 
     def test_all_tags(self):
         with patch('mecon.data.data_management.Tag.from_json') as mock_tag_factory:
@@ -288,6 +296,21 @@ class TestCachedDataManager(unittest.TestCase):
             mock_trans.assert_called_once()
             self.assertIsNotNone(self.data_manager._cache.transaction)
 
+    def test_get_filtered_transactions(self):
+        self.data_manager._cache.transaction = None
+        self.data_manager.get_filtered_transactions('2021-01-01', '2021-12-31', ['tag1'])
+        self.transactions_io.get_transactions.assert_called_once()
+        self.assertEqual(self.transactions_io.get_transactions.call_args.kwargs['containing_tags'], ['tag1'])
+
+    def test_get_filtered_transactions_with_cache(self):
+        self.data_manager._cache.transaction = None
+        self.data_manager.get_transactions()
+        self.transactions_io.get_transactions.reset_mock()
+
+        result = self.data_manager.get_filtered_transactions('2021-01-01', '2021-12-31', ['tag1'], ['tag2'])
+        self.transactions_io.get_transactions.assert_not_called()
+        self.assertListEqual(result.dataframe()['id'].to_list(), [12])
+
     def test_reset_transactions(self):
         with patch.object(self.data_manager, 'reset_transaction_tags'):
             self.data_manager.reset_transactions()
@@ -364,35 +387,35 @@ class TestCachedDataManager(unittest.TestCase):
 
     def test_update_tag(self):
         tag = Mock()
-        with patch.object(self.data_manager, 'reset_transaction_tags') as mock_reset_tags:
+        with patch.object(self.data_manager, 'update_transaction_tags') as mock_update_tags:
             self.data_manager.update_tag(tag)
             self.tags_io.set_tag.assert_called_once()
             self.data_manager._cache.reset_tags.assert_called_once()
-            mock_reset_tags.assert_called_once()
+            mock_update_tags.assert_called_once_with([tag.name])
 
     def test_update_tag_no_reset(self):
         tag = Mock()
-        with patch.object(self.data_manager, 'reset_transaction_tags') as mock_reset_tags:
+        with patch.object(self.data_manager, 'update_transaction_tags') as mock_update_tags:
             self.data_manager.update_tag(tag, update_tags=False)
             self.tags_io.set_tag.assert_called_once()
             self.data_manager._cache.reset_tags.assert_called_once()
-            mock_reset_tags.assert_not_called()
+            mock_update_tags.assert_not_called()
 
     def test_delete_tag(self):
         tag_name = 'tag1'
-        with patch.object(self.data_manager, 'reset_transaction_tags') as mock_reset_tags:
+        with patch.object(self.data_manager, 'update_transaction_tags') as mock_update_tags:
             self.data_manager.delete_tag(tag_name)
             self.tags_io.delete_tag.assert_called_once_with(tag_name)
             self.data_manager._cache.reset_tags.assert_called_once()
-            mock_reset_tags.assert_called_once()
+            mock_update_tags.assert_called_once_with([tag_name])
 
     def test_delete_tag_no_reset(self):
         tag_name = 'tag1'
-        with patch.object(self.data_manager, 'reset_transaction_tags') as mock_reset_tags:
+        with patch.object(self.data_manager, 'update_transaction_tags') as mock_update_tags:
             self.data_manager.delete_tag(tag_name, update_tags=False)
             self.tags_io.delete_tag.assert_called_once_with(tag_name)
             self.data_manager._cache.reset_tags.assert_called_once()
-            mock_reset_tags.assert_not_called()
+            mock_update_tags.assert_not_called()
 
     # @patch('mecon.data.data_management.tag_monitoring.TaggingStatsMonitoringSystem')
     # def test_reset_transaction_tags(self, mock_monitoring):
@@ -1,9 +1,11 @@
 import unittest
 from datetime import datetime, date
 
+import numpy as np
 import pandas as pd
 
 from mecon.data import datafields
+from mecon.tags import tagging
 
 
 # TODO:v3 merge with test_dataframe_wrappers maybe
@@ -177,6 +179,87 @@ class TestTagsColumnMixin(unittest.TestCase):
         self.assertEqual(example_wrapper.invalid_tags().to_list(),
                          [False, False, False, True, True, True])
 
+    def test_apply_tag(self):
+        example_wrapper = ExampleDataframeWrapper(pd.DataFrame({
+            'amount': [1, 20, 30, 5],
+            'tags': ['', 'tag1', 'tag1,tag2', 'tag2']
+        }))
+        tag = tagging.Tag.from_json('tag2', [{'amount': {'greater': 10}}])
+
+        result_wrapper = example_wrapper.apply_tag(tag)
+        self.assertListEqual(result_wrapper.tags.to_list(), ['', 'tag1,tag2', 'tag1,tag2', 'tag2'])
+        self.assertDictEqual(result_wrapper.all_tag_counts(), {'tag2': 3, 'tag1': 2})
+        self.assertListEqual(example_wrapper.tags.to_list(), ['', 'tag1', 'tag1,tag2', 'tag2'])
+
+    def test_remove_tag(self):
+        example_wrapper = ExampleDataframeWrapper(pd.DataFrame({
+            'tags': ['', 'tag1', 'tag1,tag2', 'tag2,tag1,tag3']
+        }))
+
+        result_wrapper = example_wrapper.remove_tag('tag1')
+        self.assertListEqual(result_wrapper.tags.to_list(), ['', '', 'tag2', 'tag2,tag3'])
+        self.assertDictEqual(result_wrapper.all_tag_counts(), {'tag2': 2, 'tag3': 1})
+        self.assertListEqual(example_wrapper.tags.to_list(), ['', 'tag1', 'tag1,tag2', 'tag2,tag1,tag3'])
+
+    def test_tags_index_follows_derived_wrappers(self):
+        example_wrapper = ExampleDataframeWrapper(pd.DataFrame({
+            'tags': ['', 'tag1', 'tag1,tag2', 'tag3']
+        }))
+
+        containing_wrapper = example_wrapper.containing_tags('tag1')
+        self.assertIsNotNone(containing_wrapper._tags_index)
+        self.assertListEqual(containing_wrapper.contains_tags('tag2').to_list(), [False, True])
+
+        not_containing_wrapper = example_wrapper.not_containing_tags('tag1')
+        self.assertDictEqual(not_containing_wrapper.all_tag_counts(), {'tag3': 1})
+
+        reset_wrapper = example_wrapper.reset_tags()
+        self.assertDictEqual(reset_wrapper.all_tag_counts(), {})
+
+
+class TestTagsIndex(unittest.TestCase):
+    def test_from_tags_column(self):
+        tags_index = datafields.TagsIndex.from_tags_column(pd.Series(['', 'b', 'a,b', 'b,c', 'a b']))
+
+        self.assertEqual(tags_index.size, 5)
+        self.assertListEqual(tags_index.tag_names, ['b', 'a', 'c', 'a b'])
+        np.testing.assert_array_equal(tags_index.contains('b'), [False, True, True, True, False])
+        np.testing.assert_array_equal(tags_index.contains('a'), [False, False, True, False, False])
+        np.testing.assert_array_equal(tags_index.contains('missing'), [False] * 5)
+        np.testing.assert_array_equal(tags_index.contains_all(['a', 'b']), [False, False, True, False, False])
+        np.testing.assert_array_equal(tags_index.contains_all([]), [True] * 5)
+
+    def test_from_empty_tags_column(self):
+        tags_index = datafields.TagsIndex.from_tags_column(pd.Series([], dtype=object))
+        self.assertEqual(tags_index.size, 0)
+        self.assertDictEqual(tags_index.counts(), {})
+
+    def test_counts(self):
+        tags_index = datafields.TagsIndex.from_tags_column(pd.Series(['c', 'a,b', 'b', 'a,c,d', 'b']))
+        self.assertListEqual(list(tags_index.counts().items()), [('b', 3), ('c', 2), ('a', 2), ('d', 1)])
+
+    def test_with_and_without_tag(self):
+        tags_index = datafields.TagsIndex.from_tags_column(pd.Series(['a', '', 'a,b']))
+
+        new_index = tags_index.with_tag('c', np.array([False, True, True]))
+        np.testing.assert_array_equal(new_index.contains('c'), [False, True, True])
+        np.testing.assert_array_equal(tags_index.contains('c'), [False, False, False])
+
+        new_index = new_index.with_tag('a', np.array([False, True, False]))
+        np.testing.assert_array_equal(new_index.contains('a'), [True, True, True])
+
+        new_index = new_index.without_tag('a')
+        self.assertListEqual(new_index.tag_names, ['b', 'c'])
+        self.assertListEqual(tags_index.tag_names, ['a', 'b'])
+
+    def test_select(self):
+        tags_index = datafields.TagsIndex.from_tags_column(pd.Series(['a', '', 'a,b', 'b']))
+        selected_index = tags_index.select(np.array([True, False, False, True]))
+
+        self.assertEqual(selected_index.size, 2)
+        np.testing.assert_array_equal(selected_index.contains('a'), [True, False])
+        self.assertDictEqual(selected_index.counts(), {'a': 1, 'b': 1})
+
 
 
 class TestDateTimeColumnMixin(unittest.TestCase):
@@ -0,0 +1,151 @@
+import pathlib
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+import pandas as pd
+
+from mecon.data.file_storage import TableFileStorage, CSVFileStorage, ParquetFileStorage
+
+try:
+    import pyarrow.parquet
+    PYARROW_MISSING = False
+except ImportError:
+    PYARROW_MISSING = True
+
+
+class FileStorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.TemporaryDirectory()
+        self.dirpath = pathlib.Path(self.working_dir.name)
+        self.df = pd.DataFrame({
+            'id': ['id1', 'id2', 'id3'],
+            'datetime': [datetime(2021, 1, 1, 0, 0, 0), datetime(2021, 1, 2, 10, 30, 0), datetime(2021, 2, 3, 12, 0, 0)],
+            'amount': [-10.5, 20.0, -300.0],
+            'currency': ['GBP', 'EUR', 'GBP'],
+            'amount_cur': [-10.5, 22.0, -300.0],
+            'description': ['PayPal order', 'Hotel Paris', 'Airbnb stay'],
+            'tags': ['', 'Rent', 'Rent,Airbnb'],
+        })
+
+    def tearDown(self):
+        self.working_dir.cleanup()
+
+    def test_factory(self):
+        self.assertIsInstance(TableFileStorage.factory('csv', self.dirpath), CSVFileStorage)
+        with self.assertRaises(ValueError):
+            TableFileStorage.factory('xlsx', self.dirpath)
+
+    def test_csv_transactions(self):
+        storage = CSVFileStorage(self.dirpath)
+        self.assertFalse(storage.exists('transactions'))
+        storage.write_transactions('transactions', self.df)
+        self.assertEqual(storage.path('transactions'), self.dirpath / 'transactions.csv')
+        pd.testing.assert_frame_equal(storage.read_transactions('transactions'), self.df)
+
+        storage.delete('transactions')
+        self.assertFalse(storage.exists('transactions'))
+
+    def test_concurrent_writes(self):
+        storage = CSVFileStorage(self.dirpath)
+        writers = [threading.Thread(target=storage.write_transactions, args=('transactions', self.df))
+                   for _ in range(8)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+
+        pd.testing.assert_frame_equal(storage.read_transactions('transactions'), self.df)
+        self.assertListEqual([path.name for path in self.dirpath.iterdir()], ['transactions.csv'])
+
+    def test_failed_write_keeps_the_file(self):
+        storage = CSVFileStorage(self.dirpath)
+        storage.write_transactions('transactions', self.df)
+        with self.assertRaises(AttributeError):
+            storage.write_transactions('transactions', None)
+
+        pd.testing.assert_frame_equal(storage.read_transactions('transactions'), self.df)
+        self.assertListEqual([path.name for path in self.dirpath.iterdir()], ['transactions.csv'])
+
+    @unittest.skipIf(PYARROW_MISSING, "pyarrow is not installed")
+    def test_parquet_transactions(self):
+        storage = TableFileStorage.factory('parquet', self.dirpath)
+        storage.write_transactions('transactions', self.df)
+        self.assertTrue(storage.path('transactions').exists())
+        self.assertTrue(storage.tags_path('transactions').exists())
+        pd.testing.assert_frame_equal(storage.read_transactions('transactions'), self.df)
+
+        storage.delete('transactions')
+        self.assertFalse(storage.exists('transactions'))
+        self.assertFalse(storage.tags_path('transactions').exists())
+
+    @unittest.skipIf(PYARROW_MISSING, "pyarrow is not installed")
+    def test_parquet_write_transaction_tags(self):
+        storage = ParquetFileStorage(self.dirpath)
+        storage.write_transactions('transactions', self.df)
+        mtime_ns = storage.path('transactions').stat().st_mtime_ns
+
+        df = self.df.copy()
+        df['tags'] = ['New', '', 'Rent']
+        storage.write_transaction_tags('transactions', df)
+
+        self.assertEqual(storage.path('transactions').stat().st_mtime_ns, mtime_ns)
+        pd.testing.assert_frame_equal(storage.read_transactions('transactions'), df)
+
+    def _interleaved_parquet_write(self, storage):
+        """ Writes the transactions twice and puts back the tags file of the first write, as a reader would see it
+        between the two replacements of the second write. Returns the second written transactions and tags bytes. """
+        storage.write_transactions('transactions', self.df)
+        old_tags = storage.tags_path('transactions').read_bytes()
+        df = self.df.iloc[::-1].reset_index(drop=True)  # same number of rows, different tags per row
+        storage.write_transactions('transactions', df)
+        new_tags = storage.tags_path('transactions').read_bytes()
+        storage.tags_path('transactions').write_bytes(old_tags)
+        return df, new_tags
+
+    @unittest.skipIf(PYARROW_MISSING, "pyarrow is not installed")
+    def test_parquet_interleaved_writes(self):
+        storage = ParquetFileStorage(self.dirpath)
+        storage.READ_ATTEMPTS, storage.READ_RETRY_SECONDS = 2, 0
+        self._interleaved_parquet_write(storage)
+
+        with self.assertRaises(ValueError):
+            storage.read_transactions('transactions')
+
+    @unittest.skipIf(PYARROW_MISSING, "pyarrow is not installed")
+    def test_parquet_interleaved_writes_retry(self):
+        storage = ParquetFileStorage(self.dirpath)
+        df, new_tags = self._interleaved_parquet_write(storage)
+        writer = threading.Timer(storage.READ_RETRY_SECONDS / 2, storage.tags_path('transactions').write_bytes,
+                                 [new_tags])
+        writer.start()
+
+        pd.testing.assert_frame_equal(storage.read_transactions('transactions'), df)
+        writer.join()
+
+    @unittest.skipIf(PYARROW_MISSING, "pyarrow is not installed")
+    def test_parquet_types(self):
+        pq = pyarrow.parquet
+        storage = ParquetFileStorage(self.dirpath)
+        storage.write_transactions('transactions', self.df)
+        schema = pq.read_schema(storage.path('transactions'))
+        self.assertEqual(str(schema.field('datetime').type), 'timestamp[ns]')
+        self.assertEqual(str(schema.field('amount').type), 'double')
+        self.assertNotIn('tags', schema.names)
+        columns = pq.ParquetFile(storage.path('transactions')).metadata.row_group(0)
+        encodings = {columns.column(i).path_in_schema: columns.column(i).encodings for i in range(columns.num_columns)}
+        self.assertIn('RLE_DICTIONARY', encodings['currency'])
+
+    @unittest.skipIf(PYARROW_MISSING, "pyarrow is not installed")
+    def test_parquet_tables(self):
+        storage = ParquetFileStorage(self.dirpath)
+        df_tags = pd.DataFrame({'name': ['tag1', 'tag2'],
+                                'conditions_json': ['[{}]', '[{"amount": {"greater": 0}}]'],
+                                'date_created': ['2025-01-22 00:40:10', '2025-01-21 02:40:10']})
+        storage.write('tags', df_tags)
+        pd.testing.assert_frame_equal(storage.read('tags'), df_tags)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -270,6 +270,24 @@ class TestDatetimeGrouping(unittest.TestCase):
                                                     'B': [9]}))
 
 
+    def test_group_keys_same_groups_as_labels(self):
+        class CustomDataframeWrapper(datafields.DataframeWrapper, datafields.DateTimeColumnMixin):
+            def __init__(self, df):
+                super().__init__(df=df)
+                datafields.DateTimeColumnMixin.__init__(self, df_wrapper=self)
+
+        wrapper = CustomDataframeWrapper(pd.DataFrame({
+            'datetime': pd.date_range('2020-12-25', '2022-01-10', freq='7h13min'),
+        }))
+        for i, grouper in enumerate([gp.HOUR, gp.DAY, gp.WEEK, gp.MONTH, gp.YEAR]):
+            with self.subTest(grouper=i):
+                label_codes, _ = pd.factorize(grouper.labels(wrapper))
+                key_codes, _ = pd.factorize(grouper.group_keys(wrapper))
+                self.assertListEqual(list(label_codes), list(key_codes))
+
+        self.assertEqual(gp.WEEK.group_keys(wrapper)[0], pd.Timestamp(2020, 12, 21))
+        self.assertIsNone(TagGrouping().group_keys(wrapper))
+
 class TestIndexGrouping(unittest.TestCase):
     def test_index_grouping(self):
         class CustomDataframeWrapper(datafields.DataframeWrapper, datafields.DateTimeColumnMixin):
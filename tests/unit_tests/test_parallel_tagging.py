@@ -0,0 +1,99 @@
+import unittest
+from datetime import datetime
+
+import pandas as pd
+from pandas import Timestamp
+
+from mecon.data.transactions import Transactions
+from mecon.tags.parallel_tagging import ParallelTagging, SharedColumns, transformations_of_tags, \
+    transformed_rule_json
+from mecon.tags.process import OptREPTagging
+from mecon.tags.tagging import Tag
+
+
+class SharedColumnsTestCase(unittest.TestCase):
+    def test_attach(self):
+        df = pd.DataFrame({
+            'id': ['id_1', 'id_22', ''],
+            'datetime': [datetime(2020, 1, 1), datetime(2021, 2, 3, 4, 5, 6), datetime(2022, 1, 1)],
+            'amount': [1.5, -2., 0.],
+        })
+        shared = SharedColumns(df)
+        try:
+            attached_df, blocks = SharedColumns.attach(shared.descriptors())
+            pd.testing.assert_frame_equal(attached_df, df)
+            for block in blocks:
+                block.close()
+        finally:
+            shared.release()
+
+    def test_attach_missing_values(self):
+        df = pd.DataFrame({'description': ['paypal', None, float('nan'), ''], 'amount': [1., float('nan'), 2., 3.]})
+        shared = SharedColumns(df)
+        try:
+            attached_df, blocks = SharedColumns.attach(shared.descriptors())
+            self.assertListEqual(attached_df['description'].tolist(), ['paypal', None, None, ''])
+            self.assertListEqual(attached_df['amount'].isna().tolist(), [False, True, False, False])
+            for block in blocks:
+                block.close()
+        finally:
+            shared.release()
+
+
+class ParallelTaggingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tags = [
+            Tag.from_json('Online payments', [{'description.lower': {'contains': 'paypal'}},
+                                              {'tags': {'contains': 'Accommodation'}}]),
+            Tag.from_json('Accommodation', [{'tags': {'contains': 'Rent'}},
+                                            {'tags': {'contains': 'Airbnb'}}]),
+            Tag.from_json('Rent', [{'description': {'contains': 'landlord'}}]),
+            Tag.from_json('Airbnb', [{'description.lower': {'contains': 'airbnb'}}]),
+            Tag.from_json('Big', [{'amount.abs': {'greater': 500}}]),
+        ]
+        self.transactions = Transactions(pd.DataFrame({
+            'id': ['id_1', 'id_2', 'id_3', 'id_4', 'id_5'],
+            'datetime': [Timestamp('2020-01-01 00:00:00')] * 5,
+            'amount': [-400, 600., -100, -20, -10],
+            'currency': ['GBP'] * 5,
+            'amount_cur': [-400, 600., -100, -20, -10],
+            'description': ['landlord', 'landlord', 'Airbnb', 'paypal', 'tesco'],
+            'tags': ['old tag', '', '', '', ''],
+        }))
+
+    def test_tag(self):
+        sess = ParallelTagging(self.tags, max_workers=2)
+        result = sess.tag(self.transactions)
+
+        expected = OptREPTagging(self.tags).create_rule_execution_plan().create_optimised_rule_execution_plan() \
+            .tag(self.transactions)
+        pd.testing.assert_frame_equal(result.dataframe(), expected.dataframe())
+        self.assertListEqual(result.tags.to_list(),
+                             ['Rent,Accommodation,Online payments', 'Big,Rent,Accommodation,Online payments',
+                              'Airbnb,Accommodation,Online payments', 'Online payments', ''])
+
+    def test_transformations_of_tags(self):
+        df_transformed = transformations_of_tags(self.tags, self.transactions.dataframe())
+        self.assertListEqual(list(df_transformed.columns), ['amount__abs', 'description__lower'])
+        self.assertListEqual(df_transformed['description__lower'].tolist(),
+                             ['landlord', 'landlord', 'airbnb', 'paypal', 'tesco'])
+        self.assertListEqual(transformed_rule_json(self.tags[0].rule.to_json(), df_transformed.columns),
+                             [{'description__lower': {'contains': 'paypal'}}, {'tags': {'contains': 'Accommodation'}}])
+
+    def test_level_report(self):
+        sess = ParallelTagging(self.tags, max_workers=2)
+        with self.assertRaises(ValueError):
+            sess.level_report()
+
+        sess.tag(self.transactions)
+        report = sess.level_report()
+        self.assertListEqual(report['level'].to_list(), ['0', '1', '2', 'total'])
+        self.assertListEqual(report['tags'].to_list(), [3, 1, 1, 5])
+        self.assertAlmostEqual(report['serial_time'].iloc[-1], report['serial_time'].iloc[:-1].sum())
+        total = report.iloc[-1]
+        self.assertLessEqual(total['critical_path_time'], total['serial_time'])
+        self.assertTrue(report['critical_path_time'].iloc[:-1].isna().all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from mecon.tags import comparisons
+from mecon.tags.pattern_matching import AhoCorasickAutomaton, MultiPatternMatcher
+
+
+class AhoCorasickAutomatonTestCase(unittest.TestCase):
+    def test_find(self):
+        automaton = AhoCorasickAutomaton(['he', 'she', 'his', 'hers', 'x'])
+        self.assertSetEqual(automaton.find('ushers'), {0, 1, 3})
+        self.assertSetEqual(automaton.find('this'), {2})
+        self.assertSetEqual(automaton.find('hhe'), {0})
+        self.assertSetEqual(automaton.find(''), set())
+
+    def test_find_empty_substring(self):
+        automaton = AhoCorasickAutomaton(['', 'a'])
+        self.assertSetEqual(automaton.find(''), {0})
+        self.assertSetEqual(automaton.find('ba'), {0, 1})
+
+    def test_find_same_as_contains(self):
+        rng = np.random.default_rng(42)
+        substrings = list({''.join(rng.choice(list('abc'), rng.integers(1, 5))) for _ in range(30)})
+        automaton = AhoCorasickAutomaton(substrings)
+        for _ in range(200):
+            text = ''.join(rng.choice(list('abcd'), rng.integers(0, 12)))
+            expected = {i for i, substring in enumerate(substrings) if comparisons.CONTAINS(text, substring)}
+            self.assertSetEqual(automaton.find(text), expected, text)
+
+
+class MultiPatternMatcherTestCase(unittest.TestCase):
+    def test_match(self):
+        matcher = MultiPatternMatcher(['tesco', 'paypal', ''], [r'ref \d+', '^tfl', 'card|ref', r'(\w)\1'])
+        values = pd.Series(['tesco ref 12', 'paypal *tfl', 'tfl travel', '', 'tesco ref 12', 'aa'])
+
+        result = matcher.match(values)
+        self.assertEqual(result.shape, (7, 6))
+        self.assertListEqual(result[0].tolist(), [True, False, False, False, True, False])
+        self.assertListEqual(result[1].tolist(), [False, True, False, False, False, False])
+        self.assertListEqual(result[2].tolist(), [True] * 6)
+        self.assertListEqual(result[3].tolist(), [True, False, False, False, True, False])
+        self.assertListEqual(result[4].tolist(), [False, False, True, False, False, False])
+        self.assertListEqual(result[5].tolist(), [True, False, False, False, True, False])
+        self.assertListEqual(result[6].tolist(), [False, False, False, False, False, True])
+
+    def test_match_overlapping_regexes(self):
+        matcher = MultiPatternMatcher([], ['ab', 'abc', 'b', '(?i)ABC'])
+        self.assertListEqual(matcher.match(pd.Series(['abc'])).ravel().tolist(), [True, True, True, True])
+
+    def test_match_empty_values(self):
+        matcher = MultiPatternMatcher(['a'], ['a'])
+        self.assertEqual(matcher.match(pd.Series([], dtype=object)).shape, (2, 0))
+
+    def test_match_same_as_comparisons(self):
+        rng = np.random.default_rng(42)
+        substrings = list({''.join(rng.choice(list('abc '), rng.integers(1, 4))) for _ in range(20)})
+        regexes = ['a+b', '^c', 'b$', r'\bab', 'a.c', '(ab)+c', 'c|ba']
+        values = pd.Series([''.join(rng.choice(list('abc '), rng.integers(0, 10))) for _ in range(300)])
+
+        result = MultiPatternMatcher(substrings, regexes).match(values)
+        for i, substring in enumerate(substrings):
+            expected = values.apply(lambda value: comparisons.CONTAINS(value, substring)).to_numpy()
+            np.testing.assert_array_equal(result[i], expected, err_msg=substring)
+        for i, regex in enumerate(regexes):
+            expected = values.apply(lambda value: comparisons.REGEX(value, regex)).to_numpy()
+            np.testing.assert_array_equal(result[len(substrings) + i], expected, err_msg=regex)
+
+    def test_match_automaton_same_as_direct_search(self):
+        rng = np.random.default_rng(7)
+        substrings = list({''.join(rng.choice(list('abc '), rng.integers(0, 4))) for _ in range(20)})
+        values = pd.Series([''.join(rng.choice(list('abc '), rng.integers(0, 10))) for _ in range(300)])
+
+        direct_matcher, automaton_matcher = MultiPatternMatcher(substrings, []), MultiPatternMatcher(substrings, [])
+        automaton_matcher.DIRECT_SEARCH_SUBSTRINGS = 0
+        np.testing.assert_array_equal(automaton_matcher.match(values), direct_matcher.match(values))
+
+
+if __name__ == '__main__':
+    unittest.main()
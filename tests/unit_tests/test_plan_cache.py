@@ -0,0 +1,116 @@
+import pathlib
+import tempfile
+import threading
+import unittest
+
+import pandas as pd
+from pandas import Timestamp
+
+from mecon.data.transactions import Transactions
+from mecon.tags.plan_cache import PlanCache, ruleset_hash
+from mecon.tags.process import OptREPTagging
+from mecon.tags.tagging import Tag
+
+
+class RulesetHashTestCase(unittest.TestCase):
+    def test_ruleset_hash(self):
+        tag_1 = Tag.from_json('Rent', [{'description': {'contains': 'landlord'}}])
+        tag_2 = Tag.from_json('Big', [{'amount.abs': {'greater': 500}}])
+
+        self.assertEqual(ruleset_hash([tag_1, tag_2]),
+                         ruleset_hash([Tag.from_json('Rent', [{'description': {'contains': 'landlord'}}]), tag_2]))
+        self.assertNotEqual(ruleset_hash([tag_1, tag_2]), ruleset_hash([tag_2, tag_1]))
+        self.assertNotEqual(ruleset_hash([tag_1]),
+                            ruleset_hash([Tag.from_json('Rent', [{'description': {'contains': 'Landlord'}}])]))
+        self.assertNotEqual(ruleset_hash([tag_1]),
+                            ruleset_hash([Tag.from_json('Rent2', [{'description': {'contains': 'landlord'}}])]))
+
+
+class PlanCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache = PlanCache(self.cache_dir.name)
+        self.tags = [
+            Tag.from_json('Online payments', [{'description.lower': {'contains': 'paypal'}},
+                                              {'tags': {'contains': 'Accommodation'}}]),
+            Tag.from_json('Accommodation', [{'tags': {'contains': 'Rent'}}]),
+            Tag.from_json('Rent', [{'description': {'contains': 'landlord'}}]),
+            Tag.from_json('Manual', [{'id': {'in_csv': 'id_3,id_4'}}]),
+        ]
+        self.transactions = Transactions(pd.DataFrame({
+            'id': ['id_1', 'id_2', 'id_3'],
+            'datetime': [Timestamp('2020-01-01 00:00:00')] * 3,
+            'amount': [-400, 600., -100],
+            'currency': ['GBP'] * 3,
+            'amount_cur': [-400, 600., -100],
+            'description': ['landlord', 'paypal', 'tesco'],
+            'tags': [''] * 3,
+        }))
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_session(self):
+        sess = self.cache.session(self.tags)
+        self.assertDictEqual(self.cache.stats(), {'hits': 0, 'misses': 1, 'entries': 1, 'bytes': self.cache.size()})
+
+        cached_sess = self.cache.session(self.tags)
+        self.assertIsInstance(cached_sess, OptREPTagging)
+        self.assertIsNot(cached_sess, sess)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+        expected = OptREPTagging(self.tags).create_rule_execution_plan().create_optimised_rule_execution_plan() \
+            .tag(self.transactions)
+        pd.testing.assert_frame_equal(cached_sess.tag(self.transactions).dataframe(), expected.dataframe())
+
+    def test_session_changed_tags(self):
+        self.cache.session(self.tags)
+        new_tags = self.tags[:-1] + [Tag.from_json('Manual', [{'id': {'in_csv': 'id_1'}}])]
+
+        result = self.cache.session(new_tags).tag(self.transactions)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+        self.assertListEqual(result.tags.to_list(), ['Manual,Rent,Accommodation,Online payments', 'Online payments', ''])
+
+    def test_invalidate(self):
+        self.cache.session(self.tags)
+        self.cache.session(self.tags[:2])
+
+        self.cache.invalidate(self.tags)
+        self.assertIsNone(self.cache.get(self.tags))
+        self.assertIsNotNone(self.cache.get(self.tags[:2]))
+
+        self.cache.invalidate()
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_size_cap(self):
+        self.cache.session(self.tags)
+        self.cache.max_bytes = self.cache.size() + 1
+        self.cache.session(self.tags[:3])
+
+        self.assertEqual(self.cache.stats()['entries'], 1)
+        self.assertIsNone(self.cache.get(self.tags))
+        self.assertIsNotNone(self.cache.get(self.tags[:3]))
+
+    def test_concurrent_puts(self):
+        sess = OptREPTagging(self.tags).create_rule_execution_plan().create_optimised_rule_execution_plan()
+        writers = [threading.Thread(target=self.cache.put, args=(self.tags, sess)) for _ in range(8)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+
+        self.assertIsNotNone(self.cache.get(self.tags))
+        self.assertListEqual([path.name for path in pathlib.Path(self.cache.dirpath).iterdir()],
+                             [f"{ruleset_hash(self.tags)}.pkl"])
+
+    def test_corrupted_plan(self):
+        self.cache.session(self.tags)
+        self.cache._path(ruleset_hash(self.tags)).write_bytes(b'not a pickle')
+
+        self.assertIsInstance(self.cache.session(self.tags), OptREPTagging)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+        self.assertIsNotNone(self.cache.get(self.tags))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import unittest
+from datetime import datetime, date
+from unittest.mock import Mock
+
+import numpy as np
+import pandas as pd
+
+from mecon.tags import tagging
+from mecon.tags.rule_compiler import CompiledRule
+from mecon.tags.selectivity import RuleStatistics
+
+
+class CompiledRuleTestCase(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'id': ['id1', 'id2', 'id3', 'id4', 'id5'],
+            'datetime': [datetime(2021, 1, 1, 0, 0, 0),
+                         datetime(2021, 1, 2, 10, 30, 0),
+                         datetime(2021, 2, 3, 12, 0, 0),
+                         datetime(2022, 3, 4, 23, 59, 59),
+                         datetime(2022, 3, 6, 8, 15, 0)],
+            'amount': [-10.5, 20.0, -300.0, 0.0, 1000.9],
+            'description': ['PayPal order', 'Hotel Paris', '', 'Airbnb stay', 'landlord rent'],
+            'tags': ['', 'Rent', 'Rent,Airbnb', 'Airbnb', 'Not Rent']
+        })
+
+    def assert_same_as_row_path(self, rule):
+        expected = tagging.Tagger.get_index_for_rule(self.df, rule, vectorized=False)
+        result = CompiledRule(rule)(self.df)
+        pd.testing.assert_series_equal(result, expected.astype(bool), check_names=False)
+
+    def test_conditions_match_row_path(self):
+        conditions = [
+            ('amount', None, 'greater', 0),
+            ('amount', 'abs', 'greater_equal', 20),
+            ('amount', 'int', 'less', 0),
+            ('amount', None, 'less_equal', 0),
+            ('amount', None, 'equal', 20.),
+            ('amount', 'str', 'equal', '20.0'),
+            ('description', 'lower', 'contains', 'paypal'),
+            ('description', 'upper', 'not_contains', 'HOTEL'),
+            ('description', None, 'regex', r'^(Hotel|Airbnb)\b'),
+            ('description', None, 'regex', r'.*'),
+            ('id', None, 'in_csv', 'id1,id3,id9'),
+            ('id', None, 'not_in_csv', 'id1,id3'),
+            ('id', None, 'in', ['id2', 'id4']),
+            ('id', None, 'not_in', ['id2', 'id4']),
+            ('id', None, 'in', 'id1id2'),
+            ('tags', None, 'contains', 'Rent'),
+            ('tags', 'split_comma', 'contains', 'Rent'),
+            ('tags', 'split_comma', 'in_csv', 'Airbnb,Other'),
+            ('tags', 'split_comma', 'not_in_csv', 'Airbnb'),
+            ('datetime', 'date', 'greater_equal', date(2021, 1, 2)),
+            ('datetime', 'str', 'equal', '2021-01-01 00:00:00'),
+            ('datetime', 'day', 'equal', 3),
+            ('datetime', 'month', 'equal', 3),
+            ('datetime', 'year', 'greater', 2021),
+            ('datetime', 'hour', 'less', 12),
+            ('datetime', 'minute', 'equal', 30),
+            ('datetime', 'day_of_week', 'in', ['Saturday', 'Sunday']),
+        ]
+        for field, trans, comp, value in conditions:
+            with self.subTest(condition=(field, trans, comp, value)):
+                self.assert_same_as_row_path(tagging.Condition.from_string_values(field, trans, comp, value))
+
+    def test_composite_rules_match_row_path(self):
+        tag = tagging.Tag.from_json('test', [
+            {'amount.abs': {'greater': 15}, 'description.lower': {'contains': ['hotel', 'h']}},
+            {'tags.split_comma': {'in_csv': 'Airbnb'}},
+            {},
+        ])
+        self.assert_same_as_row_path(tag.rule)
+        self.assert_same_as_row_path(tag.rule.rules[0])
+        self.assert_same_as_row_path(tag.rule.rules[2])
+
+    def test_transformations_are_calculated_once(self):
+        rule = tagging.Conjunction([
+            tagging.Condition.from_string_values('description', 'lower', 'contains', 'a'),
+            tagging.Condition.from_string_values('description', 'lower', 'contains', 'b'),
+        ])
+        compiled = CompiledRule(rule)
+        self.assertEqual(len(compiled._transformations), 1)
+        self.assertListEqual([step.kind for step in compiled.steps], ['condition', 'condition', 'all'])
+
+    def test_custom_callables_fall_back_to_row_path(self):
+        custom_condition = tagging.Condition('amount', lambda x: x * 2, lambda a, b: a > b, 30)
+        rule = tagging.Disjunction([
+            tagging.Conjunction([custom_condition]),
+            tagging.Conjunction([tagging.Condition.from_string_values('description', None, 'contains', 'rent')]),
+        ])
+        compiled = CompiledRule(rule)
+        self.assertEqual(compiled.steps[0].kind, 'row')
+        self.assertListEqual(compiled(self.df).to_list(), [False, True, False, False, True])
+
+    def test_row_observers_fall_back_to_row_path(self):
+        observer = Mock()
+        condition = tagging.Condition.from_string_values('amount', None, 'greater', 0, observers_f=observer)
+
+        compiled = CompiledRule(condition)
+        self.assertEqual(compiled.steps[0].kind, 'row')
+        compiled(self.df)
+        self.assertEqual(observer.call_count, len(self.df))
+
+    def test_batch_observers(self):
+        observer = Mock()
+        rule = tagging.Disjunction.from_json([{'amount': {'greater': 0}}, {'description': {'contains': 'Paypal'}}])
+        rule.add_batch_observers_recursively(observer)
+
+        CompiledRule(rule)(self.df)
+
+        self.assertEqual(observer.call_count, 5)
+        calls = {str(call.args[0]): call.args[2] for call in observer.call_args_list}
+        np.testing.assert_array_equal(calls['amount greater 0'], [False, True, False, False, True])
+
+    def test_empty_dataframe(self):
+        rule = tagging.Condition.from_string_values('description', 'lower', 'contains', 'a')
+        result = CompiledRule(rule)(self.df.iloc[0:0])
+        self.assertEqual(len(result), 0)
+
+    def test_non_range_index(self):
+        df = self.df.iloc[[4, 2, 0]]
+        rule = tagging.Condition.from_string_values('amount', None, 'less', 0)
+        result = CompiledRule(rule)(df)
+        self.assertListEqual(result.index.to_list(), [4, 2, 0])
+        self.assertListEqual(result.to_list(), [False, True, True])
+
+
+
+class ShortCircuitCompiledRuleTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        n_rows = 200
+        self.df = pd.DataFrame({
+            'amount': rng.choice([-300., -20.5, 0., 15., 1000.], n_rows),
+            'description': rng.choice(['PayPal order', 'Hotel Paris', '', 'Airbnb stay', 'landlord rent'], n_rows),
+            'tags': rng.choice(['', 'Rent', 'Rent,Airbnb'], n_rows),
+        }, index=rng.permutation(n_rows) + 100)
+        self.tag = tagging.Tag.from_json('test', [
+            {'amount.abs': {'greater': 15}, 'description.lower': {'contains': ['hotel', 'h']},
+             'description': {'regex': r'\bParis$'}},
+            {'tags.split_comma': {'in_csv': 'Airbnb'}, 'amount': {'less': 0}},
+            {'description': {'regex': '^land'}, 'amount': {'greater_equal': 1000}},
+            {},
+        ])
+
+    def test_same_as_full_evaluation(self):
+        statistics = RuleStatistics()
+        for _ in range(3):  # the order changes after the first evaluation
+            for rule in [self.tag.rule, self.tag.rule.rules[0], self.tag.rule.rules[3]]:
+                pd.testing.assert_series_equal(CompiledRule(rule, statistics)(self.df), CompiledRule(rule)(self.df))
+
+    def test_conditions_are_evaluated_on_the_remaining_rows(self):
+        statistics = RuleStatistics()
+        CompiledRule(self.tag.rule.rules[0], statistics)(self.df)
+        rows = {key: stats['rows'] for key, stats in statistics.to_dict().items()}
+
+        n_big = (self.df['amount'].abs() > 15).sum()
+        self.assertDictEqual(rows, {'abs(amount) greater 15': len(self.df),
+                                    'lower(description) contains hotel': n_big,
+                                    'lower(description) contains h': rows['lower(description) contains h'],
+                                    'description regex \\bParis$': rows['description regex \\bParis$']})
+        self.assertLessEqual(rows['description regex \\bParis$'], rows['lower(description) contains h'])
+        self.assertLess(rows['description regex \\bParis$'], n_big)
+
+    def test_disjunction_skips_rows_already_true(self):
+        statistics = RuleStatistics()
+        rule = tagging.Disjunction.from_json([{'amount': {'less': 0}}, {'amount': {'greater_equal': 0}},
+                                              {'description': {'regex': 'x'}}])
+        self.assertTrue(CompiledRule(rule, statistics)(self.df).all())
+        self.assertNotIn(rule.rules[2].rules[0], statistics)
+
+    def test_batch_observers_evaluate_every_row(self):
+        observer = Mock()
+        rule = tagging.Conjunction.from_dict({'amount': {'less': 0}, 'description': {'contains': 'Paypal'}})
+        rule.add_batch_observers_recursively(observer)
+        statistics = RuleStatistics()
+
+        CompiledRule(rule, statistics)(self.df)
+
+        self.assertEqual(observer.call_count, 3)
+        self.assertDictEqual(statistics.to_dict(), {})
+
+    def test_row_fallback_on_remaining_rows(self):
+        custom_condition = tagging.Condition('amount', lambda x: x * 2, lambda a, b: a > b, 30)
+        rule = tagging.Conjunction([custom_condition,
+                                    tagging.Condition.from_string_values('amount', None, 'less', 100)])
+        statistics = RuleStatistics()
+        result = CompiledRule(rule, statistics)(self.df)
+        self.assertListEqual(result.to_list(), ((self.df['amount'] > 15) & (self.df['amount'] < 100)).to_list())
+
+
+if __name__ == '__main__':
+    unittest.main()
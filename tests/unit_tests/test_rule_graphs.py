@@ -1,3 +1,4 @@
+import random
 import unittest
 
 import pandas as pd
@@ -153,6 +154,37 @@ class TestRuleGraphs(unittest.TestCase):
                                      {'depends_on': 'test7', 'tag': 'test6'}])[['tag', 'depends_on']]
         pd.testing.assert_frame_equal(arg.tidy_table(), expected_df)
 
+    def test_remove_overlapping_cycles(self):
+        def tag(name, *dep_names):
+            return tagging.Tag(name, tagging.Condition.from_string_values('tags', None, 'in', list(dep_names)))
+
+        tags = [tag('a', 'c'), tag('b', 'a'), tag('c', 'b', 'd'), tag('d', 'c', 'd'), tag('e', 'a')]
+        rg = rule_graphs.TagGraph.from_tags(tags)
+        self.assertListEqual(rg.find_all_cycles(), [['a', 'b', 'c', 'd']])
+
+        arg = rg.remove_cycles()
+        self.assertFalse(arg.has_cycles())
+        self.assertDictEqual(arg._dependency_mapping,
+                             {'a': {'depends_on': ['c']}, 'b': {'depends_on': ['a']}, 'c': {'depends_on': ['d']},
+                              'e': {'depends_on': ['a']}})
+
+    def test_find_all_cycles_self_dependency(self):
+        tags = [tagging.Tag('a', tagging.Condition.from_string_values('tags', None, 'contains', 'a')),
+                tagging.Tag('b', tagging.Condition.from_string_values('tags', None, 'contains', 'a'))]
+        rg = rule_graphs.TagGraph.from_tags(tags)
+        self.assertListEqual(rg.find_all_cycles(), [['a']])
+
+    def test_set_tag(self):
+        tags = [tagging.Tag('a', tagging.Condition.from_string_values('col1', None, 'less', 0)),
+                tagging.Tag('b', tagging.Condition.from_string_values('tags', None, 'contains', 'a'))]
+        rg = rule_graphs.TagGraph.from_tags(tags)
+        self.assertFalse(rg.has_cycles())
+
+        new_tag = tagging.Tag('a', tagging.Condition.from_string_values('tags', None, 'contains', 'b'))
+        rg.set_tag(new_tag)
+        self.assertListEqual(rg.tags, [new_tag, tags[1]])
+        self.assertListEqual(rg.find_all_cycles(), [['a', 'b']])
+
 
 class TestAcyclicTagGraph(unittest.TestCase):
     def test_add_hierarchy_levels(self):
@@ -183,6 +215,20 @@ class TestAcyclicTagGraph(unittest.TestCase):
              {'tag': 'test2', 'level': 0, 'depends_on': None}])
         pd.testing.assert_frame_equal(arg.tidy_table(), expected_df)
 
+    def test_levels_after_set_tag(self):
+        tags = [tagging.Tag('a', tagging.Condition.from_string_values('col1', None, 'less', 0)),
+                tagging.Tag('b', tagging.Condition.from_string_values('tags', None, 'contains', 'a'))]
+        arg = rule_graphs.AcyclicTagGraph.from_tags(tags)
+        self.assertDictEqual(arg.levels(), {'a': 0, 'b': 1})
+
+        arg.set_tag(tagging.Tag('c', tagging.Condition.from_string_values('tags', None, 'in_csv', 'a,b')))
+        self.assertDictEqual(arg.levels(), {'a': 0, 'b': 1, 'c': 2})
+
+        with self.assertRaises(ValueError):
+            arg.set_tag(tagging.Tag('a', tagging.Condition.from_string_values('tags', None, 'contains', 'c')))
+        self.assertEqual(arg.tags[0], tags[0])
+        self.assertDictEqual(arg.levels(), {'a': 0, 'b': 1, 'c': 2})
+
     def test_all_tag_dependencies(self):
         rule1 = tagging.Condition.from_string_values('col1', 'str', 'greater', 1)
         rule2 = tagging.Condition.from_string_values('col1', None, 'less', -1)
@@ -300,6 +346,81 @@ class TestAcyclicTagGraph(unittest.TestCase):
         self.assertSetEqual(arg.all_tags_affected_by(tags[2]), {tags[0], tags[1], tags[2]})
         self.assertSetEqual(arg.all_tags_affected_by(tags[3]), {tags[3]})
 
+    def test_all_dependent_tag_names(self):
+        tags = [
+            tagging.Tag('test1', tagging.Condition.from_string_values('col1', None, 'less', -1)),
+            tagging.Tag('test2', tagging.Condition.from_string_values('tags', None, 'contains', 'test1')),
+            tagging.Tag('test3', tagging.Condition.from_string_values('tags', None, 'in_csv', 'test2,deleted')),
+            tagging.Tag('test4', tagging.Condition.from_string_values('col3', None, 'less', -1)),
+        ]
+        arg = rule_graphs.AcyclicTagGraph.from_tags(tags)
+
+        self.assertSetEqual(arg.all_dependent_tag_names(['test1']), {'test2', 'test3'})
+        self.assertSetEqual(arg.all_dependent_tag_names(['test2']), {'test3'})
+        self.assertSetEqual(arg.all_dependent_tag_names(['test3', 'test4']), set())
+        self.assertSetEqual(arg.all_dependent_tag_names(['deleted']), {'test3'})
+
+
+class TestTagDependencyIndex(unittest.TestCase):
+    def setUp(self):
+        self.mapping = {'a': {'depends_on': []}, 'b': {'depends_on': ['a']}, 'c': {'depends_on': ['b', 'missing']},
+                        'd': {'depends_on': ['a']}, 'e': {'depends_on': []}}
+
+    def test_queries(self):
+        index = rule_graphs.TagDependencyIndex(self.mapping)
+        self.assertListEqual(index.all_dependencies('c'), ['b', 'a', 'missing'])
+        self.assertListEqual(index.all_dependencies('a'), [])
+        self.assertListEqual(index.all_dependents('a'), ['c', 'b', 'd'])
+        self.assertListEqual(index.all_dependents('missing'), ['c'])
+        self.assertListEqual(index.all_dependents('unknown'), [])
+        self.assertTrue(index.depends_on('c', 'a'))
+        self.assertFalse(index.depends_on('a', 'c'))
+        self.assertFalse(index.depends_on('c', 'unknown'))
+
+    def test_cycles(self):
+        with self.assertRaises(ValueError):
+            rule_graphs.TagDependencyIndex({'a': {'depends_on': ['b']}, 'b': {'depends_on': ['a']}})
+
+    def test_set_dependencies(self):
+        index = rule_graphs.TagDependencyIndex(self.mapping)
+        index.all_dependents('a')  # cached queries are dropped after an update
+
+        index.set_dependencies('b', ['e', 'new'])
+        self.assertListEqual(index.all_dependencies('c'), ['b', 'missing', 'e', 'new'])
+        self.assertListEqual(index.all_dependents('a'), ['d'])
+        self.assertListEqual(index.all_dependents('e'), ['c', 'b'])
+
+    def test_set_dependencies_same_as_rebuild(self):
+        rng = random.Random(0)
+        names = [f"tag{i}" for i in range(30)]
+        # a tag only depends on tags with a lower number, so there are no cycles
+        mapping = {name: {'depends_on': rng.sample(names[:i], min(i, rng.randint(0, 3)))}
+                   for i, name in enumerate(names)}
+        index = rule_graphs.TagDependencyIndex(mapping)
+        for _ in range(50):
+            i = rng.randrange(len(names))
+            mapping[names[i]] = {'depends_on': rng.sample(names[:i], min(i, rng.randint(0, 3)))}
+            index.set_dependencies(names[i], mapping[names[i]]['depends_on'])
+
+        rebuilt_index = rule_graphs.TagDependencyIndex(mapping)
+        for name in names:
+            self.assertListEqual(index.all_dependencies(name), rebuilt_index.all_dependencies(name))
+            self.assertListEqual(index.all_dependents(name), rebuilt_index.all_dependents(name))
+
+    def test_acyclic_tag_graph_set_tag(self):
+        tags = [tagging.Tag('a', tagging.Condition.from_string_values('col1', None, 'less', 0)),
+                tagging.Tag('b', tagging.Condition.from_string_values('tags', None, 'contains', 'a')),
+                tagging.Tag('c', tagging.Condition.from_string_values('col1', None, 'greater', 0))]
+        arg = rule_graphs.AcyclicTagGraph.from_tags(tags)
+        self.assertListEqual(arg.tags_that_depends_on('a'), [tags[1]])
+        dependency_index = arg.dependency_index()
+
+        new_tag = tagging.Tag('c', tagging.Condition.from_string_values('tags', None, 'contains', 'b'))
+        arg.set_tag(new_tag)
+        self.assertIs(arg.dependency_index(), dependency_index)
+        self.assertListEqual(arg.tags_that_depends_on('a'), [new_tag, tags[1]])
+        self.assertListEqual(arg.all_tag_dependencies('c'), [tags[1], tags[0]])
+
 
 if __name__ == '__main__':
     unittest.main()
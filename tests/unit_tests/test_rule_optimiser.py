@@ -0,0 +1,208 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from mecon.data.transactions import Transactions
+from mecon.tags import tagging
+from mecon.tags.process import LinearTagging, OptREPTagging
+from mecon.tags.rule_optimiser import RuleOptimiser, implies
+from mecon.tags.tagging import Tag
+
+
+def conjunctions_json(tag: Tag) -> list:
+    return [[str(rule) for rule in conjunction.rules] for conjunction in tag.rule.rules]
+
+
+class ImpliesTestCase(unittest.TestCase):
+    def condition(self, field, compare_op, value):
+        return tagging.Condition.from_string_values(field, None, compare_op, value)
+
+    def test_implies(self):
+        self.assertTrue(implies(self.condition('a', 'greater', 100), self.condition('a', 'greater', 10)))
+        self.assertTrue(implies(self.condition('a', 'greater', 10), self.condition('a', 'greater_equal', 10)))
+        self.assertTrue(implies(self.condition('a', 'less', 10), self.condition('a', 'less_equal', 10.5)))
+        self.assertTrue(implies(self.condition('a', 'equal', 5), self.condition('a', 'less', 10)))
+        self.assertTrue(implies(self.condition('a', 'equal', 'x'), self.condition('a', 'equal', 'x')))
+
+        self.assertFalse(implies(self.condition('a', 'greater', 10), self.condition('a', 'greater', 100)))
+        self.assertFalse(implies(self.condition('a', 'greater_equal', 10), self.condition('a', 'greater', 10)))
+        self.assertFalse(implies(self.condition('a', 'greater', 100), self.condition('b', 'greater', 10)))
+        self.assertFalse(implies(self.condition('a', 'greater', 100), self.condition('a', 'less', 1000)))
+        self.assertFalse(implies(self.condition('a', 'equal', 1), self.condition('a', 'equal', '1')))
+        self.assertFalse(implies(self.condition('a', 'greater', '100'), self.condition('a', 'greater', '10')))
+
+
+class RuleOptimiserTestCase(unittest.TestCase):
+    def test_merge_ranges(self):
+        tag = Tag.from_json('t', [{'amount': {'greater': 10, 'less': 500}, 'amount.abs': {'greater': 20}},
+                                  {'amount': {'less': 100}}])
+        tag.rule.rules[0].rules.extend([tagging.Condition.from_string_values('amount', None, 'greater', 100),
+                                        tagging.Condition.from_string_values('amount', None, 'less_equal', 500),
+                                        tagging.Condition.from_string_values('amount', 'abs', 'greater', 20)])
+        optimiser = RuleOptimiser()
+        optimised_tag, = optimiser.optimise([tag])
+
+        self.assertListEqual(conjunctions_json(optimised_tag), [['amount greater 100', 'amount less 500',
+                                                                 'abs(amount) greater 20'], ['amount less 100']])
+        self.assertEqual(optimiser.report['merged_ranges'], 2)
+        self.assertEqual(optimiser.report['duplicate_conditions'], 1)
+
+    def test_remove_dead_conjunctions(self):
+        tag = Tag.from_json('t', [{'amount': {'greater': 10, 'less': 5}},
+                                  {'amount': {'greater': 10, 'less': 10}},
+                                  {'amount': {'greater_equal': 10, 'less_equal': 10}},
+                                  {'amount': {'equal': 3, 'greater': 5}},
+                                  {'description': {'contains': 'x'}}])
+        tag.rule.rules[4].rules.extend([tagging.Condition.from_string_values('currency', None, 'equal', 'GBP'),
+                                        tagging.Condition.from_string_values('currency', None, 'equal', 'EUR')])
+        optimiser = RuleOptimiser()
+        optimised_tag, = optimiser.optimise([tag])
+
+        self.assertListEqual(conjunctions_json(optimised_tag), [['amount greater_equal 10', 'amount less_equal 10']])
+        self.assertEqual(optimiser.report['dead_conjunctions'], 4)
+
+    def test_never_applied_tag_keeps_one_conjunction(self):
+        tag = Tag.from_json('t', [{'amount': {'greater': 10, 'less': 5}}, {'amount': {'greater': 1, 'less': 0}}])
+        optimised_tag, = RuleOptimiser().optimise([tag])
+        self.assertListEqual(conjunctions_json(optimised_tag), [['amount greater 10', 'amount less 5']])
+
+    def test_remove_subsumed_conjunctions(self):
+        tag = Tag.from_json('t', [{'amount': {'greater': 100}, 'description': {'contains': 'x'}},
+                                  {'amount': {'greater': 10}},
+                                  {'amount': {'greater': 10}},
+                                  {'currency': {'equal': 'GBP'}, 'amount': {'equal': 50}}])
+        optimiser = RuleOptimiser()
+        optimised_tag, = optimiser.optimise([tag])
+
+        self.assertListEqual(conjunctions_json(optimised_tag), [['amount greater 10']])
+        self.assertEqual(optimiser.report['subsumed_conjunctions'], 3)
+
+    def test_fold_equals(self):
+        tag = Tag.from_json('t', [{'currency': {'equal': 'GBP'}},
+                                  {'datetime.hour': {'equal': 3}},
+                                  {'currency': {'equal': 'EUR'}},
+                                  {'tags': {'equal': 'a'}},
+                                  {'tags': {'equal': 'b'}},
+                                  {'currency': {'equal': 'GBP'}, 'amount': {'less': 0}}])
+        optimiser = RuleOptimiser()
+        optimised_tag, = optimiser.optimise([tag])
+
+        self.assertListEqual(conjunctions_json(optimised_tag), [["currency in ('GBP', 'EUR')"], ['hour(datetime) equal 3'],
+                                                                ['tags equal a'], ['tags equal b']])
+        self.assertEqual(optimiser.report['folded_equal_conditions'], 2)
+
+    def test_hoist_common_conditions(self):
+        common_json = {'amount': {'less': 0}, 'currency': {'equal': 'GBP'}}
+        tags = [Tag.from_json(f"t{i}", [{**common_json, 'description': {'contains': f"x{i}"}}]) for i in range(3)]
+        tags.append(Tag.from_json('t3', [{'amount': {'less': 0}, 'description': {'contains': 'y'}}]))
+        optimiser = RuleOptimiser()
+        optimised_tags = optimiser.optimise(tags)
+
+        shared_conjunctions = [tag.rule.rules[0].rules[0] for tag in optimised_tags[:3]]
+        self.assertIsInstance(shared_conjunctions[0], tagging.Conjunction)
+        self.assertTrue(all(conjunction is shared_conjunctions[0] for conjunction in shared_conjunctions))
+        self.assertListEqual([str(rule) for rule in shared_conjunctions[0].rules], ['amount less 0', 'currency equal GBP'])
+        self.assertListEqual(conjunctions_json(optimised_tags[0])[0][1:], ['description contains x0'])
+        self.assertIs(optimised_tags[3], tags[3])
+        self.assertEqual(optimiser.report['hoisted_conjunctions'], 1)
+
+    def test_no_hoisting_of_tag_conditions(self):
+        common_json = {'tags': {'contains': 'Shop'}, 'amount': {'less': 0}}
+        tags = [Tag.from_json(f"t{i}", [{**common_json, 'description': {'contains': f"x{i}"}}]) for i in range(3)]
+        optimised_tags = RuleOptimiser().optimise(tags)
+        for tag in optimised_tags:  # only 'amount less 0' is common without the tags condition, there is no pair
+            self.assertTrue(all(isinstance(rule, tagging.Condition) for rule in tag.rule.rules[0].rules))
+
+    def test_no_hoisting_without_saving(self):
+        tags = [Tag.from_json(f"t{i}", [{'amount': {'less': 0}, 'currency': {'equal': 'GBP'}}]) for i in range(2)]
+        optimised_tags = RuleOptimiser().optimise(tags)
+        self.assertIs(optimised_tags[0], tags[0])
+        self.assertIs(optimised_tags[1], tags[1])
+
+    def test_optimise_report_and_originals(self):
+        tag = Tag.from_json('t', [{'amount': {'greater': 10}}, {'amount': {'greater': 100}}])
+        tag_json = tag.rule.to_json()
+        unchanged_tag = Tag.from_json('u', [{'amount': {'greater': 10}}, {'description': {'contains': 'x'}}])
+        optimiser = RuleOptimiser()
+        optimised_tags = optimiser.optimise([tag, unchanged_tag])
+
+        self.assertListEqual([tag.name for tag in optimised_tags], ['t', 'u'])
+        self.assertIs(optimised_tags[1], unchanged_tag)
+        self.assertEqual(tag.rule.to_json(), tag_json)
+        self.assertEqual(optimiser.report['rules_before'], 10)
+        self.assertEqual(optimiser.report['rules_after'], 8)
+        self.assertEqual(optimiser.report['removed_rules'], 2)
+
+    def test_tags_not_in_disjunction_of_conjunctions_form(self):
+        tag = Tag('t', tagging.Disjunction([tagging.Condition.from_string_values('amount', None, 'greater', 1)]))
+        optimised_tags = RuleOptimiser().optimise([tag, Tag('e', tagging.Disjunction([]))])
+        self.assertIs(optimised_tags[0], tag)
+        self.assertListEqual(optimised_tags[1].rule.rules, [])
+
+
+class RuleOptimiserEquivalenceTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        n_rows = 300
+        amounts = rng.choice([-100, -50.5, -10, 0, 3, 10, 10.5, 50, 100, 250, np.nan], n_rows)
+        self.transactions = Transactions(pd.DataFrame({
+            'id': [f"id_{i}" for i in range(n_rows)],
+            'datetime': pd.Timestamp('2021-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 3 * 24 * 3600, n_rows)),
+                                                                     unit='s'),
+            'amount': amounts,
+            'currency': rng.choice(['GBP', 'EUR', 'USD'], n_rows),
+            'amount_cur': amounts,
+            'description': rng.choice(['Tesco ref 1', 'paypal', 'TfL travel', 'Airbnb', ''], n_rows),
+            'tags': '',
+        }))
+
+    def random_tags(self, n_tags: int, seed: int) -> list[Tag]:
+        rng = np.random.default_rng(seed)
+        condition_pool = [
+            {'amount': {'greater': 10}}, {'amount': {'greater_equal': 10}}, {'amount': {'greater': 50}},
+            {'amount': {'less': 100}}, {'amount': {'less_equal': 10}}, {'amount': {'less': -10}},
+            {'amount_cur': {'greater': 50}}, {'amount': {'equal': 10}}, {'amount': {'equal': 100}},
+            {'currency': {'equal': 'GBP'}}, {'currency': {'equal': 'EUR'}}, {'currency': {'equal': 1}},
+            {'datetime.hour': {'equal': 3}}, {'datetime.hour': {'equal': 4}}, {'datetime.hour': {'greater': 12}},
+            {'datetime.date': {'equal': '2021-01-02'}}, {'description.lower': {'contains': 'tesco'}},
+            {'description': {'regex': '^T'}}, {'tags': {'contains': 'd0'}}, {'tags.split_comma': {'in_csv': 'd1'}},
+        ]
+        tags = [Tag.from_json('d0', [{'currency': {'equal': 'USD'}}]),
+                Tag.from_json('d1', [{'amount': {'greater': 0}}, {'amount': {'equal': 0}}]),
+                Tag.from_json('d2', [{'currency': {'equal': 'GBP'}}, {'currency': {'equal': 1}},
+                                     {'amount': {'equal': 10}}, {'amount': {'equal': 10.5}},
+                                     {'datetime.date': {'equal': '2021-01-02'}}, {'datetime.date': {'equal': 'x'}},
+                                     {'datetime': {'equal': '2021-01-01 00:00:00'}}, {'datetime': {'equal': 'x'}}])]
+        for i in range(n_tags):
+            conjunctions = []
+            for _ in range(rng.integers(1, 5)):
+                conjunction = []
+                for j in rng.choice(len(condition_pool), rng.integers(1, 4)):
+                    field, compare_dict = next(iter(condition_pool[j].items()))
+                    conjunction.append(tagging.Condition.from_string_values(
+                        field.split('.')[0], field.split('.')[1] if '.' in field else None,
+                        *next(iter(compare_dict.items()))))
+                conjunctions.append(tagging.Conjunction(conjunction))
+            tags.append(Tag(f"tag{i}", tagging.Disjunction(conjunctions)))
+        return tags
+
+    def test_tagging_results_do_not_change(self):
+        for seed in range(5):
+            tags = self.random_tags(40, seed)
+            optimised_sess = OptREPTagging(tags).create_rule_execution_plan().create_optimised_rule_execution_plan()
+            result = optimised_sess.tag(self.transactions)
+            not_optimised_result = OptREPTagging(tags, optimise_rules=False).create_rule_execution_plan() \
+                .create_optimised_rule_execution_plan().tag(self.transactions)
+            linear_result = LinearTagging(tags).tag(self.transactions)
+
+            self.assertGreater(optimised_sess.rule_optimisation_report['removed_rules'], 0)
+            self.assertGreater(optimised_sess.rule_optimisation_report['folded_equal_conditions'], 0)
+            pd.testing.assert_frame_equal(result.dataframe(), not_optimised_result.dataframe())
+            for tag in tags:
+                self.assertListEqual(result.contains_tags(tag.name).to_list(),
+                                     linear_result.contains_tags(tag.name).to_list(), (seed, tag.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
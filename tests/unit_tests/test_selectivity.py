@@ -0,0 +1,88 @@
+import pathlib
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from mecon.tags import tagging
+from mecon.tags.selectivity import RuleStatistics, DEFAULT_SELECTIVITY
+
+
+def condition(field, compare_op, value):
+    return tagging.Condition.from_string_values(field, None, compare_op, value)
+
+
+class RuleStatisticsTestCase(unittest.TestCase):
+    def test_record(self):
+        statistics = RuleStatistics()
+        cond = condition('amount', 'greater', 0)
+        self.assertNotIn(cond, statistics)
+        self.assertEqual(statistics.selectivity(cond), DEFAULT_SELECTIVITY)
+
+        statistics.record(cond, 100, 10, .001)
+        statistics.record(condition('amount', 'greater', 0), 99, 0, .001)
+
+        self.assertIn(cond, statistics)
+        self.assertDictEqual(statistics.to_dict(), {'amount greater 0': {'rows': 199, 'true': 10, 'seconds': .002}})
+        self.assertAlmostEqual(statistics.selectivity(cond), 10.5 / 200)
+        self.assertAlmostEqual(statistics.cost(cond), .002 / 199)
+
+    def test_composite_rules(self):
+        statistics = RuleStatistics()
+        cond_1, cond_2 = condition('amount', 'greater', 0), condition('amount', 'less', 10)
+        statistics.record(cond_1, 9, 4, .9)
+        statistics.record(cond_2, 3, 2, .3)
+
+        self.assertAlmostEqual(statistics.selectivity(tagging.Conjunction([cond_1, cond_2])), .45 * .625)
+        self.assertAlmostEqual(statistics.selectivity(tagging.Disjunction([cond_1, cond_2])), 1 - .55 * .375)
+        self.assertEqual(statistics.selectivity(tagging.Conjunction([])), 0)
+        self.assertAlmostEqual(statistics.cost(tagging.Conjunction([cond_1, cond_2])), .2)
+
+    def test_order(self):
+        statistics = RuleStatistics()
+        regex, contains, greater = condition('d', 'regex', 'a'), condition('d', 'contains', 'a'), \
+            condition('a', 'greater', 0)
+        self.assertListEqual(statistics.conjunction_order([regex, contains, greater]), [greater, contains, regex])
+
+        statistics.record(greater, 1000, 999, 1e-4)  # cheap but almost always true
+        statistics.record(contains, 1000, 10, 5e-4)
+        self.assertListEqual(statistics.conjunction_order([regex, contains, greater]), [contains, regex, greater])
+        self.assertListEqual(statistics.disjunction_order([regex, contains, greater]), [greater, regex, contains])
+
+    def test_save_and_load(self):
+        statistics = RuleStatistics()
+        statistics.record(condition('amount', 'greater', 0), 10, 3, .5)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / 'monitoring' / 'rule_statistics.json'
+            self.assertDictEqual(RuleStatistics.load(path).to_dict(), {})
+
+            statistics.save(path)
+            self.assertDictEqual(RuleStatistics.load(path).to_dict(), statistics.to_dict())
+
+            path.write_text('not json')
+            self.assertDictEqual(RuleStatistics.load(path).to_dict(), {})
+
+    def test_save_merges_concurrent_statistics(self):
+        greater, contains = condition('amount', 'greater', 0), condition('description', 'contains', 'tesco')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / 'rule_statistics.json'
+            first, second = RuleStatistics.load(path), RuleStatistics.load(path)
+            first.record(greater, 10, 3, .5)
+            second.record(greater, 20, 5, 1.)
+            second.record(contains, 20, 1, 2.)
+
+            first.save(path)
+            second.save(path)
+            first.save(path)  # nothing recorded since the last save
+            expected = {str(greater): {'rows': 30, 'true': 8, 'seconds': 1.5},
+                        str(contains): {'rows': 20, 'true': 1, 'seconds': 2.}}
+            self.assertDictEqual(RuleStatistics.load(path).to_dict(), expected)
+            self.assertListEqual([p.name for p in pathlib.Path(tmp_dir).iterdir()], ['rule_statistics.json'])
+
+    def test_dataset_path(self):
+        dataset = Mock(statements=pathlib.Path('/datasets/ds/data/statements'))
+        self.assertEqual(RuleStatistics.dataset_path(dataset),
+                         pathlib.Path('/datasets/ds/data/monitoring/rule_statistics.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,11 +7,18 @@ from mecon import settings
 
 
 class SettingsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.TemporaryDirectory()
+        self.example_path = pathlib.Path(self.working_dir.name) / 'example_path'
+
+    def tearDown(self):
+        self.working_dir.cleanup()
+
     def test___init__(self):
         with mock.patch.object(settings.Settings, '_load') as mck_load:
             mck_load.return_value = {"a": 1, "b": "beta"}
 
-            sets = settings.Settings('example_path')
+            sets = settings.Settings(self.example_path)
 
             mck_load.assert_called_once()
             self.assertEqual(len(sets.keys()), 2)
@@ -25,7 +32,7 @@ class SettingsTestCase(unittest.TestCase):
                 mock.patch.object(settings.Settings, 'save') as mck_save:
             mck_load.return_value = {"a": 1, "b": "beta"}
 
-            sets = settings.Settings('example_path')
+            sets = settings.Settings(self.example_path)
 
             self.assertEqual(mck_save.call_count, 0)
 
@@ -36,7 +43,7 @@ class SettingsTestCase(unittest.TestCase):
             self.assertEqual(mck_save.call_count, 2)
 
     def test_all(self):
-        temp_file = pathlib.Path('temp_file.json')
+        temp_file = pathlib.Path(self.working_dir.name) / 'temp_file.json'
         try:
             sets = settings.Settings(temp_file)
 
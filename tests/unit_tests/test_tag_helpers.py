@@ -1,3 +1,4 @@
+import json
 import unittest
 
 from mecon.tags import tag_helpers, tagging
@@ -51,6 +52,26 @@ class TagHelpersTestCase(unittest.TestCase):
                               {'col1': {'less': -1}}]
                              )
 
+    def test_compact_rule_json(self):
+        ids = ','.join(f"id_{i:06d}" for i in range(100))
+        rule_json = [{'id': {'in_csv': ids}}, {'id': {'not_in_csv': [ids, 'a,b']}, 'col1': {'equal': ids}}]
+
+        compact_json = tag_helpers.compact_rule_json(rule_json)
+        self.assertTrue(compact_json[0]['id']['in_csv'].startswith('zlib:'))
+        self.assertTrue(compact_json[1]['id']['not_in_csv'][0].startswith('zlib:'))
+        self.assertEqual(compact_json[1]['id']['not_in_csv'][1], 'a,b')
+        self.assertEqual(compact_json[1]['col1']['equal'], ids)
+        self.assertLess(len(json.dumps(compact_json[0])), len(json.dumps(rule_json[0])) / 2)
+
+        self.assertListEqual(tagging.Tag.from_json('test', compact_json).rule.to_json(), rule_json)
+        self.assertListEqual(tagging.Tag.from_json_string('test', json.dumps(compact_json)).rule.to_json(), rule_json)
+
+    def test_compact_rule_json_short_values(self):
+        rule_json = [{'id': {'in_csv': 'id_1,id_2'}}, {'custom': ['rule']}]
+        self.assertListEqual(tag_helpers.compact_rule_json(rule_json), rule_json)
+        self.assertDictEqual(tag_helpers.compact_rule_json({'id': {'in_csv': 'id_1,id_2'}}, min_items=2),
+                             {'id': {'in_csv': 'id_1,id_2'}})  # not shorter when packed
+
     def test_expand_rule_to_subrules(self):
         rule1 = tagging.Condition.from_string_values('col1', 'str', 'greater', 1)
         rule2 = tagging.Condition.from_string_values('col1', None, 'less', -1)
@@ -0,0 +1,51 @@
+import unittest
+
+from mecon.monitoring.tag_monitoring import TaggingStats, TaggingReport
+
+
+class TaggingStatsTestCase(unittest.TestCase):
+    def test_dataframe(self):
+        stats = TaggingStats()
+        stats.record('a', 'rule1', 'Condition', 10, 4, .5)
+        stats.record('b', 'rule2', 'Condition', 10, 0, .25)
+        stats.record('a', 'rule1', 'Tag', 10, 4, 1.)
+        stats.record('b', 'rule2', 'Tag', 10, 0, .25)
+        stats.record('a', 'rule3', 'Condition', 10, 10, .5)
+
+        df = stats.dataframe()
+        self.assertListEqual(df.columns.to_list(), TaggingStats.columns)
+        self.assertListEqual(df['tag'].to_list(), ['a', 'a', 'a', 'b', 'b'])
+        self.assertListEqual(df['rule_type'].to_list(), ['Condition', 'Condition', 'Tag', 'Condition', 'Tag'])
+        self.assertListEqual(df['count'].to_list(), [4, 10, 4, 0, 0])
+        self.assertListEqual(df['false_count'].to_list(), [6, 0, 6, 10, 10])
+
+    def test_record_adds_up(self):
+        stats = TaggingStats()
+        stats.record('a', 'rule1', 'Condition', 10, 4, .5)
+        stats.record('a', 'rule1', 'Condition', 5, 1, .25)
+
+        row = stats.dataframe().iloc[0]
+        self.assertEqual(row['rows'], 15)
+        self.assertEqual(row['count'], 5)
+        self.assertEqual(row['false_count'], 10)
+        self.assertAlmostEqual(row['seconds'], .75)
+
+    def test_empty(self):
+        self.assertListEqual(TaggingStats().dataframe().columns.to_list(), TaggingStats.columns)
+        self.assertEqual(len(TaggingStats().dataframe()), 0)
+
+    def test_report(self):
+        stats = TaggingStats()
+        stats.record('a', 'rule1', 'Condition', 10, 0, .5)
+        stats.record('a', 'rule2', 'Condition', 10, 3, .5)
+        stats.record('a', 'rule2', 'Tag', 10, 3, 1.)
+        stats.record('b', 'rule3', 'Tag', 10, 0, .5)
+
+        report = stats.report()
+        self.assertIsInstance(report, TaggingReport)
+        self.assertListEqual(report.unsatisfied_rules_df()['rule'].to_list(), ['rule1', 'rule3'])
+        self.assertListEqual(report.unsatisfied_tagging_rules_df()['tag'].to_list(), ['b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
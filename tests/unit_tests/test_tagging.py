@@ -2,6 +2,7 @@ import unittest
 from unittest.mock import patch, Mock, call
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 
 from mecon.tags import tagging
@@ -70,6 +71,16 @@ class ConditionTestCase(unittest.TestCase):
         self.assertEqual(condition.compute({'field': '1'}), True)
         self.assertEqual(condition.compute({'field': 2}), False)
 
+    def test_compare_value(self):
+        condition = tagging.Condition.from_string_values('id', None, 'in_csv', 'id_1,id_2')
+        self.assertEqual(condition.value, 'id_1,id_2')
+        self.assertEqual(condition.compare_value, frozenset({'id_1', 'id_2'}))
+        self.assertTrue(condition.compute({'id': 'id_2'}))
+        self.assertFalse(condition.compute({'id': 'id_3'}))
+
+        condition = tagging.Condition('field', None, lambda x, y: x == y, '1')
+        self.assertEqual(condition.compare_value, '1')
+
     def test_repr(self):
         condition = tagging.Condition(
             field='field',
@@ -376,6 +387,16 @@ class TestTagger(unittest.TestCase):
                 'another_tag,another_tag,test_tag'
             ], name='tags'))
 
+    def test_add_tag_to_rows_without_tags(self):
+        df = pd.DataFrame({'tags': [np.nan, 'test_tag', 'another_tag', np.nan]})
+
+        tagging.Tagger.add_tag('test_tag', df, [True, True, True, False])
+        pd.testing.assert_series_equal(
+            df['tags'], pd.Series(['test_tag', 'test_tag', 'another_tag,test_tag', np.nan], name='tags'))
+
+        tagging.Tagger.remove_tag('test_tag', df)
+        pd.testing.assert_series_equal(df['tags'], pd.Series(['', '', 'another_tag', np.nan], name='tags'))
+
     def test_tag_without_removing_old_tags(self):
         rule = Mock()
         rule.fit = Mock(return_value=[False, False, True, True, False])
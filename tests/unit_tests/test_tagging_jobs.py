@@ -0,0 +1,112 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from mecon.app.tagging_jobs import TaggingJobRunner
+
+
+class TaggingJobRunnerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.started, self.release = threading.Event(), threading.Event()
+        self.data_managers = []
+
+        def reset_transaction_tags():
+            self.started.set()
+            self.release.wait(5)
+
+        def data_manager_factory():
+            data_manager = MagicMock()
+            data_manager.reset_transaction_tags.side_effect = reset_transaction_tags
+            data_manager.load_new_statements.return_value = 3
+            self.data_managers.append(data_manager)
+            return data_manager
+
+        self.runner = TaggingJobRunner(data_manager_factory)
+
+    def tearDown(self):
+        self.release.set()
+
+    def test_run_jobs(self):
+        job = self.runner.submit('ingest')
+
+        self.assertTrue(job.wait(5))
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.result, 3)
+        self.assertEqual(self.runner.version, 1)
+        self.assertListEqual(self.runner.finished_jobs(), [job])
+        self.assertListEqual(self.runner.finished_jobs(after_id=job.id), [])
+        self.assertEqual(job.description(), "Loading the new statements: done, 3 new transactions")
+
+    def test_failed_job(self):
+        def data_manager_factory():
+            data_manager = MagicMock()
+            data_manager.rebuild_tags_metadata.side_effect = ValueError('no tags')
+            return data_manager
+
+        runner = TaggingJobRunner(data_manager_factory)
+        job = runner.submit('metadata')
+
+        self.assertTrue(job.wait(5))
+        self.assertEqual(job.state, 'failed')
+        self.assertIsInstance(job.error, ValueError)
+        self.assertEqual(runner.version, 0)
+        self.assertListEqual(runner.active_jobs(), [])
+
+    def test_invalid_kind(self):
+        with self.assertRaises(ValueError):
+            self.runner.submit('retag_everything')
+
+    def test_coalesce_queued_jobs(self):
+        running_job = self.runner.submit('reset_tags')  # blocks until released
+        self.assertTrue(self.started.wait(5))
+        retag_job = self.runner.submit('retag', ['Rent'])
+        self.assertIs(self.runner.submit('retag', ['Big']), retag_job)
+        self.assertIs(self.runner.submit('metadata'), retag_job)
+        self.assertSetEqual(retag_job.tag_names, {'Rent', 'Big'})
+        self.assertListEqual(self.runner.active_jobs(), [running_job, retag_job])
+
+        ingest_job = self.runner.submit('ingest')
+        self.assertIsNot(ingest_job, retag_job)
+        self.assertIs(self.runner.submit('reset'), ingest_job)
+        self.assertEqual(ingest_job.kind, 'reset')
+
+        self.release.set()
+        self.assertTrue(ingest_job.wait(5))
+        self.assertListEqual([job.state for job in (running_job, retag_job, ingest_job)], ['done'] * 3)
+        self.assertEqual(self.runner.version, 3)
+        self.data_managers[1].update_transaction_tags.assert_called_once_with(['Big', 'Rent'])
+        self.data_managers[2].reset.assert_called_once_with()
+        self.assertListEqual(self.runner.active_jobs(), [])
+
+    def test_reload(self):
+        session_data_manager = MagicMock()
+        self.assertEqual(self.runner.reload(session_data_manager), 0)
+        session_data_manager.reload.assert_called_once_with()
+
+        job = self.runner.submit('reset_tags')  # blocks while writing, until released
+        self.assertTrue(self.started.wait(5))
+        self.assertIsNone(self.runner.reload(session_data_manager))
+        session_data_manager.reload.assert_called_once_with()
+
+        self.release.set()
+        self.assertTrue(job.wait(5))
+        self.assertEqual(self.runner.reload(session_data_manager), 1)
+        self.assertEqual(session_data_manager.reload.call_count, 2)
+
+    def test_progress(self):
+        def data_manager_factory():
+            data_manager = MagicMock()
+            data_manager.update_transaction_tags.side_effect = lambda tag_names: data_manager.progress(2, 5)
+            return data_manager
+
+        runner = TaggingJobRunner(data_manager_factory)
+        job = runner.submit('retag', ['Rent'])
+
+        self.assertTrue(job.wait(5))
+        self.assertTupleEqual(job.progress, (2, 5))
+        job.state = 'running'
+        self.assertEqual(job.description(), "Re-tagging Rent: running, batch 2/5")
+
+
+if __name__ == '__main__':
+    unittest.main()
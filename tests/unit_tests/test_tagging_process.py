@@ -1,11 +1,20 @@
+import pathlib
+import tempfile
 import unittest
 from unittest.mock import MagicMock
 
+import numpy as np
 import pandas as pd
 from pandas import Timestamp
 
 from mecon.data.transactions import Transactions
-from mecon.tags.process import RuleExecutionPlanTagging, OptREPTagging
+from mecon.monitoring.tag_monitoring import TaggingStats
+from mecon.tags.process import RuleExecutionPlanTagging, OptREPTagging, IncrementalTagging, RuleExecutionFrame, \
+    RuleExecutionPlanMonitor, join_tag_names, LinearTagging, RowChunkedTagging, \
+    TaggedTransactionsOptREPTagging
+from mecon.tags import comparisons
+from mecon.tags.selectivity import RuleStatistics
+from mecon.tags.transformation_cache import TransformationCache
 from mecon.tags.tagging import Tag
 
 
@@ -289,12 +298,10 @@ class OptimisedRuleExecutionPlanTaggingTestCase(unittest.TestCase):
              'tag': 'Rent', 'type': 'Transformation'},
             # {'priority': '-1', 'rule': "Transformation(field='tags', trans=TransformationFunction(none), parent_tag='Online payments')", 'tag': 'Online payments', 'type': 'Transformation'},
             {'priority': '0.0', 'rule': 'abs(amount) greater 30', 'tag': 'Accommodation', 'type': 'Condition'},
-            {'priority': '0.0', 'rule': 'description contains landlord', 'tag': 'Rent', 'type': 'Condition'},
-            {'priority': '0.0', 'rule': 'lower(description) contains airbnb', 'tag': 'Airbnb', 'type': 'Condition'},
-            {'priority': '0.0', 'rule': 'lower(description) contains hotel', 'tag': 'Accommodation',
-             'type': 'Condition'},
-            {'priority': '0.0', 'rule': 'lower(description) contains paypal', 'tag': 'Online payments',
-             'type': 'Condition'},
+            {'priority': '0.0', 'rule': "PatternMatching(column='description.lower', ...)", 'tag': 'Airbnb',
+             'type': 'PatternMatching'},
+            {'priority': '0.0', 'rule': "PatternMatching(column='description.none', ...)", 'tag': 'Rent',
+             'type': 'PatternMatching'},
             {'priority': '2.1', 'rule': 'tags contains Accommodation', 'tag': 'Online payments', 'type': 'Condition'},
             {'priority': '1.1', 'rule': 'tags contains Airbnb', 'tag': 'Accommodation', 'type': 'Condition'},
             {'priority': '1.1', 'rule': 'tags contains Rent', 'tag': 'Accommodation', 'type': 'Condition'}
@@ -302,6 +309,19 @@ class OptimisedRuleExecutionPlanTaggingTestCase(unittest.TestCase):
         pd.testing.assert_frame_equal(df_plan[['priority', 'tag', 'type']].sort_values(by=['priority']).reset_index(drop=True),
                                       expected_df[['priority', 'tag', 'type']].sort_values(by=['priority']).reset_index(drop=True))
 
+    def test_pattern_matching_execution_plan(self):
+        df_plan = self.orep.pattern_matching_execution_plan(self.orep.plan)
+
+        df_pattern_matching = df_plan[df_plan['type'] == 'PatternMatching']
+        columns = {rule.column: {str(cond) for cond in rule.conditions} for rule in df_pattern_matching['rule']}
+        self.assertDictEqual(columns, {
+            'description.lower': {'lower(description) contains paypal', 'lower(description) contains hotel',
+                                  'lower(description) contains airbnb'},
+            'description.none': {'description contains landlord'}})
+        self.assertListEqual(df_pattern_matching['priority'].to_list(), ['0.0', '0.0'])
+        self.assertEqual(len(df_plan), len(self.orep.plan) - 4 + 2)
+        self.assertIn('tags contains Rent', df_plan['rule'].apply(str).to_list())
+
     def test_split_in_batches(self):
         new_orep = OptREPTagging(self.orep.tags)
         new_orep.create_rule_execution_plan()
@@ -312,7 +332,7 @@ class OptimisedRuleExecutionPlanTaggingTestCase(unittest.TestCase):
         self.assertListEqual(list(batches.keys()),
                              ['-1', '0.0', '0.8', '1.1', '1.2', '1.4', '1.8', '2.1', '2.4', '2.8'])
         self.assertEqual(len(batches['-1']), 3)
-        self.assertEqual(len(batches['0.0']), 5)
+        self.assertEqual(len(batches['0.0']), 3)
         self.assertEqual(len(batches['0.8']), 2)
         self.assertEqual(len(batches['1.1']), 2)
         self.assertEqual(len(batches['1.2']), 1)
@@ -348,20 +368,21 @@ class OptimisedRuleExecutionPlanTaggingTestCase(unittest.TestCase):
         # mock_df.__getitem__.assert_called_with(f"{rules[17].field}.{rules[17].trans.name}")
         mock_df.__getitem__.assert_called_with(self.tag_0.rule.rules[1].rules[0].field)
 
-        # Online payments lower(description) contains paypal
-        res = converted_rules[14](mock_df)
-        res._mock_new_parent.assert_called_with(alias[self.tag_0.rule.rules[0]])
-        mock_df.__getitem__.assert_called_with(f"{rules[15].field}.{rules[15].trans.name}")
+        # PatternMatching of lower(description) contains airbnb, hotel and paypal
+        res = converted_rules[11](pd.DataFrame({'description.lower': ['paypal', 'hotel airbnb', '']}))
+        self.assertEqual(rules[11].column, 'description.lower')
+        self.assertListEqual(res[alias[self.tag_0.rule.rules[0]]].to_list(), [True, False, False])
+        self.assertListEqual(res[alias[self.tag_22.rule.rules[0]]].to_list(), [False, True, False])
 
         # Online payments Transformation(field='description', trans=TransformationFunction(lower), parent_tag='Online payments')
-        res = converted_rules[15](mock_df)
-        res._mock_new_parent.assert_called_with(f"{rules[15].field}.{rules[15].trans.name}")  # rename
-        mock_df.__getitem__.assert_called_with(f"{rules[15].field}")
+        res = converted_rules[14](mock_df)
+        res._mock_new_parent.assert_called_with(f"{rules[14].field}.{rules[14].trans.name}")  # rename
+        mock_df.__getitem__.assert_called_with(f"{rules[14].field}")
 
-        # Online payments Transformation(field='tags', trans=TransformationFunction(none), parent_tag='Online payments')
-        res = converted_rules[17](mock_df)
-        res._mock_new_parent.assert_called_with(f"{rules[17].field}.{rules[17].trans.name}")
-        mock_df.__getitem__.assert_called_with(f"{rules[17].field}")  # no alias
+        # Rent Transformation(field='description', trans=TransformationFunction(none), parent_tag='Rent')
+        res = converted_rules[15](mock_df)
+        res._mock_new_parent.assert_called_with(f"{rules[15].field}.{rules[15].trans.name}")
+        mock_df.__getitem__.assert_called_with(f"{rules[15].field}")  # no alias
 
     def test_tag(self):
         # the tags col will be reset, just keeping it for reference
@@ -399,6 +420,449 @@ class OptimisedRuleExecutionPlanTaggingTestCase(unittest.TestCase):
         new_transactions = optimised_rep.tag(transactions)
         self.assertTrue(transactions.equals(new_transactions))
 
+    def test_tag_pattern_matching_on_non_text_column(self):
+        transactions = Transactions(pd.DataFrame([
+            {'amount': -400, 'amount_cur': -400, 'currency': 'GBP', 'datetime': Timestamp('2020-01-01 00:00:00'),
+             'description': 'landlord', 'id': 'id_1', 'tags': ''}]))
+        optimised_rep = OptREPTagging([Tag.from_json('Amount text', [{'amount': {'contains': '4'}}])])
+        optimised_rep.create_rule_execution_plan()
+        optimised_rep.create_optimised_rule_execution_plan()
+
+        with self.assertRaises(comparisons.TypesOfComparedValuesDoNotMatch):
+            optimised_rep.tag(transactions)
+
+    def test_tag_monitor(self):
+        transactions = Transactions(pd.DataFrame([
+            {'amount': -400, 'amount_cur': -400, 'currency': 'GBP', 'datetime': Timestamp('2020-01-01 00:00:00'),
+             'description': 'landlord', 'id': 'id_1', 'tags': ''},
+            {'amount': -30, 'amount_cur': -30, 'currency': 'GBP', 'datetime': Timestamp('2020-01-01 00:00:00'),
+             'description': 'paypal', 'id': 'id_2', 'tags': ''}
+        ]))
+        optimised_rep = OptREPTagging(self.orep.tags)
+        optimised_rep.create_rule_execution_plan()
+        optimised_rep.create_optimised_rule_execution_plan()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            monitor = RuleExecutionPlanMonitor(MagicMock(statements=pathlib.Path(tmp_dir) / 'statements'))
+            optimised_rep.tag(transactions, monitor=monitor)
+
+            self.assertTrue(monitor.calc_path.exists())
+            self.assertListEqual(sorted(monitor.all_monitored_tag_names()), ['Accommodation', 'Airbnb', 'Online payments', 'Rent'])
+            df_calculations = monitor.get_tag_calculations('Online payments')
+            self.assertListEqual(df_calculations['id'].to_list(), ['id_1', 'id_2'])
+            self.assertListEqual(df_calculations['tags'].to_list(),
+                                 ['Rent,Accommodation,Online payments', 'Online payments'])
+            self.assertListEqual(df_calculations['description.lower'].to_list(), ['landlord', 'paypal'])
+            self.assertListEqual(df_calculations['lower(description) contains paypal'].to_list(), [False, True])
+
+            rent_calculations = monitor.get_tag_calculations('Rent')
+            self.assertNotIn('lower(description) contains paypal', rent_calculations.columns)
+            self.assertListEqual(rent_calculations['description contains landlord'].to_list(), [True, False])
+
+            monitor.transactions = None  # only the ids are stored, not the transactions
+            self.assertListEqual(monitor.get_tag_calculations('Rent').columns[:1].to_list(), ['id'])
+            self.assertNotIn('tags', monitor.get_tag_calculations('Rent').columns)
+
+    def test_tag_monitor_columns(self):
+        transactions = Transactions(pd.DataFrame([
+            {'amount': -400, 'amount_cur': -400, 'currency': 'GBP', 'datetime': Timestamp('2020-01-01 10:00:00'),
+             'description': 'landlord', 'id': 'id_1', 'tags': ''},
+            {'amount': -30, 'amount_cur': -30, 'currency': 'GBP', 'datetime': Timestamp('2020-01-02 10:00:00'),
+             'description': None, 'id': 'id_2', 'tags': ''}
+        ]))
+        optimised_rep = OptREPTagging([Tag.from_json('Rent', [{'description.upper': {'contains': 'LANDLORD'}}]),
+                                       Tag.from_json('New year', [{'datetime.date': {'equal': '2020-01-01'}}])])
+        optimised_rep.create_rule_execution_plan()
+        optimised_rep.create_optimised_rule_execution_plan()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            monitor = RuleExecutionPlanMonitor(MagicMock(statements=pathlib.Path(tmp_dir) / 'statements'))
+            optimised_rep.tag(transactions, monitor=monitor)
+
+            rent_calculations = monitor.get_tag_calculations('Rent')
+            self.assertListEqual(rent_calculations['description.upper'].to_list(), ['LANDLORD', 'NONE'])
+            new_year_calculations = monitor.get_tag_calculations('New year')
+            self.assertListEqual([str(date) for date in new_year_calculations['datetime.date']],
+                                 ['2020-01-01', '2020-01-02'])
+
+    def test_tag_monitor_overwritten(self):
+        transactions = Transactions(pd.DataFrame([
+            {'amount': -400, 'amount_cur': -400, 'currency': 'GBP', 'datetime': Timestamp('2020-01-01 00:00:00'),
+             'description': 'landlord', 'id': 'id_1', 'tags': ''}]))
+        optimised_rep = OptREPTagging([Tag.from_json('Rent', [{'description.lower': {'contains': 'landlord'}}])])
+        optimised_rep.create_rule_execution_plan()
+        optimised_rep.create_optimised_rule_execution_plan()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dataset = MagicMock(statements=pathlib.Path(tmp_dir) / 'statements')
+            monitor, other_monitor = RuleExecutionPlanMonitor(dataset), RuleExecutionPlanMonitor(dataset)
+            optimised_rep.tag(transactions, monitor=monitor)
+            optimised_rep.tag(transactions, monitor=other_monitor)  # like the preview of another session
+
+            with self.assertRaises(ValueError):
+                monitor.get_tag_calculations('Rent')
+            self.assertListEqual(other_monitor.get_tag_calculations('Rent')['id'].to_list(), ['id_1'])
+            self.assertListEqual(sorted(path.name for path in other_monitor.path.iterdir()),
+                                 ['calc_monitoring.npz', 'op_monitoring.csv'])
+
+
+class JoinTagNamesTestCase(unittest.TestCase):
+    def test_join_tag_names(self):
+        tag_matrix = np.array([[True, False, True, False],
+                               [True, False, False, False],
+                               [False, False, True, True]])
+        result = join_tag_names(['a', 'b', 'c'], tag_matrix)
+        self.assertListEqual(result.tolist(), ['a,b', '', 'a,c', 'c'])
+
+    def test_join_tag_names_initial_tags(self):
+        tag_matrix = np.array([[True, False, True, False]])
+        result = join_tag_names(['a'], tag_matrix, np.array(['x,y', '', '', 'y'], dtype=object))
+        self.assertListEqual(result.tolist(), ['x,y,a', '', 'a', 'y'])
+
+    def test_join_tag_names_many_tags(self):
+        tag_names = [f"tag{i}" for i in range(20)]
+        tag_matrix = np.random.default_rng(0).random((20, 50)) < .3
+        expected = [','.join(name for name, bit in zip(tag_names, tag_matrix[:, i]) if bit) for i in range(50)]
+        self.assertListEqual(join_tag_names(tag_names, tag_matrix).tolist(), expected)
+
+    def test_join_tag_names_empty(self):
+        self.assertListEqual(join_tag_names([], np.zeros((0, 2), dtype=bool)).tolist(), ['', ''])
+        self.assertListEqual(join_tag_names(['a'], np.zeros((1, 0), dtype=bool)).tolist(), [])
+
+
+class RuleExecutionFrameTestCase(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({'amount': [1, 2, 3], 'tags': ['x', '', '']}, index=[10, 11, 12])
+        self.frame = RuleExecutionFrame(self.df, rule_aliases=['r1', 'r2'], tag_names=['t1', 't2'])
+
+    def test_rule_outputs(self):
+        self.frame.store(pd.Series([True, False, True], index=self.df.index, name='r1'))
+        self.frame.store(pd.Series([True, True, False], index=self.df.index, name='r2'))
+        self.frame.store(pd.Series([-1, -2, -3], index=self.df.index, name='amount.neg'))
+
+        pd.testing.assert_series_equal(self.frame['r1'], pd.Series([True, False, True], index=self.df.index, name='r1'))
+        pd.testing.assert_series_equal(self.frame[['r1', 'r2']].all(axis=1),
+                                       pd.Series([True, False, False], index=self.df.index))
+        self.assertListEqual(self.frame['amount.neg'].to_list(), [-1, -2, -3])
+        self.assertListEqual(self.frame['amount'].to_list(), [1, 2, 3])
+        self.assertListEqual(list(self.frame.dataframe().columns), ['amount', 'tags', 'amount.neg', 'r1', 'r2'])
+
+    def test_tags(self):
+        self.assertListEqual(self.frame['tags'].to_list(), ['x', '', ''])
+        self.frame.add_tag('t2', pd.Series([True, True, False], index=self.df.index))
+        self.assertListEqual(self.frame['tags'].to_list(), ['x,t2', 't2', ''])
+        self.frame.add_tag('t1', pd.Series([False, True, True], index=self.df.index))
+        self.assertListEqual(self.frame.tags().tolist(), ['x,t2', 't1,t2', 't1'])
+
+
+class IncrementalTaggingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tag_0 = Tag.from_json('Online payments',
+                                   [{'description.lower': {'contains': 'paypal'}},
+                                    {'tags': {'contains': 'Accommodation'}}])
+        self.tag_1 = Tag.from_json('Accommodation',
+                                   [{'tags': {'contains': 'Rent'}},
+                                    {'tags': {'contains': 'Airbnb'}}])
+        self.tag_21 = Tag.from_json('Rent', [{'description': {'contains': 'landlord'}}])
+        self.tag_22 = Tag.from_json('Airbnb', [{'description.lower': {'contains': 'airbnb'}}])
+        self.tag_3 = Tag.from_json('Big', [{'amount.abs': {'greater': 500}}])
+        self.tags = [self.tag_0, self.tag_1, self.tag_21, self.tag_22, self.tag_3]
+
+        df = pd.DataFrame({
+            'id': ['id_1', 'id_2', 'id_3', 'id_4'],
+            'datetime': [Timestamp('2020-01-01 00:00:00')] * 4,
+            'amount': [-400, 600., -100, -20],
+            'currency': ['GBP'] * 4,
+            'amount_cur': [-400, 600., -100, -20],
+            'description': ['landlord', 'landlord', 'Airbnb', 'paypal'],
+            'tags': [''] * 4,
+        })
+        self.transactions = OptREPTagging(self.tags).create_rule_execution_plan().create_optimised_rule_execution_plan().tag(
+            Transactions(df))
+
+    def assert_same_as_full_tagging(self, tags, result_transactions):
+        expected = OptREPTagging(tags).create_rule_execution_plan().create_optimised_rule_execution_plan().tag(
+            self.transactions.reset_tags())
+        for tag in tags:
+            self.assertListEqual(result_transactions.contains_tags(tag.name).to_list(),
+                                 expected.contains_tags(tag.name).to_list(), tag.name)
+
+    def test_affected_tag_names(self):
+        sess = IncrementalTagging(self.tags, ['Airbnb'])
+        self.assertSetEqual(sess.affected_tag_names(), {'Airbnb', 'Accommodation', 'Online payments'})
+
+        sess = IncrementalTagging(self.tags, ['Big'])
+        self.assertSetEqual(sess.affected_tag_names(), {'Big'})
+
+    def test_tag_edited_tag(self):
+        new_tag = Tag.from_json('Airbnb', [{'description.lower': {'contains': 'paypal'}}])
+        new_tags = [self.tag_0, self.tag_1, self.tag_21, new_tag, self.tag_3]
+
+        sess = IncrementalTagging(new_tags, ['Airbnb'])
+        result = sess.tag(self.transactions)
+
+        self.assert_same_as_full_tagging(new_tags, result)
+        self.assertListEqual(sess.changed_rows.tolist(), [False, False, True, True])
+        self.assertListEqual(result.tags.to_list()[:2], self.transactions.tags.to_list()[:2])
+
+    def test_tag_deleted_tag(self):
+        new_tags = [self.tag_0, self.tag_1, self.tag_22, self.tag_3]
+
+        sess = IncrementalTagging(new_tags, ['Rent'])
+        result = sess.tag(self.transactions)
+
+        self.assert_same_as_full_tagging(new_tags, result)
+        self.assertNotIn('Rent', result.all_tags())
+        self.assertListEqual(sess.changed_rows.tolist(), [True, True, False, False])
+
+    def test_tag_unchanged_tag(self):
+        sess = IncrementalTagging(self.tags, ['Online payments'])
+        result = sess.tag(self.transactions)
+
+        self.assertListEqual(result.tags.to_list(), self.transactions.tags.to_list())
+        self.assertFalse(sess.changed_rows.any())
+
+    def test_tag_with_stats(self):
+        stats = TaggingStats()
+        IncrementalTagging(self.tags, ['Airbnb']).tag(self.transactions, stats=stats)
+
+        self.assertSetEqual(set(stats.dataframe()['tag']), {'Airbnb', 'Accommodation', 'Online payments'})
+
+    def test_changed_tag_sets(self):
+        old_tags = np.array(['Rent,Big', 'Rent', ',Big', 'Big', ''], dtype=object)
+        new_tags = np.array(['Big,Rent', 'Rent', 'Big', 'Big,Airbnb', 'Airbnb'], dtype=object)
+        self.assertListEqual(IncrementalTagging._changed_tag_sets(old_tags, new_tags).tolist(),
+                             [False, False, False, True, True])
+
+    def test_tagged_transactions_session_drops_removed_tags(self):
+        transactions = self.transactions.factory(
+            self.transactions.dataframe().assign(tags=['Rent,,Big,Accommodation', ',Airbnb', '', 'Big']))
+        sess = TaggedTransactionsOptREPTagging([self.tag_3], removed_tag_names=['Big', 'Airbnb'])
+
+        self.assertListEqual(sess.prepare_transactions(transactions)['tags'].to_list(),
+                             ['Rent,Accommodation', '', '', ''])
+        self.assertListEqual(sess.create_rule_execution_plan().create_optimised_rule_execution_plan()
+                             .tag(transactions).tags.to_list(), ['Rent,Accommodation', 'Big', '', ''])
+
+
+class RowChunkedTaggingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tags = [
+            Tag.from_json('Online payments', [{'description.lower': {'contains': 'paypal'}},
+                                              {'tags': {'contains': 'Accommodation'}}]),
+            Tag.from_json('Accommodation', [{'tags': {'contains': 'Rent'}}, {'tags': {'contains': 'Airbnb'}}]),
+            Tag.from_json('Rent', [{'description': {'contains': 'landlord'}}]),
+            Tag.from_json('Airbnb', [{'description.lower': {'contains': 'airbnb'}}]),
+            Tag.from_json('Big', [{'amount.abs': {'greater': 500}}]),
+        ]
+        n = 11
+        self.transactions = Transactions(pd.DataFrame({
+            'id': [f'id_{i}' for i in range(n)],
+            'datetime': [Timestamp('2020-01-01 00:00:00')] * n,
+            'amount': [-400, 600., -100, -20, -10, 700, -5, -1000, 3, -30, 12],
+            'currency': ['GBP'] * n,
+            'amount_cur': [-400, 600., -100, -20, -10, 700, -5, -1000, 3, -30, 12],
+            'description': ['landlord', 'landlord', 'Airbnb', 'paypal', 'tesco', 'airbnb stay', 'tfl', 'landlord',
+                            'paypal', 'shop', 'salary'],
+            'tags': ['old tag'] + [''] * (n - 1),
+        }, index=range(100, 100 + n)))
+
+    def test_n_chunks(self):
+        sess = RowChunkedTagging(LinearTagging(self.tags), workers=4, min_chunk_size=250)
+        self.assertEqual(sess.n_chunks(0), 1)
+        self.assertEqual(sess.n_chunks(499), 1)
+        self.assertEqual(sess.n_chunks(500), 2)
+        self.assertEqual(sess.n_chunks(10_000), 4)
+
+    def test_tag_optrep(self):
+        serial_sess = OptREPTagging(self.tags).create_rule_execution_plan().create_optimised_rule_execution_plan()
+        sess = RowChunkedTagging(serial_sess, workers=3, min_chunk_size=2)
+
+        result = sess.tag(self.transactions)
+        expected = serial_sess.tag(self.transactions)
+        pd.testing.assert_frame_equal(result.dataframe(), expected.dataframe())
+
+    def test_tag_chunks_without_transformation_cache(self):
+        serial_sess = OptREPTagging(self.tags).create_rule_execution_plan().create_optimised_rule_execution_plan()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            serial_sess.transformation_cache = TransformationCache(pathlib.Path(tmp_dir))
+            result = RowChunkedTagging(serial_sess, workers=3, min_chunk_size=2).tag(self.transactions)
+
+            self.assertListEqual(list(pathlib.Path(tmp_dir).iterdir()), [])
+            self.assertIsNotNone(serial_sess.transformation_cache)
+            pd.testing.assert_frame_equal(result.dataframe(), serial_sess.tag(self.transactions).dataframe())
+
+    def test_tag_linear(self):
+        serial_sess = LinearTagging(self.tags)
+        sess = RowChunkedTagging(serial_sess, workers=2, min_chunk_size=2)
+
+        result = sess.tag(self.transactions)
+        expected = serial_sess.tag(self.transactions)
+        pd.testing.assert_frame_equal(result.dataframe(), expected.dataframe())
+
+    def test_tag_single_chunk(self):
+        serial_sess = LinearTagging(self.tags)
+        sess = RowChunkedTagging(serial_sess, workers=2)
+
+        result = sess.tag(self.transactions)
+        pd.testing.assert_frame_equal(result.dataframe(), serial_sess.tag(self.transactions).dataframe())
+
+
+
+class LinearTaggingTestCase(unittest.TestCase):
+    setUp = RowChunkedTaggingTestCase.setUp
+
+    def test_tag_with_statistics(self):
+        statistics = RuleStatistics()
+        result = LinearTagging(self.tags, statistics=statistics).tag(self.transactions)
+
+        pd.testing.assert_frame_equal(result.dataframe(), LinearTagging(self.tags).tag(self.transactions).dataframe())
+        self.assertDictEqual(statistics.to_dict()['abs(amount) greater 500'], {
+            'rows': 11, 'true': 3, 'seconds': statistics.to_dict()['abs(amount) greater 500']['seconds']})
+
+
+
+class SelectivityTaggingTestCase(unittest.TestCase):
+    def setUp(self):
+        RowChunkedTaggingTestCase.setUp(self)
+        self.tags.append(Tag.from_json('Big landlord', [{'amount.abs': {'greater': 500},
+                                                         'description.lower': {'regex': '^land'}}]))
+
+    def assert_short_circuit(self, sess_factory):
+        statistics = RuleStatistics()
+        sess = sess_factory()
+        sess.statistics = statistics
+        result = sess.tag(self.transactions)
+
+        pd.testing.assert_frame_equal(result.dataframe(), sess_factory().tag(self.transactions).dataframe())
+        self.assertListEqual(result.dataframe()['tags'].str.contains('Big landlord').tolist(),
+                             [False, True] + [False] * 5 + [True] + [False] * 3)
+        # the regex is only read by the conjunction, so it runs on the 3 rows of 'abs(amount) greater 500'
+        regex_stats = statistics.to_dict()['lower(description) regex ^land']
+        self.assertDictEqual(regex_stats, {'rows': 3, 'true': 2, 'seconds': regex_stats['seconds']})
+        self.assertIn('lower(description) regex ^land', sess.deferred_conditions())
+        self.assertNotIn('abs(amount) greater 500', sess.deferred_conditions())  # the tag 'Big' reads it too
+
+    def test_rep_tag_with_statistics(self):
+        self.assert_short_circuit(lambda: RuleExecutionPlanTagging(self.tags).create_rule_execution_plan())
+
+    def test_optrep_tag_with_statistics(self):
+        self.assert_short_circuit(lambda: OptREPTagging(self.tags).create_rule_execution_plan()
+                                  .create_optimised_rule_execution_plan())
+
+    def test_no_deferred_conditions_without_statistics(self):
+        sess = OptREPTagging(self.tags).create_rule_execution_plan().create_optimised_rule_execution_plan()
+        self.assertDictEqual(sess.deferred_conditions(), {})
+
+
+class TransformationCacheTaggingTestCase(unittest.TestCase):
+    setUp = RowChunkedTaggingTestCase.setUp
+
+    def test_tag_with_transformation_cache(self):
+        expected = OptREPTagging(self.tags).create_rule_execution_plan().create_optimised_rule_execution_plan() \
+            .tag(self.transactions)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for _ in range(2):
+                sess = OptREPTagging(self.tags).create_rule_execution_plan().create_optimised_rule_execution_plan()
+                sess.transformation_cache = TransformationCache(pathlib.Path(cache_dir))
+                result = sess.tag(self.transactions)
+                pd.testing.assert_frame_equal(result.dataframe(), expected.dataframe())
+            self.assertEqual(sess.transformation_cache.misses, 0)
+            self.assertGreater(sess.transformation_cache.hits, 0)
+
+    def test_incremental_tagging_with_transformation_cache(self):
+        transactions = LinearTagging(self.tags).tag(self.transactions)
+        expected = IncrementalTagging(self.tags, ['Airbnb']).tag(transactions)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = TransformationCache(pathlib.Path(cache_dir))
+            result = IncrementalTagging(self.tags, ['Airbnb'], transformation_cache=cache).tag(transactions)
+            self.assertGreater(cache.misses, 0)
+        pd.testing.assert_frame_equal(result.dataframe(), expected.dataframe())
+
+
+
+class TaggingStatsTestCase(unittest.TestCase):
+    setUp = RowChunkedTaggingTestCase.setUp
+
+    def test_tag_stats(self):
+        for sess in (RuleExecutionPlanTagging(self.tags).create_rule_execution_plan(),
+                     OptREPTagging(self.tags).create_rule_execution_plan().create_optimised_rule_execution_plan()):
+            stats = TaggingStats()
+            transactions = sess.tag(self.transactions, stats=stats)
+
+            df_stats = stats.dataframe()
+            df_tags = df_stats[df_stats['rule_type'] == 'Tag'].set_index('tag')
+            self.assertSetEqual(set(df_tags.index), {tag.name for tag in self.tags})
+            for tag in self.tags:
+                self.assertEqual(df_tags.loc[tag.name, 'count'], transactions.containing_tags(tag.name).size())
+            self.assertTrue((df_stats['rows'] == len(self.transactions.dataframe())).all())
+            self.assertTrue((df_stats['count'] + df_stats['false_count'] == df_stats['rows']).all())
+            self.assertTrue((df_stats['seconds'] >= 0).all())
+
+            df_conditions = df_stats[df_stats['rule_type'] == 'Condition'].set_index('rule')
+            self.assertEqual(df_conditions.loc['description contains landlord', 'count'], 3)
+
+    def test_tag_stats_add_up(self):
+        sess = OptREPTagging(self.tags).create_rule_execution_plan().create_optimised_rule_execution_plan()
+        stats = TaggingStats()
+        sess.tag(self.transactions, stats=stats)
+        sess.tag(self.transactions, stats=stats)
+
+        df_stats = stats.dataframe()
+        self.assertTrue((df_stats['rows'] == 2 * len(self.transactions.dataframe())).all())
+
+    def test_shared_rules_belong_to_all_their_tags(self):
+        common_json = {'amount': {'less': 0}, 'currency': {'equal': 'GBP'}}
+        tags = [Tag.from_json(f"Shop {i}", [{**common_json, 'description.lower': {'contains': name}}])
+                for i, name in enumerate(['tesco', 'paypal', 'tfl'])]
+        sess = OptREPTagging(tags).create_rule_execution_plan().create_optimised_rule_execution_plan()
+        self.assertEqual(sess.rule_optimisation_report['hoisted_conjunctions'], 1)
+        stats = TaggingStats()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            monitor = RuleExecutionPlanMonitor(MagicMock(statements=pathlib.Path(tmp_dir) / 'statements'))
+            sess.tag(self.transactions, monitor=monitor, stats=stats)
+            for tag in tags:  # every tag has the calculations of the shared conjunction, not only the last one
+                self.assertIn('amount less 0', monitor.get_tag_calculations(tag.name).columns)
+
+        df_stats = stats.dataframe()
+        df_shared = df_stats[df_stats['rule'] == 'amount less 0']
+        self.assertListEqual(sorted(df_shared['tag']), [tag.name for tag in tags])
+
+
+
+class TaggingProgressTestCase(unittest.TestCase):
+    setUp = RowChunkedTaggingTestCase.setUp
+
+    def tag_with_progress(self, sess, transactions) -> list[tuple]:
+        calls = []
+        sess.progress = lambda done, total: calls.append((done, total))
+        sess.tag(transactions)
+        return calls
+
+    def test_optrep_progress(self):
+        sess = OptREPTagging(self.tags).create_rule_execution_plan().create_optimised_rule_execution_plan()
+        n_batches = len(sess.split_in_batches())
+
+        self.assertListEqual(self.tag_with_progress(sess, self.transactions),
+                             [(i, n_batches) for i in range(n_batches + 1)])
+
+    def test_linear_progress(self):
+        self.assertListEqual(self.tag_with_progress(LinearTagging(self.tags), self.transactions),
+                             [(i, 5) for i in range(6)])
+
+    def test_incremental_progress(self):
+        tagged = OptREPTagging(self.tags).create_rule_execution_plan().create_optimised_rule_execution_plan() \
+            .tag(self.transactions)
+        calls = self.tag_with_progress(IncrementalTagging(self.tags, ['Big']), tagged)
+
+        self.assertGreater(len(calls), 1)
+        self.assertEqual(calls[-1][0], calls[-1][1])
+
+    def test_row_chunked_progress(self):
+        sess = RowChunkedTagging(LinearTagging(self.tags), workers=2, min_chunk_size=2)
+        self.assertListEqual(self.tag_with_progress(sess, self.transactions), [(0, 2), (1, 2), (2, 2)])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,110 @@
+import pathlib
+import pickle
+import tempfile
+import unittest
+
+import pandas as pd
+
+from mecon.tags import transformations
+from mecon.tags.transformation_cache import TransformationCache, row_hashes
+
+
+class RowHashesTestCase(unittest.TestCase):
+    def test_row_hashes(self):
+        self.assertListEqual(row_hashes(pd.Series(['a', 'b'])).tolist(), row_hashes(pd.Series(['a', 'b'])).tolist())
+        self.assertNotEqual(row_hashes(pd.Series(['a']))[0], row_hashes(pd.Series(['b']))[0])
+        self.assertNotEqual(row_hashes(pd.Series([1, 'a'], dtype=object))[0],
+                            row_hashes(pd.Series(['1', 'a'], dtype=object))[0])
+
+
+class TransformationCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache = TransformationCache(pathlib.Path(self.cache_dir.name))
+        self.df = pd.DataFrame({
+            'datetime': pd.to_datetime(['2021-01-01 00:00:00', '2021-01-02 10:30:00', '2021-02-03 12:00:00']),
+            'amount': [-10.5, 20.0, 300.0],
+            'description': ['PayPal order', 'Hotel Paris', ''],
+            'tags': ['', 'Rent', 'Rent,Airbnb'],
+        }, index=[5, 3, 8])
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_transform(self):
+        cases = [('description', transformations.LOWER), ('tags', transformations.SPLIT_COMMA),
+                 ('datetime', transformations.DATE), ('datetime', transformations.TIME),
+                 ('datetime', transformations.DAY_OF_WEEK), ('amount', transformations.ABS)]
+        for field, transformation in cases:
+            expected = transformation.apply_series(self.df[field])
+            for _ in range(2):  # a miss and then a hit
+                pd.testing.assert_series_equal(self.cache.transform(self.df[field], transformation), expected)
+            self.assertEqual(TransformationCache(self.cache.dirpath).transform(self.df[field], transformation).to_list(),
+                             expected.to_list())
+
+        self.assertDictEqual(self.cache.stats(), {'hits': 6, 'misses': 6, 'transformed_rows': 18, 'entries': 6,
+                                                  'bytes': self.cache.size()})
+
+    def test_appended_rows(self):
+        self.cache.transform(self.df['description'], transformations.LOWER)
+        longer_values = pd.Series(['PayPal order', 'Hotel Paris', '', 'New ROW', 'Other'], name='description')
+
+        cache = TransformationCache(self.cache.dirpath)
+        result = cache.transform(longer_values, transformations.LOWER)
+
+        self.assertListEqual(result.to_list(), ['paypal order', 'hotel paris', '', 'new row', 'other'])
+        self.assertListEqual(result.index.to_list(), longer_values.index.to_list())
+        self.assertEqual(cache.transformed_rows, 2)
+
+        changed_values = pd.Series(['Other', 'Hotel Paris', '', 'New ROW', 'Changed'], name='description')
+        self.assertListEqual(cache.transform(changed_values, transformations.LOWER).to_list(),
+                             ['other', 'hotel paris', '', 'new row', 'changed'])
+        self.assertEqual(cache.transformed_rows, 3)
+
+    def test_interleaved_rows(self):
+        self.cache.transform(self.df['datetime'], transformations.DATE)
+        # new transactions merged by datetime between the old ones, like DataManager.load_new_statements does
+        merged_values = pd.Series(pd.to_datetime(['2020-12-31 09:00:00', '2021-01-01 00:00:00', '2021-01-01 12:00:00',
+                                                  '2021-01-02 10:30:00', '2021-02-03 12:00:00', '2021-03-01 08:00:00']),
+                                  index=range(10, 16), name='datetime')
+
+        cache = TransformationCache(self.cache.dirpath)
+        result = cache.transform(merged_values, transformations.DATE)
+
+        pd.testing.assert_series_equal(result, transformations.DATE.apply_series(merged_values))
+        self.assertEqual(cache.transformed_rows, 3)
+        self.assertEqual(cache.transform(merged_values.iloc[::-1], transformations.DATE).to_list(),
+                         result.iloc[::-1].to_list())
+        self.assertEqual(cache.transformed_rows, 3)
+
+    def test_corrupted_output_is_transformed_again(self):
+        self.cache.transform(self.df['description'], transformations.LOWER)
+        path, = self.cache.dirpath.glob('lower-*.pkl')
+        path.write_bytes(b'corrupted')
+
+        cache = TransformationCache(self.cache.dirpath)
+        self.assertListEqual(cache.transform(self.df['description'], transformations.LOWER).to_list(),
+                             ['paypal order', 'hotel paris', ''])
+        self.assertEqual(cache.misses, 1)
+
+    def test_eviction(self):
+        self.cache.transform(self.df['description'], transformations.LOWER)
+        self.cache.max_bytes = self.cache.size()
+        self.cache.transform(self.df['description'], transformations.UPPER)
+
+        self.assertListEqual([path.name.split('-')[0] for path in self.cache.dirpath.glob('*.pkl')], ['upper'])
+
+    def test_empty_values(self):
+        result = self.cache.transform(self.df['description'].iloc[0:0], transformations.LOWER)
+        self.assertEqual(len(result), 0)
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_pickle(self):
+        self.cache.transform(self.df['description'], transformations.LOWER)
+        cache = pickle.loads(pickle.dumps(self.cache))
+        self.assertEqual(cache.dirpath, self.cache.dirpath)
+        self.assertEqual(len(cache._memory), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()